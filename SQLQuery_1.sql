@@ -37,6 +37,8 @@ CREATE TABLE AIRLINES (
 );
 
 
+GO
+
 -- TABLE 2: AIRPORTS
 
 CREATE TABLE AIRPORTS (
@@ -53,6 +55,8 @@ CREATE TABLE AIRPORTS (
 );
 
 
+GO
+
 -- TABLE 3: AIRCRAFT
 
 CREATE TABLE AIRCRAFT (
@@ -73,6 +77,8 @@ CREATE TABLE AIRCRAFT (
 );
 
 
+GO
+
 -- TABLE 4: PASSENGERS
 
 CREATE TABLE PASSENGERS (
@@ -94,6 +100,8 @@ CREATE TABLE PASSENGERS (
 
 
 
+GO
+
 -- TABLE 5: USERS (System Access)
 
 CREATE TABLE USERS (
@@ -111,6 +119,8 @@ CREATE TABLE USERS (
 );
 
 
+GO
+
 -- TABLE 6: FLIGHTS
 
 CREATE TABLE FLIGHTS (
@@ -127,6 +137,7 @@ CREATE TABLE FLIGHTS (
     available_seats INT NOT NULL CHECK (available_seats >= 0),
     status VARCHAR(20) DEFAULT 'Scheduled' CHECK (status IN ('Scheduled', 'Boarding', 'Departed', 'Arrived', 'Cancelled', 'Delayed')),
     gate_number VARCHAR(10),
+    schedule_id INT NULL, -- the FLIGHT_SCHEDULES pattern this flight was expanded from
     created_date DATETIME DEFAULT GETDATE(),
     CONSTRAINT FK_Flight_Airline FOREIGN KEY (airline_id) REFERENCES AIRLINES(airline_id) ON DELETE NO ACTION,
     CONSTRAINT FK_Flight_Aircraft FOREIGN KEY (aircraft_id) REFERENCES AIRCRAFT(aircraft_id) ON DELETE NO ACTION,
@@ -137,6 +148,8 @@ CREATE TABLE FLIGHTS (
     CONSTRAINT UQ_flight_schedule UNIQUE (flight_number, departure_datetime)
 );
 
+GO
+
 -- TABLE 7: RESERVATIONS
 
 CREATE TABLE RESERVATIONS (
@@ -153,10 +166,16 @@ CREATE TABLE RESERVATIONS (
     special_requests VARCHAR(500),
     created_date DATETIME DEFAULT GETDATE(),
     CONSTRAINT FK_Reservation_Passenger FOREIGN KEY (passenger_id) REFERENCES PASSENGERS(passenger_id) ON DELETE NO ACTION,
-    CONSTRAINT FK_Reservation_Flight FOREIGN KEY (flight_id) REFERENCES FLIGHTS(flight_id) ON DELETE NO ACTION,
-    CONSTRAINT UQ_seat_per_flight UNIQUE (flight_id, seat_number)
+    CONSTRAINT FK_Reservation_Flight FOREIGN KEY (flight_id) REFERENCES FLIGHTS(flight_id) ON DELETE NO ACTION
 );
 
+-- One holder per seat; a cancelled reservation gives its seat back for resale
+CREATE UNIQUE NONCLUSTERED INDEX UQ_seat_per_flight
+ON RESERVATIONS(flight_id, seat_number)
+WHERE seat_number IS NOT NULL AND reservation_status IN ('Confirmed', 'Checked-In');
+
+GO
+
 -- TABLE 8: PAYMENTS
 
 CREATE TABLE PAYMENTS (
@@ -173,6 +192,8 @@ CREATE TABLE PAYMENTS (
 );
 
 
+GO
+
 -- TABLE 9: AUDIT_LOG (For tracking changes)
 
 CREATE TABLE AUDIT_LOG (
@@ -186,6 +207,87 @@ CREATE TABLE AUDIT_LOG (
     changed_date DATETIME DEFAULT GETDATE()
 );
 
+
+GO
+
+-- TABLE 10: FLIGHTS_STAGING (Schedule imports)
+-- flight_import.py bulk-inserts validated schedule rows here, keyed by an import
+-- id, and SP_MergeStagedFlights merges them into FLIGHTS. No foreign keys or
+-- checks: the client validated the rows and the merge re-checks them.
+
+CREATE TABLE FLIGHTS_STAGING (
+    import_id VARCHAR(36) NOT NULL,
+    record_number INT NOT NULL,
+    airline_id INT NOT NULL,
+    aircraft_id INT NOT NULL,
+    flight_number VARCHAR(20) NOT NULL,
+    departure_airport_id INT NOT NULL,
+    arrival_airport_id INT NOT NULL,
+    departure_datetime DATETIME NOT NULL,
+    arrival_datetime DATETIME NOT NULL,
+    base_price DECIMAL(10,2) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    gate_number VARCHAR(10),
+    CONSTRAINT PK_FLIGHTS_STAGING PRIMARY KEY (import_id, record_number)
+);
+
+
+GO
+
+-- TABLE 11: FLIGHT_SCHEDULES (Recurring flights)
+-- One row per pattern: "PK-301 at 09:00, Mon-Fri, 1 March to 31 October".
+-- days_of_week has one 0/1 character per weekday, Monday first. SP_ExpandSchedules
+-- turns the patterns into dated FLIGHTS rows up to a horizon; pattern_version
+-- changes with any column of the pattern, so the expansion can tell which
+-- patterns were edited since it last ran (expanded_version).
+
+CREATE TABLE FLIGHT_SCHEDULES (
+    schedule_id INT IDENTITY(1,1) PRIMARY KEY,
+    airline_id INT NOT NULL,
+    aircraft_id INT NOT NULL,
+    flight_number VARCHAR(20) NOT NULL,
+    departure_airport_id INT NOT NULL,
+    arrival_airport_id INT NOT NULL,
+    departure_time TIME(0) NOT NULL,
+    duration_minutes INT NOT NULL CHECK (duration_minutes > 0),
+    days_of_week CHAR(7) NOT NULL DEFAULT '1111111' CHECK (days_of_week LIKE '[01][01][01][01][01][01][01]'),
+    valid_from DATE NOT NULL,
+    valid_to DATE NOT NULL,
+    base_price DECIMAL(10,2) NOT NULL CHECK (base_price > 0),
+    gate_number VARCHAR(10),
+    status VARCHAR(20) DEFAULT 'Active' CHECK (status IN ('Active', 'Suspended')),
+    pattern_version AS CHECKSUM(airline_id, aircraft_id, flight_number, departure_airport_id, arrival_airport_id,
+                                departure_time, duration_minutes, days_of_week, valid_from, valid_to, base_price,
+                                gate_number, status) PERSISTED,
+    expanded_version INT NULL,
+    expanded_through DATE NULL,
+    created_date DATETIME DEFAULT GETDATE(),
+    CONSTRAINT FK_Schedule_Airline FOREIGN KEY (airline_id) REFERENCES AIRLINES(airline_id),
+    CONSTRAINT FK_Schedule_Aircraft FOREIGN KEY (aircraft_id) REFERENCES AIRCRAFT(aircraft_id),
+    CONSTRAINT FK_Schedule_Departure FOREIGN KEY (departure_airport_id) REFERENCES AIRPORTS(airport_id),
+    CONSTRAINT FK_Schedule_Arrival FOREIGN KEY (arrival_airport_id) REFERENCES AIRPORTS(airport_id),
+    CONSTRAINT CHK_schedule_dates CHECK (valid_to >= valid_from),
+    CONSTRAINT CHK_schedule_airports CHECK (departure_airport_id != arrival_airport_id)
+);
+
+ALTER TABLE FLIGHTS ADD CONSTRAINT FK_Flight_Schedule
+    FOREIGN KEY (schedule_id) REFERENCES FLIGHT_SCHEDULES(schedule_id) ON DELETE NO ACTION;
+
+
+GO
+
+-- TABLE 12: SCHEMA_MIGRATIONS (Setup script batches already applied, kept by sql_runner.py)
+
+CREATE TABLE SCHEMA_MIGRATIONS (
+    script_name VARCHAR(100) NOT NULL,
+    batch_hash CHAR(64) NOT NULL,  -- SHA-256 of the batch text
+    batch_number INT NOT NULL,
+    start_line INT NOT NULL,
+    duration_ms INT NOT NULL,
+    applied_date DATETIME NOT NULL DEFAULT GETDATE(),
+    CONSTRAINT PK_schema_migrations PRIMARY KEY (script_name, batch_hash)
+);
+
 PRINT 'Database schema created successfully!';
 PRINT 'Total tables created: 12';
 GO
\ No newline at end of file
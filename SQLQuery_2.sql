@@ -98,6 +98,36 @@ CREATE NONCLUSTERED INDEX idx_audit_record
 ON AUDIT_LOG(table_name, record_id, changed_date DESC);
 GO
 
+-- KEYSET PAGINATION INDEXES
+-- The list screens page by seeking past the last row shown, so each sort key
+-- (ending in the primary key as tie-breaker) needs an index in that order.
+
+-- Available flights: ORDER BY departure_datetime, flight_id
+CREATE NONCLUSTERED INDEX idx_flights_departure_page
+ON FLIGHTS(departure_datetime, flight_id)
+INCLUDE (status, available_seats, airline_id, aircraft_id, departure_airport_id, arrival_airport_id, flight_number, base_price);
+GO
+
+-- Bookings: ORDER BY booking_date DESC, reservation_id DESC
+CREATE NONCLUSTERED INDEX idx_reservations_booking_page
+ON RESERVATIONS(booking_date DESC, reservation_id DESC)
+INCLUDE (passenger_id, flight_id, booking_reference, seat_number, class_type, total_price, payment_status, reservation_status);
+GO
+
+-- Audit log: ORDER BY changed_date DESC, log_id DESC
+CREATE NONCLUSTERED INDEX idx_audit_date_page
+ON AUDIT_LOG(changed_date DESC, log_id DESC)
+INCLUDE (table_name, operation_type, changed_by);
+GO
+
+-- SCHEDULE EXPANSION INDEX
+-- SP_ExpandSchedules finds the future flights of the patterns it re-expands
+CREATE NONCLUSTERED INDEX idx_flights_schedule
+ON FLIGHTS(schedule_id, departure_datetime)
+INCLUDE (flight_number, status)
+WHERE schedule_id IS NOT NULL;
+GO
+
 PRINT 'All indexes created successfully!';
 GO
 
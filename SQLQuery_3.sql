@@ -16,11 +16,21 @@ CREATE OR ALTER PROCEDURE SP_SearchFlights
     @departure_airport_id INT,
     @arrival_airport_id INT,
     @travel_date DATE,
-    @class_type VARCHAR(20) = NULL
+    @class_type VARCHAR(20) = NULL,
+    @flex_days INT = 0,             -- Also search this many days before and after @travel_date (0-7)
+    @earliest_time TIME = NULL,     -- Optional departure time-of-day window [earliest, latest);
+    @latest_time TIME = NULL        -- earliest > latest means a window across midnight
 AS
 BEGIN
     SET NOCOUNT ON;
     
+    -- Half-open datetime range instead of CAST(departure_datetime AS DATE) = @travel_date:
+    -- a bare column compared with a range lets idx_flights_route seek on
+    -- (departure_airport_id, arrival_airport_id, departure_datetime)
+    DECLARE @flex INT = CASE WHEN @flex_days > 7 THEN 7 WHEN @flex_days > 0 THEN @flex_days ELSE 0 END;
+    DECLARE @range_start DATETIME = DATEADD(DAY, -@flex, CAST(@travel_date AS DATETIME));
+    DECLARE @range_end DATETIME = DATEADD(DAY, @flex + 1, CAST(@travel_date AS DATETIME));
+    
     SELECT 
         f.flight_id,
         f.flight_number,
@@ -44,18 +54,52 @@ BEGIN
             WHEN @class_type = 'Business' THEN f.base_price * 2.5
             WHEN @class_type = 'First Class' THEN f.base_price * 4.0
             ELSE f.base_price
-        END AS class_price
+        END AS class_price,
+        -- Quoted price (booking-window pricing) and remaining seats for each class
+        q.economy_price,
+        q.economy_seats,
+        q.business_price,
+        q.business_seats,
+        q.first_class_price,
+        q.first_class_seats
     FROM FLIGHTS f
     INNER JOIN AIRLINES al ON f.airline_id = al.airline_id
     INNER JOIN AIRPORTS dep ON f.departure_airport_id = dep.airport_id
     INNER JOIN AIRPORTS arr ON f.arrival_airport_id = arr.airport_id
     INNER JOIN AIRCRAFT ac ON f.aircraft_id = ac.aircraft_id
+    CROSS APPLY (
+        SELECT
+            MAX(CASE WHEN cq.class_type = 'Economy' THEN cq.price END) AS economy_price,
+            MAX(CASE WHEN cq.class_type = 'Economy' THEN cq.available_class_seats END) AS economy_seats,
+            MAX(CASE WHEN cq.class_type = 'Business' THEN cq.price END) AS business_price,
+            MAX(CASE WHEN cq.class_type = 'Business' THEN cq.available_class_seats END) AS business_seats,
+            MAX(CASE WHEN cq.class_type = 'First Class' THEN cq.price END) AS first_class_price,
+            MAX(CASE WHEN cq.class_type = 'First Class' THEN cq.available_class_seats END) AS first_class_seats
+        FROM dbo.FN_ClassQuotes(GETDATE()) cq
+        WHERE cq.flight_id = f.flight_id
+    ) q
     WHERE f.departure_airport_id = @departure_airport_id
         AND f.arrival_airport_id = @arrival_airport_id
-        AND CAST(f.departure_datetime AS DATE) = @travel_date
+        AND f.departure_datetime >= @range_start
+        AND f.departure_datetime < @range_end
         AND f.status IN ('Scheduled', 'Boarding')
         AND f.available_seats > 0
-    ORDER BY f.departure_datetime;
+        -- A requested class must still have seats
+        AND (@class_type IS NULL
+             OR @class_type = 'Economy' AND q.economy_seats > 0
+             OR @class_type = 'Business' AND q.business_seats > 0
+             OR @class_type = 'First Class' AND q.first_class_seats > 0)
+        -- The time window is a residual filter on the rows the range seek already returned
+        AND (
+            (@earliest_time IS NULL OR @latest_time IS NULL OR @earliest_time <= @latest_time)
+                AND (@earliest_time IS NULL OR CAST(f.departure_datetime AS TIME) >= @earliest_time)
+                AND (@latest_time IS NULL OR CAST(f.departure_datetime AS TIME) < @latest_time)
+            OR @earliest_time > @latest_time
+                AND (CAST(f.departure_datetime AS TIME) >= @earliest_time
+                     OR CAST(f.departure_datetime AS TIME) < @latest_time)
+        )
+    -- flight_id breaks ties so flights leaving at the same minute keep their order
+    ORDER BY f.departure_datetime, f.flight_id;
 END;
 GO
 
@@ -76,14 +120,25 @@ BEGIN
     BEGIN TRANSACTION;
     
     BEGIN TRY
-        -- Check if flight exists and has available seats
-        DECLARE @available_seats INT, @base_price DECIMAL(10,2), @flight_status VARCHAR(20);
+        -- Check if flight exists and has available seats. UPDLOCK holds the flight row
+        -- until commit, so concurrent bookings of the same flight queue here and each
+        -- one's seat checks and insert see the seats taken before it; bookings of
+        -- other flights are not blocked.
+        DECLARE @available_seats INT, @base_price DECIMAL(10,2), @flight_status VARCHAR(20),
+                @departure_datetime DATETIME, @class_seats INT;
         
-        SELECT @available_seats = available_seats, 
-               @base_price = base_price,
-               @flight_status = status
-        FROM FLIGHTS 
-        WHERE flight_id = @flight_id;
+        SELECT @available_seats = f.available_seats, 
+               @base_price = f.base_price,
+               @flight_status = f.status,
+               @departure_datetime = f.departure_datetime,
+               @class_seats = CASE @class_type
+                   WHEN 'Economy' THEN ac.economy_seats
+                   WHEN 'Business' THEN ac.business_seats
+                   WHEN 'First Class' THEN ac.first_class_seats
+               END
+        FROM FLIGHTS f WITH (UPDLOCK, ROWLOCK)
+        INNER JOIN AIRCRAFT ac ON f.aircraft_id = ac.aircraft_id
+        WHERE f.flight_id = @flight_id;
         
         IF @available_seats IS NULL
         BEGIN
@@ -103,6 +158,14 @@ BEGIN
             RETURN;
         END
         
+        IF ISNULL(@class_seats, 0) <= (SELECT COUNT(*) FROM RESERVATIONS
+                                       WHERE flight_id = @flight_id AND class_type = @class_type
+                                           AND reservation_status IN ('Confirmed', 'Checked-In'))
+        BEGIN
+            RAISERROR('No %s seats left on this flight', 16, 1, @class_type);
+            RETURN;
+        END
+        
         -- Calculate price based on class
         SET @total_price = CASE 
             WHEN @class_type = 'Economy' THEN @base_price
@@ -112,9 +175,7 @@ BEGIN
         END;
         
         -- Apply dynamic pricing based on booking window
-        DECLARE @days_until_departure INT;
-        SELECT @days_until_departure = DATEDIFF(DAY, GETDATE(), departure_datetime)
-        FROM FLIGHTS WHERE flight_id = @flight_id;
+        DECLARE @days_until_departure INT = DATEDIFF(DAY, GETDATE(), @departure_datetime);
         
         IF @days_until_departure < 7
             SET @total_price = @total_price * 1.5;
@@ -129,14 +190,37 @@ BEGIN
             CHAR(65 + ABS(CHECKSUM(NEWID())) % 26) +
             CAST(ABS(CHECKSUM(NEWID())) % 1000000 AS VARCHAR(6));
         
-        -- Assign seat if not provided
+        -- Assign the first free seat of the class on the aircraft's seat map if not provided
         IF @seat_number IS NULL
         BEGIN
-            SET @seat_number = @class_type + '-' + CAST((SELECT COUNT(*) FROM RESERVATIONS WHERE flight_id = @flight_id) + 1 AS VARCHAR(3));
+            SELECT TOP (1) @seat_number = l.seat_number
+            FROM FLIGHTS f
+            CROSS APPLY dbo.FN_SeatLayout(f.aircraft_id) l
+            WHERE f.flight_id = @flight_id
+                AND l.class_type = @class_type
+                AND NOT EXISTS (SELECT 1 FROM RESERVATIONS r
+                                WHERE r.flight_id = @flight_id AND r.seat_number = l.seat_number
+                                    AND r.reservation_status IN ('Confirmed', 'Checked-In'))
+            ORDER BY l.seat_index;
+            
+            IF @seat_number IS NULL
+            BEGIN
+                RAISERROR('No %s seats left on this flight', 16, 1, @class_type);
+                RETURN;
+            END
+        END
+        ELSE IF NOT EXISTS (SELECT 1 FROM FLIGHTS f
+                            CROSS APPLY dbo.FN_SeatLayout(f.aircraft_id) l
+                            WHERE f.flight_id = @flight_id AND l.class_type = @class_type
+                                AND l.seat_number = @seat_number)
+        BEGIN
+            RAISERROR('Seat %s is not in the %s cabin of this aircraft', 16, 1, @seat_number, @class_type);
+            RETURN;
         END
         
         -- Check if seat is already booked
-        IF EXISTS (SELECT 1 FROM RESERVATIONS WHERE flight_id = @flight_id AND seat_number = @seat_number AND reservation_status = 'Confirmed')
+        IF EXISTS (SELECT 1 FROM RESERVATIONS WHERE flight_id = @flight_id AND seat_number = @seat_number
+                   AND reservation_status IN ('Confirmed', 'Checked-In'))
         BEGIN
             RAISERROR('Seat already booked', 16, 1);
             RETURN;
@@ -155,9 +239,11 @@ BEGIN
         
     END TRY
     BEGIN CATCH
-        ROLLBACK TRANSACTION;
-        DECLARE @ErrorMessage NVARCHAR(4000) = ERROR_MESSAGE();
-        RAISERROR(@ErrorMessage, 16, 1);
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+        -- Re-raise with the original error number, so callers can tell a deadlock
+        -- (1205) or a duplicate seat (2601) from a booking that can never succeed
+        THROW;
     END CATCH
 END;
 GO
@@ -407,5 +493,458 @@ BEGIN
 END;
 GO
 
-PRINT 'Total procedures: 8';
+-- SP 9: Book Flight
+-- Passenger upsert, reservation and payment in one transaction and one call
+
+CREATE OR ALTER PROCEDURE SP_BookFlight
+    @first_name VARCHAR(50),
+    @last_name VARCHAR(50),
+    @passport_number VARCHAR(20),
+    @email VARCHAR(100),
+    @phone_number VARCHAR(20),
+    @flight_id INT,
+    @class_type VARCHAR(20),
+    @seat_number VARCHAR(5) = NULL,
+    @payment_method VARCHAR(20) = NULL,
+    @card_last_four VARCHAR(4) = NULL,
+    @passenger_id INT OUTPUT,
+    @reservation_id INT OUTPUT,
+    @booking_reference VARCHAR(10) OUTPUT,
+    @total_price DECIMAL(10,2) OUTPUT,
+    @payment_id INT OUTPUT
+AS
+BEGIN
+    SET NOCOUNT ON;
+    BEGIN TRANSACTION;
+    
+    BEGIN TRY
+        -- Upsert passenger by passport number (range lock so two bookings cannot both insert)
+        SELECT @passenger_id = passenger_id
+        FROM PASSENGERS WITH (UPDLOCK, HOLDLOCK)
+        WHERE passport_number = @passport_number;
+        
+        IF @passenger_id IS NULL
+        BEGIN
+            INSERT INTO PASSENGERS (first_name, last_name, date_of_birth, nationality, passport_number, passport_expiry_date, email, phone_number)
+            VALUES (@first_name, @last_name, '1990-01-01', 'Unknown', @passport_number, '2030-01-01', @email, @phone_number);
+            
+            SET @passenger_id = SCOPE_IDENTITY();
+        END
+        ELSE
+        BEGIN
+            UPDATE PASSENGERS
+            SET email = @email, phone_number = @phone_number
+            WHERE passenger_id = @passenger_id;
+        END
+        
+        -- Seat checks, pricing and the reservation itself
+        EXEC SP_CreateReservation
+            @passenger_id = @passenger_id,
+            @flight_id = @flight_id,
+            @class_type = @class_type,
+            @seat_number = @seat_number,
+            @reservation_id = @reservation_id OUTPUT,
+            @booking_reference = @booking_reference OUTPUT,
+            @total_price = @total_price OUTPUT;
+        
+        -- Payment for the server-calculated price
+        SET @payment_id = NULL;
+        IF @payment_method IS NOT NULL
+        BEGIN
+            EXEC SP_ProcessPayment
+                @reservation_id = @reservation_id,
+                @payment_method = @payment_method,
+                @amount = @total_price,
+                @card_last_four = @card_last_four,
+                @payment_id = @payment_id OUTPUT;
+        END
+        
+        COMMIT TRANSACTION;
+        
+    END TRY
+    BEGIN CATCH
+        -- SP_CreateReservation rolls back on its own errors, so the transaction may already be gone
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+        THROW;
+    END CATCH
+END;
+GO
+
+-- SP 10: Update Flight Status
+-- Changes a flight's status, records the change in AUDIT_LOG and returns the
+-- flight's route and departure so clients can drop cached search results for it.
+
+CREATE OR ALTER PROCEDURE SP_UpdateFlightStatus
+    @flight_id INT,
+    @new_status VARCHAR(20),
+    @changed_by VARCHAR(50) = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    -- The status change and its audit row commit together or not at all
+    SET XACT_ABORT ON;
+    
+    IF @new_status NOT IN ('Scheduled', 'Boarding', 'Departed', 'Arrived', 'Cancelled', 'Delayed')
+    BEGIN
+        RAISERROR('Invalid flight status.', 16, 1);
+        RETURN;
+    END
+    
+    DECLARE @old_status VARCHAR(20);
+    
+    BEGIN TRY
+        BEGIN TRANSACTION;
+        
+        -- Locked until the commit, so a concurrent change cannot slip between the read and the audit row
+        SELECT @old_status = status FROM FLIGHTS WITH (UPDLOCK) WHERE flight_id = @flight_id;
+        
+        IF @old_status IS NULL
+            RAISERROR('Flight not found.', 16, 1);
+        
+        UPDATE FLIGHTS SET status = @new_status WHERE flight_id = @flight_id;
+        
+        INSERT INTO AUDIT_LOG (table_name, operation_type, record_id, old_value, new_value, changed_by)
+        VALUES ('FLIGHTS', 'UPDATE', @flight_id, 'status=' + @old_status, 'status=' + @new_status,
+                ISNULL(@changed_by, SUSER_SNAME()));
+        
+        COMMIT TRANSACTION;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+        THROW;
+    END CATCH
+    
+    SELECT flight_id, departure_airport_id, arrival_airport_id, departure_datetime, status
+    FROM FLIGHTS WHERE flight_id = @flight_id;
+END;
+GO
+
+-- SP 11: Reconcile Available Seats
+-- TRG_UpdateAvailableSeats maintains FLIGHTS.available_seats by deltas. This
+-- recounts the seat-holding reservations of every flight (or one flight),
+-- returns each flight whose counter has drifted and, with @repair = 1, resets
+-- it and records the correction in AUDIT_LOG. A flight booked or cancelled
+-- between the recount and the repair is left for the next run; repaired = 0
+-- marks it in the result. Run it from the Admin tab or on a schedule (e.g. a
+-- nightly SQL Server Agent job).
+
+CREATE OR ALTER PROCEDURE SP_ReconcileAvailableSeats
+    @repair BIT = 1,
+    @flight_id INT = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    
+    DECLARE @drift TABLE (flight_id INT PRIMARY KEY, recorded_seats INT, expected_seats INT);
+    DECLARE @repaired TABLE (flight_id INT PRIMARY KEY, old_seats INT, new_seats INT);
+    
+    INSERT INTO @drift (flight_id, recorded_seats, expected_seats)
+    SELECT f.flight_id, f.available_seats, ac.total_seats - ISNULL(held.seats, 0)
+    FROM FLIGHTS f
+    INNER JOIN AIRCRAFT ac ON f.aircraft_id = ac.aircraft_id
+    LEFT JOIN (
+        SELECT flight_id, COUNT(*) AS seats
+        FROM RESERVATIONS
+        WHERE reservation_status IN ('Confirmed', 'Checked-In')
+        GROUP BY flight_id
+    ) held ON held.flight_id = f.flight_id
+    WHERE (@flight_id IS NULL OR f.flight_id = @flight_id)
+        AND f.available_seats <> ac.total_seats - ISNULL(held.seats, 0);
+    
+    IF @repair = 1 AND EXISTS (SELECT 1 FROM @drift)
+    BEGIN
+        BEGIN TRANSACTION;
+        
+        -- Skip flights whose counter moved since the recount (a booking in between)
+        UPDATE f
+        SET available_seats = CASE WHEN d.expected_seats < 0 THEN 0 ELSE d.expected_seats END
+        OUTPUT inserted.flight_id, deleted.available_seats, inserted.available_seats INTO @repaired
+        FROM FLIGHTS f
+        INNER JOIN @drift d ON f.flight_id = d.flight_id
+        WHERE f.available_seats = d.recorded_seats;
+        
+        -- Only the counters the UPDATE actually changed are audited
+        INSERT INTO AUDIT_LOG (table_name, operation_type, record_id, old_value, new_value, changed_by)
+        SELECT 'FLIGHTS', 'UPDATE', flight_id,
+               'available_seats=' + CAST(old_seats AS VARCHAR(10)),
+               'available_seats=' + CAST(new_seats AS VARCHAR(10)),
+               'SP_ReconcileAvailableSeats'
+        FROM @repaired;
+        
+        COMMIT TRANSACTION;
+    END
+    
+    SELECT d.flight_id, d.recorded_seats, d.expected_seats, d.expected_seats - d.recorded_seats AS drift,
+           CAST(CASE WHEN r.flight_id IS NULL THEN 0 ELSE 1 END AS BIT) AS repaired
+    FROM @drift d
+    LEFT JOIN @repaired r ON r.flight_id = d.flight_id
+    ORDER BY d.flight_id;
+END;
+GO
+
+-- SP 12: Merge Staged Flights
+-- Moves one import's rows from FLIGHTS_STAGING into FLIGHTS in one transaction.
+-- A flight already scheduled (same flight_number and departure_datetime) takes
+-- the file's arrival, price and gate; its aircraft, route and seat counter stay.
+-- New flights are inserted with every seat of their aircraft available. When
+-- the file lists a flight twice, the first record wins and the later ones are
+-- returned as duplicates (the first 20 of them by record number).
+
+CREATE OR ALTER PROCEDURE SP_MergeStagedFlights
+    @import_id VARCHAR(36),
+    @changed_by VARCHAR(50) = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    
+    DECLARE @actions TABLE (merge_action NVARCHAR(10));
+    DECLARE @duplicates TABLE (record_number INT PRIMARY KEY);
+    DECLARE @staged INT, @inserted INT, @updated INT;
+    
+    BEGIN TRY
+        BEGIN TRANSACTION;
+        
+        -- UQ_flight_schedule across batches: the client only checked within each one
+        WITH ranked AS (
+            SELECT record_number,
+                   ROW_NUMBER() OVER (PARTITION BY flight_number, departure_datetime ORDER BY record_number) AS n
+            FROM FLIGHTS_STAGING
+            WHERE import_id = @import_id
+        )
+        DELETE FROM ranked
+        OUTPUT deleted.record_number INTO @duplicates
+        WHERE n > 1;
+        
+        SELECT @staged = COUNT(*) FROM FLIGHTS_STAGING WHERE import_id = @import_id;
+        
+        MERGE FLIGHTS WITH (HOLDLOCK) AS f
+        USING (
+            SELECT s.*, ac.total_seats
+            FROM FLIGHTS_STAGING s
+            INNER JOIN AIRCRAFT ac ON s.aircraft_id = ac.aircraft_id
+            WHERE s.import_id = @import_id
+        ) AS s
+        ON f.flight_number = s.flight_number AND f.departure_datetime = s.departure_datetime
+        WHEN MATCHED AND (f.arrival_datetime <> s.arrival_datetime OR f.base_price <> s.base_price
+                          OR ISNULL(f.gate_number, '') <> ISNULL(s.gate_number, '')) THEN
+            UPDATE SET arrival_datetime = s.arrival_datetime, base_price = s.base_price, gate_number = s.gate_number
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT (airline_id, aircraft_id, flight_number, departure_airport_id, arrival_airport_id,
+                    departure_datetime, arrival_datetime, base_price, available_seats, status, gate_number)
+            VALUES (s.airline_id, s.aircraft_id, s.flight_number, s.departure_airport_id, s.arrival_airport_id,
+                    s.departure_datetime, s.arrival_datetime, s.base_price, s.total_seats, s.status, s.gate_number)
+        OUTPUT $action INTO @actions;
+        
+        SELECT @inserted = COUNT(CASE WHEN merge_action = 'INSERT' THEN 1 END),
+               @updated = COUNT(CASE WHEN merge_action = 'UPDATE' THEN 1 END)
+        FROM @actions;
+        
+        DELETE FROM FLIGHTS_STAGING WHERE import_id = @import_id;
+        
+        -- One audit row per kind of change the import made
+        INSERT INTO AUDIT_LOG (table_name, operation_type, record_id, old_value, new_value, changed_by)
+        SELECT 'FLIGHTS', op.operation_type, NULL, NULL,
+               'import ' + @import_id + ': ' + CAST(op.flights AS VARCHAR(10)) + ' ' + op.verb,
+               ISNULL(@changed_by, SUSER_SNAME())
+        FROM (VALUES ('INSERT', @inserted, 'inserted'), ('UPDATE', @updated, 'updated')) op (operation_type, flights, verb)
+        WHERE op.flights > 0;
+        
+        COMMIT TRANSACTION;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+        THROW;
+    END CATCH
+    
+    SELECT @inserted AS inserted, @updated AS updated, @staged - @inserted - @updated AS unchanged,
+           (SELECT COUNT(*) FROM @duplicates) AS duplicates,
+           (SELECT STRING_AGG(CAST(record_number AS VARCHAR(10)), ',') WITHIN GROUP (ORDER BY record_number)
+            FROM (SELECT TOP (20) record_number FROM @duplicates ORDER BY record_number) d) AS duplicate_records;
+END;
+GO
+
+-- SP 13: Expand Schedules
+-- Materialises FLIGHT_SCHEDULES into dated FLIGHTS rows from now through
+-- @through, set-based: the days of the window are cross-joined with the
+-- patterns and merged into FLIGHTS in one statement. Patterns unchanged since
+-- the last run only get the days past their expanded_through. Edited patterns
+-- are expanded again over the whole window, and MERGE writes only the flights
+-- that differ, so their bookings and seat counters stay. A flight that left
+-- its pattern (other weekdays, a shorter season, a suspended pattern) is
+-- deleted when it has no reservations and cancelled otherwise. New flights
+-- start with every seat of their aircraft. A changed aircraft moves
+-- available_seats by the difference in seats; when the seats already held
+-- would not fit, the flight keeps its aircraft and counts as a conflict, as
+-- does a flight claimed by two patterns (the lower schedule_id wins). Flights
+-- that have departed are never touched.
+
+CREATE OR ALTER PROCEDURE SP_ExpandSchedules
+    @through DATE,
+    @schedule_id INT = NULL,
+    @changed_by VARCHAR(50) = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    
+    DECLARE @now DATETIME = GETDATE();
+    DECLARE @today DATE = CAST(@now AS DATE);
+    DECLARE @work TABLE (schedule_id INT PRIMARY KEY, first_day DATE, last_day DATE, changed BIT, version INT);
+    DECLARE @actions TABLE (merge_action NVARCHAR(10));
+    DECLARE @inserted INT = 0, @updated INT = 0, @deleted INT = 0, @cancelled INT = 0, @conflicts INT = 0;
+    
+    IF DATEDIFF(DAY, @today, @through) > 9999
+    BEGIN
+        RAISERROR('The horizon can be at most 9999 days ahead.', 16, 1);
+        RETURN;
+    END
+    
+    BEGIN TRY
+        BEGIN TRANSACTION;
+        
+        -- The days each pattern needs: edited patterns the whole window (and as far as
+        -- they were expanded before), the others only the days after their last run
+        INSERT INTO @work (schedule_id, first_day, last_day, changed, version)
+        SELECT schedule_id,
+               CASE WHEN changed = 1 OR expanded_through IS NULL OR expanded_through < @today THEN @today
+                    ELSE DATEADD(DAY, 1, expanded_through) END,
+               CASE WHEN changed = 1 AND expanded_through > @through THEN expanded_through ELSE @through END,
+               changed, pattern_version
+        FROM (
+            SELECT schedule_id, expanded_through, pattern_version,
+                   CASE WHEN expanded_version IS NULL OR expanded_version <> pattern_version THEN 1 ELSE 0 END AS changed
+            FROM FLIGHT_SCHEDULES WITH (UPDLOCK)
+            WHERE @schedule_id IS NULL OR schedule_id = @schedule_id
+        ) s;
+        
+        -- Every wanted flight: the days of the window joined to the patterns flying on them
+        WITH digits AS (
+            SELECT n FROM (VALUES (0), (1), (2), (3), (4), (5), (6), (7), (8), (9)) AS v(n)
+        ),
+        days AS (
+            SELECT DATEADD(DAY, a.n + 10 * b.n + 100 * c.n + 1000 * d.n, @today) AS day
+            FROM digits a CROSS JOIN digits b CROSS JOIN digits c CROSS JOIN digits d
+        )
+        SELECT s.schedule_id, s.airline_id, s.aircraft_id, s.flight_number, s.departure_airport_id,
+               s.arrival_airport_id, dep.departure_datetime,
+               DATEADD(MINUTE, s.duration_minutes, dep.departure_datetime) AS arrival_datetime,
+               s.base_price, s.gate_number, ac.total_seats,
+               ROW_NUMBER() OVER (PARTITION BY s.flight_number, dep.departure_datetime ORDER BY s.schedule_id) AS n
+        INTO #wanted
+        FROM @work w
+        INNER JOIN FLIGHT_SCHEDULES s ON s.schedule_id = w.schedule_id
+        INNER JOIN AIRCRAFT ac ON ac.aircraft_id = s.aircraft_id
+        INNER JOIN days ON days.day BETWEEN w.first_day AND w.last_day
+                       AND days.day BETWEEN s.valid_from AND s.valid_to
+        CROSS APPLY (SELECT CAST(days.day AS DATETIME) + CAST(s.departure_time AS DATETIME) AS departure_datetime) dep
+        WHERE s.status = 'Active'
+            -- 1 January 1900 was a Monday, so this is 1 for Monday whatever DATEFIRST says
+            AND SUBSTRING(s.days_of_week, DATEDIFF(DAY, '19000101', days.day) % 7 + 1, 1) = '1'
+            AND dep.departure_datetime > @now;
+        
+        -- The same flight from two patterns
+        DELETE FROM #wanted WHERE n > 1;
+        SET @conflicts = @@ROWCOUNT;
+        CREATE UNIQUE CLUSTERED INDEX ix_wanted ON #wanted (flight_number, departure_datetime);
+        
+        -- Future flights of edited patterns that are not wanted any more. UPDLOCK keeps
+        -- bookings out of them until commit, so none is deleted under a new reservation.
+        SELECT f.flight_id,
+               CASE WHEN EXISTS (SELECT 1 FROM RESERVATIONS r WHERE r.flight_id = f.flight_id) THEN 1 ELSE 0 END AS booked
+        INTO #dropped
+        FROM FLIGHTS f WITH (UPDLOCK)
+        INNER JOIN @work w ON f.schedule_id = w.schedule_id AND w.changed = 1
+        WHERE f.departure_datetime > @now
+            AND f.departure_datetime < DATEADD(DAY, 1, CAST(w.last_day AS DATETIME))
+            AND f.status NOT IN ('Cancelled', 'Departed', 'Arrived')
+            AND NOT EXISTS (SELECT 1 FROM #wanted x
+                            WHERE x.flight_number = f.flight_number AND x.departure_datetime = f.departure_datetime
+                                AND x.schedule_id = f.schedule_id);
+        
+        DELETE FROM FLIGHTS WHERE flight_id IN (SELECT flight_id FROM #dropped WHERE booked = 0);
+        SET @deleted = @@ROWCOUNT;
+        
+        UPDATE FLIGHTS SET status = 'Cancelled'
+        OUTPUT 'FLIGHTS', 'UPDATE', inserted.flight_id, 'status=' + deleted.status, 'status=Cancelled',
+               ISNULL(@changed_by, 'SP_ExpandSchedules')
+        INTO AUDIT_LOG (table_name, operation_type, record_id, old_value, new_value, changed_by)
+        WHERE flight_id IN (SELECT flight_id FROM #dropped WHERE booked = 1);
+        SET @cancelled = @@ROWCOUNT;
+        
+        -- Flights held by another pattern, and aircraft changes the bookings would not fit
+        DELETE x FROM #wanted x
+        INNER JOIN FLIGHTS f ON f.flight_number = x.flight_number AND f.departure_datetime = x.departure_datetime
+        WHERE f.schedule_id <> x.schedule_id;
+        SET @conflicts += @@ROWCOUNT;
+        
+        SELECT @conflicts += COUNT(*)
+        FROM #wanted x
+        INNER JOIN FLIGHTS f ON f.flight_number = x.flight_number AND f.departure_datetime = x.departure_datetime
+        INNER JOIN AIRCRAFT cur ON cur.aircraft_id = f.aircraft_id
+        WHERE f.aircraft_id <> x.aircraft_id AND f.available_seats + x.total_seats - cur.total_seats < 0;
+        
+        MERGE FLIGHTS WITH (HOLDLOCK) AS f
+        USING (
+            SELECT x.*, cur.total_seats AS current_seats
+            FROM #wanted x
+            LEFT JOIN FLIGHTS ef ON ef.flight_number = x.flight_number AND ef.departure_datetime = x.departure_datetime
+            LEFT JOIN AIRCRAFT cur ON cur.aircraft_id = ef.aircraft_id
+        ) AS x
+        ON f.flight_number = x.flight_number AND f.departure_datetime = x.departure_datetime
+        WHEN MATCHED AND (f.schedule_id IS NULL OR f.airline_id <> x.airline_id
+                          OR f.departure_airport_id <> x.departure_airport_id
+                          OR f.arrival_airport_id <> x.arrival_airport_id OR f.arrival_datetime <> x.arrival_datetime
+                          OR f.base_price <> x.base_price OR ISNULL(f.gate_number, '') <> ISNULL(x.gate_number, '')
+                          OR (f.aircraft_id <> x.aircraft_id AND f.available_seats + x.total_seats - x.current_seats >= 0)) THEN
+            UPDATE SET schedule_id = x.schedule_id, airline_id = x.airline_id,
+                       departure_airport_id = x.departure_airport_id, arrival_airport_id = x.arrival_airport_id,
+                       arrival_datetime = x.arrival_datetime, base_price = x.base_price, gate_number = x.gate_number,
+                       aircraft_id = CASE WHEN f.available_seats + x.total_seats - x.current_seats >= 0
+                                          THEN x.aircraft_id ELSE f.aircraft_id END,
+                       available_seats = CASE WHEN f.available_seats + x.total_seats - x.current_seats >= 0
+                                              THEN f.available_seats + x.total_seats - x.current_seats
+                                              ELSE f.available_seats END
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT (airline_id, aircraft_id, flight_number, departure_airport_id, arrival_airport_id,
+                    departure_datetime, arrival_datetime, base_price, available_seats, status, gate_number, schedule_id)
+            VALUES (x.airline_id, x.aircraft_id, x.flight_number, x.departure_airport_id, x.arrival_airport_id,
+                    x.departure_datetime, x.arrival_datetime, x.base_price, x.total_seats, 'Scheduled', x.gate_number,
+                    x.schedule_id)
+        OUTPUT $action INTO @actions;
+        
+        SELECT @inserted = COUNT(CASE WHEN merge_action = 'INSERT' THEN 1 END),
+               @updated = COUNT(CASE WHEN merge_action = 'UPDATE' THEN 1 END)
+        FROM @actions;
+        
+        UPDATE s
+        SET expanded_version = w.version,
+            expanded_through = CASE WHEN s.expanded_through > w.last_day THEN s.expanded_through ELSE w.last_day END
+        FROM FLIGHT_SCHEDULES s
+        INNER JOIN @work w ON s.schedule_id = w.schedule_id;
+        
+        IF @inserted + @updated + @deleted + @cancelled > 0
+            INSERT INTO AUDIT_LOG (table_name, operation_type, record_id, old_value, new_value, changed_by)
+            VALUES ('FLIGHT_SCHEDULES', 'UPDATE', @schedule_id, NULL,
+                    'expanded through ' + CONVERT(VARCHAR(10), @through, 120) + ': '
+                        + CAST(@inserted AS VARCHAR(10)) + ' inserted, ' + CAST(@updated AS VARCHAR(10)) + ' updated, '
+                        + CAST(@deleted AS VARCHAR(10)) + ' deleted, ' + CAST(@cancelled AS VARCHAR(10)) + ' cancelled',
+                    ISNULL(@changed_by, SUSER_SNAME()));
+        
+        COMMIT TRANSACTION;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+        THROW;
+    END CATCH
+    
+    SELECT (SELECT COUNT(*) FROM @work WHERE changed = 1) AS changed_schedules,
+           @inserted AS inserted, @updated AS updated, @deleted AS deleted, @cancelled AS cancelled,
+           @conflicts AS conflicts;
+END;
+GO
+
+PRINT 'Total procedures: 13';
 GO
\ No newline at end of file
@@ -8,22 +8,35 @@ GO
 
 CREATE OR ALTER TRIGGER TRG_UpdateAvailableSeats
 ON RESERVATIONS
-AFTER INSERT, UPDATE
+AFTER INSERT, UPDATE, DELETE
 AS
 BEGIN
     SET NOCOUNT ON;
     
-    -- Update available seats for affected flights
+    -- Updates that leave status and flight alone (e.g. payment_status) cannot move a seat
+    IF EXISTS (SELECT 1 FROM inserted) AND EXISTS (SELECT 1 FROM deleted)
+       AND NOT (UPDATE(reservation_status) OR UPDATE(flight_id))
+        RETURN;
+    
+    -- Adjust each affected flight by the net change in seat-holding reservations:
+    -- a row entering 'Confirmed'/'Checked-In' takes a seat, a row leaving those
+    -- statuses (or deleted) gives it back. Only the affected FLIGHTS rows are
+    -- touched; no reservations are counted. SP_ReconcileAvailableSeats repairs drift.
     UPDATE f
-    SET available_seats = ac.total_seats - (
-        SELECT COUNT(*) 
-        FROM RESERVATIONS r
-        WHERE r.flight_id = f.flight_id 
-            AND r.reservation_status IN ('Confirmed', 'Checked-In')
-    )
+    SET available_seats = f.available_seats - d.seats_taken
     FROM FLIGHTS f
-    INNER JOIN AIRCRAFT ac ON f.aircraft_id = ac.aircraft_id
-    WHERE f.flight_id IN (SELECT DISTINCT flight_id FROM inserted);
+    INNER JOIN (
+        SELECT flight_id, SUM(seats) AS seats_taken
+        FROM (
+            SELECT flight_id, 1 AS seats FROM inserted
+            WHERE reservation_status IN ('Confirmed', 'Checked-In')
+            UNION ALL
+            SELECT flight_id, -1 FROM deleted
+            WHERE reservation_status IN ('Confirmed', 'Checked-In')
+        ) changes
+        GROUP BY flight_id
+        HAVING SUM(seats) <> 0
+    ) d ON f.flight_id = d.flight_id;
 END;
 GO
 
@@ -51,7 +64,7 @@ END;
 GO
 
 PRINT 'All functions and triggers created successfully!';
-PRINT 'Total Functions: 2';
+PRINT 'Total Functions: 4';
 PRINT 'Total Triggers: 2';
 GO
 
@@ -143,6 +156,100 @@ END;
 GO
 
 
+-- FUNCTION 3: Class Quotes (inline, set-based)
+-- Price and remaining seats for all three classes of every flight, priced
+-- exactly like FN_CalculateTicketPrice and counted like FN_GetAvailableSeatsByClass.
+-- Being an inline table-valued function it is expanded into the calling query,
+-- so a filter on flight_id becomes an index seek and plans can run in parallel:
+--     SELECT * FROM dbo.FN_ClassQuotes(GETDATE()) WHERE flight_id = @flight_id;
+--     SELECT ... FROM FLIGHTS f CROSS APPLY (SELECT ... FROM dbo.FN_ClassQuotes(GETDATE()) q
+--                                            WHERE q.flight_id = f.flight_id) ...;
+
+CREATE OR ALTER FUNCTION FN_ClassQuotes
+(
+    @booking_date DATETIME
+)
+RETURNS TABLE
+AS
+RETURN
+    SELECT
+        f.flight_id,
+        c.class_type,
+        CAST(f.base_price * c.class_multiplier *
+             CAST(CASE
+                 WHEN DATEDIFF(DAY, @booking_date, f.departure_datetime) < 7 THEN 1.5
+                 WHEN DATEDIFF(DAY, @booking_date, f.departure_datetime) < 14 THEN 1.3
+                 WHEN DATEDIFF(DAY, @booking_date, f.departure_datetime) < 30 THEN 1.1
+                 ELSE 1.0
+             END AS DECIMAL(5,2)) AS DECIMAL(10,2)) AS price,
+        c.class_seats AS total_class_seats,
+        CASE WHEN c.class_seats - booked.seats < 0 THEN 0 ELSE c.class_seats - booked.seats END AS available_class_seats
+    FROM FLIGHTS f
+    INNER JOIN AIRCRAFT ac ON f.aircraft_id = ac.aircraft_id
+    CROSS APPLY (VALUES
+        ('Economy', CAST(1.0 AS DECIMAL(5,2)), ac.economy_seats),
+        ('Business', CAST(2.5 AS DECIMAL(5,2)), ac.business_seats),
+        ('First Class', CAST(4.0 AS DECIMAL(5,2)), ac.first_class_seats)
+    ) c (class_type, class_multiplier, class_seats)
+    CROSS APPLY (
+        SELECT COUNT(*) AS seats
+        FROM RESERVATIONS r
+        WHERE r.flight_id = f.flight_id
+            AND r.class_type = c.class_type
+            AND r.reservation_status IN ('Confirmed', 'Checked-In')
+    ) booked;
+GO
+
+
+-- FUNCTION 4: Seat Layout (inline)
+-- Every seat of an aircraft, derived from its class seat counts exactly like
+-- seat_map.SeatLayout: First Class rows first (4 across), then Business (6
+-- across), then Economy (6 across, 9 with more than 200 economy seats). Rows
+-- are numbered from 1 and a cabin's last row is filled from the left.
+--     SELECT seat_number FROM FLIGHTS f CROSS APPLY dbo.FN_SeatLayout(f.aircraft_id) l
+--     WHERE f.flight_id = @flight_id AND l.class_type = 'Business';
+
+CREATE OR ALTER FUNCTION FN_SeatLayout
+(
+    @aircraft_id INT
+)
+RETURNS TABLE
+AS
+RETURN
+    WITH cabins AS (
+        SELECT
+            c.class_type,
+            c.class_seats,
+            c.letters,
+            -- Seats and rows of the cabins in front of this one
+            ISNULL(SUM(c.class_seats) OVER (ORDER BY c.cabin_order
+                ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) AS first_index,
+            1 + ISNULL(SUM((c.class_seats + LEN(c.letters) - 1) / LEN(c.letters)) OVER (ORDER BY c.cabin_order
+                ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) AS first_row
+        FROM AIRCRAFT ac
+        CROSS APPLY (VALUES
+            ('First Class', 1, ac.first_class_seats, 'ACDF'),
+            ('Business', 2, ac.business_seats, 'ABCDEF'),
+            ('Economy', 3, ac.economy_seats, CASE WHEN ac.economy_seats > 200 THEN 'ABCDEFGHK' ELSE 'ABCDEF' END)
+        ) c (class_type, cabin_order, class_seats, letters)
+        WHERE ac.aircraft_id = @aircraft_id
+    ),
+    digits AS (
+        SELECT d FROM (VALUES (0), (1), (2), (3), (4), (5), (6), (7), (8), (9)) v (d)
+    ),
+    numbers AS (
+        SELECT a.d + 10 * b.d + 100 * c.d + 1000 * e.d AS n
+        FROM digits a CROSS JOIN digits b CROSS JOIN digits c CROSS JOIN digits e
+    )
+    SELECT
+        cab.class_type,
+        cab.first_index + n.n AS seat_index,
+        CAST(CAST(cab.first_row + n.n / LEN(cab.letters) AS VARCHAR(3))
+             + SUBSTRING(cab.letters, n.n % LEN(cab.letters) + 1, 1) AS VARCHAR(5)) AS seat_number
+    FROM cabins cab
+    INNER JOIN numbers n ON n.n < cab.class_seats;
+GO
+
 PRINT 'All functions created successfully!';
 GO
 
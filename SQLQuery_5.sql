@@ -360,6 +360,11 @@ ELSE
 GO
 
 
+-- Sample flights were inserted with preset seat counts; make them agree with the reservations
+EXEC SP_ReconcileAvailableSeats @repair = 1;
+GO
+
+
 PRINT '';
 PRINT '========================================';
 PRINT 'DATABASE SETUP COMPLETE!';
@@ -0,0 +1,1603 @@
+"""Benchmarks for the data layer.
+
+Each benchmark runs against stub_driver (a sqlite-backed pyodbc stand-in with
+simulated latency) so the numbers are reproducible without SQL Server; they
+compare the shape of the old and new code paths (logins, round trips),
+not raw server speed. seat_counters writes from several threads, so it uses
+a sqlite file database instead of the shared in-memory one.
+
+    python benchmarks.py             # list benchmarks
+    python benchmarks.py cold_start  # run one
+    python benchmarks.py all
+"""
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import stub_driver
+from booking import book
+from database_connection import DEFAULT_SETTINGS, PROJECT_DIR, DatabaseConnection, RetryPolicy, _installed_drivers
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def timed(fn, repeat=5):
+    """Run fn repeat times; return (median seconds, last result)."""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def report(title, rows):
+    print(f"\n{title}")
+    width = max(len(r[0]) for r in rows)
+    for label, value in rows:
+        print(f"  {label.ljust(width)}  {value}")
+
+
+# --- Cold start: driver discovery ---
+LEGACY_DRIVERS = [
+    "ODBC Driver 18 for SQL Server",
+    "ODBC Driver 17 for SQL Server",
+    "ODBC Driver 13 for SQL Server",
+    "SQL Server",
+]
+
+
+def legacy_connect(driver_module):
+    """The original connect(): walk the hard-coded list, full login per attempt, then master fallback."""
+    template = ("DRIVER={{{driver}}};SERVER=localhost,1433;DATABASE=FlightReservationDB;"
+                "UID=sa;PWD=DB_Password123!;TrustServerCertificate=yes;")
+    for driver in LEGACY_DRIVERS:
+        conn_str = template.format(driver=driver)
+        try:
+            return driver_module.connect(conn_str, autocommit=True)
+        except driver_module.Error as e:
+            if "4060" in str(e) or "Cannot open database" in str(e):
+                try:
+                    return driver_module.connect(conn_str.replace("DATABASE=FlightReservationDB;", "DATABASE=master;"),
+                                                 autocommit=True)
+                except driver_module.Error:
+                    continue
+    return None
+
+
+@benchmark("cold_start")
+def bench_cold_start(login_latency=0.05):
+    # Driver 18 is installed but fails its TLS handshake, so every app start pays one wasted login
+    stub_driver.installed = ["ODBC Driver 18 for SQL Server", "ODBC Driver 17 for SQL Server"]
+    stub_driver.broken_drivers = {"ODBC Driver 18 for SQL Server"}
+    stub_driver.login_latency = login_latency
+    cache_path = os.path.join(tempfile.mkdtemp(), "cache.json")
+
+    def logins(fn):
+        before = stub_driver.stats["logins"]
+        seconds, _ = timed(fn, repeat=3)
+        return seconds, (stub_driver.stats["logins"] - before) // 3
+
+    def legacy():
+        conn = legacy_connect(stub_driver)
+        conn.close()
+
+    def new(cold):
+        def run():
+            if cold:
+                _installed_drivers.clear()
+                if os.path.exists(cache_path):
+                    os.remove(cache_path)
+            db = DatabaseConnection(driver=stub_driver, settings=dict(DEFAULT_SETTINGS), cache_path=cache_path)
+            db.connect()
+            db.disconnect()
+        return run
+
+    try:
+        rows = []
+        for label, fn in [("legacy (hard-coded list)", legacy),
+                          ("new, no cache", new(True)),
+                          ("new, cached driver", new(False))]:
+            seconds, count = logins(fn)
+            rows.append((label, f"{seconds * 1000:8.1f} ms  {count} login(s)"))
+        report(f"Cold start, {login_latency * 1000:.0f} ms per login", rows)
+    finally:
+        stub_driver.installed = ["Stub Driver"]
+        stub_driver.broken_drivers = set()
+        stub_driver.login_latency = 0.0
+
+
+def stub_db(name, latency=0.0, **kwargs):
+    """A connected DatabaseConnection on its own stub database with per-round-trip latency."""
+    stub_driver.reset(name)
+    settings = dict(DEFAULT_SETTINGS, driver="Stub Driver", database=name, server=f"bench-{name}")
+    db = DatabaseConnection(driver=stub_driver, settings=settings,
+                            cache_path=os.path.join(tempfile.mkdtemp(), "cache.json"), **kwargs)
+    db.connection_string_template += f"LATENCY={latency};"
+    ok, msg = db.connect()
+    if not ok:
+        raise RuntimeError(msg)
+    return db
+
+
+def round_trips(fn, repeat=5):
+    """(median seconds, round trips per call) for fn against the stub driver."""
+    before = stub_driver.stats["executes"]
+    seconds, result = timed(fn, repeat)
+    return seconds, (stub_driver.stats["executes"] - before) / repeat, result
+
+
+# --- Multi-result-set batches ---
+ANALYTICS_QUERIES = [
+    "SELECT airline_name, total_flights, total_passengers, avg_occupancy_rate, total_revenue FROM VW_AirlinePerformance",
+    "SELECT booking_date, total_bookings, gross_revenue, paid_revenue FROM VW_DailyRevenue ORDER BY booking_date DESC",
+    "SELECT flight_number, airline_name, departure_datetime, total_seats, available_seats, booked_seats, "
+    "occupancy_percentage, total_revenue FROM VW_FlightStatistics ORDER BY departure_datetime DESC",
+]
+
+
+@benchmark("analytics_batch")
+def bench_analytics_batch(latency=0.01, flights=2000):
+    db = stub_db("analytics", latency)
+    db.execute_query("CREATE TABLE VW_AirlinePerformance (airline_name, total_flights, total_passengers, "
+                     "avg_occupancy_rate, total_revenue)")
+    db.execute_query("CREATE TABLE VW_DailyRevenue (booking_date, total_bookings, gross_revenue, paid_revenue)")
+    db.execute_query("CREATE TABLE VW_FlightStatistics (flight_number, airline_name, departure_datetime, "
+                     "total_seats, available_seats, booked_seats, occupancy_percentage, total_revenue)")
+    with db.pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("INSERT INTO VW_AirlinePerformance VALUES (?, ?, ?, ?, ?)",
+                           [(f"Airline {i}", 100, 5000, 75.0, 1e6) for i in range(5)])
+        cursor.executemany("INSERT INTO VW_DailyRevenue VALUES (?, ?, ?, ?)",
+                           [(f"2025-01-{d:02d}", 40, 9e4, 8e4) for d in range(1, 31)])
+        cursor.executemany("INSERT INTO VW_FlightStatistics VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           [(f"PK-{i}", "Airline", "2025-01-01 09:00", 180, 20, 160, 88.9, 5e4)
+                            for i in range(flights)])
+
+    def separate():
+        return [db.fetch_results(q)[0] for q in ANALYTICS_QUERIES]
+
+    def batched():
+        return db.fetch_all_results(";\n".join(ANALYTICS_QUERIES))[0]
+
+    rows = []
+    for label, fn in [("3 x fetch_results", separate), ("1 x fetch_all_results", batched)]:
+        seconds, trips, result = round_trips(fn)
+        counts = "/".join(str(len(r[1])) for r in result)
+        rows.append((label, f"{seconds * 1000:8.1f} ms  {trips:.0f} round trip(s)  rows {counts}"))
+    report(f"Analytics tab, {latency * 1000:.0f} ms per round trip", rows)
+    db.disconnect()
+
+
+# --- Booking ---
+BOOKING_SCHEMA = [
+    "CREATE TABLE FLIGHTS (flight_id INTEGER PRIMARY KEY, base_price REAL)",
+    "CREATE TABLE PASSENGERS (passenger_id INTEGER PRIMARY KEY, first_name, last_name, date_of_birth, nationality, "
+    "passport_number UNIQUE, passport_expiry_date, email UNIQUE, phone_number)",
+    "CREATE TABLE RESERVATIONS (reservation_id INTEGER PRIMARY KEY, passenger_id, flight_id, booking_reference UNIQUE, "
+    "seat_number, class_type, total_price, payment_status DEFAULT 'Pending', UNIQUE (flight_id, seat_number))",
+    "CREATE TABLE PAYMENTS (payment_id INTEGER PRIMARY KEY, reservation_id, payment_method, amount, card_last_four)",
+]
+CLASS_MULTIPLIERS = {"Economy": 1.0, "Business": 2.5, "First Class": 4.0}
+
+
+def emulated_process_payment(raw, params):
+    """SP_ProcessPayment on sqlite: record the payment and mark the reservation paid."""
+    reservation_id, method, amount, card = params
+    cur = raw.execute("INSERT INTO PAYMENTS (reservation_id, payment_method, amount, card_last_four) VALUES (?, ?, ?, ?)",
+                      (reservation_id, method, amount, card))
+    raw.execute("UPDATE RESERVATIONS SET payment_status = 'Paid' WHERE reservation_id = ?", (reservation_id,))
+    return ["payment_id"], [(cur.lastrowid,)]
+
+
+def emulated_book_flight(raw, params):
+    """SP_BookFlight on sqlite: the same steps in one transaction."""
+    first, last, passport, email, phone, flight_id, cls, seat, method, card = params
+    raw.execute("BEGIN")
+    try:
+        row = raw.execute("SELECT passenger_id FROM PASSENGERS WHERE passport_number = ?", (passport,)).fetchone()
+        if row:
+            passenger_id = row[0]
+            raw.execute("UPDATE PASSENGERS SET email = ?, phone_number = ? WHERE passenger_id = ?", (email, phone, passenger_id))
+        else:
+            passenger_id = raw.execute(
+                "INSERT INTO PASSENGERS (first_name, last_name, date_of_birth, nationality, passport_number, "
+                "passport_expiry_date, email, phone_number) VALUES (?, ?, '1990-01-01', 'Unknown', ?, '2030-01-01', ?, ?)",
+                (first, last, passport, email, phone)).lastrowid
+        price = raw.execute("SELECT base_price FROM FLIGHTS WHERE flight_id = ?", (flight_id,)).fetchone()[0]
+        price *= CLASS_MULTIPLIERS.get(cls, 1.0)
+        reference = f"BK{passenger_id:08d}"
+        reservation_id = raw.execute(
+            "INSERT INTO RESERVATIONS (passenger_id, flight_id, booking_reference, seat_number, class_type, total_price) "
+            "VALUES (?, ?, ?, ?, ?, ?)", (passenger_id, flight_id, reference, seat, cls, price)).lastrowid
+        payment_id = None
+        if method:
+            payment_id = emulated_process_payment(raw, (reservation_id, method, price, card))[1][0][0]
+        raw.execute("COMMIT")
+    except Exception:
+        raw.execute("ROLLBACK")
+        raise
+    return (["passenger_id", "reservation_id", "booking_reference", "total_price", "payment_id"],
+            [(passenger_id, reservation_id, reference, price, payment_id)])
+
+
+def legacy_book(db, n, flight_id):
+    """The original GUI flow: five separate round trips, no transaction."""
+    passport = f"L{n:07d}"
+    db.execute_commit("INSERT INTO PASSENGERS (first_name, last_name, date_of_birth, nationality, passport_number, "
+                      "passport_expiry_date, email, phone_number) VALUES (?, ?, '1990-01-01', 'Unknown', ?, '2030-01-01', ?, ?)",
+                      ("Ali", "Khan", passport, f"{passport}@example.com", "03001234567"))
+    pid = db.fetch_results(f"SELECT passenger_id FROM PASSENGERS WHERE passport_number='{passport}'")[0][1][0][0]
+    ref = f"R{n:07d}"
+    db.execute_commit("INSERT INTO RESERVATIONS (passenger_id, flight_id, booking_reference, seat_number, class_type, "
+                      "total_price, payment_status) VALUES (?, ?, ?, ?, ?, ?, 'Pending')",
+                      (pid, flight_id, ref, f"L{n}", "Economy", 100.0))
+    res_id = db.fetch_results(f"SELECT reservation_id FROM RESERVATIONS WHERE booking_reference='{ref}'")[0][1][0][0]
+    pay_sql = ("DECLARE @payment_id INT; EXEC SP_ProcessPayment @reservation_id=?, @payment_method=?, @amount=?, "
+               "@card_last_four=?, @payment_id=@payment_id OUTPUT; SELECT @payment_id;")
+    return db.fetch_results(pay_sql, (res_id, "Credit Card", 100.0, "1234"))[0]
+
+
+@benchmark("booking")
+def bench_booking(latency=0.01, bookings=20):
+    db = stub_db("booking", latency)
+    for statement in BOOKING_SCHEMA:
+        db.execute_query(statement)
+    db.execute_query("INSERT INTO FLIGHTS VALUES (1, 100.0)")
+    stub_driver.procedures.update(SP_ProcessPayment=emulated_process_payment, SP_BookFlight=emulated_book_flight)
+    counter = iter(range(10 ** 6))
+
+    def legacy():
+        return legacy_book(db, next(counter), 1)
+
+    def single():
+        n = next(counter)
+        booking, msg = book(db, "Ali", "Khan", f"N{n:07d}", f"N{n:07d}@example.com", "03001234567", 1, "Economy",
+                            seat_number=f"N{n}", payment_method="Credit Card", card_last_four="1234")
+        if booking is None:
+            raise RuntimeError(msg)
+        return booking
+
+    try:
+        rows = []
+        for label, fn in [("legacy (5 statements)", legacy), ("book() / SP_BookFlight", single)]:
+            seconds, trips, _ = round_trips(fn, repeat=bookings)
+            rows.append((label, f"{seconds * 1000:8.1f} ms  {trips:.0f} round trip(s) per booking"))
+        report(f"Booking, {latency * 1000:.0f} ms per round trip", rows)
+    finally:
+        stub_driver.procedures.pop("SP_ProcessPayment", None)
+        stub_driver.procedures.pop("SP_BookFlight", None)
+        db.disconnect()
+
+
+# --- Booking contention ---
+CONTENTION_SCHEMA = [
+    "CREATE TABLE AIRCRAFT (aircraft_id INTEGER PRIMARY KEY, total_seats, economy_seats, business_seats, first_class_seats)",
+    "CREATE TABLE FLIGHTS (flight_id INTEGER PRIMARY KEY, aircraft_id, base_price, "
+    "available_seats INT CHECK (available_seats >= 0))",
+    "CREATE TABLE PASSENGERS (passenger_id INTEGER PRIMARY KEY, passport_number UNIQUE)",
+    "CREATE TABLE RESERVATIONS (reservation_id INTEGER PRIMARY KEY, passenger_id, flight_id, seat_number, class_type, "
+    "total_price, reservation_status DEFAULT 'Confirmed')",
+    "CREATE UNIQUE INDEX UQ_seat_per_flight ON RESERVATIONS (flight_id, seat_number) "
+    "WHERE reservation_status IN ('Confirmed', 'Checked-In')",
+]
+DEADLOCK_ERROR = ("[40001] Transaction (Process ID 61) was deadlocked on lock resources with another process and "
+                  "has been chosen as the deadlock victim. Rerun the transaction. (1205)")
+DUPLICATE_SEAT_ERROR = ("[23000] Cannot insert duplicate key row in object 'dbo.RESERVATIONS' with unique index "
+                        "'UQ_seat_per_flight'. (2601)")
+
+
+class ContentionServer:
+    """SP_BookFlight's seat checks and insert on sqlite, with or without SP_CreateReservation's UPDLOCK.
+
+    Each statement runs atomically (like one statement on the server) but, as
+    in a transaction without lock hints, other bookings can run between them;
+    work_time stands in for the rest of the procedure between the checks and
+    the insert. With flight_lock a per-flight lock is held from the first read
+    to the commit, as UPDLOCK on the FLIGHTS row does, and deadlock_rate of
+    bookings are rolled back as deadlock victims to exercise the retries.
+    legacy emulates the procedure before seat maps: no class check, and a
+    seat named after the flight's reservation count.
+    """
+
+    def __init__(self, layout, flight_lock, work_time=0.002, deadlock_rate=0.0, legacy=False, seed=13):
+        self.layout = layout
+        self.flight_lock = flight_lock
+        self.legacy = legacy
+        self.work_time = work_time
+        self.deadlock_rate = deadlock_rate
+        self._statement = threading.Lock()
+        self._flights = {}
+        self._rng = random.Random(seed)
+
+    def run(self, raw, sql, params=()):
+        with self._statement:
+            return raw.execute(sql, params).fetchall()
+
+    def book_flight(self, raw, params):
+        first, last, passport, email, phone, flight_id, cls, seat, method, card = params
+        if not self.flight_lock:
+            return self._book(raw, passport, flight_id, cls, seat)
+        with self._flights.setdefault(flight_id, threading.Lock()):
+            with self._statement:
+                deadlocked = self._rng.random() < self.deadlock_rate
+            if deadlocked:
+                raise stub_driver.OperationalError("40001", DEADLOCK_ERROR)
+            return self._book(raw, passport, flight_id, cls, seat)
+
+    def _book(self, raw, passport, flight_id, cls, seat):
+        column = {"Economy": "economy_seats", "Business": "business_seats", "First Class": "first_class_seats"}[cls]
+        available, class_seats, price = self.run(
+            raw, f"SELECT f.available_seats, ac.{column}, f.base_price FROM FLIGHTS f "
+                 "JOIN AIRCRAFT ac ON f.aircraft_id = ac.aircraft_id WHERE f.flight_id = ?", (flight_id,))[0]
+        held = self.run(raw, "SELECT seat_number FROM RESERVATIONS WHERE flight_id = ? AND class_type = ? "
+                             "AND reservation_status IN ('Confirmed', 'Checked-In')", (flight_id, cls))
+        if available <= 0:
+            raise stub_driver.ProgrammingError("42000", "[42000] No seats available on this flight (50000)")
+        if self.legacy:
+            count = self.run(raw, "SELECT COUNT(*) FROM RESERVATIONS WHERE flight_id = ?", (flight_id,))[0][0]
+            seat = seat or f"{cls}-{count + 1}"
+        elif len(held) >= class_seats:
+            raise stub_driver.ProgrammingError("42000", f"[42000] No {cls} seats left on this flight (50000)")
+        if seat is None:
+            taken = {row[0] for row in held}
+            start, end = self.layout.cabins[cls]
+            seat = next(label for label in self.layout.labels[start:end] if label not in taken)
+        elif not self.legacy and seat in {row[0] for row in held}:
+            raise stub_driver.ProgrammingError("42000", "[42000] Seat already booked (50000)")
+        time.sleep(self.work_time)
+        with self._statement:
+            try:
+                raw.execute("BEGIN")
+                passenger_id = raw.execute("INSERT INTO PASSENGERS (passport_number) VALUES (?)", (passport,)).lastrowid
+                reservation_id = raw.execute(
+                    "INSERT INTO RESERVATIONS (passenger_id, flight_id, seat_number, class_type, total_price) "
+                    "VALUES (?, ?, ?, ?, ?)", (passenger_id, flight_id, seat, cls, price)).lastrowid
+                # TRG_UpdateAvailableSeats
+                raw.execute("UPDATE FLIGHTS SET available_seats = available_seats - 1 WHERE flight_id = ?", (flight_id,))
+                raw.execute("COMMIT")
+            except sqlite3.Error as e:
+                raw.execute("ROLLBACK")
+                if isinstance(e, sqlite3.IntegrityError) and "seat_number" in str(e):
+                    raise stub_driver.IntegrityError("23000", DUPLICATE_SEAT_ERROR)
+                raise
+        return (["passenger_id", "reservation_id", "booking_reference", "total_price", "payment_id"],
+                [(passenger_id, reservation_id, f"ST{reservation_id:06d}", price, None)])
+
+
+@benchmark("booking_contention")
+def bench_booking_contention(threads=16, bookings=5, free_seats=(100, 6), latency=0.002):
+    from seat_map import SeatLayout
+    from stress_booking import run_stress, summary
+
+    # An A320 (150 Economy): first with seats for everyone, then with only a few left to sell out
+    layout = SeatLayout(150, 12, 0)
+    scenarios = [
+        # label, ContentionServer options, book() attempts, seats chosen by the client
+        ("old procedure (no lock, no class check, no retries)", dict(flight_lock=False, legacy=True), 1, False),
+        ("seat-map checks without a lock, no retries", dict(flight_lock=False), 1, False),
+        ("seat-map checks without a lock, with retries", dict(flight_lock=False), None, False),
+        ("UPDLOCK + retries, 10% deadlock victims", dict(flight_lock=True, deadlock_rate=0.1), None, False),
+        ("UPDLOCK + retries, client picks seats", dict(flight_lock=True, deadlock_rate=0.1), None, True),
+    ]
+    for free in free_seats:
+        print(f"\nBooking contention: {threads} threads x {bookings} Economy bookings for {free} free seats, "
+              f"{latency * 1000:.0f} ms per round trip")
+        for label, options, attempts, pick_seats in scenarios:
+            stub_driver.read_uncommitted = True
+            db = stub_db("contention", latency, pool_max=threads)
+            for statement in CONTENTION_SCHEMA:
+                db.execute_query(statement)
+            db.execute_query("INSERT INTO AIRCRAFT VALUES (1, 162, 150, 12, 0)")
+            db.execute_query(f"INSERT INTO FLIGHTS VALUES (1, 1, 100.0, {12 + free})")
+            start, end = layout.cabins["Economy"]
+            with db.pool.connection() as conn:
+                conn.cursor().executemany(
+                    "INSERT INTO RESERVATIONS (passenger_id, flight_id, seat_number, class_type, total_price) "
+                    "VALUES (0, 1, ?, 'Economy', 100.0)", [(seat,) for seat in layout.labels[start:end - free]])
+            server = ContentionServer(layout, **options)
+            stub_driver.procedures["SP_BookFlight"] = server.book_flight
+            try:
+                result = run_stress(db, 1, threads, bookings, "Economy", pick_seats=pick_seats, attempts=attempts)
+            finally:
+                stub_driver.procedures.pop("SP_BookFlight", None)
+                db.disconnect()
+                stub_driver.read_uncommitted = False
+            print(f"  {label}")
+            for line in summary(result):
+                print(f"    {line}")
+
+
+# --- Transient errors ---
+class FlakyServer:
+    """A procedure that fails as a deadlock victim for deadlock_rate of its calls."""
+
+    def __init__(self, deadlock_rate, seed=17):
+        self.deadlock_rate = deadlock_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def lookup(self, raw, params):
+        with self._lock:
+            deadlocked = self._rng.random() < self.deadlock_rate
+        if deadlocked:
+            raise stub_driver.OperationalError("40001", DEADLOCK_ERROR)
+        return ["flight_id", "available_seats"], [(params[0], 42)]
+
+
+def break_idle_connections(db):
+    """Simulate a server restart: every idle pooled connection is dead."""
+    for conn, _ in db.pool._idle:
+        conn.broken = True
+
+
+@benchmark("transient_errors")
+def bench_transient_errors(latency=0.005, calls=200, deadlock_rate=0.1):
+    policies = [("no retries", RetryPolicy(attempts=1)), ("RetryPolicy() (3 attempts)", RetryPolicy())]
+
+    rows = []
+    for label, policy in policies:
+        db = stub_db("transient", latency, retry_policy=policy)
+        stub_driver.procedures["SP_FlakyLookup"] = FlakyServer(deadlock_rate).lookup
+        try:
+            latencies, failed = [], 0
+            for n in range(calls):
+                started = time.perf_counter()
+                data, msg = db.fetch_results("EXEC SP_FlakyLookup ?", (n,))
+                latencies.append(time.perf_counter() - started)
+                failed += data is None
+            latencies.sort()
+            rows.append((label, f"{calls - failed:4d}/{calls} succeeded  {statistics.median(latencies) * 1000:5.1f} ms "
+                                f"median  {latencies[int(len(latencies) * 0.99)] * 1000:6.1f} ms p99  "
+                                f"{db.retry_stats()}"))
+        finally:
+            stub_driver.procedures.pop("SP_FlakyLookup", None)
+            db.disconnect()
+    report(f"Reads with {deadlock_rate:.0%} deadlock victims, {latency * 1000:.0f} ms per round trip", rows)
+
+    rows = []
+    for label, policy in policies:
+        db = stub_db("transient", latency, retry_policy=policy, pool_min=4)
+        try:
+            db.execute_query("CREATE TABLE PINGS (n INTEGER)")
+            break_idle_connections(db)
+            read, read_msg = db.fetch_results("SELECT COUNT(*) FROM PINGS")
+            break_idle_connections(db)
+            wrote, write_msg = db.execute_commit("INSERT INTO PINGS VALUES (1)")
+            rows.append((label, f"read: {'ok' if read else read_msg[:40]:40}  "
+                                f"write: {'ok' if wrote else write_msg[:40]:40}  {db.pool_stats()['failed_pings']} "
+                                f"dead connection(s) replaced  {db.retry_stats()['retries']}"))
+        finally:
+            db.disconnect()
+    report("First calls after every pooled connection dropped", rows)
+
+
+# --- Query statistics ---
+@benchmark("query_stats")
+def bench_query_stats(calls=20000):
+    from query_stats import QueryStats, fingerprint
+
+    db = stub_db("query_stats")
+    db.execute_query("CREATE TABLE FLIGHTS (flight_id INTEGER PRIMARY KEY, status)")
+    db.execute_query("INSERT INTO FLIGHTS VALUES (1, 'Scheduled')")
+
+    def run(stats, inline):
+        db.query_stats = stats
+        started = time.perf_counter()
+        for n in range(calls):
+            if inline:  # values pasted into the text: a new string, so a fingerprint cache miss, every call
+                db.fetch_results(f"SELECT status FROM FLIGHTS WHERE flight_id = {n % 1000}")
+            else:
+                db.fetch_results("SELECT status FROM FLIGHTS WHERE flight_id = ?", (n % 1000,))
+        return (time.perf_counter() - started) / calls
+
+    try:
+        rows = []
+        for inline in (False, True):
+            fingerprint.cache_clear()
+            off = run(None, inline)
+            on = run(QueryStats(), inline)
+            label = "values in the text" if inline else "parameterized"
+            rows.append((f"{label}, recording off", f"{off * 1e6:7.1f} us per call"))
+            rows.append((f"{label}, recording on", f"{on * 1e6:7.1f} us per call  (+{(on - off) * 1e6:.1f} us)"))
+        report(f"Query statistics overhead, {calls} fetch_results() calls with no latency", rows)
+        print("\n".join(db.query_stats.report(limit=3)))
+    finally:
+        db.disconnect()
+
+
+# --- Statement registry ---
+@benchmark("statements")
+def bench_statements(latency=0.001, users=500):
+    from statements import register
+
+    login = register("bench_login", "SELECT password_hash FROM USERS WHERE username = ?")
+    db = stub_db("statements", latency)
+    db.execute_query("CREATE TABLE USERS (username PRIMARY KEY, password_hash)")
+    with db.pool.connection() as conn:
+        conn.cursor().executemany("INSERT INTO USERS VALUES (?, ?)", [(f"user{n}", f"hash{n}") for n in range(users)])
+
+    variants = [
+        # The old PyQt login: the username pasted into the text
+        ("ad-hoc (value in the text)", lambda n: db.fetch_results(f"SELECT password_hash FROM USERS WHERE username = 'user{n}'")),
+        ("parameterized, new cursor per call", lambda n: db.fetch_results(str(login), (f"user{n}",))),
+        ("registered statement", lambda n: db.fetch_results(login, (f"user{n}",))),
+    ]
+    try:
+        rows = []
+        for label, fn in variants:
+            stub_driver.plans.clear()
+            prepares = stub_driver.stats["prepares"]
+            started = time.perf_counter()
+            for n in range(users):
+                fn(n)
+            elapsed = time.perf_counter() - started
+            rows.append((label, f"{elapsed / users * 1000:6.2f} ms per login  {len(stub_driver.plans):4d} statement text(s)  "
+                                f"{stub_driver.stats['prepares'] - prepares:4d} prepares"))
+        report(f"{users} logins by different users, {latency * 1000:.0f} ms per round trip", rows)
+        print(f"  {db.prepared_stats()}")
+    finally:
+        db.disconnect()
+
+
+# --- Timeouts and cancelling ---
+# Counts for as long as it is allowed to: an analytics query that never finishes
+ENDLESS_SQL = ("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+               "SELECT COUNT(*) FROM n WHERE i < 0")
+
+
+def cancel_after(seconds, cancel):
+    """Call cancel() from another thread after seconds, the way the GUIs' Cancel button does."""
+    timer = threading.Timer(seconds, cancel)
+    timer.start()
+    return timer
+
+
+@benchmark("cancellation")
+def bench_cancellation(timeout=1, cancel_at=0.2):
+    from database_connection import CancelHandle
+
+    db = stub_db("cancellation", query_timeouts={"analytics": timeout})
+    db.execute_query("CREATE TABLE FLIGHTS (flight_id INTEGER PRIMARY KEY)")
+    db.execute_query("INSERT INTO FLIGHTS VALUES (1)")
+
+    def runaway_query():
+        return db.fetch_results(ENDLESS_SQL, query_class="analytics")
+
+    def cancelled_query():
+        cancel_after(cancel_at, db.cancel)
+        return db.fetch_results(ENDLESS_SQL, query_class="analytics")
+
+    def cancelled_scope():
+        handle = CancelHandle()
+        cancel_after(cancel_at, handle.cancel)
+        with db.scope("analytics", handle):
+            first = db.fetch_results(ENDLESS_SQL)
+            second = db.fetch_results("SELECT COUNT(*) FROM FLIGHTS")
+        return first[0], f"{first[1][-40:]}; then {second[1][-30:]}"
+
+    def cancelled_stream():
+        data, msg = db.iter_results(ENDLESS_SQL.replace("COUNT(*)", "i").replace("i < 0", "i > 0"),
+                                    query_class="analytics")
+        cancel_after(cancel_at, db.cancel)
+        read = 0
+        try:
+            for _ in data[1]:
+                read += 1
+        except stub_driver.Error as e:
+            return None, f"{e.args[1][-25:]} after {read} rows"
+        return None, f"{read} rows"
+
+    try:
+        rows = []
+        for label, fn in [(f"runs into the {timeout} s analytics timeout", runaway_query),
+                          (f"db.cancel() after {cancel_at * 1000:.0f} ms", cancelled_query),
+                          (f"CancelHandle.cancel() after {cancel_at * 1000:.0f} ms", cancelled_scope),
+                          (f"streamed, db.cancel() after {cancel_at * 1000:.0f} ms", cancelled_stream)]:
+            started = time.perf_counter()
+            data, msg = fn()
+            elapsed = time.perf_counter() - started
+            rows.append((label, f"returned after {elapsed * 1000:6.0f} ms  {msg[-75:]}"))
+        check, msg = db.fetch_results("SELECT COUNT(*) FROM FLIGHTS")
+        rows.append(("next call on the same pool", f"{check[1] if check else msg}  {db.pool_stats()['size']} connection(s)"))
+        report("A query that never finishes", rows)
+        print("\n".join(db.query_stats.report(limit=3)))
+    finally:
+        db.disconnect()
+
+
+# --- Synthetic data ---
+# The uniqueness rules of SQLQuery_1.sql that generated rows must keep
+GENERATED_KEYS = [
+    "CREATE UNIQUE INDEX uq_flight_schedule ON FLIGHTS (flight_number, departure_datetime)",
+    "CREATE UNIQUE INDEX uq_passport ON PASSENGERS (passport_number)",
+    "CREATE UNIQUE INDEX uq_email ON PASSENGERS (email)",
+    "CREATE UNIQUE INDEX uq_booking_reference ON RESERVATIONS (booking_reference)",
+    "CREATE UNIQUE INDEX UQ_seat_per_flight ON RESERVATIONS (flight_id, seat_number) "
+    "WHERE reservation_status IN ('Confirmed', 'Checked-In')",
+    "CREATE UNIQUE INDEX uq_transaction ON PAYMENTS (transaction_id)",
+]
+GENERATED_DRIFT_SQL = """
+SELECT COUNT(*) FROM FLIGHTS f INNER JOIN AIRCRAFT ac ON f.aircraft_id = ac.aircraft_id
+WHERE f.available_seats <> ac.total_seats - (SELECT COUNT(*) FROM RESERVATIONS r WHERE r.flight_id = f.flight_id
+                                              AND r.reservation_status IN ('Confirmed', 'Checked-In'))
+"""
+
+
+@benchmark("data_generator")
+def bench_data_generator(reservations=200000, latency=0.002, rows_one_by_one=500):
+    import hashlib
+    from generate_data import COLUMNS, DataGenerator, first_ids, insert_sql, load
+
+    start = datetime(2025, 6, 1).date()
+    db = stub_db("data_generator", latency)
+    for table, columns in COLUMNS.items():
+        db.execute_query(f"CREATE TABLE {table} ({columns[0]} INTEGER PRIMARY KEY, {', '.join(columns[1:])})")
+    for sql in GENERATED_KEYS:
+        db.execute_query(sql)
+    try:
+        generator = DataGenerator(reservations, seed=7, start=start)
+        digests = []
+        for _ in range(2):
+            digest = hashlib.sha256()
+            for table, rows in DataGenerator(20000, seed=7, start=start).chunks():
+                digest.update(repr((table, rows)).encode())
+            digests.append(digest.hexdigest()[:16])
+        print(f"Plan for {reservations:,} reservations: {generator.plan()}")
+        print(f"Same seed, same rows: {digests[0] == digests[1]} ({digests[0]})")
+
+        # One round trip per row, the way execute_commit would insert them
+        rows = next(rows for table, rows in generator.chunks(rows_one_by_one) if table == "PASSENGERS")
+        db.execute_query(f"CREATE TABLE PASSENGERS_ONE_BY_ONE ({', '.join(COLUMNS['PASSENGERS'])})")
+        sql = insert_sql("PASSENGERS").replace("PASSENGERS", "PASSENGERS_ONE_BY_ONE")
+        started = time.perf_counter()
+        for row in rows:
+            db.execute_commit(sql, row)
+        one_by_one = len(rows) / (time.perf_counter() - started)
+        db.execute_query("DELETE FROM PASSENGERS_ONE_BY_ONE")
+        started = time.perf_counter()
+        db.execute_many(sql, rows)
+        many = len(rows) / (time.perf_counter() - started)
+        report(f"Inserting {len(rows)} passengers, {latency * 1000:.0f} ms per round trip",
+               [("execute_commit per row", f"{one_by_one:12,.0f} rows/s"),
+                ("execute_many (one chunk)", f"{many:12,.0f} rows/s")])
+
+        throughput, msg = load(db, DataGenerator(reservations, seed=7, start=start, first_ids=first_ids(db)[0]),
+                               sql_server=False)
+        print(f"\nFull load into stub_driver ({msg}):")
+        for line in throughput.report():
+            print("  " + line)
+        drift, _ = db.fetch_results(GENERATED_DRIFT_SQL, query_class="admin")
+        print(f"  flights whose available_seats disagree with their reservations: {drift[1][0][0]}")
+    finally:
+        db.disconnect()
+
+
+# --- Schedule import ---
+IMPORT_SCHEMA = [
+    "CREATE TABLE AIRPORTS (airport_id INTEGER PRIMARY KEY, airport_code, airport_name, city, country, timezone, "
+    "status)",
+    "CREATE TABLE AIRLINES (airline_id INTEGER PRIMARY KEY, airline_code, airline_name, country, status)",
+    "CREATE TABLE AIRCRAFT (aircraft_id INTEGER PRIMARY KEY, airline_id, registration_number, aircraft_model, "
+    "total_seats, economy_seats, business_seats, first_class_seats, status)",
+    "CREATE TABLE FLIGHTS (flight_id INTEGER PRIMARY KEY, airline_id, aircraft_id, flight_number, "
+    "departure_airport_id, arrival_airport_id, departure_datetime, arrival_datetime, base_price, available_seats, "
+    "status, gate_number, UNIQUE (flight_number, departure_datetime))",
+    "CREATE TABLE FLIGHTS_STAGING (import_id, record_number, airline_id, aircraft_id, flight_number, "
+    "departure_airport_id, arrival_airport_id, departure_datetime, arrival_datetime, base_price, status, gate_number, "
+    "PRIMARY KEY (import_id, record_number))",
+]
+IMPORT_FIELDS = ("airline_code", "flight_number", "aircraft_registration", "departure_airport", "arrival_airport",
+                 "departure_datetime", "arrival_datetime", "base_price", "status", "gate_number")
+
+
+def merge_staged_flights(raw, params):
+    """SP_MergeStagedFlights on sqlite: drop repeated flights, then insert or update the rest."""
+    import_id = params[0]
+    raw.execute("BEGIN")
+    try:
+        duplicates = [row[0] for row in raw.execute(
+            "SELECT record_number FROM (SELECT record_number, ROW_NUMBER() OVER (PARTITION BY flight_number, "
+            "departure_datetime ORDER BY record_number) AS n FROM FLIGHTS_STAGING WHERE import_id = ?) WHERE n > 1 "
+            "ORDER BY record_number", (import_id,))]
+        raw.executemany("DELETE FROM FLIGHTS_STAGING WHERE import_id = ? AND record_number = ?",
+                        [(import_id, n) for n in duplicates])
+        staged, inserted, updated = raw.execute(
+            "SELECT COUNT(*), COUNT(*) - COUNT(f.flight_id), "
+            "SUM(f.flight_id IS NOT NULL AND (f.arrival_datetime <> s.arrival_datetime "
+            "    OR f.base_price <> s.base_price OR IFNULL(f.gate_number, '') <> IFNULL(s.gate_number, ''))) "
+            "FROM FLIGHTS_STAGING s LEFT JOIN FLIGHTS f ON f.flight_number = s.flight_number "
+            "AND f.departure_datetime = s.departure_datetime WHERE s.import_id = ?", (import_id,)).fetchone()
+        raw.execute(
+            "INSERT INTO FLIGHTS (airline_id, aircraft_id, flight_number, departure_airport_id, arrival_airport_id, "
+            "departure_datetime, arrival_datetime, base_price, available_seats, status, gate_number) "
+            "SELECT s.airline_id, s.aircraft_id, s.flight_number, s.departure_airport_id, s.arrival_airport_id, "
+            "s.departure_datetime, s.arrival_datetime, s.base_price, ac.total_seats, s.status, s.gate_number "
+            "FROM FLIGHTS_STAGING s JOIN AIRCRAFT ac ON s.aircraft_id = ac.aircraft_id WHERE s.import_id = ? "
+            "ON CONFLICT (flight_number, departure_datetime) DO UPDATE SET arrival_datetime = excluded.arrival_datetime, "
+            "base_price = excluded.base_price, gate_number = excluded.gate_number", (import_id,))
+        raw.execute("DELETE FROM FLIGHTS_STAGING WHERE import_id = ?", (import_id,))
+        raw.execute("COMMIT")
+    except sqlite3.Error:
+        raw.execute("ROLLBACK")
+        raise
+    updated = updated or 0
+    return (["inserted", "updated", "unchanged", "duplicates", "duplicate_records"],
+            [(inserted, updated, staged - inserted - updated, len(duplicates),
+              ",".join(str(n) for n in duplicates[:20]) or None)])
+
+
+def write_schedule(path, flights, seed=5):
+    """A schedule file of about `flights` records, 2% of them broken in some way and 0.5% repeated."""
+    import csv
+    import json
+
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1, 6, 0)
+    records = []
+    for n in range(flights):
+        airline = n % 5 + 1
+        origin, destination = rng.sample(range(1, 21), 2)
+        departure = start + timedelta(days=n // 400, minutes=15 * (n % 60))
+        record = {"airline_code": f"A{airline}", "flight_number": f"A{airline}-{n % 400 + 100}",
+                  "aircraft_registration": f"AP-{airline}{n % 10}", "departure_airport": f"P{origin:02d}",
+                  "arrival_airport": f"P{destination:02d}", "departure_datetime": f"{departure:%Y-%m-%d %H:%M}",
+                  "arrival_datetime": f"{departure + timedelta(minutes=rng.randint(50, 400)):%Y-%m-%d %H:%M}",
+                  "base_price": str(rng.randint(80, 900) * 100), "status": "", "gate_number": f"G{rng.randint(1, 40)}"}
+        fault = rng.random()
+        if fault < 0.004:
+            record["arrival_datetime"] = record["departure_datetime"]
+        elif fault < 0.008:
+            record["arrival_airport"] = record["departure_airport"]
+        elif fault < 0.012:
+            record["airline_code"] = "ZZ"
+        elif fault < 0.016:
+            record["base_price"] = "-1"
+        elif fault < 0.020:
+            record["departure_datetime"] = "tomorrow"
+        records.append(record)
+        if fault > 0.995 and len(records) > 1:
+            records.append(dict(records[rng.randrange(len(records) - 1)]))  # a flight listed twice
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, IMPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+    elif path.endswith(".jsonl"):
+        with open(path, "w") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+    else:
+        with open(path, "w") as f:
+            json.dump(records, f, indent=1)
+    return len(records)
+
+
+@benchmark("flight_import")
+def bench_flight_import(sizes=(50000, 200000), latency=0.002):
+    import tracemalloc
+    from flight_import import import_flights
+
+    directory = tempfile.mkdtemp()
+    stub_driver.procedures["SP_MergeStagedFlights"] = merge_staged_flights
+    try:
+        for name, size in [("schedule.csv", size) for size in sizes] + [("schedule.jsonl", sizes[0]),
+                                                                        ("schedule.json", sizes[0])]:
+            db = stub_db("flight_import", latency)
+            for statement in IMPORT_SCHEMA:
+                db.execute_query(statement)
+            db.execute_many("INSERT INTO AIRPORTS VALUES (?, ?, ?, ?, 'Pakistan', 'PKT', 'Active')",
+                            [(i, f"P{i:02d}", f"Airport {i}", f"City {i}") for i in range(1, 21)])
+            db.execute_many("INSERT INTO AIRLINES VALUES (?, ?, ?, 'Pakistan', 'Active')",
+                            [(i, f"A{i}", f"Airline {i}") for i in range(1, 6)])
+            db.execute_many("INSERT INTO AIRCRAFT VALUES (?, ?, ?, 'A320', 180, 150, 24, 6, 'Active')",
+                            [(a * 10 + r, a, f"AP-{a}{r}") for a in range(1, 6) for r in range(10)])
+            path = os.path.join(directory, name)
+            records = write_schedule(path, size)
+            result, msg = import_flights(db, path)
+            print(f"\n{name}: {records:,} records, {os.path.getsize(path) / 1e6:.1f} MB, "
+                  f"{latency * 1000:.0f} ms per round trip ({msg})")
+            for line in result.report():
+                if not line.startswith("  record "):
+                    print("  " + line)
+            # Again under tracemalloc: every flight now exists, so it is all updates or no-ops
+            tracemalloc.start()
+            result, msg = import_flights(db, path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            merged = result.merged or {}
+            print(f"  again: {merged.get('inserted')} inserted, {merged.get('unchanged'):,} unchanged; "
+                  f"peak Python memory {peak / 1e6:.1f} MB")
+            db.disconnect()
+    finally:
+        stub_driver.procedures.pop("SP_MergeStagedFlights", None)
+
+
+# --- Schedule expansion ---
+SCHEDULE_SCHEMA = [
+    "CREATE TABLE AIRCRAFT (aircraft_id INTEGER PRIMARY KEY, total_seats)",
+    "CREATE TABLE FLIGHTS (flight_id INTEGER PRIMARY KEY, airline_id, aircraft_id, flight_number, "
+    "departure_airport_id, arrival_airport_id, departure_datetime, arrival_datetime, base_price, available_seats, "
+    "status, gate_number, schedule_id, UNIQUE (flight_number, departure_datetime))",
+    "CREATE INDEX idx_flights_schedule ON FLIGHTS (schedule_id, departure_datetime)",
+    "CREATE TABLE RESERVATIONS (reservation_id INTEGER PRIMARY KEY, flight_id INTEGER)",
+    "CREATE INDEX idx_reservations_flight ON RESERVATIONS (flight_id)",
+    "CREATE TABLE FLIGHT_SCHEDULES (schedule_id INTEGER PRIMARY KEY, airline_id, aircraft_id, flight_number, "
+    "departure_airport_id, arrival_airport_id, departure_time, duration_minutes, days_of_week, valid_from, valid_to, "
+    "base_price, gate_number, status DEFAULT 'Active', expanded_version, expanded_through)",
+]
+PATTERN_COLUMNS = ("airline_id", "aircraft_id", "flight_number", "departure_airport_id", "arrival_airport_id",
+                   "departure_time", "duration_minutes", "days_of_week", "valid_from", "valid_to", "base_price",
+                   "gate_number", "status")
+
+
+class ScheduleServer:
+    """SP_ExpandSchedules on sqlite, statement for statement, with a fixed clock."""
+
+    def __init__(self, now):
+        self.now = now
+
+    def expand(self, raw, params):
+        import zlib
+
+        through, schedule_id = str(params[0]), params[1]
+        now, today = f"{self.now:%Y-%m-%d %H:%M:%S}", f"{self.now:%Y-%m-%d}"
+        raw.execute("BEGIN")
+        try:
+            raw.execute("CREATE TEMP TABLE IF NOT EXISTS work (schedule_id INTEGER PRIMARY KEY, first_day, last_day, "
+                        "changed, version)")
+            raw.execute("DELETE FROM work")
+            work = []
+            for row in raw.execute(f"SELECT schedule_id, expanded_version, expanded_through, "
+                                   f"{', '.join(PATTERN_COLUMNS)} FROM FLIGHT_SCHEDULES "
+                                   "WHERE ? IS NULL OR schedule_id = ?", (schedule_id, schedule_id)).fetchall():
+                version = zlib.crc32(repr(row[3:]).encode())  # CHECKSUM(...) of the pattern columns
+                changed, expanded = int(row[1] != version), row[2]
+                first = today if changed or expanded is None or expanded < today else \
+                    str(datetime.fromisoformat(expanded).date() + timedelta(days=1))
+                last = expanded if changed and expanded and expanded > through else through
+                work.append((row[0], first, last, changed, version))
+            raw.executemany("INSERT INTO work VALUES (?, ?, ?, ?, ?)", work)
+
+            raw.execute("DROP TABLE IF EXISTS temp.wanted")
+            raw.execute(
+                "CREATE TEMP TABLE wanted AS "
+                "WITH RECURSIVE days(day) AS (SELECT ? UNION ALL SELECT date(day, '+1 day') FROM days "
+                "                              WHERE day < (SELECT MAX(last_day) FROM work)) "
+                "SELECT * FROM (SELECT s.schedule_id, s.airline_id, s.aircraft_id, s.flight_number, "
+                "    s.departure_airport_id, s.arrival_airport_id, days.day || ' ' || s.departure_time || ':00' AS "
+                "    departure_datetime, datetime(days.day || ' ' || s.departure_time, '+' || s.duration_minutes || "
+                "    ' minutes') AS arrival_datetime, s.base_price, s.gate_number, ac.total_seats, "
+                "    ROW_NUMBER() OVER (PARTITION BY s.flight_number, days.day || s.departure_time "
+                "                       ORDER BY s.schedule_id) AS n "
+                "  FROM work w JOIN FLIGHT_SCHEDULES s ON s.schedule_id = w.schedule_id "
+                "  JOIN AIRCRAFT ac ON ac.aircraft_id = s.aircraft_id "
+                "  JOIN days ON days.day BETWEEN w.first_day AND w.last_day AND days.day BETWEEN s.valid_from AND s.valid_to "
+                "  WHERE s.status = 'Active' AND substr(s.days_of_week, (strftime('%w', days.day) + 6) % 7 + 1, 1) = '1') "
+                "WHERE departure_datetime > ?", (today, now))
+            conflicts = raw.execute("DELETE FROM wanted WHERE n > 1").rowcount
+            raw.execute("CREATE UNIQUE INDEX temp.ix_wanted ON wanted (flight_number, departure_datetime)")
+
+            raw.execute("DROP TABLE IF EXISTS temp.dropped")
+            raw.execute(
+                "CREATE TEMP TABLE dropped AS SELECT f.flight_id, "
+                "  EXISTS (SELECT 1 FROM RESERVATIONS r WHERE r.flight_id = f.flight_id) AS booked "
+                "FROM FLIGHTS f JOIN work w ON f.schedule_id = w.schedule_id AND w.changed = 1 "
+                "WHERE f.departure_datetime > ? AND f.departure_datetime < date(w.last_day, '+1 day') "
+                "  AND f.status NOT IN ('Cancelled', 'Departed', 'Arrived') "
+                "  AND NOT EXISTS (SELECT 1 FROM wanted x WHERE x.flight_number = f.flight_number "
+                "                  AND x.departure_datetime = f.departure_datetime AND x.schedule_id = f.schedule_id)",
+                (now,))
+            deleted = raw.execute("DELETE FROM FLIGHTS WHERE flight_id IN "
+                                  "(SELECT flight_id FROM dropped WHERE booked = 0)").rowcount
+            cancelled = raw.execute("UPDATE FLIGHTS SET status = 'Cancelled' WHERE flight_id IN "
+                                    "(SELECT flight_id FROM dropped WHERE booked = 1)").rowcount
+
+            conflicts += raw.execute(
+                "DELETE FROM wanted WHERE EXISTS (SELECT 1 FROM FLIGHTS f WHERE f.flight_number = wanted.flight_number "
+                "AND f.departure_datetime = wanted.departure_datetime AND f.schedule_id <> wanted.schedule_id)").rowcount
+            conflicts += raw.execute(
+                "SELECT COUNT(*) FROM wanted x JOIN FLIGHTS f ON f.flight_number = x.flight_number "
+                "AND f.departure_datetime = x.departure_datetime JOIN AIRCRAFT cur ON cur.aircraft_id = f.aircraft_id "
+                "WHERE f.aircraft_id <> x.aircraft_id AND f.available_seats + x.total_seats - cur.total_seats < 0"
+            ).fetchone()[0]
+            # MERGE: WHEN MATCHED AND (anything differs) THEN UPDATE ...
+            fits = "f.available_seats + x.total_seats - cur.total_seats >= 0"
+            updated = raw.execute(
+                f"UPDATE FLIGHTS AS f SET schedule_id = x.schedule_id, airline_id = x.airline_id, "
+                f"departure_airport_id = x.departure_airport_id, arrival_airport_id = x.arrival_airport_id, "
+                f"arrival_datetime = x.arrival_datetime, base_price = x.base_price, gate_number = x.gate_number, "
+                f"aircraft_id = CASE WHEN {fits} THEN x.aircraft_id ELSE f.aircraft_id END, "
+                f"available_seats = CASE WHEN {fits} THEN f.available_seats + x.total_seats - cur.total_seats "
+                f"                  ELSE f.available_seats END "
+                f"FROM wanted x, AIRCRAFT cur "
+                f"WHERE f.flight_number = x.flight_number AND f.departure_datetime = x.departure_datetime "
+                f"AND cur.aircraft_id = f.aircraft_id AND (f.schedule_id IS NULL OR f.airline_id <> x.airline_id "
+                f"OR f.departure_airport_id <> x.departure_airport_id OR f.arrival_airport_id <> x.arrival_airport_id "
+                f"OR f.arrival_datetime <> x.arrival_datetime OR f.base_price <> x.base_price "
+                f"OR IFNULL(f.gate_number, '') <> IFNULL(x.gate_number, '') "
+                f"OR (f.aircraft_id <> x.aircraft_id AND {fits}))").rowcount
+            # ... WHEN NOT MATCHED BY TARGET THEN INSERT
+            inserted = raw.execute(
+                "INSERT INTO FLIGHTS (airline_id, aircraft_id, flight_number, departure_airport_id, arrival_airport_id, "
+                "departure_datetime, arrival_datetime, base_price, available_seats, status, gate_number, schedule_id) "
+                "SELECT airline_id, aircraft_id, flight_number, departure_airport_id, arrival_airport_id, "
+                "departure_datetime, arrival_datetime, base_price, total_seats, 'Scheduled', gate_number, schedule_id "
+                "FROM wanted x WHERE NOT EXISTS (SELECT 1 FROM FLIGHTS f WHERE f.flight_number = x.flight_number "
+                "AND f.departure_datetime = x.departure_datetime)").rowcount
+
+            raw.execute("UPDATE FLIGHT_SCHEDULES AS s SET expanded_version = w.version, "
+                        "expanded_through = MAX(IFNULL(s.expanded_through, ''), w.last_day) "
+                        "FROM work w WHERE s.schedule_id = w.schedule_id")
+            changed = sum(row[3] for row in work)
+            raw.execute("COMMIT")
+        except sqlite3.Error:
+            raw.execute("ROLLBACK")
+            raise
+        return (["changed_schedules", "inserted", "updated", "deleted", "cancelled", "conflicts"],
+                [(changed, inserted, updated, deleted, cancelled, conflicts)])
+
+
+def expected_flights(patterns, now, through):
+    """{(flight_number, departure): (schedule_id, aircraft_id)} the patterns call for, worked out day by day."""
+    expected = {}
+    for schedule_id, (airline, aircraft, number, _, _, at, _, days, first, last, _, _, status) in patterns.items():
+        if status != "Active":
+            continue
+        day = max(datetime.fromisoformat(first), now.replace(hour=0, minute=0, second=0))
+        while day.date() <= min(datetime.fromisoformat(last).date(), through):
+            departure = datetime.fromisoformat(f"{day:%Y-%m-%d} {at}")
+            if days[day.weekday()] == "1" and departure > now:
+                expected.setdefault((number, f"{departure:%Y-%m-%d %H:%M:%S}"), (schedule_id, aircraft))
+            day += timedelta(days=1)
+    return expected
+
+
+@benchmark("schedule_expansion")
+def bench_schedule_expansion(routes=300, latency=0.001, row_by_row_routes=10):
+    from datetime import date
+    from schedules import days_mask, expand_schedules
+
+    rng = random.Random(23)
+    now = datetime(2026, 3, 1, 12, 0)
+    through = date(2026, 10, 31)
+    server = ScheduleServer(now)
+    stub_driver.procedures["SP_ExpandSchedules"] = server.expand
+    db = stub_db("schedules", latency)
+    try:
+        for statement in SCHEDULE_SCHEMA:
+            db.execute_query(statement)
+        db.execute_many("INSERT INTO AIRCRAFT VALUES (?, ?)", [(1, 150), (2, 180), (3, 300), (4, 60)])
+        masks = [days_mask(text) for text in ("daily", "Mon-Fri", "Mon,Wed,Fri", "Sat-Sun", "Tue,Thu")]
+        patterns = {}
+        for n in range(1, routes + 1):
+            origin, destination = rng.sample(range(1, 41), 2)
+            patterns[n] = (n % 8 + 1, rng.choice((1, 2, 3)), f"SX-{n:04d}", origin, destination,
+                           f"{rng.randrange(5, 23):02d}:{rng.choice((0, 15, 30, 45)):02d}", rng.randint(50, 400),
+                           rng.choice(masks), "2026-03-01", "2026-12-31", float(rng.randint(80, 900) * 100),
+                           f"G{n % 30}", "Active")
+        db.execute_many(f"INSERT INTO FLIGHT_SCHEDULES (schedule_id, {', '.join(PATTERN_COLUMNS)}) "
+                        f"VALUES (?, {', '.join('?' * len(PATTERN_COLUMNS))})",
+                        [(n,) + pattern for n, pattern in patterns.items()])
+        print(f"\nSchedule expansion: {routes} patterns, {now:%Y-%m-%d} to {through}, "
+              f"{latency * 1000:.0f} ms per round trip")
+
+        # The loop it replaces: look up and insert each dated flight of a pattern on its own
+        sample = dict(list(patterns.items())[:row_by_row_routes])
+        started = time.perf_counter()
+        flights = 0
+        for (number, departure), (schedule_id, aircraft) in expected_flights(sample, now, through).items():
+            data, _ = db.fetch_results("SELECT flight_id FROM FLIGHTS WHERE flight_number = ? AND departure_datetime = ?",
+                                       (number, departure))
+            if not data[1]:
+                pattern = patterns[schedule_id]
+                arrival = datetime.fromisoformat(departure) + timedelta(minutes=pattern[6])
+                db.execute_commit("INSERT INTO FLIGHTS (airline_id, aircraft_id, flight_number, departure_airport_id, "
+                                  "arrival_airport_id, departure_datetime, arrival_datetime, base_price, "
+                                  "available_seats, status, gate_number) VALUES (?, ?, ?, ?, ?, ?, ?, ?, "
+                                  "(SELECT total_seats FROM AIRCRAFT WHERE aircraft_id = ?), 'Scheduled', ?)",
+                                  (pattern[0], aircraft, number, pattern[3], pattern[4], departure,
+                                   f"{arrival:%Y-%m-%d %H:%M:%S}", pattern[10], aircraft, pattern[11]))
+                flights += 1
+        loop = time.perf_counter() - started
+        db.execute_query("DELETE FROM FLIGHTS")
+        rows = [(f"row by row, {row_by_row_routes} patterns", f"{loop:8.2f} s  {flights:,} flights "
+                 f"(~{loop * routes / row_by_row_routes:,.0f} s for all {routes})")]
+
+        def run(label, through=through):
+            started = time.perf_counter()
+            counts, msg = expand_schedules(db, through)
+            rows.append((label, f"{time.perf_counter() - started:8.2f} s  {msg}"))
+
+        run("SP_ExpandSchedules, first run")
+        run("again, nothing changed")
+        # Bookings on some flights, then an edit to one pattern in ten: other weekdays,
+        # a new price or a different aircraft
+        booked = [row[0] for row in db.fetch_results("SELECT flight_id FROM FLIGHTS WHERE flight_id % 7 = 0")[0][1]]
+        db.execute_many("INSERT INTO RESERVATIONS (flight_id) VALUES (?)", [(f,) for f in booked for _ in range(100)])
+        db.execute_query("UPDATE FLIGHTS SET available_seats = available_seats - 100 WHERE flight_id % 7 = 0")
+        for n in range(1, routes + 1, 10):
+            change = rng.choice(("days", "price", "aircraft"))
+            pattern = list(patterns[n])
+            if change == "days":
+                pattern[7] = rng.choice([mask for mask in masks if mask != pattern[7]])
+            elif change == "price":
+                pattern[10] += 500
+            else:
+                pattern[1] = rng.choice([a for a in (1, 2, 3, 4) if a != pattern[1]])
+            patterns[n] = tuple(pattern)
+            db.execute_commit(f"UPDATE FLIGHT_SCHEDULES SET {', '.join(c + ' = ?' for c in PATTERN_COLUMNS)} "
+                              "WHERE schedule_id = ?", patterns[n] + (n,))
+        run(f"after editing {len(range(1, routes + 1, 10))} patterns")
+        run("a week later on the horizon", through + timedelta(days=7))
+        report("Expanding recurring schedules", rows)
+
+        # The flights must be exactly what the patterns say, seat counters included
+        expected = expected_flights(patterns, now, through + timedelta(days=7))
+        data, _ = db.fetch_results(
+            "SELECT f.flight_number, f.departure_datetime, f.schedule_id, f.aircraft_id, f.status, "
+            "f.available_seats - ac.total_seats + (SELECT COUNT(*) FROM RESERVATIONS r WHERE r.flight_id = f.flight_id) "
+            "FROM FLIGHTS f JOIN AIRCRAFT ac ON ac.aircraft_id = f.aircraft_id")
+        scheduled = {(row[0], row[1]): (row[2], row[3]) for row in data[1] if row[4] != "Cancelled"}
+        kept = sum(1 for key, value in scheduled.items() if expected.get(key, value) != value)
+        print(f"  flights match the patterns: {set(scheduled) == set(expected)} "
+              f"({kept} kept their aircraft for the seats sold); seat counters off: "
+              f"{sum(1 for row in data[1] if row[5])}")
+    finally:
+        stub_driver.procedures.pop("SP_ExpandSchedules", None)
+        db.disconnect()
+
+
+# --- Setup scripts and the migration ledger ---
+MIGRATION_TABLES = ["AIRLINES", "AIRPORTS", "AIRCRAFT", "PASSENGERS", "USERS", "FLIGHTS", "RESERVATIONS",
+                    "PAYMENTS", "AUDIT_LOG", "FLIGHTS_STAGING", "FLIGHT_SCHEDULES"]
+
+
+def write_setup_scripts(directory, rows):
+    """SQLQuery_0..5.sql in sqlite's dialect, GO-separated and shaped like the real ones."""
+    scripts = {
+        0: [f"DROP TABLE IF EXISTS {table}" for table in MIGRATION_TABLES + ["SCHEMA_MIGRATIONS"]],
+        1: [f"-- TABLE {n}: {table}\nCREATE TABLE {table} (id INTEGER PRIMARY KEY, code, name, value, created)"
+            for n, table in enumerate(MIGRATION_TABLES, 1)]
+        + ["CREATE TABLE SCHEMA_MIGRATIONS (script_name, batch_hash, batch_number, start_line, duration_ms, "
+           "applied_date DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (script_name, batch_hash))"],
+        2: [f"CREATE INDEX idx_{table.lower()}_code ON {table} (code, value)" for table in MIGRATION_TABLES],
+        # DROP + CREATE standing in for CREATE OR ALTER
+        3: [f"DROP VIEW IF EXISTS VW_{table};\nCREATE VIEW VW_{table} AS SELECT code, COUNT(*) AS n FROM {table} "
+            "GROUP BY code" for table in MIGRATION_TABLES],
+        5: [f"INSERT INTO {table} (code, name, value, created) WITH RECURSIVE n(i) AS "
+            f"(SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {rows}) "
+            "SELECT i % 97, 'row ' || i, i * 1.5, '2025-01-01' FROM n" for table in MIGRATION_TABLES],
+    }
+    for number, batches in scripts.items():
+        with open(os.path.join(directory, f"SQLQuery_{number}.sql"), "w", encoding="utf-8") as f:
+            f.write("\nGO\n\n".join(batches) + "\nGO\n")
+
+
+@benchmark("migrations")
+def bench_migrations(rows=20000, latency=0.002):
+    from sql_runner import LEDGER, SQLRunner, split_batches
+
+    directory = tempfile.mkdtemp()
+    write_setup_scripts(directory, rows)
+    db = stub_db("migrations", latency)
+    try:
+        runner = SQLRunner(db)
+        runner.ledger = LEDGER  # sqlite has no three-part names
+        results = []
+
+        def run(label, incremental=True):
+            started = time.perf_counter()
+            success, msg = runner.run_all_scripts(directory, incremental)
+            seconds = time.perf_counter() - started
+            results.append((label, f"{seconds * 1000:9.1f} ms  {len(runner.timings):3} batch(es) run  "
+                                   f"{msg.splitlines()[0] if success else msg.splitlines()[-1]}"))
+            return msg
+
+        run("incremental, empty database")
+        run("full rebuild", incremental=False)
+        run("incremental, nothing changed")
+
+        # A changed view and a new index: only those two batches run
+        path = os.path.join(directory, "SQLQuery_3.sql")
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content.replace("COUNT(*) AS n FROM FLIGHTS GROUP", "SUM(value) AS n FROM FLIGHTS GROUP"))
+        with open(os.path.join(directory, "SQLQuery_2.sql"), "a", encoding="utf-8") as f:
+            f.write("\nCREATE INDEX idx_flights_created ON FLIGHTS (created)\nGO\n")
+        msg = run("incremental, 2 batches changed")
+        details = [line for line in msg.splitlines() if line.startswith("  batch")]
+        run("incremental, nothing changed")
+
+        # A CREATE TABLE edited in place cannot be re-run, so incremental mode refuses it and the ledger stays as it was
+        path = os.path.join(directory, "SQLQuery_1.sql")
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content.replace("CREATE TABLE USERS (id INTEGER PRIMARY KEY, code,",
+                                    "CREATE TABLE USERS (id INTEGER PRIMARY KEY, email, code,"))
+        run("incremental, CREATE TABLE edited")
+        report(f"Setup scripts, {len(MIGRATION_TABLES)} tables of {rows:,} rows, "
+               f"{latency * 1000:.0f} ms per round trip", results)
+        print("  batches of the 2-change run:\n" + "\n".join(details))
+
+        data, _ = db.fetch_results(f"SELECT COUNT(*) FROM {LEDGER} WHERE script_name = 'SQLQuery_1.sql'")
+        with open(path, encoding="utf-8") as f:
+            batches = len(split_batches(f.read()))
+        print(f"  SQLQuery_1.sql: {batches} batches, {data[1][0][0]} ledger rows, still those of the tables "
+              "as created")
+    finally:
+        db.disconnect()
+
+
+# --- Splitting scripts into batches ---
+# Correctness (the setup scripts, GO in strings and comments, fuzzing) is in tests/test_sql_runner.py
+@benchmark("batch_splitter")
+def bench_batch_splitter(data_rows=200000):
+    import re
+    import tracemalloc
+    from sql_runner import script_batches
+
+    directory = tempfile.mkdtemp()
+    # Streaming: a data script of one INSERT batch per row, split without holding the file
+    path = os.path.join(directory, "data.sql")
+    with open(path, "w", encoding="utf-8") as f:
+        for n in range(data_rows):
+            f.write(f"INSERT INTO AUDIT_LOG (table_name, action, details) VALUES ('FLIGHTS', 'INSERT', "
+                    f"'row {n}: it''s a\nGO\nmulti-line note /* not a comment */');\nGO\n")
+    size = os.path.getsize(path)
+    rows = []
+    for label, split in [("re.split on the whole file", lambda: sum(1 for part in re.split(
+                             r"\bGO\b", open(path, encoding="utf-8").read(), flags=re.IGNORECASE) if part.strip())),
+                         ("streaming splitter", lambda: sum(1 for _ in script_batches(path)))]:
+        started = time.perf_counter()
+        batches = split()
+        seconds = time.perf_counter() - started
+        # Measured on a second run, as tracing allocations slows it down
+        tracemalloc.start()
+        split()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        rows.append((label, f"{seconds:6.2f} s  {size / seconds / 1e6:6.1f} MB/s  peak {peak / 1024:9,.0f} KB  "
+                            f"{batches:,} batches"))
+    report(f"Data script of {size / 1e6:.0f} MB, {data_rows:,} batches", rows)
+
+
+# --- Flight search ---
+SEARCH_SCHEMA = [
+    "CREATE TABLE FLIGHTS (flight_id INTEGER PRIMARY KEY, departure_airport_id INT, arrival_airport_id INT, "
+    "departure_datetime TEXT, base_price REAL, available_seats INT, status TEXT)",
+    # Same key as idx_flights_route in SQLQuery_2.sql
+    "CREATE INDEX idx_flights_route ON FLIGHTS (departure_airport_id, arrival_airport_id, departure_datetime)",
+]
+SEARCH_COLUMNS = "flight_id, departure_datetime, base_price, available_seats"
+SEARCH_FILTER = "departure_airport_id = ? AND arrival_airport_id = ? AND status IN ('Scheduled', 'Boarding') AND available_seats > 0"
+# The old SP_SearchFlights predicate; sqlite's date() stands in for CAST(... AS DATE)
+LEGACY_SEARCH_SQL = (f"SELECT {SEARCH_COLUMNS} FROM FLIGHTS WHERE {SEARCH_FILTER} "
+                     "AND date(departure_datetime) = ? ORDER BY departure_datetime")
+RANGE_SEARCH_SQL = (f"SELECT {SEARCH_COLUMNS} FROM FLIGHTS WHERE {SEARCH_FILTER} "
+                    "AND departure_datetime >= ? AND departure_datetime < ? ORDER BY departure_datetime, flight_id")
+SEARCH_EPOCH = datetime(2025, 1, 1)
+
+
+def synthetic_flights(count, airports, days, seed=7):
+    """count flights at random quarter hours, spread over every route between airports and the given days."""
+    rng = random.Random(seed)
+    for flight_id in range(1, count + 1):
+        dep = rng.randrange(airports)
+        arr = (dep + rng.randrange(1, airports)) % airports
+        departure = SEARCH_EPOCH + timedelta(minutes=15 * rng.randrange(days * 96))
+        yield (flight_id, dep + 1, arr + 1, departure.strftime("%Y-%m-%d %H:%M:%S"), 100.0 + flight_id % 400,
+               rng.randrange(180), "Cancelled" if flight_id % 50 == 0 else "Scheduled")
+
+
+def day_range(travel_date, flex_days=0):
+    """The [start, end) departure range SP_SearchFlights derives from @travel_date and @flex_days."""
+    day = datetime.strptime(travel_date, "%Y-%m-%d")
+    start, end = day - timedelta(days=flex_days), day + timedelta(days=flex_days + 1)
+    return start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S")
+
+
+@benchmark("flight_search")
+def bench_flight_search(flights=500000, airports=8, days=365, searches=200):
+    db = stub_db("search")
+    for statement in SEARCH_SCHEMA:
+        db.execute_query(statement)
+    with db.pool.connection() as conn:
+        conn.cursor().executemany("INSERT INTO FLIGHTS VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                  synthetic_flights(flights, airports, days))
+    rng = random.Random(11)
+    probes = []
+    for _ in range(searches):
+        dep = rng.randrange(1, airports + 1)
+        travel_date = (SEARCH_EPOCH + timedelta(days=rng.randrange(days))).strftime("%Y-%m-%d")
+        probes.append((dep, dep % airports + 1, travel_date))
+
+    def plan(sql, params):
+        data, msg = db.fetch_results("EXPLAIN QUERY PLAN " + sql, params)
+        return "; ".join(str(row[-1]) for row in data[1])
+
+    def legacy():
+        return [db.fetch_results(LEGACY_SEARCH_SQL, (dep, arr, d))[0][1] for dep, arr, d in probes]
+
+    def ranged(flex_days):
+        def run():
+            return [db.fetch_results(RANGE_SEARCH_SQL, (dep, arr) + day_range(d, flex_days))[0][1]
+                    for dep, arr, d in probes]
+        return run
+
+    dep, arr, travel_date = probes[0]
+    report("Flight search plans", [
+        ("CAST(... AS DATE) = @date", plan(LEGACY_SEARCH_SQL, (dep, arr, travel_date))),
+        ("half-open range", plan(RANGE_SEARCH_SQL, (dep, arr) + day_range(travel_date))),
+    ])
+    rows = []
+    results = {}
+    for label, fn in [("CAST(... AS DATE) = @date", legacy), ("half-open range", ranged(0)),
+                      ("half-open range, ± 3 days", ranged(3))]:
+        seconds, results[label] = timed(fn, repeat=3)
+        found = sum(len(r) for r in results[label])
+        rows.append((label, f"{seconds / searches * 1000:8.3f} ms per search  {found} flights found"))
+    if results["half-open range"] != results["CAST(... AS DATE) = @date"]:
+        raise RuntimeError("The range search returned different flights than the date comparison")
+    report(f"Flight search, {flights} flights on {airports * (airports - 1)} routes over {days} days", rows)
+    db.disconnect()
+
+
+# --- Connecting itineraries ---
+def network_flights(count, airports, hubs, days, seed=5):
+    """FLIGHTS_SQL-shaped rows: most routes touch one of the first hubs airports, as in a hub-and-spoke schedule."""
+    rng = random.Random(seed)
+    for flight_id in range(1, count + 1):
+        if rng.random() < 0.8:
+            hub, spoke = rng.randrange(hubs), rng.randrange(airports)
+            dep, arr = (hub, spoke) if rng.random() < 0.5 else (spoke, hub)
+            if dep == arr:
+                arr = (arr + 1) % airports
+        else:
+            dep = rng.randrange(airports)
+            arr = (dep + rng.randrange(1, airports)) % airports
+        departure = SEARCH_EPOCH + timedelta(minutes=5 * rng.randrange(days * 288))
+        arrival = departure + timedelta(minutes=rng.randrange(60, 13 * 60, 5))
+        base_price = 100.0 + flight_id % 400
+        seats = [rng.randrange(0, limit) for limit in (150, 24, 6)]
+        quotes = [value for multiplier, free in zip((1.0, 2.5, 4.0), seats) for value in (base_price * multiplier, free)]
+        yield (flight_id, f"XX{flight_id}", "Airline", dep + 1, arr + 1, departure, arrival,
+               base_price, max(sum(seats), 1), *quotes)
+
+
+@benchmark("itineraries")
+def bench_itineraries(flights=300000, airports=60, hubs=4, days=365, searches=100):
+    from itineraries import FlightNetwork
+
+    network = FlightNetwork(None, now=lambda: SEARCH_EPOCH)  # The schedule is fixed, so is its clock
+    rows = list(network_flights(flights, airports, hubs, days))
+    start = time.perf_counter()
+    network.load(rows)
+    built = time.perf_counter() - start
+    del rows
+    network.loaded_at = float("inf")  # Never stale: no database behind it
+    rng = random.Random(3)
+    probes = []
+    for _ in range(searches):
+        origin = rng.randrange(hubs + 1, airports + 1)  # Spoke to spoke, so most trips need a connection
+        destination = rng.randrange(hubs + 1, airports + 1)
+        if destination == origin:
+            destination = destination % airports + 1
+        day = (SEARCH_EPOCH + timedelta(days=rng.randrange(days - 3))).strftime("%Y-%m-%d")
+        probes.append((origin, destination, day))
+
+    rows = [("index build", f"{built * 1000:8.1f} ms  {flights} flights, {airports} airports")]
+    for max_legs in (1, 2, 3):
+        for sort in ("duration", "price"):
+            samples = []
+            found = 0
+            for origin, destination, day in probes:
+                begin = time.perf_counter()
+                result, msg = network.search(origin, destination, day, max_legs=max_legs, sort=sort)
+                samples.append(time.perf_counter() - begin)
+                found += len(result)
+            samples.sort()
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+            rows.append((f"up to {max_legs} leg(s), by {sort}",
+                         f"{statistics.median(samples) * 1000:8.2f} ms median  {p99 * 1000:8.2f} ms p99  "
+                         f"{found / searches:6.1f} itineraries per search"))
+    report(f"Itinerary search, {searches} spoke-to-spoke searches", rows)
+
+
+# --- Seat counter maintenance ---
+SEAT_SCHEMA = [
+    "CREATE TABLE FLIGHTS (flight_id INTEGER PRIMARY KEY, total_seats INT, available_seats INT CHECK (available_seats >= 0))",
+    "CREATE TABLE RESERVATIONS (reservation_id INTEGER PRIMARY KEY, flight_id INT, reservation_status TEXT)",
+    "CREATE INDEX idx_reservations_flight ON RESERVATIONS (flight_id, reservation_status)",
+]
+ACTIVE = "('Confirmed', 'Checked-In')"
+# The old TRG_UpdateAvailableSeats: recount the flight's reservations on every insert and update
+RECOUNT_TRIGGERS = [
+    f"""CREATE TRIGGER seats_{event} AFTER {event} ON RESERVATIONS BEGIN
+        UPDATE FLIGHTS SET available_seats = total_seats - (
+            SELECT COUNT(*) FROM RESERVATIONS r
+            WHERE r.flight_id = FLIGHTS.flight_id AND r.reservation_status IN {ACTIVE})
+        WHERE flight_id = NEW.flight_id;
+    END""" for event in ("INSERT", "UPDATE")
+]
+# The new one: apply the status transition as a +/-1 delta (sqlite triggers are per row)
+DELTA_TRIGGERS = [
+    f"""CREATE TRIGGER seats_insert AFTER INSERT ON RESERVATIONS WHEN NEW.reservation_status IN {ACTIVE} BEGIN
+        UPDATE FLIGHTS SET available_seats = available_seats - 1 WHERE flight_id = NEW.flight_id;
+    END""",
+    f"""CREATE TRIGGER seats_update AFTER UPDATE OF reservation_status, flight_id ON RESERVATIONS BEGIN
+        UPDATE FLIGHTS SET available_seats = available_seats + 1
+        WHERE flight_id = OLD.flight_id AND OLD.reservation_status IN {ACTIVE};
+        UPDATE FLIGHTS SET available_seats = available_seats - 1
+        WHERE flight_id = NEW.flight_id AND NEW.reservation_status IN {ACTIVE};
+    END""",
+    f"""CREATE TRIGGER seats_delete AFTER DELETE ON RESERVATIONS WHEN OLD.reservation_status IN {ACTIVE} BEGIN
+        UPDATE FLIGHTS SET available_seats = available_seats + 1 WHERE flight_id = OLD.flight_id;
+    END""",
+]
+# SP_ReconcileAvailableSeats' recount
+SEAT_DRIFT_SQL = f"""
+SELECT f.flight_id, f.available_seats, f.total_seats - COALESCE(held.seats, 0)
+FROM FLIGHTS f LEFT JOIN (
+    SELECT flight_id, COUNT(*) AS seats FROM RESERVATIONS
+    WHERE reservation_status IN {ACTIVE} GROUP BY flight_id) held ON held.flight_id = f.flight_id
+WHERE f.available_seats <> f.total_seats - COALESCE(held.seats, 0)
+"""
+
+
+def seat_database(path, triggers, flights, booked):
+    """A file database with flights; flight 1 is the popular one with booked reservations already."""
+    import sqlite3
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    for statement in SEAT_SCHEMA:
+        conn.execute(statement)
+    capacity = booked * 2 + 100000
+    conn.executemany("INSERT INTO FLIGHTS VALUES (?, ?, ?)", [(i, capacity, capacity) for i in range(1, flights + 1)])
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO RESERVATIONS (flight_id, reservation_status) VALUES (1, ?)",
+                     [("Confirmed" if i % 10 else "Cancelled",) for i in range(booked)])
+    conn.execute("COMMIT")
+    conn.execute("UPDATE FLIGHTS SET available_seats = total_seats - (SELECT COUNT(*) FROM RESERVATIONS r "
+                 f"WHERE r.flight_id = FLIGHTS.flight_id AND r.reservation_status IN {ACTIVE})")
+    # Triggers last, so loading the existing reservations does not pay for them
+    for statement in triggers:
+        conn.execute(statement)
+    conn.close()
+
+
+def seat_worker(path, operations, latencies, seed):
+    """Book on the popular flight (cancel every fifth time), one short transaction each."""
+    import sqlite3
+    conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+    rng = random.Random(seed)
+    mine = []
+    for n in range(operations):
+        start = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        if n % 5 == 4 and mine:
+            conn.execute("UPDATE RESERVATIONS SET reservation_status = 'Cancelled' WHERE reservation_id = ?",
+                         (mine.pop(rng.randrange(len(mine))),))
+        else:
+            cur = conn.execute("INSERT INTO RESERVATIONS (flight_id, reservation_status) VALUES (1, 'Confirmed')")
+            mine.append(cur.lastrowid)
+        conn.execute("COMMIT")
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+@benchmark("seat_counters")
+def bench_seat_counters(booked=50000, threads=(1, 4, 8), operations=300):
+    import sqlite3
+    import threading
+
+    rows = []
+    for label, triggers in (("recount (old trigger)", RECOUNT_TRIGGERS), ("delta (new trigger)", DELTA_TRIGGERS)):
+        for count in threads:
+            path = os.path.join(tempfile.mkdtemp(), "seats.db")
+            seat_database(path, triggers, flights=100, booked=booked)
+            latencies = []
+            workers = [threading.Thread(target=seat_worker, args=(path, operations, latencies, i))
+                       for i in range(count)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+            conn = sqlite3.connect(path)
+            drift = conn.execute(SEAT_DRIFT_SQL).fetchall()
+            conn.close()
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            rows.append((f"{label}, {count} thread(s)",
+                         f"{len(latencies) / elapsed:8.0f} ops/s  {statistics.median(latencies) * 1000:7.2f} ms median  "
+                         f"{p99 * 1000:7.2f} ms p99  drift: {len(drift)} flight(s)"))
+    report(f"Seat counters, bookings and cancellations on a flight with {booked} reservations", rows)
+
+    # Reconciliation: knock one counter out of step and let the recount find it
+    path = os.path.join(tempfile.mkdtemp(), "seats.db")
+    seat_database(path, DELTA_TRIGGERS, flights=100, booked=booked)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("UPDATE FLIGHTS SET available_seats = available_seats - 3 WHERE flight_id = 1")
+    seconds, drift = timed(lambda: conn.execute(SEAT_DRIFT_SQL).fetchall(), repeat=3)
+    conn.close()
+    report("Seat reconciliation", [("recount of all flights", f"{seconds * 1000:8.1f} ms  drifted: {drift}")])
+
+
+# --- Seat maps ---
+SEAT_MAP_SCHEMA = [
+    "CREATE TABLE AIRCRAFT (aircraft_id INTEGER PRIMARY KEY, economy_seats, business_seats, first_class_seats)",
+    "CREATE TABLE FLIGHTS (flight_id INTEGER PRIMARY KEY, aircraft_id)",
+    "CREATE TABLE RESERVATIONS (reservation_id INTEGER PRIMARY KEY, flight_id, seat_number, class_type, reservation_status)",
+    "CREATE INDEX idx_reservations_flight ON RESERVATIONS (flight_id, reservation_status, seat_number, class_type)",
+]
+SEAT_CHECK_SQL = ("SELECT 1 FROM RESERVATIONS WHERE flight_id = ? AND seat_number = ? "
+                  "AND reservation_status IN ('Confirmed', 'Checked-In')")
+
+
+@benchmark("seat_map")
+def bench_seat_map(latency=0.01, occupancy=0.9, checks=100000):
+    from seat_map import SeatLayout, load_seat_map
+
+    # An A380 (399/76/42) with occupancy of every cabin booked, front rows first
+    db = stub_db("seat_map", latency)
+    for statement in SEAT_MAP_SCHEMA:
+        db.execute_query(statement)
+    layout = SeatLayout(399, 76, 42)
+    db.execute_query("INSERT INTO AIRCRAFT VALUES (1, 399, 76, 42)")
+    db.execute_query("INSERT INTO FLIGHTS VALUES (1, 1)")
+    booked = []
+    for class_type, (start, end) in layout.cabins.items():
+        booked += [(layout.labels[i], class_type) for i in range(start, start + int((end - start) * occupancy))]
+    with db.pool.connection() as conn:
+        conn.cursor().executemany("INSERT INTO RESERVATIONS (flight_id, seat_number, class_type, reservation_status) "
+                                  "VALUES (1, ?, ?, 'Confirmed')", booked)
+
+    def probe_seats():
+        # The old way to find a free seat: ask the server about one candidate after another
+        for label in layout.labels[layout.cabins["Economy"][0]:]:
+            data, _ = db.fetch_results(SEAT_CHECK_SQL, (1, label))
+            if not data[1]:
+                return label
+
+    probe_seconds, probe_trips, probe_seat = round_trips(probe_seats, repeat=1)
+    load_seconds, load_trips, (seats, _) = round_trips(lambda: load_seat_map(db, 1), repeat=3)
+    rng = random.Random(3)
+    labels = [rng.choice(layout.labels) for _ in range(1000)]
+    check_seconds, _ = timed(lambda: [seats.is_free(label) for _ in range(checks // 1000) for label in labels], repeat=3)
+    best_seconds, best = timed(lambda: seats.next_best("Economy", preferred="20A"), repeat=20)
+    report(f"Seat map of a {len(layout)}-seat aircraft, {len(booked)} seats booked, "
+           f"{latency * 1000:.0f} ms per round trip", [
+        ("probe seats one query each", f"{probe_seconds * 1000:8.1f} ms  {probe_trips:.0f} round trip(s)  -> {probe_seat}"),
+        ("load seat map", f"{load_seconds * 1000:8.1f} ms  {load_trips:.0f} round trip(s)"),
+        ("is_free", f"{check_seconds / checks * 1e9:8.0f} ns per check"),
+        ("next_best (Economy, near 20A)", f"{best_seconds * 1e6:8.1f} us  -> {best}"),
+    ])
+    db.disconnect()
+
+
+# --- Grid rendering ---
+RENDER_SIZES = (1000, 10000, 100000)
+FLIGHT_HEADERS = ("ID", "Airline", "Flight No", "Origin", "Dest", "Departure", "Price", "Seats", "Status")
+
+
+def flight_rows(count):
+    return [(i, f"Airline {i % 12}", f"PK-{i:05d}", "Karachi", "Lahore", f"2025-01-{i % 28 + 1:02d} 09:00:00",
+             125.5 + i % 300, 180 - i % 180, "Scheduled") for i in range(count)]
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def render_tk(mode, rows):
+    import tkinter as tk
+    from tkinter import ttk
+    from table_models import WindowedTreeview
+
+    root = tk.Tk()
+    tree_class = WindowedTreeview if mode == "windowed" else ttk.Treeview
+    tree = tree_class(root, columns=FLIGHT_HEADERS, show="headings", height=20)
+    tree.pack(fill=tk.BOTH, expand=True)
+    root.update()
+    before = rss_mb()
+    start = time.perf_counter()
+    if mode == "windowed":
+        tree.set_rows(rows)
+    else:
+        for row in rows:
+            tree.insert("", tk.END, values=list(row))
+    root.update()
+    return time.perf_counter() - start, rss_mb() - before, root
+
+
+def render_qt(mode, rows):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication, QTableWidget, QTableWidgetItem
+    import gui_pyqt
+
+    app = QApplication.instance() or QApplication([])
+    if mode == "model":
+        table = gui_pyqt.create_table(FLIGHT_HEADERS)
+    else:
+        table = QTableWidget(0, len(FLIGHT_HEADERS))
+    table.resize(1000, 600)
+    table.show()
+    app.processEvents()
+    before = rss_mb()
+    start = time.perf_counter()
+    if mode == "model":
+        table.model().set_rows(rows)
+    else:
+        table.setRowCount(len(rows))
+        for r, row in enumerate(rows):
+            for c, val in enumerate(row):
+                table.setItem(r, c, QTableWidgetItem(str(val)))
+    app.processEvents()
+    return time.perf_counter() - start, rss_mb() - before, table
+
+
+RENDERERS = {"tk": render_tk, "qt": render_qt}
+
+
+def render_child(toolkit, mode, count):
+    """Runs in a fresh interpreter so each RSS figure covers one grid only."""
+    seconds, growth, widget = RENDERERS[toolkit](mode, flight_rows(count))
+    print(seconds, growth)
+
+
+@benchmark("table_render")
+def bench_table_render(sizes=RENDER_SIZES):
+    # Old way first: one widget item per row (Tk) or per cell (Qt); then the windowed tree / table model
+    for toolkit, modes in (("tk", ("insert", "windowed")), ("qt", ("items", "model"))):
+        rows = []
+        for mode in modes:
+            for count in sizes:
+                code = f"import benchmarks; benchmarks.render_child({toolkit!r}, {mode!r}, {count})"
+                proc = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, capture_output=True, text=True)
+                if proc.returncode != 0:
+                    reason = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+                    rows.append((f"{mode}, {count} rows", f"skipped: {reason}"))
+                    break
+                seconds, mb = map(float, proc.stdout.split()[-2:])
+                rows.append((f"{mode}, {count:>6} rows", f"{seconds * 1000:9.1f} ms  {mb:+7.1f} MB RSS"))
+        report(f"Grid render ({toolkit}), time to fill and paint, RSS growth", rows)
+
+
+def main(argv):
+    if not argv:
+        print("Available benchmarks: " + ", ".join(sorted(BENCHMARKS)) + ", all")
+        return
+    names = sorted(BENCHMARKS) if argv[0] == "all" else argv
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark: {name}")
+            continue
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
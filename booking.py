@@ -0,0 +1,128 @@
+"""Booking API shared by both GUIs.
+
+book() registers or updates the passenger, reserves the seat and records the
+payment with one call to SP_BookFlight, which does all of it in a single
+server-side transaction: either everything is written or nothing is.
+DatabaseConnection runs it again when the server rolled it back as a
+deadlock victim or after a lock timeout, and book() does when the seat the
+server picked was taken by a concurrent booking first.
+
+class_quotes() prices every class of one or many flights in one query, and
+reconcile_seats() checks FLIGHTS.available_seats, which the seat trigger
+maintains by deltas, against a recount of the reservations.
+"""
+import random
+import time
+
+from statements import register
+
+BOOK_SQL = register("book", """
+DECLARE @passenger_id INT, @reservation_id INT, @booking_reference VARCHAR(10),
+        @total_price DECIMAL(10,2), @payment_id INT;
+EXEC SP_BookFlight
+    @first_name=?, @last_name=?, @passport_number=?, @email=?, @phone_number=?,
+    @flight_id=?, @class_type=?, @seat_number=?, @payment_method=?, @card_last_four=?,
+    @passenger_id=@passenger_id OUTPUT,
+    @reservation_id=@reservation_id OUTPUT,
+    @booking_reference=@booking_reference OUTPUT,
+    @total_price=@total_price OUTPUT,
+    @payment_id=@payment_id OUTPUT;
+SELECT @passenger_id AS passenger_id, @reservation_id AS reservation_id,
+       @booking_reference AS booking_reference, @total_price AS total_price, @payment_id AS payment_id;
+""")
+
+BOOK_ATTEMPTS = 3
+RETRY_DELAY = 0.05  # seconds before the second attempt, doubled for each one after, with jitter
+SEAT_TAKEN_ERROR = "UQ_seat_per_flight"  # Named in the duplicate key error (2601) when a seat is taken twice
+
+
+def book(db, first_name, last_name, passport_number, email, phone_number, flight_id, class_type,
+         seat_number=None, payment_method=None, card_last_four=None, attempts=BOOK_ATTEMPTS):
+    """Book a seat in one round trip, retried up to attempts times when a concurrent booking took its seat.
+
+    Returns (booking, msg). booking is a dict with passenger_id,
+    reservation_id, booking_reference, total_price (as priced by the server),
+    payment_id (None when no payment_method was given) and attempts (1 unless
+    it was retried); on failure it is None and msg carries the server's error.
+    Deadlock and lock timeout retries happen inside db and show in
+    db.retry_stats(), not in attempts.
+    """
+    params = (first_name, last_name, passport_number, email, phone_number, flight_id, class_type,
+              seat_number or None, payment_method or None, card_last_four or None)
+    for attempt in range(1, attempts + 1):
+        # Not idempotent: after a dropped connection the booking may have been made
+        data, msg = db.fetch_results(BOOK_SQL, params, idempotent=False)
+        if data is not None:
+            break
+        if SEAT_TAKEN_ERROR not in msg:
+            return None, msg
+        if seat_number:
+            return None, f"Seat {seat_number} already booked"
+        # The seat the server picked was taken first; the next attempt picks another
+        if attempt == attempts:
+            return None, f"{msg} (gave up after {attempts} attempts)"
+        time.sleep(RETRY_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+    columns, rows = data
+    if not rows or rows[0][1] is None:
+        return None, "Booking returned no reservation."
+    booking = dict(zip(columns, rows[0]))
+    booking["attempts"] = attempt
+    return booking, "Success"
+
+
+CLASS_TYPES = ("Economy", "Business", "First Class")
+QUOTE_SQL = ("SELECT flight_id, class_type, price, available_class_seats "
+             "FROM dbo.FN_ClassQuotes(GETDATE()) WHERE flight_id IN ({})")
+QUOTE_BATCH = 1000  # flight ids per query, well under the driver's 2100 parameter limit
+# IN-list lengths a batch is padded up to (repeating its last id), so there are five
+# statements, and five plans on the server, instead of one per number of flights
+QUOTE_SIZES = (8, 32, 128, 512, QUOTE_BATCH)
+
+
+def class_quotes(db, flight_ids):
+    """Price and remaining seats for every class of the given flights, in one query per 1000 flights.
+
+    Returns ({flight_id: {class_type: (price, available_seats)}}, msg), or
+    (None, msg) on failure.
+    """
+    flight_ids = list(dict.fromkeys(flight_ids))
+    quotes = {flight_id: {} for flight_id in flight_ids}
+    for start in range(0, len(flight_ids), QUOTE_BATCH):
+        batch = flight_ids[start:start + QUOTE_BATCH]
+        size = next(n for n in QUOTE_SIZES if n >= len(batch))
+        statement = register(f"class_quotes_{size}", QUOTE_SQL.format(", ".join("?" * size)))
+        data, msg = db.fetch_results(statement, batch + batch[-1:] * (size - len(batch)))
+        if data is None:
+            return None, msg
+        for flight_id, class_type, price, seats in data[1]:
+            quotes.setdefault(flight_id, {})[class_type] = (float(price), seats)
+    return quotes, "Success"
+
+
+RECONCILE_SQL = register("reconcile_seats", "EXEC SP_ReconcileAvailableSeats @repair=?, @flight_id=?")
+
+
+def reconcile_seats(db, repair=True, flight_id=None):
+    """Find (and with repair, fix) seat counters that disagree with the reservations.
+
+    Returns (drifted, msg). drifted lists (flight_id, recorded_seats,
+    expected_seats, repaired) for every flight that was off, or for
+    flight_id only; on failure it is None. repaired is False for a flight
+    whose counter moved between the recount and the repair; it is left for
+    the next run.
+    """
+    # A repair writes FLIGHTS and AUDIT_LOG, so it must not run again after a dropped connection
+    data, msg = db.fetch_results(RECONCILE_SQL, (1 if repair else 0, flight_id), idempotent=not repair,
+                                 query_class="admin")
+    if data is None:
+        return None, msg
+    drifted = [(row[0], row[1], row[2], bool(row[4])) for row in data[1]]
+    if not drifted:
+        return drifted, "All seat counters match the reservations."
+    if not repair:
+        return drifted, f"{len(drifted)} seat counter(s) out of step."
+    repaired = sum(1 for row in drifted if row[3])
+    msg = f"{repaired} seat counter(s) repaired."
+    if repaired < len(drifted):
+        msg += f" {len(drifted) - repaired} changed during the check and were left for the next run."
+    return drifted, msg
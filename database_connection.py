@@ -1,99 +1,1076 @@
-import pyodbc
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from query_stats import QueryStats
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = os.path.join(PROJECT_DIR, "db_config.json")
+CACHE_FILE = os.path.join(PROJECT_DIR, ".db_connection_cache.json")
+
+# Connection settings: defaults < db_config.json < FRS_DB_* environment variables
+DEFAULT_SETTINGS = {
+    "driver": "",
+    "server": "localhost,1433",
+    "database": "FlightReservationDB",
+    "uid": "sa",
+    "pwd": "DB_Password123!",
+    "trust_server_certificate": "yes",
+}
+ENV_PREFIX = "FRS_DB_"
+
+_installed_drivers = {}  # driver module name -> result of drivers(), probed once per process
+
+
+def load_settings(config_path=None, environ=None):
+    """Return connection settings merged from defaults, the JSON config file and the environment."""
+    settings = dict(DEFAULT_SETTINGS)
+    config_path = config_path or os.environ.get(ENV_PREFIX + "CONFIG", CONFIG_FILE)
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        settings.update({k.lower(): str(v) for k, v in data.items() if k.lower() in settings})
+    except (OSError, ValueError):
+        pass
+    environ = os.environ if environ is None else environ
+    for key in settings:
+        value = environ.get(ENV_PREFIX + key.upper())
+        if value is not None:
+            settings[key] = value
+    return settings
+
+
+def installed_drivers(driver_module):
+    """ODBC drivers reported by the driver module, queried only once."""
+    name = getattr(driver_module, "__name__", str(id(driver_module)))
+    if name not in _installed_drivers:
+        try:
+            _installed_drivers[name] = list(driver_module.drivers())
+        except Exception:
+            # Unknown: fall back to probing the candidate list as-is
+            _installed_drivers[name] = None
+    return _installed_drivers[name]
+
+
+def read_cache(path=CACHE_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def write_cache(data, path=CACHE_FILE):
+    try:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # The cache is only an optimisation
+
+
+# Seconds a statement of each class may run before the driver cancels it (0: no limit).
+# Calls default to "interactive"; execute_query (scripts) to "admin".
+QUERY_TIMEOUTS = {
+    "interactive": 15,  # logins, bookings, check-in, seat maps, reference data, paging
+    "search": 30,       # flight search and the network load behind connecting itineraries
+    "analytics": 120,   # the analytics views
+    "admin": 600,       # setup scripts, seat reconciliation, table lists, plan cache
+}
+LOGIN_TIMEOUT = 15  # seconds to open a connection
+
+# Errors by SQLSTATE (args[0] of a pyodbc error) or by the native SQL Server error
+# number pyodbc puts after each message, before the ODBC function that failed:
+# "... Rerun the transaction. (1205) (SQLExecDirectW)"
+ERROR_CLASSES_BY_SQLSTATE = {
+    "40001": "deadlock",
+    "HYT00": "timeout", "HYT01": "timeout",
+    "HY008": "cancelled",
+    "08S01": "connection", "08001": "connection", "08003": "connection", "08004": "connection",
+    "08007": "connection",
+}
+ERROR_CLASSES_BY_NUMBER = {
+    1205: "deadlock",
+    1222: "lock_timeout",
+    233: "connection", 10053: "connection", 10054: "connection", 10060: "connection", 64: "connection",
+    40197: "unavailable", 40501: "unavailable", 40613: "unavailable",
+}
+# Classes worth running the call again for; a timed-out or cancelled call is not
+TRANSIENT_CLASSES = ("deadlock", "lock_timeout", "connection", "unavailable")
+# Classes after which the server has undone the failed statement, and with it the
+# transaction when it is a procedure that rolls back in its CATCH block (all of ours do)
+ROLLED_BACK_CLASSES = ("deadlock", "lock_timeout")
+# Classes after which the connection itself may be gone, so the pool pings it before reuse
+BROKEN_CLASSES = ("connection", "unavailable")
+# Only that position: a number in parentheses inside the message may be data the server
+# echoed, e.g. the key value of a duplicate key error
+_ERROR_NUMBER = re.compile(r"\((\d+)\)\s*(?:\(SQL\w+\)|$)")
+
+
+def classify_error(exc):
+    """The class of a driver error: transient ("deadlock", "lock_timeout", "connection",
+    "unavailable"), "timeout" or "cancelled", or None for any other error."""
+    sqlstate = exc.args[0] if exc.args and isinstance(exc.args[0], str) else ""
+    if sqlstate in ERROR_CLASSES_BY_SQLSTATE:
+        return ERROR_CLASSES_BY_SQLSTATE[sqlstate]
+    message = exc.args[1] if len(exc.args) > 1 and isinstance(exc.args[1], str) else str(exc)
+    for number in _ERROR_NUMBER.findall(message.rstrip()):
+        if int(number) in ERROR_CLASSES_BY_NUMBER:
+            return ERROR_CLASSES_BY_NUMBER[int(number)]
+    if sqlstate.startswith("08"):
+        return "connection"
+    return None
+
+
+class RetryPolicy:
+    """Which failed calls DatabaseConnection runs again, how often, and how long it waits first.
+
+    A call is retried when its error is transient (TRANSIENT_CLASSES) and
+    running it again cannot apply it twice: the error came before anything
+    reached the server, the call is idempotent (a read), or the server
+    rolled the work back (ROLLED_BACK_CLASSES) and the call is one
+    transaction. A connection that drops after a write was sent is not
+    retried, since the write may have committed first.
+    """
+
+    def __init__(self, attempts=3, base_delay=0.05, max_delay=2.0, rolled_back=ROLLED_BACK_CLASSES,
+                 transient=TRANSIENT_CLASSES):
+        self.attempts = attempts
+        self.base_delay = base_delay  # seconds before the second attempt, doubled for each one after
+        self.max_delay = max_delay
+        self.rolled_back = rolled_back
+        self.transient = transient
+
+    def retryable(self, error_class, sent=True, idempotent=True, atomic=True):
+        if error_class not in self.transient:
+            return False
+        if not sent or idempotent:
+            return True
+        return atomic and error_class in self.rolled_back
+
+    def delay(self, attempt):
+        """Seconds to wait after the given failed attempt, with jitter so colliding callers spread out."""
+        return min(self.max_delay, self.base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free within the checkout timeout."""
+
+
+class Cancelled(Exception):
+    """Raised when a call would start under a CancelHandle that was already cancelled."""
+
+
+class CancelHandle:
+    """Cancels the statements running under it, from any thread.
+
+    Calls made inside db.scope(handle=handle) run under it; handle.cancel()
+    then calls cursor.cancel() on each running statement, which fails with
+    "cancelled", and any later call in the scope fails without starting.
+    """
 
-class DatabaseConnection:
     def __init__(self):
+        self.cancelled = False
+        self._cursors = set()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """Cancel the running statements. Returns how many there were."""
+        with self._lock:
+            self.cancelled = True
+            cursors = list(self._cursors)
+        for cursor in cursors:
+            _cancel_cursor(cursor)
+        return len(cursors)
+
+    def _attach(self, cursor):
+        with self._lock:
+            if self.cancelled:
+                raise Cancelled("Cancelled before it started.")
+            self._cursors.add(cursor)
+
+    def _detach(self, cursor):
+        with self._lock:
+            self._cursors.discard(cursor)
+
+
+def _cancel_cursor(cursor):
+    try:
+        cursor.cancel()
+    except Exception:
+        pass  # Finished (or its connection died) in the meantime
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections.
+
+    Connections are created lazily up to max_size, validated with a cheap
+    query when borrowed after sitting idle for validate_after seconds, and
+    closed once they sit idle longer than idle_timeout (never dropping below
+    min_size).
+    """
+
+    def __init__(self, factory, min_size=1, max_size=5, timeout=10.0,
+                 idle_timeout=300.0, ping_query="SELECT 1", validate_on_borrow=True,
+                 validate_after=1.0, on_close=None):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool size must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_query = ping_query
+        self.validate_on_borrow = validate_on_borrow
+        self.validate_after = validate_after
+        self.on_close = on_close  # on_close(conn) after the pool closes a connection
+
+        self._cond = threading.Condition()
+        self._idle = []  # (connection, returned_at), most recently returned last
+        self._size = 0   # idle + in use
+        self._closed = False
+        self._stats = {
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "failed_pings": 0,
+            "evicted": 0,
+        }
+
+    # --- Lifecycle ---
+    def fill(self, seed=None):
+        """Open connections up to min_size, optionally adopting an already open one."""
+        with self._cond:
+            if seed is not None:
+                self._idle.append((seed, time.monotonic()))
+                self._size += 1
+                self._stats["created"] += 1
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self.factory()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._stats["created"] += 1
+                self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_conn(conn)
+
+    # --- Checkout ---
+    def acquire(self, timeout=None, validate=False):
+        """Borrow a connection; validate pings an idle one however briefly it sat idle."""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited = False
+        start = time.monotonic()
+        while True:
+            conn = None
+            create = False
+            idle_for = 0.0
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed.")
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"No connection available within {timeout:.1f}s "
+                                          f"({self._size}/{self.max_size} in use).")
+                    waited = True
+                    self._cond.wait(remaining)
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed.")
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    idle_for = time.monotonic() - returned_at
+                else:
+                    self._size += 1
+                    create = True
+
+            if create:
+                try:
+                    conn = self.factory()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats["created"] += 1
+            elif ((validate or self.validate_on_borrow and idle_for >= self.validate_after)
+                  and not self._ping(conn)):
+                self._discard(conn)
+                with self._cond:
+                    self._stats["failed_pings"] += 1
+                continue
+
+            with self._cond:
+                self._stats["checkouts"] += 1
+                if waited:
+                    self._stats["waits"] += 1
+                    self._stats["wait_time"] += time.monotonic() - start
+            return conn
+
+    def release(self, conn, discard=False):
+        if discard:
+            self._discard(conn)
+            return
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                close_now = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                close_now = False
+            self._cond.notify()
+        if close_now:
+            self._close_conn(conn)
+        self.evict_idle()
+
+    @contextmanager
+    def connection(self, timeout=None, validate=False):
+        """Borrow a connection for the block. One that raised an error of BROKEN_CLASSES is pinged
+        and, if dead, closed instead of returned; after any other error it is returned as it is."""
+        conn = self.acquire(timeout, validate)
+        try:
+            yield conn
+        except BaseException as e:
+            self.release(conn, discard=classify_error(e) in BROKEN_CLASSES and not self._ping(conn))
+            raise
+        else:
+            self.release(conn)
+
+    # --- Maintenance ---
+    def evict_idle(self):
+        """Close connections idle longer than idle_timeout, keeping min_size open."""
+        if self.idle_timeout is None:
+            return 0
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = []
+        with self._cond:
+            # Oldest connections sit at the front of the idle list
+            while self._idle and self._idle[0][1] < cutoff and self._size > self.min_size:
+                expired.append(self._idle.pop(0)[0])
+                self._size -= 1
+            self._stats["evicted"] += len(expired)
+        for conn in expired:
+            self._close_conn(conn)
+        return len(expired)
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._stats)
+            data["size"] = self._size
+            data["idle"] = len(self._idle)
+            data["in_use"] = self._size - len(self._idle)
+            data["max_size"] = self.max_size
+        return data
+
+    # --- Helpers ---
+    def _ping(self, conn):
+        if not self.ping_query:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.ping_query)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        self._close_conn(conn)
+
+    def _close_conn(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        if self.on_close:
+            self.on_close(conn)
+        with self._cond:
+            self._stats["closed"] += 1
+
+
+class ResultStream:
+    """One result set read in fetchmany() batches over a borrowed pooled connection.
+
+    columns is available as soon as the query returns. The connection goes
+    back to the pool when the rows are exhausted, max_rows is reached or
+    close() is called.
+    """
+
+    def __init__(self, conn, cursor, batch_size, max_rows=None, release=None):
+        # release(conn, error) hands the connection back; error ended the reading or the close, or is None
+        self.release = release
+        self.conn = conn
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.columns = [column[0] for column in cursor.description] if cursor.description else []
+        self.rows_read = 0
+        self.truncated = False  # True when max_rows cut the result short
+        self.error = None  # The driver error that ended the reading, e.g. a timeout or cancel
+        self.closed = False
+
+    def batches(self):
+        try:
+            while not self.closed:
+                size = self.batch_size
+                if self.max_rows is not None:
+                    size = min(size, self.max_rows - self.rows_read)
+                    if size <= 0:
+                        self.truncated = self.cursor.fetchone() is not None
+                        break
+                rows = self.cursor.fetchmany(size)
+                if not rows:
+                    break
+                self.rows_read += len(rows)
+                yield rows
+        except Exception as e:
+            self.error = e
+            raise
+        finally:
+            self.close()
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        error = self.error
+        try:
+            self.cursor.close()
+        except Exception as e:
+            error = error or e
+        if self.release:
+            self.release(self.conn, error)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _pyodbc():
+    # Imported only when no other driver is given, so stub_driver works without unixODBC installed
+    import pyodbc
+    return pyodbc
+
+
+class DatabaseConnection:
+    def __init__(self, driver=None, pool_min=1, pool_max=5, pool_timeout=10.0, idle_timeout=300.0,
+                 settings=None, cache_path=None, retry_policy=None, query_stats=None, query_timeouts=None,
+                 login_timeout=LOGIN_TIMEOUT):
+        # driver is any module exposing the pyodbc API (see stub_driver.py for a local stand-in)
+        self.driver = driver or _pyodbc()
+        # Preferred drivers, newest first; only the ones actually installed are tried
         self.drivers = [
             "ODBC Driver 18 for SQL Server",
             "ODBC Driver 17 for SQL Server",
             "ODBC Driver 13 for SQL Server",
             "SQL Server"
         ]
+        self.settings = settings if settings is not None else load_settings()
+        self.cache_path = cache_path or os.environ.get(ENV_PREFIX + "CACHE", CACHE_FILE)
         self.connection_string_template = (
             "DRIVER={{{driver}}};"
-            "SERVER=localhost,1433;"
-            "DATABASE=FlightReservationDB;"
-            "UID=sa;"
-            "PWD=DB_Password123!;"
-            "TrustServerCertificate=yes;"
+            "SERVER={server};"
+            "DATABASE={database};"
+            "UID={uid};"
+            "PWD={pwd};"
+            "TrustServerCertificate={trust_server_certificate};"
+        )
+        self.pool_min = pool_min
+        self.pool_max = pool_max
+        self.pool_timeout = pool_timeout
+        self.idle_timeout = idle_timeout
+        self.pool = None
+        self.conn_str = None
+        self.fetch_batch_size = 500
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Query class -> seconds its statements may run; see QUERY_TIMEOUTS
+        self.query_timeouts = dict(QUERY_TIMEOUTS, **(query_timeouts or {}))
+        self.login_timeout = login_timeout
+        # Timing of every call by statement fingerprint; set to None to stop recording
+        self.query_stats = query_stats if query_stats is not None else QueryStats()
+        self._stats_lock = threading.Lock()
+        self._prepared = {}  # id(connection) -> {(statement name, timeout): cursor kept for it}
+        self._prepared_counts = Counter()  # "prepares" (cursors opened for a statement), "reuses"
+        self._retries = Counter()  # error class -> calls run again after it
+        self._gave_up = Counter()  # error class -> calls still failing with it after the last attempt
+        self._running = {}  # id(cursor) -> (cursor, query class) of every statement running now
+        # Per thread: the pinned connection, and the query class and CancelHandle of db.scope()
+        self._local = threading.local()
+
+    def _open(self, conn_str):
+        return self.driver.connect(conn_str, autocommit=True, timeout=self.login_timeout)
+
+    def _start_pool(self, conn_str, first_conn):
+        self.conn_str = conn_str
+        self.pool = ConnectionPool(
+            lambda: self._open(conn_str),
+            min_size=self.pool_min,
+            max_size=self.pool_max,
+            timeout=self.pool_timeout,
+            idle_timeout=self.idle_timeout,
+            on_close=self._forget_cursors,
         )
-        self.conn = None
+        self.pool.fill(seed=first_conn)
+
+    def build_conn_str(self, driver, database=None):
+        values = dict(self.settings)
+        values["driver"] = driver
+        if database:
+            values["database"] = database
+        return self.connection_string_template.format(**values)
+
+    def candidate_drivers(self):
+        """Drivers to try, in order: last known good, configured, then installed preferred ones."""
+        installed = installed_drivers(self.driver)
+        cached = read_cache(self.cache_path).get(self.settings["server"], {}).get("driver")
+
+        ordered = []
+        for name in [cached, self.settings.get("driver")] + self.drivers:
+            if name and name not in ordered:
+                ordered.append(name)
+        if installed is None:
+            return ordered
+        # Any other installed SQL Server driver is still worth a try, after the preferred ones
+        ordered += [d for d in installed if "SQL Server" in d and d not in ordered]
+        return [d for d in ordered if d in installed]
+
+    def _remember(self, driver, database):
+        cache = read_cache(self.cache_path)
+        entry = cache.get(self.settings["server"], {})
+        if entry.get("driver") == driver and entry.get("database") == database:
+            return
+        cache[self.settings["server"]] = {
+            "driver": driver,
+            "database": database,
+            "uid": self.settings["uid"],
+            "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        write_cache(cache, self.cache_path)
 
     def connect(self):
+        # Reconnecting replaces the current pool
+        self.disconnect()
+        with self._stats_lock:
+            self._retries.clear()
+            self._gave_up.clear()
+            self._prepared_counts.clear()
+        candidates = self.candidate_drivers()
+        if not candidates:
+            return False, "No SQL Server ODBC driver installed."
+
+        database = self.settings["database"]
         last_error = None
-        for driver in self.drivers:
+        for driver in candidates:
             try:
-                conn_str = self.connection_string_template.format(driver=driver)
+                conn_str = self.build_conn_str(driver)
                 # Try connecting to the specific database
-                self.conn = pyodbc.connect(conn_str, autocommit=True)
+                self._start_pool(conn_str, self._open(conn_str))
+                self._remember(driver, database)
                 return True, f"Connected successfully using {driver}."
-            except pyodbc.Error as e:
+            except self.driver.Error as e:
                 last_error = e
-                # Fallback to master if FlightReservationDB doesn't exist yet (first run)
-                # ... existing fallback logic adapted ...
+                # Fallback to master if the database doesn't exist yet (first run)
                 if "4060" in str(e) or "Cannot open database" in str(e):
                      try:
-                        fallback_conn_str = conn_str.replace("DATABASE=FlightReservationDB;", "DATABASE=master;")
-                        self.conn = pyodbc.connect(fallback_conn_str, autocommit=True)
-                        return True, f"Connected to 'master' using {driver} (FlightReservationDB not found)."
-                     except pyodbc.Error as e2:
+                        fallback_conn_str = self.build_conn_str(driver, database="master")
+                        self._start_pool(fallback_conn_str, self._open(fallback_conn_str))
+                        self._remember(driver, "master")
+                        return True, f"Connected to 'master' using {driver} ({database} not found)."
+                     except self.driver.Error as e2:
                         last_error = e2
                         continue # Try next driver
-        
+
         return False, f"All drivers failed. Last error: {last_error}"
 
     def disconnect(self):
-        if self.conn:
-            self.conn.close()
-            self.conn = None
+        if self.pool:
+            self.pool.close()
+            self.pool = None
             return True, "Disconnected."
         return False, "No active connection."
 
-    def execute_query(self, query):
-        if not self.conn:
-            return False, "Not connected to database."
+    @property
+    def is_connected(self):
+        return self.pool is not None
+
+    def pool_stats(self):
+        return self.pool.stats() if self.pool else {}
+
+    def retry_stats(self):
+        """{"retries": {error class: count}, "gave_up": {error class: count}} since connecting."""
+        with self._stats_lock:
+            return {"retries": dict(self._retries), "gave_up": dict(self._gave_up)}
+
+    def prepared_stats(self):
+        """Cursors kept for registered statements: how many are open, opened (prepares) and reused."""
+        with self._stats_lock:
+            return {"cursors": sum(len(cursors) for cursors in list(self._prepared.values())),
+                    "prepares": self._prepared_counts["prepares"], "reuses": self._prepared_counts["reuses"]}
+
+    def _count(self, counter, key):
+        with self._stats_lock:
+            counter[key] += 1
+
+    # --- Query classes and cancelling ---
+    @contextmanager
+    def scope(self, query_class=None, handle=None):
+        """Calls made on this thread inside the block default to query_class and run under handle
+        (a CancelHandle), so another thread can cancel them."""
+        if query_class is not None:
+            self._timeout(query_class)
+        saved = (getattr(self._local, "query_class", None), getattr(self._local, "handle", None))
+        self._local.query_class = query_class or saved[0]
+        self._local.handle = handle or saved[1]
+        try:
+            yield handle
+        finally:
+            self._local.query_class, self._local.handle = saved
+
+    def cancel(self, query_class=None):
+        """Cancel every statement running now (only those of query_class, if given), from any thread.
+
+        Returns how many were cancelled. Each fails with "cancelled" and is
+        not retried.
+        """
+        with self._stats_lock:
+            running = [cursor for cursor, cls in self._running.values() if query_class in (None, cls)]
+        for cursor in running:
+            _cancel_cursor(cursor)
+        return len(running)
+
+    def running(self):
+        """{query class: statements running now}."""
+        with self._stats_lock:
+            return dict(Counter(cls for _, cls in self._running.values()))
+
+    def _class_of(self, query_class, default="interactive"):
+        query_class = query_class or getattr(self._local, "query_class", None) or default
+        self._timeout(query_class)
+        return query_class
+
+    def _timeout(self, query_class):
         try:
-            cursor = self.conn.cursor()
+            return self.query_timeouts[query_class]
+        except KeyError:
+            raise ValueError(f"Unknown query class {query_class!r}; expected one of "
+                             f"{', '.join(self.query_timeouts)}") from None
+
+    def _cursor(self, conn, query_class):
+        """A new cursor whose statements time out after the limit of query_class. The driver
+        applies the connection's timeout to each cursor as it is created."""
+        timeout = self._timeout(query_class)
+        if getattr(conn, "timeout", None) != timeout:
+            conn.timeout = timeout
+        return conn.cursor()
+
+    def _watch(self, cursor, query_class):
+        """Register a statement about to run, so cancel() and the thread's CancelHandle can reach it.
+        Returns the handle, for _unwatch()."""
+        handle = getattr(self._local, "handle", None)
+        if handle is not None:
+            handle._attach(cursor)
+        with self._stats_lock:
+            self._running[id(cursor)] = (cursor, query_class)
+        return handle
+
+    def _unwatch(self, cursor, handle):
+        if handle is not None:
+            handle._detach(cursor)
+        with self._stats_lock:
+            self._running.pop(id(cursor), None)
+
+    @contextmanager
+    def _statement_cursor(self, conn, query, query_class):
+        """A cursor for one call, watched while it runs. A registered statement (statements.Statement)
+        gets the cursor kept for it, and its query class's timeout, on this connection: the driver
+        prepares a statement once per cursor, so running it again there skips the prepare. Other
+        SQL gets a cursor of its own, closed afterwards.
+        """
+        name = getattr(query, "name", None)
+        if name is None:
+            cursor = self._cursor(conn, query_class)
+            try:
+                handle = self._watch(cursor, query_class)
+                try:
+                    yield cursor
+                finally:
+                    self._unwatch(cursor, handle)
+            finally:
+                # Close before the connection goes back to the pool so no pending results leak
+                cursor.close()
+            return
+        cursors = self._prepared.setdefault(id(conn), {})
+        key = (name, self._timeout(query_class))
+        cursor = cursors.get(key)
+        self._count(self._prepared_counts, "reuses" if cursor is not None else "prepares")
+        if cursor is None:
+            cursor = cursors[key] = self._cursor(conn, query_class)
+        handle = self._watch(cursor, query_class)
+        try:
+            try:
+                yield cursor
+                # Read past any remaining results, which would otherwise keep the connection busy
+                while cursor.nextset():
+                    pass
+            finally:
+                self._unwatch(cursor, handle)
+        except BaseException:
+            cursors.pop(key, None)
+            try:
+                cursor.close()
+            except self.driver.Error:
+                pass
+            raise
+
+    def _forget_cursors(self, conn):
+        self._prepared.pop(id(conn), None)
+
+    @contextmanager
+    def pinned(self):
+        """Run every call made on this thread inside the block on one pooled connection.
+
+        Needed when statements depend on session state, e.g. a script whose
+        batches rely on an earlier USE or SET.
+        """
+        if getattr(self._local, "conn", None) is not None:
+            yield self._local.conn
+            return
+        with self.pool.connection() as conn:
+            self._local.conn = conn
+            try:
+                yield conn
+            finally:
+                self._local.conn = None
+
+    @contextmanager
+    def _borrow(self, validate=False):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+        else:
+            with self.pool.connection(validate=validate) as conn:
+                yield conn
+
+    def _run(self, query, work, failure, query_class, idempotent=True, atomic=True, hold=False):
+        """Run work(conn) on a borrowed connection, again while retry_policy allows, and record the call.
+
+        work returns (result, rows, result_sets). Returns (result, None), or
+        (None, "<failure>: <error>") once it gives up. With hold, work(conn,
+        lease) returns the result alone and may keep the connection past the
+        call by taking over lease (an ExitStack) with lease.pop_all(); the
+        call is then left for it to record.
+        """
+        started = time.perf_counter()
+        attempt = 1
+        while True:
+            sent = False
+            try:
+                with ExitStack() as lease:
+                    # A retry pings its connection first, so the pool replaces ones that died with the last attempt's
+                    conn = lease.enter_context(self._borrow(validate=attempt > 1))
+                    sent = True
+                    if hold:
+                        return work(conn, lease), None
+                    result, rows, result_sets = work(conn)
+                self._record(query, started, rows, result_sets)
+                return result, None
+            except PoolTimeout as e:
+                error, error_class = f"{failure}: {e}", None
+                break
+            except Cancelled as e:
+                error, error_class = f"{failure}: {e}", "cancelled"
+                break
+            except self.driver.Error as e:
+                error_class = classify_error(e)
+                retry, note = self._after_failure(error_class, attempt, sent, idempotent, atomic)
+                if not retry:
+                    # A timeout before anything was sent is the login's, not the statement's
+                    note = note or (self._interruption(error_class, query_class) if sent else "")
+                    error = f"{failure}: {e}{note}"
+                    break
+                attempt += 1
+        return self._failed(query, started, error, error_class)
+
+    def _record(self, query, started, rows=0, result_sets=0, error=None, error_class=None):
+        stats = self.query_stats
+        if stats is not None:
+            stats.record(query, time.perf_counter() - started, max(rows, 0), result_sets, error, error_class)
+
+    def _failed(self, query, started, error, error_class=None):
+        self._record(query, started, error=error, error_class=error_class)
+        return None, error
+
+    def _interruption(self, error_class, query_class):
+        """Note for the error message of a timed-out or cancelled call."""
+        if error_class == "timeout":
+            return f" (over the {self.query_timeouts[query_class]} s limit for {query_class} queries)"
+        if error_class == "cancelled":
+            return " (cancelled)"
+        return ""
+
+    def _after_failure(self, error_class, attempt, sent, idempotent=True, atomic=True):
+        """Count a failed attempt and, if it is to be retried, wait. Returns (retry, note for the error message).
+
+        Calls on a pinned connection are never retried: the session state and
+        any transaction the block opened went with the failed attempt.
+        """
+        policy = self.retry_policy
+        if getattr(self._local, "conn", None) is not None or not policy.retryable(error_class, sent, idempotent, atomic):
+            return False, ""
+        if attempt >= policy.attempts:
+            if attempt == 1:
+                return False, ""
+            self._count(self._gave_up, error_class)
+            return False, f" (gave up after {attempt} attempts)"
+        self._count(self._retries, error_class)
+        time.sleep(policy.delay(attempt))
+        return True, ""
+
+    def _execute(self, cursor, query, params=None):
+        if params:
+            cursor.execute(query, params)
+        else:
             cursor.execute(query)
-            return True, "Query executed."
-        except pyodbc.Error as e:
-            return False, f"Execution failed: {e}"
 
-    def execute_commit(self, query, params=None):
-        """Executes INSERT/UPDATE/DELETE queries with parameters safely."""
-        if not self.conn:
+    def execute_query(self, query, query_class=None):
+        """Run a script batch, as an "admin" query unless told otherwise. Only retried when it failed
+        before reaching the server, as a batch is not one transaction and may have done part of its
+        work before failing."""
+        if not self.pool:
             return False, "Not connected to database."
-        try:
-            cursor = self.conn.cursor()
-            if params:
-                cursor.execute(query, params)
-            else:
+        query_class = self._class_of(query_class, "admin")
+
+        def work(conn):
+            with self._statement_cursor(conn, query, query_class) as cursor:
                 cursor.execute(query)
-            return True, "Operation successful."
-        except pyodbc.Error as e:
-            return False, f"Operation failed: {e}"
+                rows = cursor.rowcount
+                # Drain all result sets so the whole batch runs before the connection is reused
+                while cursor.nextset():
+                    pass
+            return None, rows, 0
+
+        _, error = self._run(query, work, "Execution failed", query_class, idempotent=False, atomic=False)
+        return (False, error) if error else (True, "Query executed.")
+
+    def execute_commit(self, query, params=None, idempotent=False, query_class=None):
+        """Executes INSERT/UPDATE/DELETE queries with parameters safely.
+
+        A deadlocked or lock-timed-out statement is run again; pass
+        idempotent=True to also retry after a dropped connection.
+        """
+        if not self.pool:
+            return False, "Not connected to database."
+        query_class = self._class_of(query_class)
+
+        def work(conn):
+            with self._statement_cursor(conn, query, query_class) as cursor:
+                self._execute(cursor, query, params)
+                rows = cursor.rowcount
+                while cursor.nextset():
+                    pass
+            return None, rows, 0
 
-    def fetch_results(self, query, params=None):
-        if not self.conn:
+        _, error = self._run(query, work, "Operation failed", query_class, idempotent)
+        return (False, error) if error else (True, "Operation successful.")
+
+    def execute_many(self, query, rows, query_class=None):
+        """Run one parameterized statement for every row of rows, all in one transaction.
+
+        The cursor uses pyodbc's fast_executemany, so the rows travel as
+        parameter arrays in a few round trips instead of one each. A
+        deadlocked or lock-timed-out call is run again, as execute_commit is;
+        the rollback leaves nothing of it behind.
+        """
+        if not self.pool:
+            return False, "Not connected to database."
+        query_class = self._class_of(query_class)
+        rows = rows if isinstance(rows, list) else list(rows)
+
+        def work(conn):
+            with self._statement_cursor(conn, query, query_class) as cursor:
+                cursor.fast_executemany = True
+                conn.autocommit = False
+                try:
+                    cursor.executemany(query, rows)
+                    conn.commit()
+                except BaseException:
+                    try:
+                        conn.rollback()
+                    except self.driver.Error:
+                        pass  # The connection went with the error; the server rolled back
+                    raise
+                finally:
+                    try:
+                        conn.autocommit = True
+                    except self.driver.Error:
+                        pass
+            return None, len(rows), 0
+
+        _, error = self._run(query, work, "Operation failed", query_class, idempotent=False)
+        return (False, error) if error else (True, f"{len(rows)} row(s) written.")
+
+    def fetch_results(self, query, params=None, idempotent=True, query_class=None):
+        """Run a query and return its first result set as ((columns, rows), msg).
+
+        Retried on any transient error; a call that writes (e.g. EXECs a
+        booking procedure) should pass idempotent=False, which leaves it to
+        the retries execute_commit gets. query_class (a QUERY_TIMEOUTS key)
+        sets how long it may run; it defaults to the one of the enclosing
+        scope(), else "interactive".
+        """
+        if not self.pool:
             return None, "Not connected to database."
-        try:
-            cursor = self.conn.cursor()
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-                
-            # Iterate through result sets to find the first one with data (skipping row counts/prints)
-            while True:
-                if cursor.description:
-                    columns = [column[0] for column in cursor.description]
-                    results = cursor.fetchall()
-                    return (columns, results), "Success"
-                
-                # Move to next result set, break if no more
-                if not cursor.nextset():
-                    break
-            
+        query_class = self._class_of(query_class)
+
+        def work(conn):
+            with self._statement_cursor(conn, query, query_class) as cursor:
+                self._execute(cursor, query, params)
+
+                # Iterate through result sets to find the first one with data (skipping row counts/prints)
+                while True:
+                    if cursor.description:
+                        columns = [column[0] for column in cursor.description]
+                        rows = cursor.fetchall()
+                        return (columns, rows), len(rows), 1
+
+                    # Move to next result set, break if no more
+                    if not cursor.nextset():
+                        return None, 0, 0
+
+        data, error = self._run(query, work, "Fetch failed", query_class, idempotent)
+        if error:
+            return None, error
+        if data is None:
             return ([], []), "No results returned"
-            
-        except pyodbc.Error as e:
-            return None, f"Fetch failed: {e}"
+        return data, "Success"
+
+    def fetch_all_results(self, query, params=None, max_rows=None, idempotent=True, query_class=None):
+        """Run a multi-statement batch in one round trip and return every result set.
+
+        Returns ([(columns, rows), ...], msg) in statement order; row counts and
+        PRINT output are skipped. max_rows caps each result set. Retried and
+        timed out like fetch_results.
+        """
+        if not self.pool:
+            return None, "Not connected to database."
+        query_class = self._class_of(query_class)
+
+        def work(conn):
+            result_sets = []
+            with self._statement_cursor(conn, query, query_class) as cursor:
+                self._execute(cursor, query, params)
+                while True:
+                    if cursor.description:
+                        columns = [column[0] for column in cursor.description]
+                        rows = cursor.fetchall() if max_rows is None else cursor.fetchmany(max_rows)
+                        result_sets.append((columns, rows))
+                    if not cursor.nextset():
+                        return result_sets, sum(len(rows) for _, rows in result_sets), len(result_sets)
+
+        result_sets, error = self._run(query, work, "Fetch failed", query_class, idempotent)
+        if error:
+            return None, error
+        if not result_sets:
+            return [], "No results returned"
+        return result_sets, "Success"
+
+    def fetch_batches(self, query, params=None, batch_size=None, max_rows=None, query_class=None):
+        """Stream the first result set. Returns ((columns, ResultStream), msg); iterate stream.batches().
+
+        Retried like fetch_results until the result set is open; errors while
+        reading it reach the caller. The statement can be cancelled until the
+        stream closes, and the call is recorded then, its time covering the
+        reading as well.
+        """
+        if not self.pool:
+            return None, "Not connected to database."
+        query_class = self._class_of(query_class)
+        started = time.perf_counter()
+
+        def work(conn, lease):
+            cursor = self._cursor(conn, query_class)
+            handle = None
+            try:
+                handle = self._watch(cursor, query_class)
+                self._execute(cursor, query, params)
+                # Skip row counts/prints until the first result set with columns
+                while not cursor.description:
+                    if not cursor.nextset():
+                        break
+            except BaseException:
+                self._unwatch(cursor, handle)
+                try:
+                    cursor.close()
+                except self.driver.Error:
+                    pass
+                raise
+            held = lease.pop_all()
+
+            def finish(c, error):
+                self._unwatch(cursor, handle)
+                # Leaving the borrow with the error lets the pool decide whether to keep the connection
+                if error is None:
+                    held.close()
+                else:
+                    held.__exit__(type(error), error, error.__traceback__)
+                self._record(query, started, stream.rows_read, 1 if stream.columns else 0,
+                             None if stream.error is None else f"Fetch failed: {stream.error}",
+                             None if stream.error is None else classify_error(stream.error))
+
+            stream = ResultStream(conn, cursor, batch_size or self.fetch_batch_size, max_rows, finish)
+            return stream
+
+        # Nothing has been read when a retry starts, so a read can start over
+        stream, error = self._run(query, work, "Fetch failed", query_class, hold=True)
+        if error:
+            return None, error
+        if not stream.columns:
+            stream.close()
+            return (stream.columns, stream), "No results returned"
+        return (stream.columns, stream), "Success"
+
+    def iter_results(self, query, params=None, batch_size=None, max_rows=None, query_class=None):
+        """Like fetch_results, but rows are a generator backed by fetchmany() instead of a list."""
+        data, msg = self.fetch_batches(query, params, batch_size, max_rows, query_class)
+        if data is None:
+            return None, msg
+        columns, stream = data
+        return (columns, iter(stream)), msg
@@ -0,0 +1,192 @@
+"""Background execution of database work for the GUIs.
+
+DBExecutor runs callables on daemon worker threads and hands their results
+back to the GUI thread through a `post(callback)` function supplied by each
+GUI (a root.after-polled queue for Tkinter, a queued signal for PyQt).
+
+Work is grouped by key, usually one key per screen:
+  * tasks with the same key run one at a time, in submission order;
+  * a newer replaceable task makes older ones for that key stale: queued
+    ones are skipped and results that still arrive are dropped;
+  * on_busy(keys) is posted whenever the set of keys with pending work
+    changes, so the GUI can show a progress indicator.
+"""
+import queue
+import threading
+from collections import deque
+
+
+class QueueDispatcher:
+    """Thread-safe post() for toolkits without one: callbacks are queued and
+    run by drain(), which the GUI thread calls periodically."""
+
+    def __init__(self):
+        self.pending = queue.Queue()
+
+    def post(self, callback):
+        self.pending.put(callback)
+
+    def drain(self, limit=100):
+        for _ in range(limit):
+            try:
+                callback = self.pending.get_nowait()
+            except queue.Empty:
+                return
+            callback()
+
+
+class Task:
+    def __init__(self, executor, key, generation, fn, args, on_result, on_error, replace, pass_task):
+        self.executor = executor
+        self.key = key
+        self.generation = generation
+        self.fn = fn
+        self.args = args
+        self.on_result = on_result
+        self.on_error = on_error
+        self.replace = replace
+        self.pass_task = pass_task
+
+    @property
+    def stale(self):
+        """True once a newer replaceable task was submitted for the same key."""
+        return self.replace and self.executor._generation.get(self.key) != self.generation
+
+    def post(self, callback, *args):
+        """Run callback(*args) on the GUI thread unless this task has gone stale by then."""
+        if callback is None:
+            return
+
+        def deliver():
+            if not self.stale:
+                callback(*args)
+        self.executor.post(deliver)
+
+
+class DBExecutor:
+    def __init__(self, post, workers=3, on_busy=None):
+        self.post = post
+        self.on_busy = on_busy
+        self._lock = threading.Lock()
+        self._queues = {}      # key -> deque of Tasks not started yet
+        self._scheduled = set()  # keys queued for or held by a worker
+        self._generation = {}
+        self._ready = queue.Queue()
+        self._closed = False
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "skipped": 0}
+        self._threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._work, name=f"db-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, key, fn, *args, on_result=None, on_error=None, replace=True, pass_task=False):
+        """Run fn(*args) in the background and post on_result(value) or on_error(exc).
+
+        replace=False is for work that must not be dropped (bookings,
+        cancellations): it still runs in order but is never made stale.
+        With pass_task=True fn receives the Task first, to check task.stale
+        or post partial results with task.post().
+        """
+        with self._lock:
+            if self._closed:
+                return None
+            if replace:
+                self._generation[key] = self._generation.get(key, 0) + 1
+            task = Task(self, key, self._generation.get(key, 0), fn, args, on_result, on_error, replace, pass_task)
+            pending = self._queues.setdefault(key, deque())
+            if replace:
+                kept = deque(t for t in pending if not t.replace)
+                self.stats["skipped"] += len(pending) - len(kept)
+                pending = self._queues[key] = kept
+            pending.append(task)
+            self.stats["submitted"] += 1
+            was_idle = key not in self._scheduled
+            if was_idle:
+                self._scheduled.add(key)
+                self._ready.put(key)
+        if was_idle:
+            self._notify_busy()
+        return task
+
+    def stream(self, key, open_stream, on_batch, on_done=None, on_error=None):
+        """Read a streamed query in the background, posting each batch as it arrives.
+
+        open_stream() must return DatabaseConnection.fetch_batches()-style
+        ((columns, ResultStream), msg). on_batch(columns, rows, first) runs
+        on the GUI thread per batch; on_done(stream) after the last one.
+        Reading stops early once a newer request for the key replaces this one.
+        """
+        def run(task):
+            data, msg = open_stream()
+            if data is None:
+                raise RuntimeError(msg)
+            columns, stream = data
+            first = True
+            with stream:
+                for rows in stream.batches():
+                    if task.stale:
+                        break
+                    task.post(on_batch, columns, rows, first)
+                    first = False
+            if first:
+                task.post(on_batch, columns, [], True)
+            return stream
+
+        return self.submit(key, run, on_result=on_done, on_error=on_error, pass_task=True)
+
+    def busy_keys(self):
+        with self._lock:
+            return sorted(str(k) for k in self._scheduled)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            self._queues.clear()
+        for _ in self._threads:
+            self._ready.put(None)
+
+    # --- Internals ---
+    def _notify_busy(self):
+        if self.on_busy:
+            keys = self.busy_keys()
+            self.post(lambda: self.on_busy(keys))
+
+    def _work(self):
+        while True:
+            key = self._ready.get()
+            if key is None:
+                return
+            with self._lock:
+                pending = self._queues.get(key)
+                task = pending.popleft() if pending else None
+            if task is not None and not task.stale:
+                self._run(task)
+            elif task is not None:
+                with self._lock:
+                    self.stats["skipped"] += 1
+            with self._lock:
+                if self._queues.get(key):
+                    self._ready.put(key)
+                    done = False
+                else:
+                    self._queues.pop(key, None)
+                    self._scheduled.discard(key)
+                    done = True
+            if done:
+                self._notify_busy()
+
+    def _run(self, task):
+        try:
+            if task.pass_task:
+                result = task.fn(task, *task.args)
+            else:
+                result = task.fn(*task.args)
+        except Exception as e:
+            with self._lock:
+                self.stats["failed"] += 1
+            task.post(task.on_error, e)
+            return
+        with self._lock:
+            self.stats["completed"] += 1
+        task.post(task.on_result, result)
@@ -0,0 +1,287 @@
+"""Streaming import of flight schedules from CSV or JSON files into FLIGHTS.
+
+Each record names its airline, aircraft and airports by code:
+
+    airline_code,flight_number,aircraft_registration,departure_airport,arrival_airport,departure_datetime,arrival_datetime,base_price,status,gate_number
+    PK,PK-305,AP-BHA,KHI,ISB,2025-07-01 09:00,2025-07-01 11:00,24000,,A4
+
+JSON files hold the same fields, either as one array of objects or as one
+object per line. status defaults to Scheduled and gate_number may be empty.
+
+The file is read BATCH_SIZE records at a time. Codes are resolved against
+the in-memory reference_data indexes, and the CHK_arrival_after_departure,
+CHK_different_airports and UQ_flight_schedule rules are checked for the
+batch on the client. The good rows are bulk-inserted into FLIGHTS_STAGING
+with DatabaseConnection.execute_many (fast_executemany), and
+SP_MergeStagedFlights merges the whole import into FLIGHTS at the end.
+Only one batch is held at a time, so memory stays flat with the file's
+size. Rejected records are counted by reason, and the first MAX_EXAMPLES
+are kept with their record numbers.
+
+    result, msg = import_flights(db, "schedule.csv")
+    print("\\n".join(result.report()))
+
+    python flight_import.py schedule.csv [batch size]
+"""
+import csv
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from database_connection import DatabaseConnection
+from reference_data import ReferenceCache
+from statements import register
+
+BATCH_SIZE = 5000
+MAX_EXAMPLES = 20
+MAX_RECORD_CHARS = 1 << 20  # a JSON record longer than this is taken as a broken file
+
+FIELDS = ("airline_code", "flight_number", "aircraft_registration", "departure_airport", "arrival_airport",
+          "departure_datetime", "arrival_datetime", "base_price", "status", "gate_number")
+REQUIRED = FIELDS[:8]
+STATUSES = ("Scheduled", "Boarding", "Departed", "Arrived", "Cancelled", "Delayed")
+# Column sizes of FLIGHTS
+MAX_LENGTHS = {"flight_number": 20, "gate_number": 10}
+MAX_PRICE = Decimal("100000000")  # DECIMAL(10,2)
+DUPLICATE = "flight listed earlier in the file"
+
+STAGE_SQL = register("stage_flight", """
+INSERT INTO FLIGHTS_STAGING (import_id, record_number, airline_id, aircraft_id, flight_number,
+    departure_airport_id, arrival_airport_id, departure_datetime, arrival_datetime, base_price, status, gate_number)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+""")
+MERGE_SQL = register("merge_staged_flights", "EXEC SP_MergeStagedFlights @import_id=?")
+UNSTAGE_SQL = register("unstage_flights", "DELETE FROM FLIGHTS_STAGING WHERE import_id = ?")
+
+
+# --- Reading ---
+def read_records(path):
+    """(record number, dict) for every record of a .csv, .json or .jsonl file, read as it goes."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if os.path.splitext(path)[1].lower() == ".csv":
+            records = csv.DictReader(f)
+        else:
+            records = _json_records(f)
+        for number, record in enumerate(records, 1):
+            yield number, record
+
+
+def _json_records(f, read_size=1 << 16):
+    """The objects of a JSON array, or of JSON Lines, decoded one at a time."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    while True:
+        # Between records there are only brackets, commas and whitespace
+        while pos < len(buffer) and buffer[pos] in "[],\r\n\t ":
+            pos += 1
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+            # A value running to the end of the buffer may go on in the next read (a number)
+            complete = end < len(buffer) or eof
+        except ValueError:
+            complete = False
+        if complete:
+            yield record
+            pos = end
+            continue
+        if eof:
+            if pos < len(buffer):
+                raise ValueError(f"Invalid JSON near: {buffer[pos:pos + 60]!r}")
+            return
+        more = f.read(read_size)
+        eof = not more
+        buffer, pos = buffer[pos:] + more, 0
+        if len(buffer) > MAX_RECORD_CHARS:
+            raise ValueError(f"JSON record longer than {MAX_RECORD_CHARS} characters")
+
+
+# --- Validation ---
+def _text(record, field):
+    value = record.get(field)
+    return str(value).strip() if value is not None else ""
+
+
+def _datetime(value):
+    # DATETIME keeps milliseconds at best; schedules are to the minute or second
+    return datetime.fromisoformat(value.replace("T", " ")).replace(microsecond=0, tzinfo=None)
+
+
+def validate(record, refs):
+    """(FLIGHTS_STAGING values without the import id and record number, None) or (None, reason)."""
+    if not isinstance(record, dict):
+        return None, "not an object"
+    missing = [field for field in REQUIRED if not _text(record, field)]
+    if missing:
+        return None, f"missing {missing[0]}"
+    for field, length in MAX_LENGTHS.items():
+        if len(_text(record, field)) > length:
+            return None, f"{field} longer than {length}"
+    airline = refs.airlines.by_code(_text(record, "airline_code"))
+    if airline is None:
+        return None, "unknown airline"
+    aircraft = refs.aircraft.by_code(_text(record, "aircraft_registration"))
+    if aircraft is None:
+        return None, "unknown aircraft"
+    if aircraft["airline_id"] != airline["airline_id"]:
+        return None, "aircraft of another airline"
+    departure_airport = refs.airports.by_code(_text(record, "departure_airport"))
+    arrival_airport = refs.airports.by_code(_text(record, "arrival_airport"))
+    if departure_airport is None or arrival_airport is None:
+        return None, "unknown airport"
+    # CHK_different_airports
+    if departure_airport["airport_id"] == arrival_airport["airport_id"]:
+        return None, "same departure and arrival airport"
+    try:
+        departure = _datetime(_text(record, "departure_datetime"))
+        arrival = _datetime(_text(record, "arrival_datetime"))
+    except ValueError:
+        return None, "bad date"
+    # CHK_arrival_after_departure
+    if arrival <= departure:
+        return None, "arrival not after departure"
+    try:
+        price = Decimal(_text(record, "base_price")).quantize(Decimal("0.01"))
+        if not 0 < price < MAX_PRICE:
+            raise InvalidOperation
+    except InvalidOperation:
+        return None, "bad base_price"
+    status = _text(record, "status") or "Scheduled"
+    if status not in STATUSES:
+        return None, "unknown status"
+    return (airline["airline_id"], aircraft["aircraft_id"], _text(record, "flight_number"),
+            departure_airport["airport_id"], arrival_airport["airport_id"], departure, arrival, price, status,
+            _text(record, "gate_number") or None), None
+
+
+class ImportResult:
+    """Counts and timing of one import."""
+
+    def __init__(self):
+        self.read = 0
+        self.staged = 0
+        self.rejected = {}  # reason -> count
+        self.examples = []  # (record number, reason), the first MAX_EXAMPLES rejections
+        self.merged = None  # SP_MergeStagedFlights result as a dict, once it ran
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def reject(self, number, reason):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        if len(self.examples) < MAX_EXAMPLES:
+            self.examples.append((number, reason))
+
+    def report(self):
+        rate = self.read / self.seconds if self.seconds else 0
+        lines = [f"{self.read:,} records read, {self.staged:,} staged in {self.seconds:.1f} s ({rate:,.0f} records/s)"]
+        rejected = dict(self.rejected)
+        merged = self.merged
+        if merged:
+            lines.append(f"Merged: {merged['inserted']:,} inserted, {merged['updated']:,} updated, "
+                         f"{merged['unchanged']:,} unchanged")
+            if merged["duplicates"]:
+                rejected[DUPLICATE] = rejected.get(DUPLICATE, 0) + merged["duplicates"]
+        lines.append(f"Rejected: {sum(rejected.values()):,}")
+        for reason, count in sorted(rejected.items(), key=lambda item: -item[1]):
+            lines.append(f"  {reason:<36} {count:>10,}")
+        for number, reason in self.examples:
+            lines.append(f"  record {number}: {reason}")
+        if merged and merged["duplicates"]:
+            lines.append(f"  records listed earlier in the file (found by the merge): {merged['duplicate_records']}"
+                         + ("..." if merged["duplicates"] > MAX_EXAMPLES else ""))
+        return lines
+
+
+def _batches(records, refs, result, import_id, batch_size):
+    """Lists of FLIGHTS_STAGING rows, one per batch_size records read."""
+    batch, seen = [], {}
+    for number, record in records:
+        result.read += 1
+        row, reason = validate(record, refs)
+        if row is not None:
+            # UQ_flight_schedule within the batch; SP_MergeStagedFlights checks across batches
+            key = (row[2], row[5])
+            if key in seen:
+                row, reason = None, DUPLICATE
+            else:
+                seen[key] = number
+        if row is None:
+            result.reject(number, reason)
+        else:
+            batch.append((import_id, number) + row)
+        if result.read % batch_size == 0:
+            yield batch
+            batch, seen = [], {}
+    if batch:
+        yield batch
+
+
+def import_flights(db, path, batch_size=BATCH_SIZE, refs=None, progress=None):
+    """Stage every valid record of the file and merge them into FLIGHTS. Returns (ImportResult, msg).
+
+    refs is a ReferenceCache to resolve codes with (loaded here when not
+    given); progress(result) is called after each batch.
+    """
+    result = ImportResult()
+    if refs is None:
+        refs = ReferenceCache(db)
+    ok, msg = refs.refresh()
+    if not ok:
+        result.seconds = time.perf_counter() - result.started
+        return result, msg
+    import_id = str(uuid.uuid4())
+    try:
+        for batch in _batches(read_records(path), refs, result, import_id, batch_size):
+            if batch:
+                ok, msg = db.execute_many(STAGE_SQL, batch, query_class="admin")
+                if not ok:
+                    db.execute_commit(UNSTAGE_SQL, (import_id,), idempotent=True, query_class="admin")
+                    result.seconds = time.perf_counter() - result.started
+                    return result, f"Staging failed: {msg}"
+                result.staged += len(batch)
+            if progress:
+                progress(result)
+    except (OSError, ValueError, csv.Error) as e:
+        db.execute_commit(UNSTAGE_SQL, (import_id,), idempotent=True, query_class="admin")
+        result.seconds = time.perf_counter() - result.started
+        return result, f"Could not read {path}: {e}"
+    if result.staged:
+        data, msg = db.fetch_results(MERGE_SQL, (import_id,), idempotent=False, query_class="admin")
+        if data is None:
+            db.execute_commit(UNSTAGE_SQL, (import_id,), idempotent=True, query_class="admin")
+            result.seconds = time.perf_counter() - result.started
+            return result, f"Merge failed: {msg}"
+        result.merged = dict(zip(data[0], data[1][0]))
+    result.seconds = time.perf_counter() - result.started
+    return result, "Success"
+
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return
+    batch_size = int(argv[1]) if len(argv) > 1 else BATCH_SIZE
+    db = DatabaseConnection()
+    ok, msg = db.connect()
+    print(msg)
+    if not ok:
+        return
+
+    last = [0.0]
+
+    def progress(result):
+        if time.perf_counter() - last[0] >= 10:
+            last[0] = time.perf_counter()
+            print(f"  {result.read:,} records read, {result.staged:,} staged")
+
+    result, msg = import_flights(db, argv[0], batch_size, progress=progress)
+    for line in result.report() + [msg]:
+        print(line)
+    db.disconnect()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,206 @@
+"""Flight search API shared by both GUIs.
+
+search() calls SP_SearchFlights, which selects flights by a half-open
+departure range so the route index is used for the date as well as the
+airports. The travel date can be widened by a few days either way and the
+departure limited to a time-of-day window:
+
+    data, msg = search(db, dep_id, arr_id, "2025-01-15", flex_days=2, window="Morning (06-12)")
+
+Results can be kept in a SearchCache, which the GUIs tell about every
+booking, cancellation and status change so it only drops the results that
+change could affect:
+
+    cache = SearchCache()
+    data, msg = search(db, dep_id, arr_id, "2025-01-15", cache=cache)  # server
+    data, msg = search(db, dep_id, arr_id, "2025-01-15", cache=cache)  # cache
+    cache.invalidate_flight(flight_id, (dep_id, arr_id), departure)
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from statements import register
+
+SEARCH_SQL = register("search_flights",
+                      "EXEC SP_SearchFlights @departure_airport_id=?, @arrival_airport_id=?, @travel_date=?, "
+                      "@class_type=?, @flex_days=?, @earliest_time=?, @latest_time=?")
+
+CACHE_SIZE = 256    # Cached searches, least recently used dropped first
+CACHE_TTL = 120.0   # seconds; a safety net for changes made outside this client
+MAX_FLEX_DAYS = 7  # SP_SearchFlights clamps to the same limit
+FLEX_CHOICES = ["Exact date", "± 1 day", "± 2 days", "± 3 days"]
+
+# Display name -> (earliest, latest) departure time, latest exclusive; None leaves that side open
+TIME_WINDOWS = {
+    "Any time": (None, None),
+    "Night (00-06)": (None, "06:00"),
+    "Morning (06-12)": ("06:00", "12:00"),
+    "Afternoon (12-18)": ("12:00", "18:00"),
+    "Evening (18-24)": ("18:00", None),
+}
+
+
+# SP_SearchFlights columns of each class's quoted price and remaining seats
+CLASS_QUOTE_COLUMNS = {"Economy": ("economy_price", "economy_seats"),
+                       "Business": ("business_price", "business_seats"),
+                       "First Class": ("first_class_price", "first_class_seats")}
+
+
+def grid_rows(data, class_type=None):
+    """The flights-grid rows for SP_SearchFlights results (columns, rows).
+
+    Price and Seats are the quote for the class searched for, or the
+    Economy quote and the seats on the whole flight when any class will do.
+    Columns are found by name, so the procedure may add or reorder them.
+    """
+    columns, rows = data
+    index = {name: i for i, name in enumerate(columns)}
+    price_column, seats_column = CLASS_QUOTE_COLUMNS.get(class_type, ("economy_price", "available_seats"))
+    if price_column not in index:  # Procedure from before the class quote columns
+        price_column, seats_column = "class_price", "available_seats"
+    picks = [index[name] for name in ("flight_id", "airline_name", "flight_number", "departure_city", "arrival_city",
+                                      "departure_datetime", price_column, seats_column, "status")]
+    return [tuple(row[i] for i in picks) for row in rows]
+
+
+def flex_for(choice):
+    """Days either side of the travel date for a FLEX_CHOICES entry."""
+    return FLEX_CHOICES.index(choice) if choice in FLEX_CHOICES else 0
+
+
+def search(db, departure_airport_id, arrival_airport_id, travel_date, class_type=None, flex_days=0,
+           window=None, cache=None):
+    """Run SP_SearchFlights. Returns ((columns, rows), msg) like DatabaseConnection.fetch_results.
+
+    class_type "Any" or None searches every class, which grid_rows() shows
+    at the Economy quote; window is a TIME_WINDOWS key, None for any time.
+    With a cache, a repeated search is answered from it and msg says so.
+    """
+    earliest, latest = TIME_WINDOWS.get(window, (None, None)) if window else (None, None)
+    params = (departure_airport_id, arrival_airport_id, str(travel_date),
+              None if class_type in (None, "", "Any") else class_type,
+              min(max(int(flex_days or 0), 0), MAX_FLEX_DAYS), earliest, latest)
+    if cache is not None:
+        data = cache.get(params)
+        if data is not None:
+            return data, "Success (cached)"
+        # Read before the query, so a booking committed while it runs keeps its rows out of the cache
+        generation = cache.generation
+    data, msg = db.fetch_results(SEARCH_SQL, params, query_class="search")
+    if cache is not None and data is not None:
+        cache.put(params, data, generation)
+    return data, msg
+
+
+class SearchCache:
+    """LRU cache of search results with a TTL, keyed by the SP_SearchFlights parameters.
+
+    Each entry is indexed by the flight ids it contains and by its route, so
+    invalidate_flight() drops the results a flight could have left (seats
+    sold out, status changed) and, given the route and departure, those it
+    could have joined (seats freed, flight rescheduled).
+
+    Every invalidation also bumps generation. A search reads it before
+    going to the server and hands it to put(), which drops the result when
+    an invalidation ran in between: its rows may predate the change.
+    """
+
+    def __init__(self, max_entries=CACHE_SIZE, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, data, flight ids), oldest use first
+        self._by_flight = {}           # flight_id -> keys of results containing it
+        self._by_route = {}            # (departure, arrival) -> keys
+        self._lock = threading.Lock()
+        self.generation = 0  # bumped by invalidate_flight() and clear()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "stale": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key, data, generation=None):
+        """Cache data under key, unless generation (read before fetching it) is no longer current.
+
+        Returns True when it was cached.
+        """
+        flight_ids = {row[0] for row in data[1]}
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stats["stale"] += 1
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, data, flight_ids)
+            for flight_id in flight_ids:
+                self._by_flight.setdefault(flight_id, set()).add(key)
+            self._by_route.setdefault(key[:2], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+            return True
+
+    def invalidate_flight(self, flight_id, route=None, departure=None):
+        """Drop cached results affected by a change to one flight. Returns how many were dropped.
+
+        route is (departure_airport_id, arrival_airport_id) and departure the
+        flight's departure datetime; pass them when the change can make the
+        flight appear in results that do not list it yet.
+        """
+        with self._lock:
+            self.generation += 1
+            keys = set(self._by_flight.get(flight_id, ()))
+            if route is not None and departure is not None:
+                day = str(departure)[:10]
+                keys.update(key for key in self._by_route.get(tuple(route), ()) if _covers(key, day))
+            for key in keys:
+                self._remove(key)
+            self.stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._by_flight.clear()
+            self._by_route.clear()
+
+    def summary(self):
+        hits, misses = self.stats["hits"], self.stats["misses"]
+        rate = f" ({hits * 100 // (hits + misses)}% hits)" if hits + misses else ""
+        return (f"Search cache: {hits} hits, {misses} misses{rate}, {len(self._entries)} cached, "
+                f"{self.stats['invalidations']} invalidated, {self.stats['stale']} stale not kept, "
+                f"{self.stats['evictions']} evicted")
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for flight_id in entry[2]:
+            keys = self._by_flight.get(flight_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_flight[flight_id]
+        keys = self._by_route.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_route[key[:2]]
+
+
+def _covers(key, day):
+    """True when the search key's date range (travel date ± flex days) includes day ("YYYY-MM-DD")."""
+    travel = datetime.strptime(key[2], "%Y-%m-%d")
+    flex = timedelta(days=key[4])
+    return (travel - flex).strftime("%Y-%m-%d") <= day <= (travel + flex).strftime("%Y-%m-%d")
@@ -0,0 +1,473 @@
+"""Synthetic data for load testing at any scale.
+
+Builds airlines, airports and fleets, a year of flights from weekly
+schedules (from DAYS_BEFORE days before the start date to DAYS_AFTER
+after), passengers, reservations, payments and audit rows, sized from the
+number of reservations asked for. The same seed and start date give the
+same rows.
+
+    python generate_data.py 1000000                    # ~1M reservations into the configured database
+    python generate_data.py 20000000 7 2025-06-01      # seed 7, schedule around 1 June 2025
+    python generate_data.py 1000000 7 - csv data/      # CSV files for BULK INSERT instead
+
+Rows get explicit ids after the highest existing ones (IDENTITY_INSERT),
+so data already in the database stays. The seat and payment triggers are
+disabled while loading: every flight already carries the available_seats
+its reservations leave and every reservation the payment_status of its
+payment. Each chunk is inserted with DatabaseConnection.execute_many, one
+fast_executemany call per CHUNK_SIZE rows, and the load ends with rows per
+second for every table. Point it at a test database.
+"""
+import csv
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from database_connection import DatabaseConnection
+from seat_map import SeatLayout
+
+CHUNK_SIZE = 10000
+DAYS_BEFORE = 180
+DAYS_AFTER = 185
+CHANGED_BY = "generate_data"
+
+# Columns written for each table, id first, in load order
+COLUMNS = {
+    "AIRLINES": ("airline_id", "airline_name", "airline_code", "country", "contact_number", "email"),
+    "AIRPORTS": ("airport_id", "airport_code", "airport_name", "city", "country", "timezone", "latitude",
+                 "longitude"),
+    "AIRCRAFT": ("aircraft_id", "airline_id", "aircraft_model", "registration_number", "total_seats",
+                 "economy_seats", "business_seats", "first_class_seats", "manufacturing_year", "status"),
+    "FLIGHTS": ("flight_id", "airline_id", "aircraft_id", "flight_number", "departure_airport_id",
+                "arrival_airport_id", "departure_datetime", "arrival_datetime", "base_price", "available_seats",
+                "status", "gate_number"),
+    "PASSENGERS": ("passenger_id", "first_name", "last_name", "date_of_birth", "gender", "nationality",
+                   "passport_number", "passport_expiry_date", "email", "phone_number"),
+    "RESERVATIONS": ("reservation_id", "passenger_id", "flight_id", "booking_reference", "seat_number",
+                     "class_type", "booking_date", "total_price", "payment_status", "reservation_status"),
+    "PAYMENTS": ("payment_id", "reservation_id", "payment_method", "amount", "payment_date", "transaction_id",
+                 "payment_status", "card_last_four"),
+    "AUDIT_LOG": ("log_id", "table_name", "operation_type", "record_id", "old_value", "new_value", "changed_by",
+                  "changed_date"),
+}
+TRIGGERS = ("TRG_UpdateAvailableSeats ON RESERVATIONS", "TRG_UpdatePaymentStatus ON PAYMENTS")
+
+ID_BASES = """
+SELECT (SELECT COALESCE(MAX(airline_id), 0) FROM AIRLINES), (SELECT COALESCE(MAX(airport_id), 0) FROM AIRPORTS),
+       (SELECT COALESCE(MAX(aircraft_id), 0) FROM AIRCRAFT), (SELECT COALESCE(MAX(flight_id), 0) FROM FLIGHTS),
+       (SELECT COALESCE(MAX(passenger_id), 0) FROM PASSENGERS),
+       (SELECT COALESCE(MAX(reservation_id), 0) FROM RESERVATIONS),
+       (SELECT COALESCE(MAX(payment_id), 0) FROM PAYMENTS), (SELECT COALESCE(MAX(log_id), 0) FROM AUDIT_LOG)
+"""
+
+# (model, economy, business, first, range in km), as in the sample fleet of SQLQuery_5.sql
+MODELS = [
+    ("Airbus A320-200", 156, 12, 0, 3000),
+    ("Boeing 737-800", 159, 12, 0, 3000),
+    ("Airbus A321-200", 200, 20, 0, 4000),
+    ("Airbus A330-300", 249, 40, 0, 8000),
+    ("Airbus A350-900", 247, 36, 0, 13000),
+    ("Boeing 787-9", 247, 52, 12, 13000),
+    ("Boeing 777-300ER", 304, 42, 8, 20000),
+    ("Airbus A380-800", 399, 76, 42, 20000),
+]
+CLASS_MULTIPLIERS = {"Economy": 1.0, "Business": 2.5, "First Class": 4.0}  # FN_CalculateTicketPrice
+CLASS_LOADS = {"Economy": (6, 2), "Business": (4, 3), "First Class": (3, 4)}  # beta(a, b) share of seats sold
+PAYMENT_METHODS = [("Credit Card", 45), ("Debit Card", 25), ("PayPal", 15), ("Bank Transfer", 10), ("Cash", 5)]
+COUNTRIES = [("Pakistan", "PKT", 92), ("UAE", "GST", 971), ("Qatar", "AST", 974), ("Turkey", "TRT", 90),
+             ("UK", "GMT", 44), ("USA", "EST", 1), ("Oman", "GST", 968), ("Saudi Arabia", "AST", 966),
+             ("Germany", "CET", 49), ("Malaysia", "MYT", 60)]
+FIRST_NAMES = {
+    "Male": ["Ahmed", "Ali", "Bilal", "Usman", "Hassan", "Omar", "John", "James", "Daniel", "Mehmet", "Yusuf",
+             "Khalid", "Arjun", "Lukas", "David", "Imran", "Faisal", "Tariq", "Samuel", "Ibrahim"],
+    "Female": ["Sarah", "Ayesha", "Fatima", "Zainab", "Hira", "Maria", "Emma", "Olivia", "Elif", "Mariam",
+               "Noor", "Aisha", "Sofia", "Hannah", "Layla", "Amina", "Sana", "Leila", "Grace", "Mina"],
+}
+LAST_NAMES = ["Khan", "Ali", "Malik", "Raza", "Sheikh", "Hussain", "Siddiqui", "Tariq", "Ahmed", "Smith",
+              "Jones", "Brown", "Garcia", "Yilmaz", "Kaya", "Al-Mansoori", "Al-Thani", "Schmidt", "Rahman",
+              "Chaudhry", "Butt", "Qureshi", "Iqbal", "Wilson", "Taylor", "Demir", "Haddad", "Nasser"]
+SYLLABLES = ["al", "ba", "cor", "da", "el", "fa", "gar", "ha", "is", "ka", "lor", "ma", "nor", "or", "pa", "qa",
+             "ran", "sa", "tur", "va", "wen", "zan"]
+# Departure banks (hour, weight) of a hub schedule
+DEPARTURE_BANKS = [(6, 3), (8, 4), (10, 3), (13, 2), (15, 3), (18, 4), (21, 3), (23, 2)]
+
+
+class DataGenerator:
+    """Deterministic rows for every table, sized from the number of reservations.
+
+    ids start after first_ids (the highest id already in each table);
+    chunks() yields (table, rows) in an order that satisfies the foreign keys.
+    """
+
+    def __init__(self, reservations, seed=1, start=None, first_ids=None):
+        self.reservations = reservations
+        self.seed = seed
+        self.start = datetime.combine(start or date.today(), datetime.min.time())
+        self.first_ids = dict.fromkeys(COLUMNS, 0)
+        self.first_ids.update(first_ids or {})
+        # Routes are sized for an average aircraft; weekly departures then for the ones flying them
+        weeks = (DAYS_BEFORE + DAYS_AFTER) / 7
+        average = sum(_expected_sales(model[1:4]) for model in MODELS) / len(MODELS)
+        self.routes = max(4, math.ceil(reservations / average / weeks / 7))
+        self.airports = min(900, max(8, math.ceil(math.sqrt(self.routes * 3))))
+        self.airlines = min(99, max(3, self.routes // 25))
+        self.passengers = max(10, reservations // 3)
+        self.network = self._network()
+        sales = sum(_expected_sales(route[1][2]) for route in self.network["routes"]) / self.routes
+        self.weekly_departures = max(1, round(reservations / sales / weeks))
+
+    def _rng(self, part):
+        # One stream per table, so each is the same whatever else is generated
+        return random.Random(f"{self.seed}:{part}")
+
+    def plan(self):
+        """Rough row counts: the schedule decides the exact number of flights and reservations."""
+        weeks = (DAYS_BEFORE + DAYS_AFTER) / 7
+        return {"airlines": self.airlines, "airports": self.airports, "aircraft": len(self.network["aircraft"]),
+                "routes": self.routes, "weekly departures": self.weekly_departures,
+                "flights": round(self.weekly_departures * weeks), "passengers": self.passengers,
+                "reservations": self.reservations}
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        network = self.network
+        yield from _chunked("AIRLINES", network["airlines"], chunk_size)
+        yield from _chunked("AIRPORTS", network["airports"], chunk_size)
+        yield from _chunked("AIRCRAFT", network["aircraft"], chunk_size)
+        flights = []
+        yield from _chunked("FLIGHTS", self._flights(network, flights), chunk_size)
+        yield from _chunked("PASSENGERS", self._passengers(), chunk_size)
+        yield from self._bookings(flights, chunk_size)
+
+    # --- Network and schedule ---
+    def _network(self):
+        rng = self._rng("network")
+        ids = self.first_ids
+        airports, places = [], []
+        for n in range(1, self.airports + 1):
+            airport_id = ids["AIRPORTS"] + n
+            country, timezone, _ = rng.choice(COUNTRIES)
+            city = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+            # One region, so the longest route is a flight of a few hours
+            lat, lon = round(rng.uniform(20, 45), 6), round(rng.uniform(40, 90), 6)
+            airports.append((airport_id, f"X{airport_id:03d}", f"{city} International Airport", city, country,
+                             timezone, lat, lon))
+            places.append((airport_id, city, lat, lon))
+        # The first airports are hubs: every airline is based at one, and most routes touch one
+        hubs = places[:max(2, self.airports // 10)]
+        airlines, fleets, aircraft = [], {}, []
+        for n in range(1, self.airlines + 1):
+            airline_id = ids["AIRLINES"] + n
+            hub = hubs[(n - 1) % len(hubs)]
+            country, _, code = rng.choice(COUNTRIES)
+            name = f"{hub[1]} Air {airline_id}"
+            airlines.append((airline_id, name, f"Y{airline_id:02d}", country, f"+{code}-{rng.randint(100, 999)}-"
+                             f"{rng.randint(1000000, 9999999)}", f"contact@y{airline_id:02d}.example.com"))
+            fleets[airline_id] = (hub, [])
+        for n in range(1, max(self.routes // 2, self.airlines * 2) + 1):
+            aircraft_id = ids["AIRCRAFT"] + n
+            airline_id = ids["AIRLINES"] + (n - 1) % self.airlines + 1
+            model, economy, business, first, reach = MODELS[rng.randrange(len(MODELS))]
+            aircraft.append((aircraft_id, airline_id, model, f"SY-{aircraft_id:05d}", economy + business + first,
+                             economy, business, first, rng.randint(2008, 2024), "Active"))
+            fleets[airline_id][1].append((aircraft_id, reach, (economy, business, first)))
+        routes = []
+        for n in range(self.routes):
+            airline_id = ids["AIRLINES"] + n % self.airlines + 1
+            hub, fleet = fleets[airline_id]
+            other = rng.choice(places)
+            while other[0] == hub[0]:
+                other = rng.choice(places)
+            origin, destination = (hub, other) if n % 2 == 0 else (other, hub)
+            km = _distance(origin, destination)
+            # The smallest aircraft of the airline that has the range, else its longest-range one
+            able = [plane for plane in fleet if plane[1] >= km] or [max(fleet, key=lambda plane: plane[1])]
+            plane = min(able, key=lambda plane: sum(plane[2]))
+            routes.append((airline_id, plane, origin[0], destination[0], km))
+        return {"airlines": airlines, "airports": airports, "aircraft": aircraft, "routes": routes}
+
+    def _flights(self, network, flights):
+        """FLIGHTS rows. Also appends (flight_id, departure, base price, seats per class, status,
+        seats sold per class, cancelled, no-shows) to flights for _bookings(), which makes
+        exactly that many reservations, so available_seats matches them."""
+        rng = self._rng("flights")
+        routes = network["routes"]
+        # Weekly slots (weekday, minute of the day), spread over the routes
+        slots = [[] for _ in routes]
+        banks, weights = zip(*DEPARTURE_BANKS)
+        for n in range(self.weekly_departures):
+            hour = rng.choices(banks, weights)[0]
+            slots[n % len(routes)].append((rng.randrange(7), hour * 60 + rng.randrange(0, 60, 5)))
+        first_day = self.start - timedelta(days=DAYS_BEFORE)
+        flight_id = self.first_ids["FLIGHTS"]
+        numbers = {}
+        for day in range(DAYS_BEFORE + DAYS_AFTER):
+            midnight = first_day + timedelta(days=day)
+            for route_no, (route, route_slots) in enumerate(zip(routes, slots)):
+                airline_id, (aircraft_id, _, seats), origin, destination, km = route
+                for slot_no, (weekday, minute) in enumerate(route_slots):
+                    if weekday != midnight.weekday():
+                        continue
+                    flight_id += 1
+                    key = (route_no, slot_no)
+                    if key not in numbers:
+                        numbers[key] = f"Y{airline_id:02d}-{1000 + len(numbers)}"
+                    departure = midnight + timedelta(minutes=minute)
+                    arrival = departure + timedelta(minutes=round(30 + km / 13.3))
+                    base_price = round(8000 + km * 12, -2)
+                    if departure < self.start:
+                        status = "Cancelled" if rng.random() < 0.02 else "Arrived"
+                    else:
+                        status = "Delayed" if rng.random() < 0.03 else "Scheduled"
+                    sold = {cls: round(count * rng.betavariate(*CLASS_LOADS[cls]))
+                            for cls, count in zip(CLASS_MULTIPLIERS, seats)}
+                    # Only Confirmed and Checked-In reservations hold a seat (TRG_UpdateAvailableSeats)
+                    total = sum(sold.values())
+                    if status == "Cancelled":
+                        cancelled, no_shows = total, 0
+                    else:
+                        cancelled = round(total * 0.08 * rng.random())
+                        no_shows = round((total - cancelled) * 0.08 * rng.random()) if status == "Arrived" else 0
+                    flights.append((flight_id, departure, base_price, seats, status, sold, cancelled, no_shows))
+                    yield (flight_id, airline_id, aircraft_id, numbers[key], origin, destination, departure,
+                           arrival, base_price, sum(seats) - (total - cancelled - no_shows), status,
+                           f"{'ABCDEFGH'[flight_id % 8]}{flight_id % 40 + 1}")
+
+    def _passengers(self):
+        rng = self._rng("passengers")
+        expiry_from = max(self.start.date(), date.today())
+        for n in range(1, self.passengers + 1):
+            passenger_id = self.first_ids["PASSENGERS"] + n
+            gender = rng.choice(("Male", "Female"))
+            first, last = rng.choice(FIRST_NAMES[gender]), rng.choice(LAST_NAMES)
+            country, _, code = rng.choice(COUNTRIES)
+            born = date(1940, 1, 1) + timedelta(days=rng.randrange(365 * 66))
+            yield (passenger_id, first, last, born, gender, country, f"SY{passenger_id:09d}",
+                   expiry_from + timedelta(days=rng.randint(30, 3650)),
+                   f"{first}.{last}.{passenger_id}@example.com".lower().replace("'", ""),
+                   f"+{code}-3{rng.randint(0, 99):02d}-{rng.randint(1000000, 9999999)}")
+
+    # --- Reservations, payments and audit rows ---
+    def _bookings(self, flights, chunk_size):
+        rng = self._rng("bookings")
+        ids = self.first_ids
+        reservation_id, payment_id, log_id = ids["RESERVATIONS"], ids["PAYMENTS"], ids["AUDIT_LOG"]
+        methods, method_weights = zip(*PAYMENT_METHODS)
+        layouts = {}
+        reservations, payments, audit = [], [], []
+        for flight_id, departure, base_price, seats, status, sold, cancelled, no_shows in flights:
+            layout = layouts.get(seats)
+            if layout is None:
+                layout = layouts[seats] = SeatLayout(*seats)
+            flown = departure < self.start
+            if status != "Scheduled":
+                log_id += 1
+                audit.append((log_id, "FLIGHTS", "UPDATE", flight_id, "status=Scheduled", f"status={status}",
+                              CHANGED_BY, min(departure, self.start)))
+            to_cancel, to_miss = cancelled, no_shows
+            for class_type, count in sold.items():
+                begin, end = layout.cabins[class_type]
+                for seat in rng.sample(range(begin, end), count):
+                    reservation_id += 1
+                    booked = departure - timedelta(days=min(rng.expovariate(1 / 30), 330), minutes=rng.randrange(1440))
+                    booked = min(booked, self.start - timedelta(minutes=rng.randrange(1, 1440))).replace(microsecond=0)
+                    days_ahead = (departure - booked).days
+                    demand = 1.5 if days_ahead < 7 else 1.3 if days_ahead < 14 else 1.1 if days_ahead < 30 else 1.0
+                    price = round(base_price * CLASS_MULTIPLIERS[class_type] * demand, 2)
+                    paid = flown or rng.random() < 0.9
+                    if to_cancel > 0:
+                        to_cancel -= 1
+                        state, payment = "Cancelled", "Refunded" if paid else "Cancelled"
+                        log_id += 1
+                        audit.append((log_id, "RESERVATIONS", "UPDATE", reservation_id, "reservation_status=Confirmed",
+                                      "reservation_status=Cancelled", CHANGED_BY, min(booked + timedelta(days=1), departure)))
+                    elif to_miss > 0:
+                        to_miss -= 1
+                        state, payment = "No-Show", "Paid"
+                    elif flown:
+                        state, payment = "Checked-In", "Paid"
+                    else:
+                        near = departure - self.start < timedelta(days=1)
+                        state = "Checked-In" if near and rng.random() < 0.6 else "Confirmed"
+                        payment = "Paid" if paid else "Pending"
+                    reservations.append((reservation_id, ids["PASSENGERS"] + rng.randint(1, self.passengers), flight_id,
+                                         f"S{reservation_id:09d}", layout.labels[seat], class_type, booked, price,
+                                         payment, state))
+                    if payment in ("Paid", "Refunded"):
+                        payment_id += 1
+                        method = rng.choices(methods, method_weights)[0]
+                        card = f"{rng.randrange(10000):04d}" if method.endswith("Card") else None
+                        payments.append((payment_id, reservation_id, method, price, booked, f"SYTXN{payment_id:012d}",
+                                         "Success" if payment == "Paid" else "Refunded", card))
+            if len(reservations) >= chunk_size:
+                yield "RESERVATIONS", reservations
+                if payments:
+                    yield "PAYMENTS", payments
+                reservations, payments = [], []
+            if len(audit) >= chunk_size:
+                yield "AUDIT_LOG", audit
+                audit = []
+        for table, rows in (("RESERVATIONS", reservations), ("PAYMENTS", payments), ("AUDIT_LOG", audit)):
+            if rows:
+                yield table, rows
+
+
+def _expected_sales(seats):
+    """Mean reservations per flight of an aircraft with (economy, business, first) seats."""
+    return sum(count * a / (a + b) for count, (a, b) in zip(seats, CLASS_LOADS.values()))
+
+
+def _chunked(table, rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield table, chunk
+            chunk = []
+    if chunk:
+        yield table, chunk
+
+
+def _distance(a, b):
+    """Great-circle km between two (id, city, latitude, longitude) places."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[2], a[3], b[2], b[3]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h))
+
+
+def insert_sql(table):
+    columns = COLUMNS[table]
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+def first_ids(db):
+    """{table: highest id in it}. Returns (ids, msg); ids is None on failure."""
+    data, msg = db.fetch_results(ID_BASES, query_class="admin")
+    if data is None:
+        return None, msg
+    return dict(zip(COLUMNS, data[1][0])), msg
+
+
+class Throughput:
+    """Rows and seconds spent writing them, per table."""
+
+    def __init__(self):
+        self.tables = {}  # table -> [rows, seconds]
+        self.started = time.perf_counter()
+
+    def add(self, table, rows, seconds):
+        entry = self.tables.setdefault(table, [0, 0.0])
+        entry[0] += rows
+        entry[1] += seconds
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        writing = sum(seconds for _, seconds in self.tables.values())
+        total = sum(rows for rows, _ in self.tables.values())
+        lines = []
+        for table, (rows, seconds) in self.tables.items():
+            lines.append(f"{table:<13} {rows:>12,} rows {seconds:9.1f} s {rows / seconds if seconds else 0:>12,.0f} rows/s")
+        lines.append(f"{'total':<13} {total:>12,} rows {elapsed:9.1f} s {total / elapsed if elapsed else 0:>12,.0f} rows/s "
+                     f"({(elapsed - writing) / elapsed if elapsed else 0:.0%} of it generating)")
+        return lines
+
+
+def load(db, generator, chunk_size=CHUNK_SIZE, sql_server=True, progress=None):
+    """Insert the generator's rows, each chunk in one execute_many transaction. Returns (Throughput, msg).
+
+    sql_server turns on IDENTITY_INSERT and turns the triggers off around
+    the load; stub_driver databases have neither. The calls run pinned to one
+    connection, since IDENTITY_INSERT is a session setting.
+    """
+    throughput = Throughput()
+    with db.pinned(), db.scope("admin"):
+        if sql_server:
+            for trigger in TRIGGERS:
+                db.execute_query(f"DISABLE TRIGGER {trigger}")
+        identity = None
+        try:
+            for table, rows in generator.chunks(chunk_size):
+                if sql_server and table != identity:
+                    if identity:
+                        db.execute_query(f"SET IDENTITY_INSERT {identity} OFF")
+                    db.execute_query(f"SET IDENTITY_INSERT {table} ON")
+                    identity = table
+                started = time.perf_counter()
+                ok, msg = db.execute_many(insert_sql(table), rows)
+                if not ok:
+                    return throughput, f"{table}: {msg}"
+                throughput.add(table, len(rows), time.perf_counter() - started)
+                if progress:
+                    progress(table, throughput)
+        finally:
+            if sql_server:
+                if identity:
+                    db.execute_query(f"SET IDENTITY_INSERT {identity} OFF")
+                for trigger in TRIGGERS:
+                    db.execute_query(f"ENABLE TRIGGER {trigger}")
+    return throughput, "Success"
+
+
+def write_csv(generator, directory, chunk_size=CHUNK_SIZE):
+    """Write one <TABLE>.csv with a header row per table, for BULK INSERT or bcp. Returns Throughput."""
+    os.makedirs(directory, exist_ok=True)
+    throughput = Throughput()
+    files = {}
+    try:
+        for table, rows in generator.chunks(chunk_size):
+            started = time.perf_counter()
+            if table not in files:
+                f = open(os.path.join(directory, f"{table}.csv"), "w", newline="", encoding="utf-8")
+                files[table] = (f, csv.writer(f))
+                files[table][1].writerow(COLUMNS[table])
+            files[table][1].writerows(rows)
+            throughput.add(table, len(rows), time.perf_counter() - started)
+    finally:
+        for f, _ in files.values():
+            f.close()
+    return throughput
+
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return
+    reservations = int(argv[0])
+    seed = int(argv[1]) if len(argv) > 1 else 1
+    start = date.fromisoformat(argv[2]) if len(argv) > 2 and argv[2] != "-" else None
+    to_csv = len(argv) > 4 and argv[3] == "csv"
+
+    if to_csv:
+        generator = DataGenerator(reservations, seed, start)
+        print(f"Plan: {generator.plan()}")
+        lines = write_csv(generator, argv[4]).report()
+    else:
+        db = DatabaseConnection()
+        ok, msg = db.connect()
+        print(msg)
+        if not ok:
+            return
+        ids, msg = first_ids(db)
+        if ids is None:
+            print(msg)
+            return
+        generator = DataGenerator(reservations, seed, start, ids)
+        print(f"Plan: {generator.plan()}")
+        last = [0.0]
+
+        def progress(table, throughput):
+            if time.perf_counter() - last[0] >= 10:
+                last[0] = time.perf_counter()
+                print(f"  {table}: {throughput.tables[table][0]:,} rows")
+
+        throughput, msg = load(db, generator, progress=progress)
+        lines = throughput.report() + [msg]
+        db.disconnect()
+    for line in lines:
+        print(line)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,11 +1,20 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import os
-import random
 import re  # For email validation
 from datetime import datetime, date
 from database_connection import DatabaseConnection
+from db_worker import DBExecutor, QueueDispatcher
 from sql_runner import SQLRunner
+from booking import book, class_quotes, reconcile_seats
+from flight_search import search, flex_for, grid_rows, SearchCache, FLEX_CHOICES, TIME_WINDOWS
+from itineraries import FlightNetwork, STOP_CHOICES, SORT_CHOICES, leg_rows, describe
+from reference_data import ReferenceCache, SNAPSHOT_FILE
+from schedules import expand_schedules
+from seat_map import load_seat_map
+from table_models import WindowedTreeview
+from pagination import KeysetPager, FIRST, NEXT, PREV, CURRENT
+import statements
 
 # --- Theme Configuration ---
 COLOR_PRIMARY = "#004085"     # Dark Blue
@@ -16,6 +25,20 @@ FONT_HEADER = ("Helvetica", 16, "bold")
 FONT_NORMAL = ("Helvetica", 10)
 FONT_BOLD = ("Helvetica", 10, "bold")
 
+# Analytics result sets are capped at this many rows
+STREAM_MAX_ROWS = 100000
+
+# Rows per page on the paged lists
+FLIGHTS_PAGE_SIZE = 100
+BOOKINGS_PAGE_SIZE = 50
+AUDIT_PAGE_SIZE = 50
+
+FLIGHT_COLUMNS = ("flight_id, airline_name, flight_number, departure_city, arrival_city, departure_datetime, "
+                  "base_price, available_seats, status")
+BOOKING_COLUMNS = ("reservation_id, booking_reference, passenger_name, flight_number, airline_name, "
+                   "departure_city + ' → ' + arrival_city AS route, seat_number, class_type, "
+                   "reservation_status, payment_status, total_price")
+
 class LoginWindow:
     def __init__(self, root, on_success):
         self.root = root
@@ -97,18 +120,14 @@ class LoginWindow:
 
         try:
             # Call SP_AuthenticateUser
-            # DECLARE variables for output parameters
-            query = """
-            DECLARE @uid INT, @role VARCHAR(20), @pid INT;
-            EXEC SP_AuthenticateUser ?, ?, @uid OUTPUT, @role OUTPUT, @pid OUTPUT;
-            SELECT @uid, @role, @pid;
-            """
-            data, msg = self.db.fetch_results(query, (user, pwd))
+            data, msg = self.db.fetch_results(statements.LOGIN, (user, pwd))
             
             if data and data[1] and data[1][0][0]:
                 # Login Successful
                 # user_id = data[1][0][0]
                 # role = data[1][0][1]
+                # The main window opens its own pool; this one would stay open for the whole session
+                self.db.disconnect()
                 self.root.destroy()
                 self.on_success()
             else:
@@ -136,14 +155,8 @@ class LoginWindow:
         try:
             # Call SP_RegisterUser
             # Checks for duplicate username/email handles inside the SP (RAISERROR)
-            query = """
-            DECLARE @new_id INT;
-            EXEC SP_RegisterUser ?, ?, ?, 'Customer', NULL, @new_id OUTPUT;
-            SELECT @new_id;
-            """
-            
             # Note: SP raises error if user exists, fetch_results catches it in msg
-            data, msg = self.db.fetch_results(query, (user, pwd, email))
+            data, msg = self.db.fetch_results(statements.REGISTER_USER, (user, pwd, email), idempotent=False)
             
             if data and data[1]:
                 messagebox.showinfo("Success", "Registration Successful! Please Login.")
@@ -161,6 +174,71 @@ class LoginWindow:
             messagebox.showerror("System Error", str(e))
 
 
+class SeatPickerWindow:
+    """Seat map of one flight drawn on a canvas; clicking a free seat of the booked class picks it."""
+
+    CELL = 26
+    COLORS = {"free": "#d4edda", "taken": "#adb5bd", "other": "#f1f3f5", "selected": COLOR_PRIMARY}
+
+    def __init__(self, parent, seat_map, class_type, selected, on_pick):
+        self.seat_map = seat_map
+        self.class_type = class_type
+        self.on_pick = on_pick
+        layout = seat_map.layout
+        width = max(len(cells) for _, _, cells in layout.rows) if layout.rows else 0
+
+        self.top = tk.Toplevel(parent)
+        self.top.title(f"Choose a {class_type} Seat")
+        self.top.configure(bg=COLOR_BG)
+        self.top.transient(parent)
+        tk.Label(self.top, text=f"{seat_map.free_count(class_type)} {class_type} seats free - click one to choose it",
+                 bg=COLOR_BG, font=FONT_BOLD).pack(pady=5)
+
+        frame = tk.Frame(self.top, bg=COLOR_BG)
+        frame.pack(fill=tk.BOTH, expand=True)
+        canvas_width = (width + 1) * self.CELL + 10
+        self.canvas = tk.Canvas(frame, width=canvas_width, height=min(len(layout.rows) * self.CELL + 10, 500),
+                                bg=COLOR_WHITE, highlightthickness=0,
+                                scrollregion=(0, 0, canvas_width, len(layout.rows) * self.CELL + 10))
+        scroll = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=scroll.set)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # One rectangle per seat; the tag carries the seat number for the click handler
+        for r, (row, row_class, cells) in enumerate(layout.rows):
+            y = 5 + r * self.CELL
+            self.canvas.create_text(5 + self.CELL // 2, y + self.CELL // 2, text=str(row), font=("Helvetica", 8))
+            for c, i in enumerate(cells):
+                if i is None:
+                    continue
+                label = layout.labels[i]
+                if row_class != class_type:
+                    state = "other"
+                elif label == selected:
+                    state = "selected"
+                else:
+                    state = "free" if seat_map.is_free(label) else "taken"
+                x = 5 + (c + 1) * self.CELL
+                tags = ("seat", f"seat:{label}") if state in ("free", "selected") else ()
+                self.canvas.create_rectangle(x + 2, y + 2, x + self.CELL - 2, y + self.CELL - 2,
+                                             fill=self.COLORS[state], outline="#6c757d", tags=tags)
+                self.canvas.create_text(x + self.CELL // 2, y + self.CELL // 2, text=label[-1], tags=tags,
+                                        fill=COLOR_WHITE if state == "selected" else "black", font=("Helvetica", 8))
+        self.canvas.tag_bind("seat", "<Button-1>", self.on_click)
+        if selected in layout.index:
+            # Start scrolled to the chosen seat's row
+            self.canvas.yview_moveto(max(layout.row_numbers[layout.index[selected]] - 3, 0) / max(len(layout.rows), 1))
+
+    def on_click(self, event):
+        item = self.canvas.find_withtag("current")
+        for tag in self.canvas.gettags(item):
+            if tag.startswith("seat:"):
+                self.on_pick(tag[5:])
+                self.top.destroy()
+                return
+
+
 class DatabaseGUI:
     def __init__(self, root):
         self.root = root
@@ -171,17 +249,28 @@ class DatabaseGUI:
         self.db = DatabaseConnection()
         self.runner = SQLRunner(self.db)
         self.project_dir = os.path.dirname(os.path.abspath(__file__))
+        # Airports, airlines and aircraft, kept client-side (warm from the last run's snapshot)
+        self.reference = ReferenceCache(self.db, snapshot_path=SNAPSHOT_FILE)
+        # Bookable flights indexed by airport for connecting itineraries (loaded on the first such search)
+        self.network = FlightNetwork(self.db)
+        # Recent direct searches; bookings, cancellations and status changes drop the results they affect
+        self.search_cache = SearchCache()
+        self.pagers = {}          # list name -> (KeysetPager, function showing a page of rows)
+        self.pager_controls = {}  # list name -> (previous button, page label, next button)
+
+        # Database work runs on background threads; results come back through root.after
+        self.dispatcher = QueueDispatcher()
+        self.worker = DBExecutor(self.dispatcher.post, on_busy=self.show_busy)
 
         # Styles
         self.setup_styles()
-        
-        # Connect
-        self.db.connect()
         self.create_widgets()
+        self.pump_worker()
+        if self.reference.load_snapshot():
+            self.populate_airport_combos()
         
-        # Load initial data
-        self.refresh_flights()
-        self.refresh_bookings()
+        # Connect, then load initial data
+        self.connect_db()
         
         # Fix macOS focus issues - bind click to all interactive widgets
         self.fix_macos_focus()
@@ -221,6 +310,16 @@ class DatabaseGUI:
         tk.Label(header_frame, text="✈  Flight Reservation System", font=("Helvetica", 20, "bold"), 
                  bg=COLOR_PRIMARY, fg=COLOR_WHITE).pack(pady=15)
 
+        # Status bar with a progress indicator while database work is running
+        status_frame = tk.Frame(self.root, bg=COLOR_BG)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=20, pady=(0, 5))
+        self.status_label = tk.Label(status_frame, text="Ready", bg=COLOR_BG, font=FONT_NORMAL)
+        self.status_label.pack(side=tk.LEFT)
+        self.progress = ttk.Progressbar(status_frame, mode="indeterminate", length=150)
+        # Shown with the progress bar: cancels the statements running on the server
+        self.btn_cancel_queries = ttk.Button(status_frame, text="Cancel", style="Secondary.TButton",
+                                             command=self.cancel_queries)
+
         # Main Tab Control
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
@@ -277,14 +376,36 @@ class DatabaseGUI:
         btn_clear = ttk.Button(row1, text="Clear", style="Secondary.TButton", command=self.clear_search)
         btn_clear.pack(side=tk.LEFT, padx=5)
         
-        # Populate dropdowns with airports
-        self.populate_airport_combos()
+        # Row 2: Flexible dates and departure time window
+        row2 = ttk.Frame(search_frame)
+        row2.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(row2, text="Flexible:", font=FONT_BOLD).pack(side=tk.LEFT, padx=(0, 5))
+        self.combo_flex = ttk.Combobox(row2, values=FLEX_CHOICES, width=12, state="readonly")
+        self.combo_flex.set(FLEX_CHOICES[0])
+        self.combo_flex.pack(side=tk.LEFT, padx=(0, 20))
+        
+        ttk.Label(row2, text="Departure:", font=FONT_BOLD).pack(side=tk.LEFT, padx=(0, 5))
+        self.combo_window = ttk.Combobox(row2, values=list(TIME_WINDOWS), width=18, state="readonly")
+        self.combo_window.set("Any time")
+        self.combo_window.pack(side=tk.LEFT, padx=(0, 20))
+        
+        ttk.Label(row2, text="Stops:", font=FONT_BOLD).pack(side=tk.LEFT, padx=(0, 5))
+        self.combo_stops = ttk.Combobox(row2, values=STOP_CHOICES, width=14, state="readonly")
+        self.combo_stops.set(STOP_CHOICES[0])
+        self.combo_stops.pack(side=tk.LEFT, padx=(0, 20))
+        
+        ttk.Label(row2, text="Sort:", font=FONT_BOLD).pack(side=tk.LEFT, padx=(0, 5))
+        self.combo_sort = ttk.Combobox(row2, values=list(SORT_CHOICES), width=10, state="readonly")
+        self.combo_sort.set("Shortest")
+        self.combo_sort.pack(side=tk.LEFT, padx=(0, 20))
         
         # Action frame
         action_frame = ttk.Frame(self.tab_flights, padding="15")
         action_frame.pack(fill=tk.X)
         
         ttk.Label(action_frame, text="Available Flights", font=FONT_HEADER).pack(side=tk.LEFT)
+        self.add_pager_controls(action_frame, "flights").pack(side=tk.LEFT, padx=20)
         
         btn_refresh = ttk.Button(action_frame, text="↻ Show All Flights", style="Secondary.TButton", command=self.refresh_flights)
         btn_refresh.pack(side=tk.RIGHT, padx=5)
@@ -294,7 +415,7 @@ class DatabaseGUI:
 
         # Treeview
         columns = ("ID", "Airline", "Flight No", "Origin", "Dest", "Departure", "Price", "Seats", "Status")
-        self.flight_tree = ttk.Treeview(self.tab_flights, columns=columns, show="headings", height=12)
+        self.flight_tree = WindowedTreeview(self.tab_flights, columns=columns, show="headings", height=12)
         
         widths = [50, 180, 80, 120, 120, 160, 80, 60, 80]
         for i, col in enumerate(columns):
@@ -317,21 +438,26 @@ class DatabaseGUI:
             self.open_booking_window()
     
     def populate_airport_combos(self):
-        """Populate departure and arrival dropdowns with airports"""
-        query = "SELECT airport_id, city + ' (' + airport_code + ')' AS display FROM AIRPORTS WHERE status = 'Operational' ORDER BY city"
-        data, msg = self.db.fetch_results(query)
-        if data and data[1]:
-            self.airport_list = [(row[0], row[1]) for row in data[1]]
-            display_values = [row[1] for row in data[1]]
-            self.combo_departure['values'] = display_values
-            self.combo_arrival['values'] = display_values
+        """Populate departure and arrival dropdowns with operational airports from the reference cache"""
+        display_values = self.reference.airports.labels(status="Operational")
+        self.combo_departure['values'] = display_values
+        self.combo_arrival['values'] = display_values
+
+    def load_reference_data(self, force=False):
+        """Refresh the reference cache in the background (only if expired unless forced), then the combos"""
+        def done(result):
+            success, msg = result
+            if not success:
+                self.log(msg)
+            self.populate_airport_combos()
+
+        self.worker.submit("airports", self.reference.refresh, force, on_result=done,
+                           on_error=lambda e: self.log(f"Could not load reference data: {e}"))
     
     def get_airport_id(self, display_value):
         """Get airport_id from display value"""
-        for aid, display in self.airport_list:
-            if display == display_value:
-                return aid
-        return None
+        airport = self.reference.airports.by_label(display_value)
+        return airport["airport_id"] if airport else None
     
     def search_flights(self):
         """Search flights using SP_SearchFlights stored procedure"""
@@ -367,38 +493,68 @@ class DatabaseGUI:
             messagebox.showerror("Error", "Invalid airport selection.")
             return
         
-        # Clear treeview
-        for item in self.flight_tree.get_children():
-            self.flight_tree.delete(item)
-        
-        # Call SP_SearchFlights
-        try:
-            if class_type == "Any":
-                query = "EXEC SP_SearchFlights @departure_airport_id=?, @arrival_airport_id=?, @travel_date=?"
-                params = (dep_id, arr_id, travel_date)
-            else:
-                query = "EXEC SP_SearchFlights @departure_airport_id=?, @arrival_airport_id=?, @travel_date=?, @class_type=?"
-                params = (dep_id, arr_id, travel_date, class_type)
-            
-            data, msg = self.db.fetch_results(query, params)
-            
+        flex = flex_for(self.combo_flex.get())
+        window = self.combo_window.get()
+        max_legs = STOP_CHOICES.index(self.combo_stops.get()) + 1
+        if max_legs > 1:
+            self.search_itineraries(dep_id, arr_id, travel_date, class_type, flex, window, max_legs)
+            return
+
+        def show(result):
+            data, msg = result
             if data and data[1]:
-                for row in data[1]:
-                    # Columns: flight_id, flight_number, airline_name, airline_code, dep_airport, dep_city, arr_airport, arr_city, dep_time, arr_time, duration, base_price, avail_seats, aircraft, status, gate, class_price
-                    display_row = (row[0], row[2], row[1], row[5], row[7], row[8], row[16] if len(row) > 16 else row[11], row[12], row[14])
-                    self.flight_tree.insert("", tk.END, values=display_row)
-                self.log(f"Search found {len(data[1])} flights.")
+                # Price and Seats are the quote for the class searched for
+                display_rows = grid_rows(data, class_type)
+                self.flight_tree.set_rows(display_rows)
+                self.update_pager_controls("flights", paged=False)
+                source = " (from cache)" if msg.endswith("(cached)") else ""
+                self.log(f"Search found {len(data[1])} flights{source}. {self.search_cache.summary()}")
             else:
+                self.flight_tree.clear_rows()
+                self.update_pager_controls("flights", paged=False)
                 messagebox.showinfo("No Results", "No flights found for the selected criteria.")
-        except Exception as e:
-            messagebox.showerror("Search Error", str(e))
+
+        # Same key as refresh_flights: a new search replaces a list that is still loading
+        self.worker.submit("flights", search, self.db, dep_id, arr_id, travel_date, class_type, flex, window,
+                           self.search_cache, on_result=show, on_error=lambda e: messagebox.showerror("Search Error", str(e)))
     
+    def search_itineraries(self, dep_id, arr_id, travel_date, class_type, flex, window, max_legs):
+        """Connecting itineraries from the in-memory flight network, one grid row per leg"""
+        earliest, latest = TIME_WINDOWS.get(window, (None, None))
+        sort = SORT_CHOICES.get(self.combo_sort.get(), "duration")
+
+        def city(airport_id):
+            airport = self.reference.airports.get(airport_id)
+            return airport["city"] if airport else airport_id
+
+        def show(result):
+            trips, msg = result
+            if trips is None:
+                messagebox.showerror("Search Error", msg)
+                return
+            self.flight_tree.set_rows(leg_rows(trips, class_type, city))
+            self.update_pager_controls("flights", paged=False)
+            if trips:
+                self.log(f"{msg} Best: {describe(trips[0])}.")
+            else:
+                messagebox.showinfo("No Results", "No flights or connections found for the selected criteria.")
+
+        def run():
+            return self.network.search(dep_id, arr_id, travel_date, class_type, flex, earliest, latest,
+                                       max_legs=max_legs, sort=sort)
+
+        self.worker.submit("flights", run, on_result=show,
+                           on_error=lambda e: messagebox.showerror("Search Error", str(e)))
+
     def clear_search(self):
         """Clear search filters and show all flights"""
         self.combo_departure.set('')
         self.combo_arrival.set('')
         self.entry_travel_date.delete(0, tk.END)
         self.combo_class.set("Any")
+        self.combo_flex.set(FLEX_CHOICES[0])
+        self.combo_window.set("Any time")
+        self.combo_stops.set(STOP_CHOICES[0])
         self.refresh_flights()
 
     def build_bookings_tab(self):
@@ -406,7 +562,7 @@ class DatabaseGUI:
         
         # Enhanced columns from the view
         columns = ("ID", "Reference", "Passenger", "Flight", "Airline", "Route", "Seat", "Class", "Status", "Payment", "Amount")
-        self.booking_tree = ttk.Treeview(self.tab_bookings, columns=columns, show="headings", height=12)
+        self.booking_tree = WindowedTreeview(self.tab_bookings, columns=columns, show="headings", height=12)
         
         widths = [40, 80, 120, 70, 100, 140, 50, 70, 80, 70, 80]
         for i, col in enumerate(columns):
@@ -428,6 +584,7 @@ class DatabaseGUI:
 
         btn_refresh = ttk.Button(action_frame, text="Refresh Bookings", style="Secondary.TButton", command=self.refresh_bookings)
         btn_refresh.pack(side=tk.LEFT, padx=5)
+        self.add_pager_controls(action_frame, "bookings").pack(side=tk.LEFT, padx=20)
 
         btn_cancel = ttk.Button(action_frame, text="Cancel Reservation", style="TButton", command=self.action_cancel)
         btn_cancel.pack(side=tk.RIGHT, padx=5)
@@ -455,26 +612,20 @@ class DatabaseGUI:
             messagebox.showerror("Error", "Cannot check-in a cancelled reservation.")
             return
 
-        try:
-            # Call SP_CheckInPassenger
-            sql = """
-            DECLARE @info VARCHAR(MAX);
-            EXEC SP_CheckInPassenger ?, @info OUTPUT;
-            SELECT @info;
-            """
-            data, msg = self.db.fetch_results(sql, (res_id,))
-            
+        # Call SP_CheckInPassenger (statements.CHECK_IN)
+        def show(result):
+            data, msg = result
             if data and data[1] and data[1][0][0]:
                 pass_info = data[1][0][0]
                 messagebox.showinfo("Boarding Pass", pass_info)
-                self.refresh_bookings()
-            else:
-                 # It might return error via RAISERROR which goes to Exception
-                 pass
-
-        except Exception as e:
-            # If SP raises error (e.g. not eligible), catch it
-            messagebox.showerror("Check-In Failed", str(e))
+                self.refresh_bookings(CURRENT)
+            elif data is None:
+                # RAISERROR from the SP (e.g. not eligible) comes back in msg
+                messagebox.showerror("Check-In Failed", msg)
+
+        self.worker.submit("reservations", lambda: self.db.fetch_results(statements.CHECK_IN, (res_id,), idempotent=False),
+                           on_result=show, replace=False,
+                           on_error=lambda e: messagebox.showerror("Check-In Failed", str(e)))
             
     def action_cancel(self):
         selected = self.booking_tree.selection()
@@ -493,23 +644,25 @@ class DatabaseGUI:
         if not messagebox.askyesno("Confirm Cancel", "Are you sure you want to cancel? Refund rules apply."):
             return
 
-        try:
-            # Call SP_CancelReservation
-            sql = """
-            DECLARE @refund DECIMAL(10,2);
-            EXEC SP_CancelReservation ?, 'User Requested', @refund OUTPUT;
-            SELECT @refund;
-            """
-            data, msg = self.db.fetch_results(sql, (res_id,))
-            
+        # Call SP_CancelReservation; the flight comes back too so cached searches can be dropped
+
+        def show(result):
+            data, msg = result
             if data and data[1]:
-                refund = data[1][0][0]
+                refund, flight_id, dep_id, arr_id, departure = data[1][0]
+                # A freed seat can put a sold-out flight back into search results
+                self.network.invalidate()
+                self.drop_cached_searches(flight_id, (dep_id, arr_id), departure)
                 messagebox.showinfo("Cancelled", f"Reservation Cancelled.\nRefund Amount: ${refund}")
-                self.refresh_bookings()
+                self.refresh_bookings(CURRENT)
                 self.refresh_analytics()
+            elif data is None:
+                messagebox.showerror("Cancellation Failed", msg)
 
-        except Exception as e:
-             messagebox.showerror("Cancellation Failed", str(e))
+        self.worker.submit("reservations",
+                           lambda: self.db.fetch_results(statements.CANCEL_RESERVATION, (res_id, res_id), idempotent=False),
+                           on_result=show, replace=False,
+                           on_error=lambda e: messagebox.showerror("Cancellation Failed", str(e)))
 
     def build_analytics_tab(self):
         # Split into three panes
@@ -521,7 +674,7 @@ class DatabaseGUI:
         paned.add(frame1)
         
         columns1 = ("Airline", "Flights", "Passengers", "Occupancy %", "Revenue")
-        self.tree_analytics1 = ttk.Treeview(frame1, columns=columns1, show="headings", height=4)
+        self.tree_analytics1 = WindowedTreeview(frame1, columns=columns1, show="headings", height=4)
         for col in columns1:
             self.tree_analytics1.heading(col, text=col)
             self.tree_analytics1.column(col, width=120)
@@ -532,7 +685,7 @@ class DatabaseGUI:
         paned.add(frame2)
         
         columns2 = ("Date", "Bookings", "Gross Revenue", "Paid Revenue")
-        self.tree_analytics2 = ttk.Treeview(frame2, columns=columns2, show="headings", height=4)
+        self.tree_analytics2 = WindowedTreeview(frame2, columns=columns2, show="headings", height=4)
         for col in columns2:
             self.tree_analytics2.heading(col, text=col)
             self.tree_analytics2.column(col, width=120)
@@ -543,7 +696,7 @@ class DatabaseGUI:
         paned.add(frame3)
         
         columns3 = ("Flight", "Airline", "Departure", "Total Seats", "Available", "Booked", "Occupancy %", "Revenue")
-        self.tree_analytics3 = ttk.Treeview(frame3, columns=columns3, show="headings", height=5)
+        self.tree_analytics3 = WindowedTreeview(frame3, columns=columns3, show="headings", height=5)
         widths3 = [70, 150, 130, 80, 70, 60, 80, 100]
         for i, col in enumerate(columns3):
             self.tree_analytics3.heading(col, text=col)
@@ -559,13 +712,63 @@ class DatabaseGUI:
 
         ttk.Button(btn_frame, text="Re-Connect Database", style="Secondary.TButton", command=self.connect_db).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="Run All SQL Scripts (Reset DB)", style="Secondary.TButton", command=self.run_all_scripts).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Apply Changed SQL Scripts", style="Secondary.TButton", command=self.apply_changed_scripts).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="Show Tables Log", style="Secondary.TButton", command=self.show_tables_log).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="Update Flight Status", style="Secondary.TButton", command=self.open_update_status_window).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="Show Audit Log", style="Secondary.TButton", command=self.show_audit_log).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Reconcile Seats", style="Secondary.TButton", command=self.reconcile_seats).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Expand Schedules", style="Secondary.TButton", command=self.expand_schedules).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Query Stats", style="Secondary.TButton", command=self.show_query_stats).pack(side=tk.LEFT, padx=5)
+        self.add_pager_controls(btn_frame, "audit", prev_text="◀ Newer", next_text="Older ▶").pack(side=tk.LEFT, padx=5)
 
         self.log_area = scrolledtext.ScrolledText(self.tab_admin, height=15, font=("Consolas", 10))
         self.log_area.pack(fill=tk.BOTH, expand=True, padx=15, pady=10)
 
+    def reconcile_seats(self):
+        """Check every flight's seat counter against its reservations and repair drift (SP_ReconcileAvailableSeats)"""
+        def show(result):
+            drifted, msg = result
+            self.log(msg)
+            for flight_id, recorded, expected, repaired in drifted or ():
+                self.log(f"  Flight {flight_id}: {recorded} -> {expected} available seats"
+                         + ("" if repaired else " (not changed)"))
+            if drifted:
+                self.network.invalidate()
+                self.search_cache.clear()
+                self.refresh_flights()
+
+        self.worker.submit("admin", reconcile_seats, self.db, on_result=show, replace=False,
+                           on_error=lambda e: self.log(f"Seat reconciliation failed: {e}"))
+
+    def expand_schedules(self):
+        """Create and update the flights of the recurring schedules up to the horizon (SP_ExpandSchedules)"""
+        def show(result):
+            counts, msg = result
+            self.log(msg)
+            if counts and counts["inserted"] + counts["updated"] + counts["deleted"] + counts["cancelled"]:
+                self.network.invalidate()
+                self.search_cache.clear()
+                self.refresh_flights()
+
+        self.worker.submit("admin", expand_schedules, self.db, on_result=show, replace=False,
+                           on_error=lambda e: self.log(f"Schedule expansion failed: {e}"))
+
+    def show_query_stats(self):
+        """Log the statements that took the most time in total, the latest slow calls and plan reuse"""
+        if self.db.query_stats is None:
+            self.log("Query statistics are turned off.")
+        else:
+            for line in self.db.query_stats.report():
+                self.log(line)
+        self.log(f"Retries: {self.db.retry_stats()}")
+
+        def show(result):
+            lines, msg = result
+            for line in lines or [msg]:
+                self.log(line)
+
+        self.worker.submit("admin-log", statements.plan_cache_report, self.db, on_result=show)
+
     def open_update_status_window(self):
         """Open a window to update flight status (Triggers Audit Log)"""
         top = tk.Toplevel(self.root)
@@ -595,125 +798,146 @@ class DatabaseGUI:
                 messagebox.showerror("Error", "Please enter a valid Flight ID.")
                 return
                 
-            try:
-                # Call SP_UpdateFlightStatus
-                query = "EXEC SP_UpdateFlightStatus @flight_id=?, @new_status=?"
-                if self.db.execute_commit(query, (fid, status)):
+            # Call SP_UpdateFlightStatus
+
+            def show(result):
+                data, msg = result
+                if data and data[1]:
+                    # The procedure returns the flight's route and departure for the search cache
+                    flight_id, dep_id, arr_id, departure = data[1][0][:4]
                     messagebox.showinfo("Success", "Flight Status Updated.\nCheck Audit Log for details.")
                     top.destroy()
+                    self.network.invalidate()
+                    self.drop_cached_searches(flight_id, (dep_id, arr_id), departure)
                     self.refresh_flights()
                 else:
-                    messagebox.showerror("Error", "Failed to update status.")
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
+                    messagebox.showerror("Error", f"Failed to update status.\n{msg}")
+
+            # The procedure writes FLIGHTS and AUDIT_LOG, so it must not run twice
+            self.worker.submit("admin",
+                               lambda: self.db.fetch_results(statements.UPDATE_FLIGHT_STATUS, (fid, status),
+                                                             idempotent=False),
+                               on_result=show, replace=False,
+                               on_error=lambda e: messagebox.showerror("Error", str(e)))
                 
         ttk.Button(frame, text="Update Status", style="TButton", command=do_update).pack(pady=20, fill=tk.X)
 
     # --- Data Operations ---
+    def add_pager_controls(self, parent, name, prev_text="◀ Previous", next_text="Next ▶"):
+        """Previous/next buttons and a page label for a paged list; returns the frame to pack"""
+        frame = ttk.Frame(parent)
+        btn_prev = ttk.Button(frame, text=prev_text, style="Secondary.TButton", state=tk.DISABLED,
+                              command=lambda: self.load_page(name, PREV))
+        btn_prev.pack(side=tk.LEFT)
+        label = ttk.Label(frame, text="", width=10, anchor=tk.CENTER)
+        label.pack(side=tk.LEFT, padx=5)
+        btn_next = ttk.Button(frame, text=next_text, style="Secondary.TButton", state=tk.DISABLED,
+                              command=lambda: self.load_page(name, NEXT))
+        btn_next.pack(side=tk.LEFT)
+        self.pager_controls[name] = (btn_prev, label, btn_next)
+        return frame
+
+    def update_pager_controls(self, name, paged=True):
+        btn_prev, label, btn_next = self.pager_controls[name]
+        pager = self.pagers[name][0] if name in self.pagers else None
+        if not paged or pager is None:
+            # e.g. search results, which are not paged
+            btn_prev.configure(state=tk.DISABLED)
+            btn_next.configure(state=tk.DISABLED)
+            label.configure(text="")
+            return
+        btn_prev.configure(state=tk.NORMAL if pager.has_prev else tk.DISABLED)
+        btn_next.configure(state=tk.NORMAL if pager.has_next else tk.DISABLED)
+        label.configure(text=pager.label())
+
+    def load_page(self, name, direction=FIRST, on_error=None):
+        """Fetch a page of a paged list on the worker and show it"""
+        pager, show_rows = self.pagers[name]
+        sql, params = pager.request(direction)
+
+        def show(result):
+            data, msg = result
+            if data is None:
+                if on_error:
+                    on_error(msg)
+                else:
+                    self.log(f"Query failed: {msg}")
+                return
+            rows = pager.accept(direction, data[1])
+            if rows is not None:
+                show_rows(rows)
+            self.update_pager_controls(name)
+
+        self.worker.submit(name, self.db.fetch_results, sql, params, on_result=show,
+                           on_error=lambda e: self.log(f"Query failed: {e}"))
+
     def refresh_flights(self):
-        for item in self.flight_tree.get_children():
-            self.flight_tree.delete(item)
-            
         # Using the View VW_AvailableFlights if available, else fallback
         # Let's try to use the view first as it's "Advanced"
-        view_query = "SELECT flight_id, airline_name, flight_number, departure_city, arrival_city, departure_datetime, base_price, available_seats, status FROM VW_AvailableFlights ORDER BY departure_datetime"
-        data, msg = self.db.fetch_results(view_query)
-        
-        if not data: # Fallback if View not created yet
+        self.pagers["flights"] = (KeysetPager(FLIGHT_COLUMNS, "VW_AvailableFlights",
+                                              key=[("departure_datetime", False), ("flight_id", False)],
+                                              page_size=FLIGHTS_PAGE_SIZE),
+                                  self.flight_tree.set_rows)
+
+        def fallback(error): # Fallback if View not created yet
              self.log("View VW_AvailableFlights not found, using raw query.")
-             query = """
-                SELECT F.flight_id, A.airline_name, F.flight_number, 
-                    Dep.city, Arr.city, F.departure_datetime, F.base_price, F.available_seats, F.status
-                FROM FLIGHTS F
+             pager = KeysetPager(
+                "F.flight_id, A.airline_name, F.flight_number, Dep.city, Arr.city, F.departure_datetime, "
+                "F.base_price, F.available_seats, F.status",
+                """FLIGHTS F
                 JOIN AIRLINES A ON F.airline_id = A.airline_id
                 JOIN AIRPORTS Dep ON F.departure_airport_id = Dep.airport_id
-                JOIN AIRPORTS Arr ON F.arrival_airport_id = Arr.airport_id
-                WHERE F.status = 'Scheduled'
-                ORDER BY F.departure_datetime
-             """
-             data, msg = self.db.fetch_results(query)
-
-        if data and data[1]:
-            for row in data[1]:
-                self.flight_tree.insert("", tk.END, values=list(row))
-
-    def refresh_bookings(self):
-        for item in self.booking_tree.get_children():
-            self.booking_tree.delete(item)
-        
-        # Use VW_PassengerReservationDetails view for richer data
-        query = """
-        SELECT TOP 20 
-            reservation_id, 
-            booking_reference, 
-            passenger_name, 
-            flight_number, 
-            airline_name,
-            departure_city + ' → ' + arrival_city AS route,
-            seat_number, 
-            class_type,
-            reservation_status, 
-            payment_status,
-            total_price
-        FROM VW_PassengerReservationDetails
-        ORDER BY booking_date DESC
-        """
-        data, msg = self.db.fetch_results(query)
-        
-        if not data:  # Fallback if view doesn't exist
+                JOIN AIRPORTS Arr ON F.arrival_airport_id = Arr.airport_id""",
+                key=[("F.departure_datetime", False), ("F.flight_id", False)],
+                where="F.status = 'Scheduled'", page_size=FLIGHTS_PAGE_SIZE)
+             self.pagers["flights"] = (pager, self.flight_tree.set_rows)
+             self.load_page("flights")
+
+        self.load_page("flights", on_error=fallback)
+
+    def refresh_bookings(self, direction=FIRST):
+        # Use VW_PassengerReservationDetails view for richer data, newest bookings first
+        if direction == FIRST or "bookings" not in self.pagers:
+            self.pagers["bookings"] = (KeysetPager(BOOKING_COLUMNS, "VW_PassengerReservationDetails",
+                                                   key=[("booking_date", True), ("reservation_id", True)],
+                                                   page_size=BOOKINGS_PAGE_SIZE),
+                                       self.booking_tree.set_rows)
+
+        def fallback(error):  # Fallback if view doesn't exist
             self.log("View VW_PassengerReservationDetails not found, using raw query.")
-            query = """
-            SELECT TOP 20 R.reservation_id, R.booking_reference, 
-                   P.first_name + ' ' + P.last_name AS passenger_name, 
-                   F.flight_number, A.airline_name,
-                   Dep.city + ' → ' + Arr.city AS route,
-                   R.seat_number, R.class_type, R.reservation_status, R.payment_status, R.total_price
-            FROM RESERVATIONS R
-            JOIN PASSENGERS P ON R.passenger_id = P.passenger_id
-            JOIN FLIGHTS F ON R.flight_id = F.flight_id
-            JOIN AIRLINES A ON F.airline_id = A.airline_id
-            JOIN AIRPORTS Dep ON F.departure_airport_id = Dep.airport_id
-            JOIN AIRPORTS Arr ON F.arrival_airport_id = Arr.airport_id
-            ORDER BY R.reservation_id DESC
-            """
-            data, msg = self.db.fetch_results(query)
-        
-        if data and data[1]:
-            for row in data[1]:
-                self.booking_tree.insert("", tk.END, values=list(row))
+            pager = KeysetPager(
+                "R.reservation_id, R.booking_reference, P.first_name + ' ' + P.last_name AS passenger_name, "
+                "F.flight_number, A.airline_name, Dep.city + ' → ' + Arr.city AS route, "
+                "R.seat_number, R.class_type, R.reservation_status, R.payment_status, R.total_price",
+                """RESERVATIONS R
+                JOIN PASSENGERS P ON R.passenger_id = P.passenger_id
+                JOIN FLIGHTS F ON R.flight_id = F.flight_id
+                JOIN AIRLINES A ON F.airline_id = A.airline_id
+                JOIN AIRPORTS Dep ON F.departure_airport_id = Dep.airport_id
+                JOIN AIRPORTS Arr ON F.arrival_airport_id = Arr.airport_id""",
+                key=[("R.booking_date", True), ("R.reservation_id", True)], page_size=BOOKINGS_PAGE_SIZE)
+            self.pagers["bookings"] = (pager, self.booking_tree.set_rows)
+            self.load_page("bookings")
+
+        # Only fall back from the first page of the view; later reloads keep whichever pager is active
+        self.load_page("bookings", direction, on_error=fallback if direction == FIRST else None)
 
     def refresh_analytics(self):
-        # 1. Airline Performance
-        for item in self.tree_analytics1.get_children(): 
-            self.tree_analytics1.delete(item)
-        q1 = "SELECT airline_name, total_flights, total_passengers, avg_occupancy_rate, total_revenue FROM VW_AirlinePerformance"
-        d1, msg1 = self.db.fetch_results(q1)
-        if d1 and d1[1]:
-            for r in d1[1]: 
-                self.tree_analytics1.insert("", tk.END, values=list(r))
-            
-        # 2. Daily Revenue
-        for item in self.tree_analytics2.get_children(): 
-            self.tree_analytics2.delete(item)
-        q2 = "SELECT booking_date, total_bookings, gross_revenue, paid_revenue FROM VW_DailyRevenue ORDER BY booking_date DESC"
-        d2, msg2 = self.db.fetch_results(q2)
-        if d2 and d2[1]:
-            for r in d2[1]: 
-                self.tree_analytics2.insert("", tk.END, values=list(r))
-        
-        # 3. Flight Statistics (VW_FlightStatistics)
-        for item in self.tree_analytics3.get_children(): 
-            self.tree_analytics3.delete(item)
-        q3 = """
-        SELECT flight_number, airline_name, departure_datetime, total_seats, available_seats,
-               booked_seats, occupancy_percentage, total_revenue
-        FROM VW_FlightStatistics
-        ORDER BY departure_datetime DESC
-        """
-        d3, msg3 = self.db.fetch_results(q3)
-        if d3 and d3[1]:
-            for r in d3[1]: 
-                self.tree_analytics3.insert("", tk.END, values=list(r))
+        # All three views in one round trip (statements.ANALYTICS)
+
+        def show(result):
+            data, msg = result
+            if not data:
+                self.log(f"Analytics unavailable: {msg}")
+                return
+            # 1. Airline Performance, 2. Daily Revenue, 3. Flight Statistics (VW_FlightStatistics)
+            trees = (self.tree_analytics1, self.tree_analytics2, self.tree_analytics3)
+            for tree, (columns, rows) in zip(trees, data):
+                tree.set_rows(rows)
+
+        self.worker.submit("analytics", lambda: self.db.fetch_all_results(statements.ANALYTICS, max_rows=STREAM_MAX_ROWS,
+                                                                      query_class="analytics"),
+                           on_result=show, on_error=lambda e: self.log(f"Analytics unavailable: {e}"))
 
     def open_booking_window(self):
         selected = self.flight_tree.selection()
@@ -724,7 +948,6 @@ class DatabaseGUI:
         flight_values = self.flight_tree.item(selected[0])['values']
         flight_id = flight_values[0]
         base_price = float(flight_values[6])
-        dep_date = flight_values[5] # String or datetime object
         
         top = tk.Toplevel(self.root)
         top.title(f"Book Flight {flight_values[2]}")
@@ -757,10 +980,11 @@ class DatabaseGUI:
 
         row_seat = tk.Frame(entry_frame, bg=COLOR_WHITE)
         row_seat.pack(fill=tk.X, pady=5)
-        tk.Label(row_seat, text="Seat Pref", width=12, anchor="w", bg=COLOR_WHITE, font=FONT_BOLD).pack(side=tk.LEFT)
-        seat_combo = ttk.Combobox(row_seat, values=["1A", "1B", "1C", "2A", "2B", "2C", "3A", "3B"], state="readonly")
-        seat_combo.pack(side=tk.RIGHT, expand=True, fill=tk.X)
-        seat_combo.set("1A")
+        tk.Label(row_seat, text="Seat", width=12, anchor="w", bg=COLOR_WHITE, font=FONT_BOLD).pack(side=tk.LEFT)
+        seat_var = tk.StringVar(value="Loading seat map...")
+        btn_seat = ttk.Button(row_seat, text="Choose...", state=tk.DISABLED)
+        btn_seat.pack(side=tk.RIGHT)
+        tk.Label(row_seat, textvariable=seat_var, anchor="w", bg=COLOR_WHITE).pack(side=tk.LEFT, expand=True, fill=tk.X)
         
         # Payment Section (SP_ProcessPayment)
         tk.Label(top, text="Payment Details (SP_ProcessPayment)", font=FONT_HEADER, bg=COLOR_BG).pack(pady=(15, 5))
@@ -790,47 +1014,76 @@ class DatabaseGUI:
         lbl_seats = tk.Label(top, text="Checking availability...", font=("Helvetica", 10), bg=COLOR_BG)
         lbl_seats.pack(pady=5)
         
+        # Simple Python Fallback multipliers
+        multipliers = {"Economy": 1.0, "Business": 2.5, "First Class": 4.0}
+        quotes = {}  # class -> (price, seats left) from FN_ClassQuotes, filled in by the background prefetch
+
+        def current_price():
+            cls = class_combo.get()
+            return quotes[cls][0] if cls in quotes else base_price * multipliers.get(cls, 1.0)
+
+        # The flight's seat map (one query); None until loaded, and then the server picks the seat
+        seats = {"map": None, "seat": None}
+
+        def choose_seat(seat):
+            seats["seat"] = seat
+            seat_var.set(seat or f"Any (no {class_combo.get()} seat free)")
+
+        def pick_seat(preferred=None):
+            """Keep the chosen seat if it is free and in the class, otherwise move to the next best one"""
+            if seats["map"] is not None:
+                choose_seat(seats["map"].next_best(class_combo.get(), preferred or seats["seat"]))
+
+        def show_seat_map(result):
+            seat_map, msg = result
+            if not top.winfo_exists():
+                return
+            if seat_map is None:
+                seat_var.set("Assigned at booking (seat map unavailable)")
+                return
+            seats["map"] = seat_map
+            btn_seat.config(state=tk.NORMAL)
+            pick_seat()
+
+        def open_seat_picker():
+            if seats["map"] is not None:
+                SeatPickerWindow(top, seats["map"], class_combo.get(), seats["seat"], choose_seat)
+
+        btn_seat.config(command=open_seat_picker)
+
         def update_price_and_seats(event=None):
+            """Show the selected class's quote; every class was fetched up front, so no query here"""
             cls = class_combo.get()
-            
-            # Simple Python Fallback multipliers
-            multipliers = {"Economy": 1.0, "Business": 2.5, "First Class": 4.0}
-            mult = multipliers.get(cls, 1.0)
-            
-            # 1. Update Price using DB Function (with fallback)
-            try:
-                # Try SQL Function first: SELECT dbo.FN_CalculateTicketPrice(...)
-                q_price = f"SELECT dbo.FN_CalculateTicketPrice({base_price}, '{cls}', GETDATE(), '{dep_date}')"
-                d_price, _ = self.db.fetch_results(q_price)
-                if d_price and d_price[1]:
-                    new_price = float(d_price[1][0][0])
-                else:
-                    # Fallback if function returns nothing or doesn't exist
-                    new_price = base_price * mult
-            except Exception as e:
-                # Fallback on any error
-                print(f"Pricing Error (using fallback): {e}")
-                new_price = base_price * mult
-                
-            lbl_price.config(text=f"Total Price: ${new_price:.2f}")
-            
-            # 2. Check Specific Class Availability using DB Function
-            try:
-                q_seats = f"SELECT dbo.FN_GetAvailableSeatsByClass({flight_id}, '{cls}')"
-                d_seats, _ = self.db.fetch_results(q_seats)
-                if d_seats and d_seats[1]:
-                    seats_avail = d_seats[1][0][0]
-                    lbl_seats.config(text=f"Seats Available in {cls}: {seats_avail}", fg="black" if seats_avail > 0 else "red")
-                else:
-                    lbl_seats.config(text="Availability unknown")
-            except:
+            lbl_price.config(text=f"Total Price: ${current_price():.2f}")
+            pick_seat()
+            if cls in quotes:
+                seats_avail = quotes[cls][1]
+                lbl_seats.config(text=f"Seats Available in {cls}: {seats_avail}", fg="black" if seats_avail > 0 else "red")
+
+        def show_quotes(result):
+            found, msg = result
+            if not top.winfo_exists():
+                return
+            if found is None:
+                print(f"Quote Error (using fallback): {msg}")
+                lbl_seats.config(text="Availability check failed")
+                return
+            quotes.update(found.get(int(flight_id), {}))
+            if not quotes:
+                lbl_seats.config(text="Availability unknown")
+            update_price_and_seats()
+
+        def quote_failed(e):
+            print(f"Quote Error (using fallback): {e}")
+            if top.winfo_exists():
                 lbl_seats.config(text="Availability check failed")
-                
-            return new_price
 
         class_combo.bind("<<ComboboxSelected>>", update_price_and_seats)
-        # Initial call
-        top.after(100, update_price_and_seats)
+        # Price and seats for all three classes in one query (FN_ClassQuotes)
+        self.worker.submit(f"quote-{id(top)}", class_quotes, self.db, [int(flight_id)],
+                           on_result=show_quotes, on_error=quote_failed)
+        self.worker.submit(f"seats-{id(top)}", load_seat_map, self.db, int(flight_id), on_result=show_seat_map,
+                           on_error=lambda e: top.winfo_exists() and seat_var.set("Assigned at booking (seat map unavailable)"))
         
         def validate_and_submit():
             fname = entries["First Name"].get().strip()
@@ -841,10 +1094,6 @@ class DatabaseGUI:
             cls = class_combo.get()
             payment_method = payment_combo.get()
             card_last4 = entry_card_last4.get().strip()
-            
-            # Re-calculate final price securely
-            final_price = update_price_and_seats() 
-            if final_price is None: final_price = base_price
 
             # --- Validation Constraints ---
             if not all([fname, lname, passport, email, phone]):
@@ -881,125 +1130,158 @@ class DatabaseGUI:
                 messagebox.showerror("Validation Error", "Card last 4 digits must be exactly 4 numbers.")
                 return
 
-            # Submit logic
-            try:
-                # Insert Passenger
-                p_query = """
-                INSERT INTO PASSENGERS (first_name, last_name, date_of_birth, nationality, passport_number, passport_expiry_date, email, phone_number)
-                VALUES (?, ?, '1990-01-01', 'Unknown', ?, '2030-01-01', ?, ?)
-                """
-                p_params = (fname, lname, passport, email, phone)
-                
-                if self.db.execute_commit(p_query, p_params):
-                    # Fetch ID
-                    pid_data, _ = self.db.fetch_results(f"SELECT passenger_id FROM PASSENGERS WHERE passport_number='{passport}'")
-                    if pid_data and pid_data[1]:
-                        pid = pid_data[1][0][0]
-                        
-                        # Insert Reservation (with Pending payment status)
-                        ref = f"BK{random.randint(10000,99999)}"
-                        r_query = """
-                        INSERT INTO RESERVATIONS (passenger_id, flight_id, booking_reference, seat_number, class_type, total_price, payment_status)
-                        VALUES (?, ?, ?, ?, ?, ?, 'Pending')
-                        """
-                        r_params = (pid, flight_id, ref, seat_combo.get(), cls, final_price)
-                        
-                        if self.db.execute_commit(r_query, r_params):
-                            # Get reservation ID
-                            res_data, _ = self.db.fetch_results(f"SELECT reservation_id FROM RESERVATIONS WHERE booking_reference='{ref}'")
-                            if res_data and res_data[1]:
-                                res_id = res_data[1][0][0]
-                                
-                                # Process Payment using SP_ProcessPayment
-                                try:
-                                    pay_sql = """
-                                    DECLARE @payment_id INT;
-                                    EXEC SP_ProcessPayment 
-                                        @reservation_id=?, 
-                                        @payment_method=?, 
-                                        @amount=?, 
-                                        @card_last_four=?,
-                                        @payment_id=@payment_id OUTPUT;
-                                    SELECT @payment_id;
-                                    """
-                                    pay_params = (res_id, payment_method, final_price, card_last4 if card_last4 else None)
-                                    pay_data, pay_msg = self.db.fetch_results(pay_sql, pay_params)
-                                    
-                                    if pay_data and pay_data[1]:
-                                        payment_id = pay_data[1][0][0]
-                                        messagebox.showinfo("Success", 
-                                            f"Ticket Booked & Paid Successfully!\n\n"
-                                            f"Booking Ref: {ref}\n"
-                                            f"Payment ID: {payment_id}\n"
-                                            f"Amount: ${final_price:.2f}\n"
-                                            f"Method: {payment_method}\n"
-                                            f"Class: {cls}")
-                                        top.destroy()
-                                        self.refresh_bookings()
-                                        self.refresh_analytics()
-                                    else:
-                                        messagebox.showwarning("Partial Success", 
-                                            f"Reservation created but payment processing returned no ID.\n"
-                                            f"Booking Ref: {ref}")
-                                        top.destroy()
-                                        self.refresh_bookings()
-                                        
-                                except Exception as pay_error:
-                                    messagebox.showwarning("Booking Created", 
-                                        f"Reservation created but payment failed:\n{pay_error}\n\n"
-                                        f"Booking Ref: {ref}\nPlease complete payment later.")
-                                    top.destroy()
-                                    self.refresh_bookings()
-                            else:
-                                messagebox.showerror("Error", "Could not retrieve reservation ID.")
-                        else:
-                            messagebox.showerror("Booking Error", "Failed to create reservation.")
-                    else:
-                        messagebox.showerror("Error", "Could not retrieve new passenger ID.")
-                else:
-                    messagebox.showerror("Passenger Error", "Failed to register passenger. \nPassport or Email might already exist.")
-
-            except Exception as e:
+            seat = seats["seat"]
+            seat_map = seats["map"]
+
+            # Submit logic (runs on a worker thread; returns what the dialog should show)
+            def run_booking():
+                booking, msg = book(self.db, fname, lname, passport, email, phone, flight_id, cls,
+                                    seat_number=seat, payment_method=payment_method, card_last_four=card_last4)
+                if booking is None:
+                    # Nothing was written: the server rolls the whole booking back
+                    if seat and seat_map is not None and "already booked" in msg:
+                        # Someone else took the seat: reload the map and offer the nearest free one
+                        seats["map"] = load_seat_map(self.db, int(flight_id))[0] or seat_map
+                        return "warning", "Seat Taken", (f"Seat {seat} was just booked by someone else.\n"
+                                                         f"The nearest free seat is selected; confirm again to book it."), False
+                    return "error", "Booking Error", f"Booking failed:\n{msg}", False
+                text = (f"Ticket Booked & Paid Successfully!\n\n"
+                        f"Booking Ref: {booking['booking_reference']}\n"
+                        f"Payment ID: {booking['payment_id']}\n"
+                        f"Amount: ${booking['total_price']:.2f}\n"
+                        f"Method: {payment_method}\n"
+                        f"Class: {cls}")
+                return "info", "Success", text, True
+
+            def show(result):
+                kind, title, text, booked = result
+                {"info": messagebox.showinfo, "warning": messagebox.showwarning,
+                 "error": messagebox.showerror}[kind](title, text)
+                if booked:
+                    if top.winfo_exists():
+                        top.destroy()
+                    self.network.invalidate()  # Seat counts changed
+                    self.drop_cached_searches(int(flight_id))
+                    self.refresh_bookings()
+                    self.refresh_analytics()
+                elif top.winfo_exists():
+                    if kind == "warning":
+                        pick_seat(seat)  # The nearest free seat to the one that was taken
+                    btn_confirm.config(state=tk.NORMAL)
+
+            def failed(e):
                 messagebox.showerror("System Error", str(e))
+                if top.winfo_exists():
+                    btn_confirm.config(state=tk.NORMAL)
+
+            # Bookings are never dropped as stale; the button stays disabled until this one finishes
+            btn_confirm.config(state=tk.DISABLED)
+            self.worker.submit("booking", run_booking, on_result=show, on_error=failed, replace=False)
 
-        ttk.Button(top, text="Confirm & Pay", style="TButton", command=validate_and_submit).pack(pady=10)
+        btn_confirm = ttk.Button(top, text="Confirm & Pay", style="TButton", command=validate_and_submit)
+        btn_confirm.pack(pady=10)
 
     # --- Setup Helpers ---
+    def drop_cached_searches(self, flight_id, route=None, departure=None):
+        """Invalidate cached search results after a change to one flight and note it in the admin log"""
+        dropped = self.search_cache.invalidate_flight(flight_id, route, departure)
+        if dropped:
+            self.log(f"Flight {flight_id} changed: dropped {dropped} cached search(es). {self.search_cache.summary()}")
+
     def log(self, msg):
         self.log_area.insert(tk.END, msg + "\n")
         self.log_area.see(tk.END)
 
+    def pump_worker(self):
+        """Run callbacks posted by the database workers, then poll again"""
+        self.dispatcher.drain()
+        self.root.after(30, self.pump_worker)
+
+    def show_busy(self, keys):
+        if keys:
+            self.status_label.config(text="Working: " + ", ".join(keys))
+            if not self.progress.winfo_ismapped():
+                self.btn_cancel_queries.pack(side=tk.RIGHT, padx=(5, 0))
+                self.progress.pack(side=tk.RIGHT)
+                self.progress.start(10)
+        else:
+            self.status_label.config(text="Ready")
+            self.progress.stop()
+            self.progress.pack_forget()
+            self.btn_cancel_queries.pack_forget()
+
+    def cancel_queries(self):
+        """Cancel the statements running now; their tasks end with a "cancelled" error"""
+        count = self.db.cancel()
+        self.log(f"Cancelled {count} running statement(s)." if count else "No statement running to cancel.")
+
     def connect_db(self):
-        success, msg = self.db.connect()
-        self.log(msg)
-        if success:
-            self.refresh_flights()
+        def connected(result):
+            success, msg = result
+            self.log(msg)
+            if success:
+                self.load_reference_data()
+                self.refresh_flights()
+                self.refresh_bookings()
+
+        self.worker.submit("connect", self.db.connect, on_result=connected,
+                           on_error=lambda e: self.log(f"Connection failed: {e}"))
 
     def run_all_scripts(self):
         if messagebox.askyesno("Confirm Reset", "This will WIPE the database and create fresh data. Continue?"):
             self.log("Running all scripts...")
-            success, msg = self.runner.run_all_scripts(self.project_dir)
+            self.submit_scripts(incremental=False)
+
+    def apply_changed_scripts(self):
+        self.log("Applying new and changed script batches...")
+        self.submit_scripts(incremental=True)
+
+    def submit_scripts(self, incremental):
+        def run():
+            result = self.runner.run_all_scripts(self.project_dir, incremental=incremental)
+            # A full run drops the database under the pooled connections
+            if not incremental:
+                self.db.connect()
+            return result
+
+        def done(result):
+            success, msg = result
             self.log(msg)
-            self.db.connect()
+            # Fresh data from the scripts replaces whatever reference data was cached
+            self.reference.invalidate()
+            self.network.invalidate()
+            self.search_cache.clear()
+            self.load_reference_data()
             self.refresh_flights()
 
+        self.worker.submit("admin", run, on_result=done, replace=False,
+                           on_error=lambda e: self.log(f"Scripts failed: {e}"))
+
     def show_tables_log(self):
-        query = "SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE='BASE TABLE'"
-        data, msg = self.db.fetch_results(query)
-        if data and data[1]:
-            self.log("Tables found:")
-            for r in data[1]:
-                self.log(f"- {r[0]}")
+        def show(result):
+            data, msg = result
+            if data and data[1]:
+                self.log("Tables found:")
+                for r in data[1]:
+                    self.log(f"- {r[0]}")
+
+        self.worker.submit("admin-log", lambda: self.db.fetch_results(statements.LIST_TABLES, query_class="admin"),
+                           on_result=show)
     
     def show_audit_log(self):
-        query = "SELECT TOP 50 log_id, table_name, operation_type, changed_date, changed_by FROM AUDIT_LOG ORDER BY changed_date DESC"
-        data, msg = self.db.fetch_results(query)
-        if data and data[1]:
-            self.log("--- SYSTEM SECURITY AUDIT LOG ---")
-            for r in data[1]:
-                self.log(f"[{r[3]}] {r[2]} on {r[1]} by {r[4]}")
-        else:
-            self.log("No audit records found (or query error).")
+        pager = KeysetPager("log_id, table_name, operation_type, changed_date, changed_by", "AUDIT_LOG",
+                            key=[("changed_date", True), ("log_id", True)], page_size=AUDIT_PAGE_SIZE)
+
+        def show(rows):
+            if rows:
+                self.log(f"--- SYSTEM SECURITY AUDIT LOG ({pager.label()}) ---")
+                for r in rows:
+                    self.log(f"[{r[3]}] {r[2]} on {r[1]} by {r[4]}")
+            else:
+                self.log("No audit records found.")
+
+        self.pagers["audit"] = (pager, show)
+        self.load_page("audit", on_error=lambda msg: self.log(f"No audit records found ({msg})."))
 
 def main():
     root = tk.Tk()
@@ -1014,14 +1296,19 @@ def main():
     
     # Create login window as Toplevel
     login_window = tk.Toplevel(root)
-    login_window.protocol("WM_DELETE_WINDOW", root.destroy)  # Close app if login closed
     
     # Force focus on macOS
     login_window.lift()
     login_window.attributes('-topmost', True)
     login_window.after(200, lambda: login_window.attributes('-topmost', False))
     
-    LoginWindow(login_window, on_login_success)
+    login = LoginWindow(login_window, on_login_success)
+
+    def on_login_closed():
+        login.db.disconnect()
+        root.destroy()
+
+    login_window.protocol("WM_DELETE_WINDOW", on_login_closed)  # Close app if login closed
     
     root.mainloop()
 
@@ -1,18 +1,27 @@
 import sys
-import random
 import re
 from datetime import datetime, date
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
-    QTabWidget, QLabel, QLineEdit, QPushButton, QComboBox, QTableWidget,
-    QTableWidgetItem, QMessageBox, QGroupBox, QFrame, QHeaderView, QTextEdit,
-    QDialog, QFormLayout, QDialogButtonBox, QSplitter
+    QTabWidget, QLabel, QLineEdit, QPushButton, QComboBox, QTableView,
+    QMessageBox, QGroupBox, QFrame, QHeaderView, QTextEdit,
+    QDialog, QFormLayout, QDialogButtonBox, QSplitter, QProgressBar, QScrollArea
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, pyqtSignal, QAbstractTableModel, QModelIndex
 from PyQt5.QtGui import QFont, QPalette, QColor
 
 from database_connection import DatabaseConnection
+from db_worker import DBExecutor
 from sql_runner import SQLRunner
+from booking import book, class_quotes, reconcile_seats
+from flight_search import search, flex_for, grid_rows, SearchCache, FLEX_CHOICES, TIME_WINDOWS
+from itineraries import FlightNetwork, STOP_CHOICES, SORT_CHOICES, leg_rows, describe
+from reference_data import ReferenceCache, SNAPSHOT_FILE
+from schedules import expand_schedules
+from seat_map import load_seat_map
+from table_models import RowStore
+from pagination import KeysetPager, FIRST, NEXT, PREV, CURRENT
+import statements
 import os
 
 # --- Theme Configuration ---
@@ -21,6 +30,98 @@ COLOR_SECONDARY = "#343a40"
 COLOR_BG = "#f8f9fa"
 COLOR_WHITE = "#ffffff"
 
+# Analytics result sets are capped at this many rows
+STREAM_MAX_ROWS = 100000
+
+# Rows per page on the paged lists
+FLIGHTS_PAGE_SIZE = 100
+BOOKINGS_PAGE_SIZE = 50
+
+FLIGHT_COLUMNS = ("flight_id, airline_name, flight_number, departure_city, arrival_city, departure_datetime, "
+                  "base_price, available_seats, status")
+BOOKING_COLUMNS = ("reservation_id, booking_reference, passenger_name, flight_number, airline_name, "
+                   "departure_city + ' → ' + arrival_city, seat_number, class_type, "
+                   "reservation_status, payment_status, total_price")
+
+
+class UiDispatcher(QObject):
+    """Delivers callbacks posted from database worker threads on the Qt event thread."""
+    invoke = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        # Emitted from worker threads, so Qt queues the call onto this object's (GUI) thread
+        self.invoke.connect(self.run)
+
+    def post(self, callback):
+        self.invoke.emit(callback)
+
+    def run(self, callback):
+        callback()
+
+
+class RowTableModel(QAbstractTableModel):
+    """Read-only table model over a RowStore; the view only asks for the cells it paints."""
+
+    def __init__(self, headers, parent=None):
+        super().__init__(parent)
+        self.headers = list(headers)
+        self.rows = RowStore()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        return str(row[index.column()]) if index.column() < len(row) else None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows.clear()
+        self.rows.extend(rows)
+        self.endResetModel()
+
+    def append_rows(self, rows):
+        rows = [tuple(r) for r in rows]
+        if not rows:
+            return
+        start = len(self.rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    def row(self, index):
+        return self.rows[index]
+
+
+def create_table(headers, select_rows=True):
+    """A QTableView over a RowTableModel with fixed-height rows, so large lists never measure every row."""
+    table = QTableView()
+    table.setModel(RowTableModel(headers, table))
+    table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+    table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+    table.verticalHeader().setDefaultSectionSize(24)
+    if select_rows:
+        table.setSelectionBehavior(QTableView.SelectRows)
+        table.setSelectionMode(QTableView.SingleSelection)
+    return table
+
+
+def selected_row(table):
+    """The row behind the current selection of a create_table() view, or None."""
+    rows = table.selectionModel().selectedRows()
+    return table.model().row(rows[0].row()) if rows else None
+
 
 class LoginDialog(QDialog):
     def __init__(self):
@@ -104,18 +205,16 @@ class LoginDialog(QDialog):
             QMessageBox.warning(self, "Input Error", "Please enter username and password.")
             return
         
-        query = f"SELECT password_hash FROM USERS WHERE username = '{user}'"
-        data, msg = self.db.fetch_results(query)
-        
-        if data and data[1]:
-            db_hash = data[1][0][0]
-            if db_hash == pwd:
-                self.logged_in = True
-                self.accept()
-            else:
-                QMessageBox.critical(self, "Login Failed", "Invalid password.")
+        # Call SP_AuthenticateUser, which checks the password on the server
+        data, msg = self.db.fetch_results(statements.LOGIN, (user, pwd))
+
+        if data and data[1] and data[1][0][0]:
+            self.logged_in = True
+            self.accept()
+        elif data is None:
+            QMessageBox.critical(self, "Login Error", msg)
         else:
-            QMessageBox.critical(self, "Login Failed", "User not found. Please Register.")
+            QMessageBox.critical(self, "Login Failed", "Invalid username or password.")
     
     def do_register(self):
         user = self.reg_user.text().strip()
@@ -130,21 +229,90 @@ class LoginDialog(QDialog):
             QMessageBox.critical(self, "Validation Error", "Email must contain '@' and '.'.")
             return
         
-        query = "INSERT INTO USERS (username, password_hash, email, role) VALUES (?, ?, ?, 'Customer')"
-        if self.db.execute_commit(query, (user, pwd, email)):
+        # Call SP_RegisterUser, which rejects a taken username or email
+        data, msg = self.db.fetch_results(statements.REGISTER_USER, (user, pwd, email), idempotent=False)
+        if data and data[1]:
             QMessageBox.information(self, "Success", "Registration Successful! Please Login.")
         else:
-            QMessageBox.critical(self, "Error", "Registration failed.")
+            QMessageBox.critical(self, "Error", f"Registration failed: {msg}")
+
+
+class SeatPickerDialog(QDialog):
+    """Seat map of one flight as a grid of buttons; only free seats of the booked class can be picked."""
+
+    STYLES = {
+        "free": "background-color: #d4edda;",
+        "taken": "background-color: #adb5bd; color: #495057;",
+        "other": "background-color: #f1f3f5; color: #ced4da;",
+        "selected": f"background-color: {COLOR_PRIMARY}; color: white; font-weight: bold;",
+    }
+
+    def __init__(self, seat_map, class_type, selected=None, parent=None):
+        super().__init__(parent)
+        self.seat = selected
+        layout = seat_map.layout
+        self.setWindowTitle(f"Choose a {class_type} Seat")
+        self.resize(420, 560)
+
+        outer = QVBoxLayout(self)
+        outer.addWidget(QLabel(f"{seat_map.free_count(class_type)} {class_type} seats free - click one to choose it"))
+        grid = QGridLayout()
+        grid.setSpacing(2)
+        selected_button = None
+        for r, (row, row_class, cells) in enumerate(layout.rows):
+            grid.addWidget(QLabel(str(row)), r, 0)
+            for c, i in enumerate(cells):
+                if i is None:
+                    continue
+                label = layout.labels[i]
+                if row_class != class_type:
+                    state = "other"
+                elif label == selected:
+                    state = "selected"
+                else:
+                    state = "free" if seat_map.is_free(label) else "taken"
+                button = QPushButton(label[-1])
+                button.setFixedSize(26, 24)
+                button.setToolTip(f"{label} ({row_class})")
+                button.setStyleSheet(self.STYLES[state])
+                button.setEnabled(state in ("free", "selected"))
+                button.clicked.connect(lambda checked=False, seat=label: self.pick(seat))
+                grid.addWidget(button, r, c + 1)
+                if state == "selected":
+                    selected_button = button
+
+        content = QWidget()
+        content.setLayout(grid)
+        scroll = QScrollArea()
+        scroll.setWidget(content)
+        outer.addWidget(scroll)
+        if selected_button is not None:
+            scroll.ensureWidgetVisible(selected_button)
+
+    def pick(self, seat):
+        self.seat = seat
+        self.accept()
 
 
 class BookingDialog(QDialog):
-    def __init__(self, db, flight_data, parent=None):
+    def __init__(self, db, worker, flight_data, parent=None):
         super().__init__(parent)
         self.db = db
+        self.worker = worker
         self.flight_data = flight_data
         self.flight_id = flight_data[0]
         self.base_price = float(flight_data[6])
+        self.quotes = {}  # class -> (price, seats left) from FN_ClassQuotes, filled in by the background prefetch
+        self.seat_map = None  # The flight's SeatMap; until it loads the server picks the seat
+        self.seat = None
         self.init_ui()
+        # Price and seats for all three classes in one query; changing class needs no further query
+        self.worker.submit(f"quote-{id(self)}", class_quotes, self.db, [int(self.flight_id)],
+                           on_result=self.show_quotes,
+                           on_error=lambda e: self.seats_label.setText("Availability check failed"))
+        self.worker.submit(f"seats-{id(self)}", load_seat_map, self.db, int(self.flight_id),
+                           on_result=self.show_seat_map,
+                           on_error=lambda e: self.seat_label.setText("Assigned at booking (seat map unavailable)"))
     
     def init_ui(self):
         self.setWindowTitle(f"Book Flight {self.flight_data[2]}")
@@ -173,9 +341,14 @@ class BookingDialog(QDialog):
         self.class_combo.currentIndexChanged.connect(self.update_price)
         form.addRow("Class:", self.class_combo)
         
-        self.seat_combo = QComboBox()
-        self.seat_combo.addItems(["1A", "1B", "1C", "2A", "2B", "2C", "3A", "3B"])
-        form.addRow("Seat:", self.seat_combo)
+        seat_row = QHBoxLayout()
+        self.seat_label = QLabel("Loading seat map...")
+        self.btn_seat = QPushButton("Choose...")
+        self.btn_seat.setEnabled(False)
+        self.btn_seat.clicked.connect(self.open_seat_picker)
+        seat_row.addWidget(self.seat_label, 1)
+        seat_row.addWidget(self.btn_seat)
+        form.addRow("Seat:", seat_row)
         
         passenger_group.setLayout(form)
         layout.addWidget(passenger_group)
@@ -203,14 +376,18 @@ class BookingDialog(QDialog):
         self.price_label.setAlignment(Qt.AlignCenter)
         layout.addWidget(self.price_label)
         
+        self.seats_label = QLabel("Checking availability...")
+        self.seats_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.seats_label)
+        
         # Buttons
         btn_layout = QHBoxLayout()
-        btn_book = QPushButton("Confirm & Pay")
-        btn_book.setStyleSheet(f"background-color: {COLOR_PRIMARY}; color: white; padding: 10px; font-weight: bold;")
-        btn_book.clicked.connect(self.book_flight)
+        self.btn_book = QPushButton("Confirm & Pay")
+        self.btn_book.setStyleSheet(f"background-color: {COLOR_PRIMARY}; color: white; padding: 10px; font-weight: bold;")
+        self.btn_book.clicked.connect(self.book_flight)
         btn_cancel = QPushButton("Cancel")
         btn_cancel.clicked.connect(self.reject)
-        btn_layout.addWidget(btn_book)
+        btn_layout.addWidget(self.btn_book)
         btn_layout.addWidget(btn_cancel)
         layout.addLayout(btn_layout)
         
@@ -220,8 +397,47 @@ class BookingDialog(QDialog):
     def update_price(self):
         cls = self.class_combo.currentText()
         multipliers = {"Economy": 1.0, "Business": 2.5, "First Class": 4.0}
-        self.final_price = self.base_price * multipliers.get(cls, 1.0)
+        if cls in self.quotes:
+            self.final_price, seats = self.quotes[cls]
+            self.seats_label.setText(f"Seats Available in {cls}: {seats}")
+            self.seats_label.setStyleSheet("color: black;" if seats > 0 else "color: red;")
+        else:
+            self.final_price = self.base_price * multipliers.get(cls, 1.0)
         self.price_label.setText(f"Total Price: ${self.final_price:.2f}")
+        self.pick_seat()
+
+    def choose_seat(self, seat):
+        self.seat = seat
+        self.seat_label.setText(seat or f"Any (no {self.class_combo.currentText()} seat free)")
+
+    def pick_seat(self, preferred=None):
+        """Keep the chosen seat if it is free and in the class, otherwise move to the next best one."""
+        if self.seat_map is not None:
+            self.choose_seat(self.seat_map.next_best(self.class_combo.currentText(), preferred or self.seat))
+
+    def show_seat_map(self, result):
+        seat_map, msg = result
+        if seat_map is None:
+            self.seat_label.setText("Assigned at booking (seat map unavailable)")
+            return
+        self.seat_map = seat_map
+        self.btn_seat.setEnabled(True)
+        self.pick_seat()
+
+    def open_seat_picker(self):
+        dialog = SeatPickerDialog(self.seat_map, self.class_combo.currentText(), self.seat, self)
+        if dialog.exec_() == QDialog.Accepted:
+            self.choose_seat(dialog.seat)
+
+    def show_quotes(self, result):
+        found, msg = result
+        if found is None:
+            self.seats_label.setText("Availability check failed")
+            return
+        self.quotes.update(found.get(int(self.flight_id), {}))
+        if not self.quotes:
+            self.seats_label.setText("Availability unknown")
+        self.update_price()
     
     def book_flight(self):
         fname = self.first_name.text().strip()
@@ -251,41 +467,69 @@ class BookingDialog(QDialog):
             QMessageBox.critical(self, "Error", "Phone must be 11 digits.")
             return
         
-        try:
-            # Insert Passenger
-            p_query = """
-            INSERT INTO PASSENGERS (first_name, last_name, date_of_birth, nationality, passport_number, passport_expiry_date, email, phone_number)
-            VALUES (?, ?, '1990-01-01', 'Unknown', ?, '2030-01-01', ?, ?)
-            """
-            if self.db.execute_commit(p_query, (fname, lname, passport, email, phone)):
-                pid_data, _ = self.db.fetch_results(f"SELECT passenger_id FROM PASSENGERS WHERE passport_number='{passport}'")
-                if pid_data and pid_data[1]:
-                    pid = pid_data[1][0][0]
-                    ref = f"BK{random.randint(10000,99999)}"
-                    
-                    r_query = """
-                    INSERT INTO RESERVATIONS (passenger_id, flight_id, booking_reference, seat_number, class_type, total_price, payment_status)
-                    VALUES (?, ?, ?, ?, ?, ?, 'Pending')
-                    """
-                    if self.db.execute_commit(r_query, (pid, self.flight_id, ref, self.seat_combo.currentText(), cls, self.final_price)):
-                        QMessageBox.information(self, "Success", 
-                            f"Booking Successful!\n\nRef: {ref}\nPrice: ${self.final_price:.2f}\nClass: {cls}")
-                        self.accept()
-                    else:
-                        QMessageBox.critical(self, "Error", "Failed to create reservation.")
+        if card_last4 and (len(card_last4) != 4 or not card_last4.isdigit()):
+            QMessageBox.critical(self, "Error", "Card last 4 digits must be exactly 4 numbers.")
+            return
+        
+        seat = self.seat
+        seat_map = self.seat_map
+
+        # Runs on a worker thread; returns (ok, message) for the dialog to show
+        def run_booking():
+            booking, msg = book(self.db, fname, lname, passport, email, phone, self.flight_id, cls,
+                                seat_number=seat, payment_method=payment_method, card_last_four=card_last4)
+            if booking is None:
+                # Nothing was written: the server rolls the whole booking back
+                if seat and seat_map is not None and "already booked" in msg:
+                    # Someone else took the seat: reload the map and offer the nearest free one
+                    self.seat_map = load_seat_map(self.db, int(self.flight_id))[0] or seat_map
+                    return False, (f"Seat {seat} was just booked by someone else.\n"
+                                   f"The nearest free seat is selected; confirm again to book it.")
+                return False, f"Booking failed:\n{msg}"
+            return True, (f"Booking Successful!\n\nRef: {booking['booking_reference']}\n"
+                          f"Price: ${booking['total_price']:.2f}\nClass: {cls}\n"
+                          f"Payment ID: {booking['payment_id']} ({payment_method})")
+
+        def done(result):
+            ok, text = result
+            if ok:
+                QMessageBox.information(self, "Success", text)
+                self.accept()
             else:
-                QMessageBox.critical(self, "Error", "Failed to register passenger.")
-        except Exception as e:
+                QMessageBox.critical(self, "Error", text)
+                if seat and self.seat_map is not seat_map:
+                    self.pick_seat(seat)  # The nearest free seat to the one that was taken
+                self.btn_book.setEnabled(True)
+
+        def failed(e):
             QMessageBox.critical(self, "Error", str(e))
+            self.btn_book.setEnabled(True)
+
+        # Bookings are never dropped as stale; the button stays disabled until this one finishes
+        self.btn_book.setEnabled(False)
+        self.worker.submit("booking", run_booking, on_result=done, on_error=failed, replace=False)
 
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.db = DatabaseConnection()
-        self.db.connect()
         self.runner = SQLRunner(self.db)
         self.project_dir = os.path.dirname(os.path.abspath(__file__))
+
+        # Database work runs on background threads; results come back through a queued signal
+        self.dispatcher = UiDispatcher()
+        self.worker = DBExecutor(self.dispatcher.post, on_busy=self.show_busy)
+
+        self.pagers = {}          # list name -> (KeysetPager, table)
+        self.pager_controls = {}  # list name -> (previous button, page label, next button)
+
+        # Airports, airlines and aircraft, kept client-side (warm from the last run's snapshot)
+        self.reference = ReferenceCache(self.db, snapshot_path=SNAPSHOT_FILE)
+        # Bookable flights indexed by airport for connecting itineraries (loaded on the first such search)
+        self.network = FlightNetwork(self.db)
+        # Recent direct searches; bookings, cancellations and status changes drop the results they affect
+        self.search_cache = SearchCache()
         self.init_ui()
     
     def init_ui(self):
@@ -313,10 +557,25 @@ class MainWindow(QMainWindow):
         layout.addWidget(tabs)
         
         central.setLayout(layout)
-        
-        # Load initial data
-        self.refresh_flights()
-        self.refresh_bookings()
+
+        # Status bar with a progress indicator while database work is running
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 0)  # Indeterminate
+        self.progress.setMaximumWidth(150)
+        self.progress.hide()
+        self.statusBar().addPermanentWidget(self.progress)
+        # Shown with the progress bar: cancels the statements running on the server
+        self.btn_cancel_queries = QPushButton("Cancel")
+        self.btn_cancel_queries.clicked.connect(self.cancel_queries)
+        self.btn_cancel_queries.hide()
+        self.statusBar().addPermanentWidget(self.btn_cancel_queries)
+        self.statusBar().showMessage("Ready")
+        
+        if self.reference.load_snapshot():
+            self.populate_airports()
+
+        # Connect, then load initial data
+        self.connect_db()
     
     def create_flights_tab(self):
         widget = QWidget()
@@ -356,15 +615,39 @@ class MainWindow(QMainWindow):
         btn_clear.clicked.connect(self.refresh_flights)
         search_layout.addWidget(btn_clear)
         
-        search_group.setLayout(search_layout)
+        # Second row: flexible dates, departure time window, connections
+        options_layout = QHBoxLayout()
+        options_layout.addWidget(QLabel("Flexible:"))
+        self.combo_flex = QComboBox()
+        self.combo_flex.addItems(FLEX_CHOICES)
+        options_layout.addWidget(self.combo_flex)
+        
+        options_layout.addWidget(QLabel("Departure:"))
+        self.combo_window = QComboBox()
+        self.combo_window.addItems(list(TIME_WINDOWS))
+        options_layout.addWidget(self.combo_window)
+        
+        options_layout.addWidget(QLabel("Stops:"))
+        self.combo_stops = QComboBox()
+        self.combo_stops.addItems(STOP_CHOICES)
+        options_layout.addWidget(self.combo_stops)
+        
+        options_layout.addWidget(QLabel("Sort:"))
+        self.combo_sort = QComboBox()
+        self.combo_sort.addItems(list(SORT_CHOICES))
+        options_layout.addWidget(self.combo_sort)
+        options_layout.addStretch()
+        
+        search_rows = QVBoxLayout()
+        search_rows.addLayout(search_layout)
+        search_rows.addLayout(options_layout)
+        search_group.setLayout(search_rows)
         layout.addWidget(search_group)
         
-        # Populate airports
-        self.populate_airports()
-        
         # Buttons
         btn_layout = QHBoxLayout()
         btn_layout.addWidget(QLabel("Available Flights"))
+        btn_layout.addLayout(self.create_pager_controls("flights"))
         btn_layout.addStretch()
         btn_book = QPushButton("✓ Book Selected Flight")
         btn_book.setStyleSheet(f"background-color: {COLOR_PRIMARY}; color: white; padding: 8px;")
@@ -373,13 +656,13 @@ class MainWindow(QMainWindow):
         layout.addLayout(btn_layout)
         
         # Flights Table
-        self.flights_table = QTableWidget()
-        self.flights_table.setColumnCount(9)
-        self.flights_table.setHorizontalHeaderLabels(["ID", "Airline", "Flight No", "Origin", "Dest", "Departure", "Price", "Seats", "Status"])
-        self.flights_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.flights_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.flights_table = create_table(["ID", "Airline", "Flight No", "Origin", "Dest", "Departure", "Price", "Seats", "Status"])
         self.flights_table.doubleClicked.connect(self.book_selected_flight)
         layout.addWidget(self.flights_table)
+        self.pagers["flights"] = (KeysetPager(FLIGHT_COLUMNS, "VW_AvailableFlights",
+                                              key=[("departure_datetime", False), ("flight_id", False)],
+                                              page_size=FLIGHTS_PAGE_SIZE),
+                                  self.flights_table)
         
         widget.setLayout(layout)
         return widget
@@ -390,12 +673,13 @@ class MainWindow(QMainWindow):
         
         layout.addWidget(QLabel("Reservation Details (VW_PassengerReservationDetails)"))
         
-        self.bookings_table = QTableWidget()
-        self.bookings_table.setColumnCount(11)
-        self.bookings_table.setHorizontalHeaderLabels(["ID", "Ref", "Passenger", "Flight", "Airline", "Route", "Seat", "Class", "Status", "Payment", "Amount"])
-        self.bookings_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.bookings_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.bookings_table = create_table(["ID", "Ref", "Passenger", "Flight", "Airline", "Route", "Seat", "Class", "Status", "Payment", "Amount"])
         layout.addWidget(self.bookings_table)
+        # Newest bookings first
+        self.pagers["bookings"] = (KeysetPager(BOOKING_COLUMNS, "VW_PassengerReservationDetails",
+                                               key=[("booking_date", True), ("reservation_id", True)],
+                                               page_size=BOOKINGS_PAGE_SIZE),
+                                   self.bookings_table)
         
         # Action Buttons
         btn_layout = QHBoxLayout()
@@ -403,6 +687,7 @@ class MainWindow(QMainWindow):
         btn_refresh = QPushButton("Refresh Bookings")
         btn_refresh.clicked.connect(self.refresh_bookings)
         btn_layout.addWidget(btn_refresh)
+        btn_layout.addLayout(self.create_pager_controls("bookings"))
 
         btn_cancel = QPushButton("Cancel Reservation")
         btn_cancel.setStyleSheet(f"background-color: #dc3545; color: white; font-weight: bold;") # Red for cancel
@@ -425,18 +710,13 @@ class MainWindow(QMainWindow):
         
         # Airline Performance
         layout.addWidget(QLabel("Airline Performance (VW_AirlinePerformance)"))
-        self.analytics_table1 = QTableWidget()
-        self.analytics_table1.setColumnCount(5)
-        self.analytics_table1.setHorizontalHeaderLabels(["Airline", "Flights", "Passengers", "Occupancy %", "Revenue"])
-        self.analytics_table1.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.analytics_table1 = create_table(["Airline", "Flights", "Passengers", "Occupancy %", "Revenue"], select_rows=False)
         layout.addWidget(self.analytics_table1)
         
         # Flight Statistics
         layout.addWidget(QLabel("Flight Statistics (VW_FlightStatistics)"))
-        self.analytics_table2 = QTableWidget()
-        self.analytics_table2.setColumnCount(8)
-        self.analytics_table2.setHorizontalHeaderLabels(["Flight", "Airline", "Departure", "Total", "Available", "Booked", "Occupancy %", "Revenue"])
-        self.analytics_table2.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.analytics_table2 = create_table(["Flight", "Airline", "Departure", "Total", "Available", "Booked", "Occupancy %", "Revenue"],
+                                             select_rows=False)
         layout.addWidget(self.analytics_table2)
         
         btn_refresh = QPushButton("Refresh Analytics")
@@ -459,11 +739,27 @@ class MainWindow(QMainWindow):
         btn_run_scripts = QPushButton("Run All SQL Scripts")
         btn_run_scripts.clicked.connect(self.run_all_scripts)
         btn_layout.addWidget(btn_run_scripts)
+
+        btn_apply_scripts = QPushButton("Apply Changed SQL Scripts")
+        btn_apply_scripts.clicked.connect(self.apply_changed_scripts)
+        btn_layout.addWidget(btn_apply_scripts)
         
         btn_tables = QPushButton("Show Tables")
         btn_tables.clicked.connect(self.show_tables)
         btn_layout.addWidget(btn_tables)
         
+        btn_reconcile = QPushButton("Reconcile Seats")
+        btn_reconcile.clicked.connect(self.reconcile_seats)
+        btn_layout.addWidget(btn_reconcile)
+
+        btn_expand = QPushButton("Expand Schedules")
+        btn_expand.clicked.connect(self.expand_schedules)
+        btn_layout.addWidget(btn_expand)
+
+        btn_stats = QPushButton("Query Stats")
+        btn_stats.clicked.connect(self.show_query_stats)
+        btn_layout.addWidget(btn_stats)
+        
         layout.addLayout(btn_layout)
         
         self.log_area = QTextEdit()
@@ -475,26 +771,71 @@ class MainWindow(QMainWindow):
         return widget
     
     def populate_airports(self):
-        query = "SELECT airport_id, city + ' (' + airport_code + ')' AS display FROM AIRPORTS WHERE status = 'Operational' ORDER BY city"
-        data, msg = self.db.fetch_results(query)
-        if data and data[1]:
-            self.airport_list = [(row[0], row[1]) for row in data[1]]
-            for aid, display in self.airport_list:
-                self.combo_from.addItem(display, aid)
-                self.combo_to.addItem(display, aid)
+        """Fill the airport combos with operational airports from the reference cache."""
+        airports = self.reference.airports
+        self.combo_from.clear()
+        self.combo_to.clear()
+        for display in airports.labels(status="Operational"):
+            aid = airports.by_label(display)["airport_id"]
+            self.combo_from.addItem(display, aid)
+            self.combo_to.addItem(display, aid)
+
+    def load_reference_data(self, force=False):
+        """Refresh the reference cache in the background (only if expired unless forced), then the combos."""
+        def done(result):
+            success, msg = result
+            if not success:
+                self.log_area.append(msg)
+            self.populate_airports()
+
+        self.worker.submit("airports", self.reference.refresh, force, on_result=done,
+                           on_error=lambda e: self.log_area.append(f"Could not load reference data: {e}"))
     
+    def create_pager_controls(self, name):
+        """Previous/next buttons and a page label for a paged list."""
+        layout = QHBoxLayout()
+        btn_prev = QPushButton("◀ Previous")
+        btn_prev.clicked.connect(lambda: self.load_page(name, PREV))
+        label = QLabel("")
+        label.setMinimumWidth(70)
+        label.setAlignment(Qt.AlignCenter)
+        btn_next = QPushButton("Next ▶")
+        btn_next.clicked.connect(lambda: self.load_page(name, NEXT))
+        for w in (btn_prev, label, btn_next):
+            layout.addWidget(w)
+        btn_prev.setEnabled(False)
+        btn_next.setEnabled(False)
+        self.pager_controls[name] = (btn_prev, label, btn_next)
+        return layout
+
+    def update_pager_controls(self, name, paged=True):
+        btn_prev, label, btn_next = self.pager_controls[name]
+        pager = self.pagers[name][0]
+        # Search results are not paged
+        btn_prev.setEnabled(paged and pager.has_prev)
+        btn_next.setEnabled(paged and pager.has_next)
+        label.setText(pager.label() if paged and pager.page_number else "")
+
+    def load_page(self, name, direction=FIRST):
+        """Fetch a page of a paged list on the worker and show it."""
+        pager, table = self.pagers[name]
+        sql, params = pager.request(direction)
+
+        def show(result):
+            data, msg = result
+            if data is None:
+                self.log_area.append(f"Query failed: {msg}")
+                return
+            rows = pager.accept(direction, data[1])
+            if rows is not None:
+                table.model().set_rows(rows)
+            self.update_pager_controls(name)
+
+        self.worker.submit(name, self.db.fetch_results, sql, params, on_result=show,
+                           on_error=lambda e: self.log_area.append(f"Query failed: {e}"))
+
     def refresh_flights(self):
-        self.flights_table.setRowCount(0)
-        query = """SELECT flight_id, airline_name, flight_number, departure_city, arrival_city, 
-                   departure_datetime, base_price, available_seats, status 
-                   FROM VW_AvailableFlights ORDER BY departure_datetime"""
-        data, msg = self.db.fetch_results(query)
-        if data and data[1]:
-            for row in data[1]:
-                row_pos = self.flights_table.rowCount()
-                self.flights_table.insertRow(row_pos)
-                for col, val in enumerate(row):
-                    self.flights_table.setItem(row_pos, col, QTableWidgetItem(str(val)))
+        self.load_page("flights")
     
     def search_flights(self):
         from_idx = self.combo_from.currentIndex()
@@ -521,105 +862,224 @@ class MainWindow(QMainWindow):
         dep_id = self.combo_from.currentData()
         arr_id = self.combo_to.currentData()
         
-        self.flights_table.setRowCount(0)
-        query = "EXEC SP_SearchFlights @departure_airport_id=?, @arrival_airport_id=?, @travel_date=?"
-        data, msg = self.db.fetch_results(query, (dep_id, arr_id, travel_date))
-        if data and data[1]:
-            for row in data[1]:
-                row_pos = self.flights_table.rowCount()
-                self.flights_table.insertRow(row_pos)
-                display_row = [row[0], row[2], row[1], row[5], row[7], row[8], row[11], row[12], row[14]]
-                for col, val in enumerate(display_row):
-                    self.flights_table.setItem(row_pos, col, QTableWidgetItem(str(val)))
-        else:
-            QMessageBox.information(self, "No Results", "No flights found.")
+        class_type = self.combo_class.currentText()
+        flex = flex_for(self.combo_flex.currentText())
+        window = self.combo_window.currentText()
+        max_legs = self.combo_stops.currentIndex() + 1
+        if max_legs > 1:
+            self.search_itineraries(dep_id, arr_id, travel_date, class_type, flex, window, max_legs)
+            return
+
+        def show(result):
+            data, msg = result
+            if data and data[1]:
+                display_rows = grid_rows(data, class_type)
+                self.flights_table.model().set_rows(display_rows)
+                self.update_pager_controls("flights", paged=False)
+                source = " (from cache)" if msg.endswith("(cached)") else ""
+                self.log_area.append(f"Search found {len(data[1])} flights{source}. {self.search_cache.summary()}")
+            else:
+                self.flights_table.model().set_rows(())
+                self.update_pager_controls("flights", paged=False)
+                QMessageBox.information(self, "No Results", "No flights found.")
+
+        # Same key as refresh_flights: a new search replaces a list that is still loading
+        self.worker.submit("flights", search, self.db, dep_id, arr_id, travel_date, class_type, flex, window,
+                           self.search_cache, on_result=show,
+                           on_error=lambda e: QMessageBox.critical(self, "Search Error", str(e)))
     
+    def search_itineraries(self, dep_id, arr_id, travel_date, class_type, flex, window, max_legs):
+        """Connecting itineraries from the in-memory flight network, one table row per leg."""
+        earliest, latest = TIME_WINDOWS.get(window, (None, None))
+        sort = SORT_CHOICES.get(self.combo_sort.currentText(), "duration")
+
+        def city(airport_id):
+            airport = self.reference.airports.get(airport_id)
+            return airport["city"] if airport else airport_id
+
+        def show(result):
+            trips, msg = result
+            if trips is None:
+                QMessageBox.critical(self, "Search Error", msg)
+                return
+            self.flights_table.model().set_rows(leg_rows(trips, class_type, city))
+            self.update_pager_controls("flights", paged=False)
+            if trips:
+                self.log_area.append(f"{msg} Best: {describe(trips[0])}.")
+            else:
+                QMessageBox.information(self, "No Results", "No flights or connections found.")
+
+        def run():
+            return self.network.search(dep_id, arr_id, travel_date, class_type, flex, earliest, latest,
+                                       max_legs=max_legs, sort=sort)
+
+        self.worker.submit("flights", run, on_result=show,
+                           on_error=lambda e: QMessageBox.critical(self, "Search Error", str(e)))
+
     def book_selected_flight(self):
-        selected = self.flights_table.selectedItems()
-        if not selected:
+        row = selected_row(self.flights_table)
+        if row is None:
             QMessageBox.warning(self, "Selection", "Please select a flight.")
             return
         
-        row = self.flights_table.currentRow()
-        flight_data = [self.flights_table.item(row, col).text() for col in range(9)]
+        flight_data = [str(val) for val in row[:9]]
         
-        dialog = BookingDialog(self.db, flight_data, self)
+        dialog = BookingDialog(self.db, self.worker, flight_data, self)
         if dialog.exec_() == QDialog.Accepted:
+            self.network.invalidate()  # Seat counts changed
+            self.drop_cached_searches(int(row[0]))
             self.refresh_flights()
             self.refresh_bookings()
     
     def refresh_bookings(self):
-        self.bookings_table.setRowCount(0)
-        query = """SELECT TOP 20 reservation_id, booking_reference, passenger_name, flight_number, 
-                   airline_name, departure_city + ' → ' + arrival_city, seat_number, class_type,
-                   reservation_status, payment_status, total_price
-                   FROM VW_PassengerReservationDetails ORDER BY booking_date DESC"""
-        data, msg = self.db.fetch_results(query)
-        if data and data[1]:
-            for row in data[1]:
-                row_pos = self.bookings_table.rowCount()
-                self.bookings_table.insertRow(row_pos)
-                for col, val in enumerate(row):
-                    self.bookings_table.setItem(row_pos, col, QTableWidgetItem(str(val)))
+        self.load_page("bookings")
     
     def refresh_analytics(self):
-        # Airline Performance
-        self.analytics_table1.setRowCount(0)
-        q1 = "SELECT airline_name, total_flights, total_passengers, avg_occupancy_rate, total_revenue FROM VW_AirlinePerformance"
-        d1, _ = self.db.fetch_results(q1)
-        if d1 and d1[1]:
-            for row in d1[1]:
-                row_pos = self.analytics_table1.rowCount()
-                self.analytics_table1.insertRow(row_pos)
-                for col, val in enumerate(row):
-                    self.analytics_table1.setItem(row_pos, col, QTableWidgetItem(str(val)))
-        
-        # Flight Statistics
-        self.analytics_table2.setRowCount(0)
-        q2 = """SELECT flight_number, airline_name, departure_datetime, total_seats, available_seats,
-                booked_seats, occupancy_percentage, total_revenue FROM VW_FlightStatistics"""
-        d2, _ = self.db.fetch_results(q2)
-        if d2 and d2[1]:
-            for row in d2[1]:
-                row_pos = self.analytics_table2.rowCount()
-                self.analytics_table2.insertRow(row_pos)
-                for col, val in enumerate(row):
-                    self.analytics_table2.setItem(row_pos, col, QTableWidgetItem(str(val)))
+        # Airline Performance and Flight Statistics in one round trip (statements.ANALYTICS_WITHOUT_REVENUE)
+
+        def show(result):
+            data, msg = result
+            if not data:
+                self.log_area.append(f"Analytics unavailable: {msg}")
+                return
+            for table, (columns, rows) in zip((self.analytics_table1, self.analytics_table2), data):
+                table.model().set_rows(rows)
+
+        self.worker.submit("analytics", lambda: self.db.fetch_all_results(statements.ANALYTICS_WITHOUT_REVENUE,
+                                                                      max_rows=STREAM_MAX_ROWS, query_class="analytics"),
+                           on_result=show, on_error=lambda e: self.log_area.append(f"Analytics unavailable: {e}"))
     
+    def drop_cached_searches(self, flight_id, route=None, departure=None):
+        """Invalidate cached search results after a change to one flight and note it in the admin log."""
+        dropped = self.search_cache.invalidate_flight(flight_id, route, departure)
+        if dropped:
+            self.log_area.append(f"Flight {flight_id} changed: dropped {dropped} cached search(es). "
+                                 f"{self.search_cache.summary()}")
+
+    def show_busy(self, keys):
+        if keys:
+            self.statusBar().showMessage("Working: " + ", ".join(keys))
+            self.progress.show()
+            self.btn_cancel_queries.show()
+        else:
+            self.statusBar().showMessage("Ready")
+            self.progress.hide()
+            self.btn_cancel_queries.hide()
+
+    def cancel_queries(self):
+        """Cancel the statements running now; their tasks end with a "cancelled" error"""
+        count = self.db.cancel()
+        self.log_area.append(f"Cancelled {count} running statement(s)." if count else "No statement running to cancel.")
+
     def connect_db(self):
-        success, msg = self.db.connect()
-        self.log_area.append(msg)
-        if success:
-            self.refresh_flights()
+        def connected(result):
+            success, msg = result
+            self.log_area.append(msg)
+            if success:
+                self.load_reference_data()
+                self.refresh_flights()
+                self.refresh_bookings()
+
+        self.worker.submit("connect", self.db.connect, on_result=connected,
+                           on_error=lambda e: self.log_area.append(f"Connection failed: {e}"))
     
     def run_all_scripts(self):
         reply = QMessageBox.question(self, "Confirm", "This will reset the database. Continue?")
         if reply == QMessageBox.Yes:
             self.log_area.append("Running scripts...")
-            success, msg = self.runner.run_all_scripts(self.project_dir)
+            self.submit_scripts(incremental=False)
+
+    def apply_changed_scripts(self):
+        self.log_area.append("Applying new and changed script batches...")
+        self.submit_scripts(incremental=True)
+
+    def submit_scripts(self, incremental):
+        def run():
+            result = self.runner.run_all_scripts(self.project_dir, incremental=incremental)
+            # A full run drops the database under the pooled connections
+            if not incremental:
+                self.db.connect()
+            return result
+
+        def done(result):
+            success, msg = result
             self.log_area.append(msg)
-            self.db.connect()
+            # Fresh data from the scripts replaces whatever reference data was cached
+            self.reference.invalidate()
+            self.network.invalidate()
+            self.search_cache.clear()
+            self.load_reference_data()
             self.refresh_flights()
+
+        self.worker.submit("admin", run, on_result=done, replace=False,
+                           on_error=lambda e: self.log_area.append(f"Scripts failed: {e}"))
     
     def show_tables(self):
-        query = "SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE='BASE TABLE'"
-        data, msg = self.db.fetch_results(query)
-        if data and data[1]:
-            self.log_area.append("Tables found:")
-            for r in data[1]:
-                self.log_area.append(f"  - {r[0]}")
+        def show(result):
+            data, msg = result
+            if data and data[1]:
+                self.log_area.append("Tables found:")
+                for r in data[1]:
+                    self.log_area.append(f"  - {r[0]}")
+
+        self.worker.submit("admin-log", lambda: self.db.fetch_results(statements.LIST_TABLES, query_class="admin"),
+                           on_result=show)
+
+    def reconcile_seats(self):
+        """Check every flight's seat counter against its reservations and repair drift."""
+        def show(result):
+            drifted, msg = result
+            self.log_area.append(msg)
+            for flight_id, recorded, expected, repaired in drifted or ():
+                self.log_area.append(f"  Flight {flight_id}: {recorded} -> {expected} available seats"
+                                 + ("" if repaired else " (not changed)"))
+            if drifted:
+                self.network.invalidate()
+                self.search_cache.clear()
+                self.refresh_flights()
+
+        self.worker.submit("admin", reconcile_seats, self.db, on_result=show, replace=False,
+                           on_error=lambda e: self.log_area.append(f"Seat reconciliation failed: {e}"))
+
+    def expand_schedules(self):
+        """Create and update the flights of the recurring schedules up to the horizon."""
+        def show(result):
+            counts, msg = result
+            self.log_area.append(msg)
+            if counts and counts["inserted"] + counts["updated"] + counts["deleted"] + counts["cancelled"]:
+                self.network.invalidate()
+                self.search_cache.clear()
+                self.refresh_flights()
+
+        self.worker.submit("admin", expand_schedules, self.db, on_result=show, replace=False,
+                           on_error=lambda e: self.log_area.append(f"Schedule expansion failed: {e}"))
+
+    def show_query_stats(self):
+        """Log the statements that took the most time in total, the latest slow calls and plan reuse."""
+        if self.db.query_stats is None:
+            self.log_area.append("Query statistics are turned off.")
+        else:
+            for line in self.db.query_stats.report():
+                self.log_area.append(line)
+        self.log_area.append(f"Retries: {self.db.retry_stats()}")
+
+        def show(result):
+            lines, msg = result
+            for line in lines or [msg]:
+                self.log_area.append(line)
+
+        self.worker.submit("admin-log", statements.plan_cache_report, self.db, on_result=show)
 
     def action_cancel(self):
-        selected = self.bookings_table.selectedItems()
-        if not selected:
+        row = selected_row(self.bookings_table)
+        if row is None:
             QMessageBox.warning(self, "Selection", "Please select a reservation to cancel.")
             return
 
-        row = self.bookings_table.currentRow()
         # Columns: ["ID", "Ref", "Passenger", "Flight", "Airline", "Route", "Seat", "Class", "Status", "Payment", "Amount"]
         # ID is at index 0, Status is at index 8
-        res_id = self.bookings_table.item(row, 0).text()
-        status = self.bookings_table.item(row, 8).text()
+        res_id = row[0]
+        status = row[8]
 
         if status == 'Cancelled':
             QMessageBox.information(self, "Info", "Already cancelled.")
@@ -629,58 +1089,53 @@ class MainWindow(QMainWindow):
                                      QMessageBox.Yes | QMessageBox.No)
         
         if reply == QMessageBox.Yes:
-            try:
-                # Call SP_CancelReservation
-                sql = """\
-                DECLARE @refund DECIMAL(10,2);
-                EXEC SP_CancelReservation ?, 'User Requested', @refund OUTPUT;
-                SELECT @refund;
-                """
-                data, msg = self.db.fetch_results(sql, (res_id,))
-                
+            # Call SP_CancelReservation; the flight comes back too so cached searches can be dropped
+
+            def show(result):
+                data, msg = result
                 if data and data[1]:
-                    refund = data[1][0][0]
+                    refund, flight_id, dep_id, arr_id, departure = data[1][0]
+                    # A freed seat can put a sold-out flight back into search results
+                    self.network.invalidate()
+                    self.drop_cached_searches(flight_id, (dep_id, arr_id), departure)
                     QMessageBox.information(self, "Cancelled", f"Reservation Cancelled.\nRefund Amount: ${refund}")
-                    self.refresh_bookings()
+                    self.load_page("bookings", CURRENT)
                     self.refresh_analytics()
                 else:
                      QMessageBox.critical(self, "Error", f"Cancellation failed: {msg}")
 
-            except Exception as e:
-                 QMessageBox.critical(self, "Error", str(e))
+            self.worker.submit("reservations",
+                               lambda: self.db.fetch_results(statements.CANCEL_RESERVATION, (res_id, res_id),
+                                                             idempotent=False),
+                               on_result=show, replace=False,
+                               on_error=lambda e: QMessageBox.critical(self, "Error", str(e)))
 
     def action_checkin(self):
-        selected = self.bookings_table.selectedItems()
-        if not selected:
+        row = selected_row(self.bookings_table)
+        if row is None:
             QMessageBox.warning(self, "Selection", "Please select a reservation to check-in.")
             return
 
-        row = self.bookings_table.currentRow()
-        res_id = self.bookings_table.item(row, 0).text()
-        status = self.bookings_table.item(row, 8).text()
+        res_id = row[0]
+        status = row[8]
 
         if status == 'Cancelled':
             QMessageBox.critical(self, "Error", "Cannot check-in a cancelled reservation.")
             return
 
-        try:
-            # Call SP_CheckInPassenger
-            sql = """
-            DECLARE @info VARCHAR(MAX);
-            EXEC SP_CheckInPassenger ?, @info OUTPUT;
-            SELECT @info;
-            """
-            data, msg = self.db.fetch_results(sql, (res_id,))
-            
+        # Call SP_CheckInPassenger (statements.CHECK_IN)
+        def show(result):
+            data, msg = result
             if data and data[1] and data[1][0][0]:
                 pass_info = data[1][0][0]
                 QMessageBox.information(self, "Boarding Pass", pass_info)
-                self.refresh_bookings()
+                self.load_page("bookings", CURRENT)
             else:
                  QMessageBox.critical(self, "Error", f"Check-in failed: {msg}")
 
-        except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
+        self.worker.submit("reservations", lambda: self.db.fetch_results(statements.CHECK_IN, (res_id,), idempotent=False),
+                           on_result=show, replace=False,
+                           on_error=lambda e: QMessageBox.critical(self, "Error", str(e)))
 
 
 def main():
@@ -688,7 +1143,10 @@ def main():
     
     # Show login dialog first
     login = LoginDialog()
-    if login.exec_() == QDialog.Accepted and login.logged_in:
+    accepted = login.exec_() == QDialog.Accepted
+    # The main window opens its own pool; the dialog's would stay open for the whole session
+    login.db.disconnect()
+    if accepted and login.logged_in:
         # Show main window
         window = MainWindow()
         window.show()
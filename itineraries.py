@@ -0,0 +1,293 @@
+"""Connecting itinerary search over an in-memory index of bookable flights.
+
+SP_SearchFlights only returns direct flights. FlightNetwork loads every
+scheduled flight with free seats once, groups them by departure airport in
+departure order, and answers "A to B with up to two stops" by walking that
+index: each connection is a bisect into the next airport's departures
+between the minimum and maximum connection time, so a search costs
+milliseconds however many flights are loaded.
+
+    network = FlightNetwork(db)
+    itineraries, msg = network.search(lhe_id, jfk_id, "2025-01-15", max_legs=3, sort="price")
+    for trip in itineraries:
+        print(trip.duration_minutes, trip.price, [leg.flight_number for leg in trip.legs])
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from booking import CLASS_TYPES
+from statements import register
+
+DEFAULT_TTL = 300.0          # seconds; seat counts go stale, so this is shorter than the reference cache's
+MIN_CONNECTION = 45          # minutes between arriving and the next departure
+MIN_LEAD = 60                # minutes before departure a flight can still start a trip
+MAX_CONNECTION = 12 * 60
+MAX_LEGS = 3
+RESULT_LIMIT = 50
+
+SORT_KEYS = ("duration", "price")
+
+# Search panel choices: stops -> max_legs is index + 1; sort label -> sort key
+STOP_CHOICES = ["Direct only", "Up to 1 stop", "Up to 2 stops"]
+SORT_CHOICES = {"Shortest": "duration", "Cheapest": "price"}
+
+# Each class's quoted price and free seats, pivoted from FN_ClassQuotes as SP_SearchFlights does
+FLIGHTS_SQL = register("network_flights", """
+SELECT f.flight_id, f.flight_number, al.airline_name, f.departure_airport_id, f.arrival_airport_id,
+       f.departure_datetime, f.arrival_datetime, f.base_price, f.available_seats,
+       q.economy_price, q.economy_seats, q.business_price, q.business_seats,
+       q.first_class_price, q.first_class_seats
+FROM FLIGHTS f
+INNER JOIN AIRLINES al ON f.airline_id = al.airline_id
+CROSS APPLY (
+    SELECT
+        MAX(CASE WHEN cq.class_type = 'Economy' THEN cq.price END) AS economy_price,
+        MAX(CASE WHEN cq.class_type = 'Economy' THEN cq.available_class_seats END) AS economy_seats,
+        MAX(CASE WHEN cq.class_type = 'Business' THEN cq.price END) AS business_price,
+        MAX(CASE WHEN cq.class_type = 'Business' THEN cq.available_class_seats END) AS business_seats,
+        MAX(CASE WHEN cq.class_type = 'First Class' THEN cq.price END) AS first_class_price,
+        MAX(CASE WHEN cq.class_type = 'First Class' THEN cq.available_class_seats END) AS first_class_seats
+    FROM dbo.FN_ClassQuotes(GETDATE()) cq
+    WHERE cq.flight_id = f.flight_id
+) q
+WHERE f.status IN ('Scheduled', 'Boarding')
+    AND f.available_seats > 0
+    AND f.departure_datetime >= ?
+ORDER BY f.departure_datetime, f.flight_id
+""")
+
+# quotes: class type -> (quoted price, free seats in that class), as booking.class_quotes() returns them
+Leg = namedtuple("Leg", "flight_id flight_number airline_name departure_airport_id arrival_airport_id "
+                        "departure arrival base_price available_seats quotes")
+
+
+def quoted_class(class_type):
+    """The class whose quote a search for class_type shows: Economy for "Any" or none."""
+    return class_type if class_type in CLASS_TYPES else "Economy"
+
+
+def as_datetime(value):
+    """Driver datetimes pass through; ISO strings (sqlite, CSV) are parsed."""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+class Itinerary:
+    """One to MAX_LEGS flights where each leg leaves from where the previous one landed.
+
+    price is the sum of the legs' quoted prices in class_type (Economy for
+    any class); available_seats counts seats in class_type, or on the whole
+    flight for any class.
+    """
+
+    def __init__(self, legs, class_type=None):
+        self.legs = list(legs)
+        quoted = quoted_class(class_type)
+        self.price = round(sum(leg.quotes[quoted][0] for leg in self.legs), 2)
+        self.departure = self.legs[0].departure
+        self.arrival = self.legs[-1].arrival
+        self.duration_minutes = int((self.arrival - self.departure).total_seconds() // 60)
+        self.layovers = [int((b.departure - a.arrival).total_seconds() // 60)
+                         for a, b in zip(self.legs, self.legs[1:])]
+        self.available_seats = min(_seats(leg, class_type) for leg in self.legs)
+
+    @property
+    def stops(self):
+        return len(self.legs) - 1
+
+    def sort_key(self, sort):
+        if sort == "price":
+            return self.price, self.duration_minutes, self.departure
+        return self.duration_minutes, self.price, self.departure
+
+
+def leg_rows(itineraries, class_type, city):
+    """Flights-grid rows, one per leg, with "Trip n: leg/legs" in the status column.
+
+    Each leg keeps its own flight id, so the usual booking dialog books it.
+    city maps an airport id to the name shown. The price column is the
+    leg's quoted price in class_type and Seats its free seats, as in the
+    direct search grid.
+    """
+    quoted = quoted_class(class_type)
+    rows = []
+    for n, trip in enumerate(itineraries, 1):
+        for i, leg in enumerate(trip.legs, 1):
+            rows.append((leg.flight_id, leg.airline_name, leg.flight_number, city(leg.departure_airport_id),
+                         city(leg.arrival_airport_id), leg.departure, leg.quotes[quoted][0],
+                         _seats(leg, class_type), f"Trip {n}: {i}/{len(trip.legs)}"))
+    return rows
+
+
+def describe(trip):
+    """One-line summary, e.g. "14h05, 1 stop, $812.50"."""
+    hours, minutes = divmod(trip.duration_minutes, 60)
+    stops = "direct" if not trip.stops else f"{trip.stops} stop{'s' if trip.stops > 1 else ''}"
+    return f"{hours}h{minutes:02d}, {stops}, ${trip.price:.2f}"
+
+
+class FlightNetwork:
+    def __init__(self, db, ttl=DEFAULT_TTL, now=datetime.now):
+        self.db = db
+        self.ttl = ttl
+        self.now = now  # clock for the booking cutoff
+        self.loaded_at = None  # time.time() of the index held, None when empty or invalidated
+        self._lock = threading.Lock()
+        self.stats = {"loads": 0, "searches": 0, "flights": 0}
+        self._set_index([])
+
+    @property
+    def fresh(self):
+        loaded_at = self.loaded_at
+        return loaded_at is not None and time.time() - loaded_at < self.ttl
+
+    def refresh(self, force=False):
+        """Reload bookable flights when forced, invalidated or older than the TTL. Returns (success, msg)."""
+        with self._lock:
+            if not force and self.fresh:
+                return True, "Flight network is up to date."
+            # Flights leaving within the lead time cannot be booked, to start a trip or to continue one
+            data, msg = self.db.iter_results(FLIGHTS_SQL, (self.cutoff(),), batch_size=5000, query_class="search")
+            if data is None:
+                return False, f"Could not load flights: {msg}"
+            self.load(data[1])
+            return True, f"Indexed {self.stats['flights']} bookable flights."
+
+    def load(self, rows):
+        """Build the index from FLIGHTS_SQL rows (any iterable, in any order)."""
+        legs = [Leg(r[0], r[1], r[2], r[3], r[4], as_datetime(r[5]), as_datetime(r[6]), r[7], r[8],
+                    {class_type: (float(r[i]), r[i + 1]) for class_type, i in zip(CLASS_TYPES, (9, 11, 13))})
+                for r in rows]
+        self._set_index(legs)
+        self.loaded_at = time.time()
+        self.stats["loads"] += 1
+
+    def cutoff(self):
+        """Earliest departure that can still be booked: now plus MIN_LEAD."""
+        return self.now() + timedelta(minutes=MIN_LEAD)
+
+    def invalidate(self):
+        """Mark the index stale; searches keep using it until the next refresh() replaces it."""
+        self.loaded_at = None
+
+    def search(self, origin, destination, travel_date, class_type=None, flex_days=0, earliest=None, latest=None,
+               max_legs=MAX_LEGS, min_connection=MIN_CONNECTION, max_connection=MAX_CONNECTION,
+               sort="duration", limit=RESULT_LIMIT):
+        """Itineraries from origin to destination whose first leg leaves on travel_date (± flex_days).
+
+        earliest/latest ("HH:MM", latest exclusive) limit the first departure
+        to a time of day like SP_SearchFlights does. Flights leaving before
+        cutoff() are left out, and so are flights with no free seat in
+        class_type when one is given. Results are ranked by
+        sort ("duration" or "price") and cut to limit. Refreshes the index
+        first when it is stale, so call it from a worker thread. Returns
+        (itineraries, msg).
+        """
+        ok, msg = self.refresh()
+        # Snapshot the index: refresh() on another thread swaps in a new one rather than changing this
+        times, legs, feeders = self._index
+        if not ok and not times:
+            return None, msg
+        max_legs = min(max(int(max_legs), 1), MAX_LEGS)
+        day = datetime.strptime(str(travel_date), "%Y-%m-%d")
+        # The index may be up to ttl old, so flights that left since it was loaded are still in it
+        start = max(day - timedelta(days=flex_days), self.cutoff())
+        end = day + timedelta(days=flex_days + 1)
+        window = _time_window(earliest, latest)
+        found = []
+        reach = _reach(feeders, destination, max_legs)
+        gap_min, gap_max = timedelta(minutes=min_connection), timedelta(minutes=max_connection)
+        seated = class_type if class_type in CLASS_TYPES else None
+
+        def extend(path, visited):
+            last = path[-1]
+            if last.arrival_airport_id == destination:
+                found.append(Itinerary(path, class_type))
+                return
+            remaining = max_legs - len(path)
+            if not remaining:
+                return
+            airport = last.arrival_airport_id
+            for leg in _departures(times, legs, airport, last.arrival + gap_min, last.arrival + gap_max):
+                nxt = leg.arrival_airport_id
+                if seated and not leg.quotes[seated][1]:
+                    continue
+                if nxt not in visited and reach.get(nxt, MAX_LEGS) < remaining:
+                    visited.add(nxt)
+                    path.append(leg)
+                    extend(path, visited)
+                    path.pop()
+                    visited.discard(nxt)
+
+        for leg in _departures(times, legs, origin, start, end):
+            if window and not window(leg.departure.time()):
+                continue
+            if seated and not leg.quotes[seated][1]:
+                continue
+            if reach.get(leg.arrival_airport_id, MAX_LEGS) < max_legs:
+                extend([leg], {origin, leg.arrival_airport_id})
+        self.stats["searches"] += 1
+        sort = sort if sort in SORT_KEYS else "duration"
+        results = heapq.nsmallest(limit, found, key=lambda trip: trip.sort_key(sort))
+        return results, f"Found {len(found)} itineraries."
+
+    def _set_index(self, legs):
+        # The index is swapped in one assignment, so searches on other threads never see a half-built one
+        by_airport = {}
+        feeders = {}
+        for leg in sorted(legs, key=lambda l: (l.departure, l.flight_id)):
+            by_airport.setdefault(leg.departure_airport_id, []).append(leg)
+            feeders.setdefault(leg.arrival_airport_id, set()).add(leg.departure_airport_id)
+        times = {airport: [leg.departure for leg in rows] for airport, rows in by_airport.items()}
+        # feeders: arrival airport -> airports with a flight to it
+        self._index = (times, by_airport, feeders)
+        self.stats["flights"] = len(legs)
+
+
+def _seats(leg, class_type):
+    return leg.quotes[class_type][1] if class_type in CLASS_TYPES else leg.available_seats
+
+
+def _departures(times, legs, airport, start, end):
+    """Flights leaving airport in [start, end), in departure order."""
+    rows = legs.get(airport)
+    if not rows:
+        return
+    column = times[airport]
+    for i in range(bisect_left(column, start), len(rows)):
+        if column[i] >= end:
+            break
+        yield rows[i]
+
+
+def _reach(feeders, destination, max_legs):
+    """airport -> fewest legs to destination (ignoring times), for airports within max_legs - 1 legs.
+
+    A breadth-first walk backwards over routes; it lets the search drop a
+    leg at once when the remaining legs cannot reach the destination.
+    """
+    reach = {destination: 0}
+    frontier = [destination]
+    for hops in range(1, max_legs):
+        nxt = []
+        for airport in frontier:
+            for feeder in feeders.get(airport, ()):
+                if feeder not in reach:
+                    reach[feeder] = hops
+                    nxt.append(feeder)
+        frontier = nxt
+    return reach
+
+
+def _time_window(earliest, latest):
+    """Predicate on a departure time for an [earliest, latest) window that may wrap past midnight."""
+    if not earliest and not latest:
+        return None
+    lo = datetime.strptime(earliest, "%H:%M").time() if earliest else None
+    hi = datetime.strptime(latest, "%H:%M").time() if latest else None
+    if lo and hi and lo > hi:
+        return lambda t: t >= lo or t < hi
+    return lambda t: (lo is None or t >= lo) and (hi is None or t < hi)
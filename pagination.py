@@ -0,0 +1,135 @@
+"""Keyset (seek) pagination for the list screens.
+
+A page is fetched with a range predicate on the sort key of the last row
+already shown instead of OFFSET, so every page costs one index seek plus
+page_size rows no matter how deep the user has paged:
+
+    pager = KeysetPager("reservation_id, booking_reference", "RESERVATIONS",
+                        key=[("booking_date", True), ("reservation_id", True)])
+    sql, params = pager.request("next")       # GUI thread
+    data, msg = db.fetch_results(sql, params)  # worker thread
+    rows = pager.accept("next", data[1])       # GUI thread
+"""
+
+PAGE_SIZE = 50
+
+FIRST, NEXT, PREV, CURRENT = "first", "next", "prev", "current"
+
+
+class KeysetPager:
+    """Seek pagination over one listing.
+
+    key is a list of (column, descending) pairs that orders the rows
+    uniquely, so it must end with a unique column such as the primary key;
+    key columns must not be NULL. request() builds the SQL for a page from
+    the boundary keys of the page on screen and accept() adopts the fetched
+    rows. Only accept() changes the pager, so the query itself can run on a
+    worker thread and a dropped result leaves the pager on the page shown.
+    """
+
+    def __init__(self, columns, source, key, where=None, params=(), page_size=PAGE_SIZE):
+        self.columns = columns  # Select list as SQL text
+        self.source = source    # Table, view or join
+        self.key = list(key)
+        self.where = where
+        self.params = tuple(params)
+        self.page_size = page_size
+        self.reset()
+
+    def reset(self):
+        self.page_number = 0
+        self.first_key = None
+        self.last_key = None
+        self.has_prev = False
+        self.has_next = False
+
+    def label(self):
+        return f"Page {self.page_number}" if self.page_number else "No rows"
+
+    def request(self, direction=FIRST):
+        """(sql, params) for the first, next, previous or current page."""
+        if direction == NEXT and self.last_key is None or direction in (PREV, CURRENT) and self.first_key is None:
+            direction = FIRST
+        backwards = direction == PREV
+        conditions = [f"({self.where})"] if self.where else []
+        params = list(self.params)
+        if direction == NEXT:
+            seek, values = self._seek(self.last_key, backwards=False)
+        elif direction == PREV:
+            seek, values = self._seek(self.first_key, backwards=True)
+        elif direction == CURRENT:
+            seek, values = self._seek(self.first_key, backwards=False, inclusive=True)
+        else:
+            seek, values = None, []
+        if seek:
+            conditions.append(seek)
+            params.extend(values)
+
+        key_columns = ", ".join(column for column, _ in self.key)
+        # Reading backwards flips every column's direction; accept() restores the order
+        order = ", ".join(f"{column} {'DESC' if descending != backwards else 'ASC'}"
+                          for column, descending in self.key)
+        sql = f"SELECT TOP ({self.page_size + 1}) {self.columns}, {key_columns} FROM {self.source}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return sql + f" ORDER BY {order}", tuple(params)
+
+    def accept(self, direction, rows):
+        """Adopt rows fetched for request(direction); returns them without the key columns.
+
+        Returns None when a next/previous page turned out to be empty (rows
+        were deleted meanwhile), in which case the current page stays.
+        """
+        if direction == NEXT and self.last_key is None or direction in (PREV, CURRENT) and self.first_key is None:
+            direction = FIRST
+        rows = [tuple(row) for row in rows]
+        more = len(rows) > self.page_size  # One extra row is fetched to tell if another page follows
+        rows = rows[:self.page_size]
+        if direction == PREV:
+            rows.reverse()
+        width = len(self.key)
+
+        if not rows:
+            if direction == NEXT:
+                self.has_next = False
+                return None
+            if direction == PREV:
+                self.has_prev = False
+                return None
+            self.reset()
+            return []
+
+        self.first_key = rows[0][-width:]
+        self.last_key = rows[-1][-width:]
+        if direction == FIRST:
+            self.page_number = 1
+            self.has_prev, self.has_next = False, more
+        elif direction == NEXT:
+            self.page_number += 1
+            self.has_prev, self.has_next = True, more
+        elif direction == PREV:
+            self.page_number = self.page_number - 1 if more else 1
+            self.has_prev, self.has_next = more, True
+        else:
+            self.has_next = more
+        return [row[:-width] for row in rows]
+
+    def _seek(self, values, backwards, inclusive=False):
+        """Predicate for rows strictly after values in key order (before them when backwards).
+
+        Written as a range on the leading column plus the usual OR expansion,
+        so SQL Server can seek on an index that starts with the key columns.
+        """
+        terms = []
+        params = []
+        for i, (column, descending) in enumerate(self.key):
+            op = "<" if descending != backwards else ">"
+            parts = [f"{c} = ?" for c, _ in self.key[:i]] + [f"{column} {op} ?"]
+            terms.append("(" + " AND ".join(parts) + ")")
+            params.extend(values[:i + 1])
+        if inclusive:
+            terms.append("(" + " AND ".join(f"{c} = ?" for c, _ in self.key) + ")")
+            params.extend(values)
+        lead, descending = self.key[0]
+        lead_op = "<=" if descending != backwards else ">="
+        return f"{lead} {lead_op} ? AND ({' OR '.join(terms)})", [values[0]] + params
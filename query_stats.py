@@ -0,0 +1,182 @@
+"""Per-statement timing for DatabaseConnection.
+
+Every call is recorded under the fingerprint of its SQL: the text with
+comments dropped, literals replaced by ?, lists of values folded and
+whitespace collapsed, so one statement run with different values (or with
+values pasted into the text) is one entry:
+
+    fingerprint("SELECT * FROM FLIGHTS WHERE flight_id IN (1, 2, 3) AND status = 'Delayed'")
+    # "SELECT * FROM FLIGHTS WHERE flight_id IN (...) AND status = ?"
+
+Each entry keeps calls, errors (timeouts and cancellations also counted on
+their own), total and maximum time, rows, result sets and a latency
+histogram. Calls slower than slow_threshold also go to a slow-query log, as
+fingerprints and error classes only: values such as passwords never land
+in it, not even echoed in an error message. So do calls that timed out or
+were cancelled, however quick:
+
+    db.query_stats.report()          # top statements by total time, then the slow log
+    db.query_stats.slow_threshold = 0.2
+    db.query_stats = None            # turn recording off
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+
+SLOW_QUERY_SECONDS = 0.5
+SLOW_LOG_SIZE = 200
+# Histogram bucket upper bounds in ms; the last bucket holds everything slower
+LATENCY_BUCKETS_MS = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+# Error classes logged whatever their duration, with their label in the report
+INTERRUPTED = {"timeout": "TIMED OUT", "cancelled": "CANCELLED"}
+
+# Strings first, so quotes and dashes inside them are not read as comments
+_TOKENS = re.compile(r"""
+    (?P<string>N?'(?:[^']|'')*')
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<number>(?<![\w@#$.])(?:0x[0-9A-Fa-f]+|\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)\b)
+""", re.VERBOSE | re.DOTALL)
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROW_LIST = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE = re.compile(r"\s+")
+
+
+def _token(match):
+    return " " if match.group("comment") else "?"
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """sql with comments removed, literals as ?, value lists as (...) and whitespace collapsed."""
+    text = _TOKENS.sub(_token, sql)
+    text = _VALUE_LIST.sub("(...)", text)
+    text = _ROW_LIST.sub("(...)", text)
+    return _SPACE.sub(" ", text).strip().rstrip(";").strip()
+
+
+class StatementStats:
+    """Totals and latency histogram of one fingerprint."""
+
+    __slots__ = ("fingerprint", "calls", "errors", "timeouts", "cancelled", "total", "max", "rows", "result_sets",
+                 "buckets")
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.total = 0.0  # seconds
+        self.max = 0.0
+        self.rows = 0
+        self.result_sets = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    @property
+    def mean(self):
+        return self.total / self.calls if self.calls else 0.0
+
+    def percentile(self, p):
+        """Upper bound in seconds of the histogram bucket holding the p-th percentile call (0 < p <= 100),
+        capped at the slowest call."""
+        if not self.calls:
+            return 0.0
+        rank = max(1, round(self.calls * p / 100))
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(LATENCY_BUCKETS_MS[i] / 1000, self.max) if i < len(LATENCY_BUCKETS_MS) else self.max
+        return self.max
+
+
+class QueryStats:
+    """Thread-safe statement statistics and slow-query log of one DatabaseConnection."""
+
+    def __init__(self, slow_threshold=SLOW_QUERY_SECONDS, slow_log_size=SLOW_LOG_SIZE):
+        self.slow_threshold = slow_threshold
+        # (time, seconds, rows, fingerprint, failed, error class), oldest first
+        self.slow_log = deque(maxlen=slow_log_size)
+        self._entries = {}  # fingerprint -> StatementStats
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def record(self, sql, seconds, rows=0, result_sets=0, error=None, error_class=None):
+        """error_class is the one of database_connection.classify_error(); "timeout" and "cancelled"
+        are counted on their own."""
+        key = fingerprint(sql)
+        bucket = bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = StatementStats(key)
+            entry.calls += 1
+            entry.total += seconds
+            entry.rows += rows
+            entry.result_sets += result_sets
+            entry.buckets[bucket] += 1
+            if seconds > entry.max:
+                entry.max = seconds
+            if error is not None:
+                entry.errors += 1
+            interrupted = error_class in INTERRUPTED
+            if error_class == "timeout":
+                entry.timeouts += 1
+            elif error_class == "cancelled":
+                entry.cancelled += 1
+            if seconds >= self.slow_threshold or interrupted:
+                self.slow_log.append((time.time(), seconds, rows, key, error is not None, error_class))
+
+    def top(self, limit=10, by="total"):
+        """The limit statements with the highest total (or mean, max, calls, rows, timeouts, ...) as StatementStats."""
+        with self._lock:
+            entries = list(self._entries.values())
+        return sorted(entries, key=lambda e: getattr(e, by), reverse=True)[:limit]
+
+    def slow(self, limit=20):
+        """The most recent slow calls, newest first."""
+        with self._lock:
+            return list(self.slow_log)[::-1][:limit]
+
+    def interruptions(self):
+        """{"timeouts": n, "cancelled": n} over all statements."""
+        with self._lock:
+            entries = list(self._entries.values())
+        return {"timeouts": sum(e.timeouts for e in entries), "cancelled": sum(e.cancelled for e in entries)}
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self.slow_log.clear()
+            self.started = time.time()
+
+    def report(self, limit=10, slow_limit=10, width=90):
+        """Report lines: the top statements by total time, then the latest slow, timed-out and cancelled calls."""
+        entries = self.top(limit)
+        since = time.strftime("%H:%M:%S", time.localtime(self.started))
+        if not entries:
+            return [f"No statements recorded since {since}."]
+        lines = [f"Top {len(entries)} statements by total time since {since}:",
+                 f"{'total ms':>10} {'calls':>7} {'mean ms':>8} {'p95 ms':>8} {'max ms':>8} {'rows':>8} "
+                 f"{'err':>4} {'t/o':>4} {'cxl':>4}  statement"]
+        for e in entries:
+            lines.append(f"{e.total * 1000:10.1f} {e.calls:7d} {e.mean * 1000:8.2f} {e.percentile(95) * 1000:8.2f} "
+                         f"{e.max * 1000:8.2f} {e.rows:8d} {e.errors:4d} {e.timeouts:4d} {e.cancelled:4d}  "
+                         f"{_shorten(e.fingerprint, width)}")
+        slow = self.slow(slow_limit)
+        interrupted = self.interruptions()
+        lines.append(f"Timed out: {interrupted['timeouts']}, cancelled: {interrupted['cancelled']}")
+        lines.append(f"Slow, timed-out and cancelled calls (slow >= {self.slow_threshold * 1000:.0f} ms): "
+                     f"{len(self.slow_log)} logged" + (", latest first:" if slow else ""))
+        for at, seconds, rows, key, failed, error_class in slow:
+            failed = f"  {INTERRUPTED[error_class]}" if error_class in INTERRUPTED else "  FAILED" if failed else ""
+            lines.append(f"  {time.strftime('%H:%M:%S', time.localtime(at))} {seconds * 1000:8.1f} ms "
+                         f"{rows:6d} rows  {_shorten(key, width)}{failed}")
+        return lines
+
+
+def _shorten(text, width):
+    return text if len(text) <= width else text[:width - 3] + "..."
@@ -0,0 +1,177 @@
+"""In-process cache of the small reference tables: AIRPORTS, AIRLINES, AIRCRAFT.
+
+All three tables are read in one round trip and indexed by id, code and
+display label, so combo boxes and client-side lookups never go back to the
+database. The cache expires after a TTL, can be invalidated explicitly (e.g.
+after the database is reset) and can be saved to a JSON snapshot so the next
+start has airports to show before the database answers. The snapshot names
+the server and database it was read from and is ignored for any other:
+
+    cache = ReferenceCache(db, snapshot_path=SNAPSHOT_FILE)
+    cache.load_snapshot()          # warm start, no database needed
+    cache.refresh()                # reloads only when missing or expired
+    cache.airports.by_label("Karachi (KHI)")["airport_id"]
+"""
+import json
+import os
+import threading
+import time
+
+from database_connection import PROJECT_DIR
+from statements import register
+
+SNAPSHOT_FILE = os.path.join(PROJECT_DIR, ".reference_data.json")
+DEFAULT_TTL = 3600.0  # seconds
+
+REFERENCE_BATCH = register("reference_data", """
+SELECT airport_id, airport_code, airport_name, city, country, timezone, status
+FROM AIRPORTS ORDER BY city, airport_code;
+
+SELECT airline_id, airline_code, airline_name, country, status
+FROM AIRLINES ORDER BY airline_name;
+
+SELECT aircraft_id, airline_id, registration_number, aircraft_model, total_seats,
+       economy_seats, business_seats, first_class_seats, status
+FROM AIRCRAFT ORDER BY registration_number;
+""")
+
+
+def airport_label(row):
+    return f"{row['city']} ({row['airport_code']})"
+
+
+def airline_label(row):
+    return f"{row['airline_name']} ({row['airline_code']})"
+
+
+def aircraft_label(row):
+    return f"{row['aircraft_model']} ({row['registration_number']})"
+
+
+class ReferenceTable:
+    """One reference table as a list of row dicts plus id, code and label indexes."""
+
+    def __init__(self, id_column, code_column, label, rows=()):
+        self.id_column = id_column
+        self.code_column = code_column
+        self.label = label
+        self.rows = [dict(r) for r in rows]
+        self._by_id = {r[id_column]: r for r in self.rows}
+        self._by_code = {str(r[code_column]).upper(): r for r in self.rows}
+        self._by_label = {label(r): r for r in self.rows}
+
+    def get(self, row_id):
+        return self._by_id.get(row_id)
+
+    def by_code(self, code):
+        return self._by_code.get(str(code).strip().upper()) if code is not None else None
+
+    def by_label(self, label):
+        return self._by_label.get(label)
+
+    def labels(self, status=None):
+        """Display labels in table order, optionally only rows with the given status."""
+        return [self.label(r) for r in self.rows if status is None or r.get("status") == status]
+
+    def __len__(self):
+        return len(self.rows)
+
+
+TABLES = {
+    # name -> (id column, code column, label function)
+    "airports": ("airport_id", "airport_code", airport_label),
+    "airlines": ("airline_id", "airline_code", airline_label),
+    "aircraft": ("aircraft_id", "registration_number", aircraft_label),
+}
+
+
+class ReferenceCache:
+    def __init__(self, db, ttl=DEFAULT_TTL, snapshot_path=None):
+        self.db = db
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.loaded_at = None  # time.time() of the data held, None when empty or invalidated
+        self._lock = threading.Lock()
+        self.stats = {"loads": 0, "snapshot_loads": 0}
+        self._set_tables({name: [] for name in TABLES}, None)
+
+    @property
+    def airports(self):
+        return self._tables["airports"]
+
+    @property
+    def airlines(self):
+        return self._tables["airlines"]
+
+    @property
+    def aircraft(self):
+        return self._tables["aircraft"]
+
+    @property
+    def fresh(self):
+        loaded_at = self.loaded_at
+        return loaded_at is not None and time.time() - loaded_at < self.ttl
+
+    def refresh(self, force=False):
+        """Reload from the database when forced, invalidated or older than the TTL. Returns (success, msg)."""
+        if not force and self.fresh:
+            return True, "Reference data is up to date."
+        data, msg = self.db.fetch_all_results(REFERENCE_BATCH)
+        if not data or len(data) < len(TABLES):
+            return False, f"Could not load reference data: {msg}"
+        tables = {}
+        for name, (columns, rows) in zip(TABLES, data):
+            tables[name] = [dict(zip(columns, row)) for row in rows]
+        with self._lock:
+            self._set_tables(tables, time.time())
+            self.stats["loads"] += 1
+        self.save_snapshot()
+        return True, f"Loaded {len(self.airports)} airports, {len(self.airlines)} airlines, {len(self.aircraft)} aircraft."
+
+    def invalidate(self):
+        """Mark the data stale; it stays readable until the next refresh() replaces it."""
+        self.loaded_at = None
+
+    # --- Snapshot ---
+    def _source(self):
+        settings = self.db.settings
+        return {"server": settings["server"], "database": settings["database"]}
+
+    def load_snapshot(self):
+        """Fill the cache from the snapshot file. Returns True if one was read for this server and database."""
+        if not self.snapshot_path:
+            return False
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            tables = {name: snapshot["tables"][name] for name in TABLES}
+            if snapshot["source"] != self._source():
+                return False
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        with self._lock:
+            # Keep the original load time so the TTL still decides when to go back to the database
+            self._set_tables(tables, snapshot.get("saved_at"))
+            self.stats["snapshot_loads"] += 1
+        return True
+
+    def save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        tables = self._tables
+        snapshot = {"saved_at": self.loaded_at, "source": self._source(),
+                    "tables": {name: tables[name].rows for name in TABLES}}
+        try:
+            tmp = self.snapshot_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, default=str)
+            os.replace(tmp, self.snapshot_path)
+        except OSError:
+            pass  # The snapshot is only a start-up optimisation
+
+    def _set_tables(self, tables, loaded_at):
+        # All three tables are built first and swapped in with one assignment, so a reader on
+        # another thread sees either the old set or the new one, never a mix
+        self._tables = {name: ReferenceTable(id_column, code_column, label, tables[name])
+                        for name, (id_column, code_column, label) in TABLES.items()}
+        self.loaded_at = loaded_at
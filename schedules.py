@@ -0,0 +1,105 @@
+"""Recurring flight schedules, expanded into dated FLIGHTS rows.
+
+A row of FLIGHT_SCHEDULES is a pattern such as "PK-301 at 09:00, Mon-Fri,
+1 March to 31 October". SP_ExpandSchedules turns the patterns into dated
+flights from now up to a horizon. It does this in a few set-based
+statements, not one INSERT per flight. Each run adds the days that came
+into the horizon and re-expands only the patterns edited since the last
+run, writing only the flights that changed.
+
+    schedule_id, msg = add_schedule(db, airline_id=1, aircraft_id=2, flight_number="PK-301",
+                                    departure_airport_id=1, arrival_airport_id=4, departure_time="09:00",
+                                    duration_minutes=120, days=days_mask("Mon-Fri"),
+                                    valid_from=date(2025, 3, 1), valid_to=date(2025, 10, 31), base_price=25000)
+    counts, msg = expand_schedules(db)          # HORIZON_DAYS ahead
+
+    python schedules.py [through date] [schedule_id]
+
+Schedule it to run nightly (e.g. a SQL Server Agent job calling
+SP_ExpandSchedules) to keep the horizon rolling.
+"""
+import sys
+from datetime import date, timedelta
+
+from database_connection import DatabaseConnection
+from statements import register
+
+HORIZON_DAYS = 120
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+EXPAND_SQL = register("expand_schedules", "EXEC SP_ExpandSchedules @through=?, @schedule_id=?")
+ADD_SCHEDULE_SQL = register("add_schedule", """
+INSERT INTO FLIGHT_SCHEDULES (airline_id, aircraft_id, flight_number, departure_airport_id, arrival_airport_id,
+    departure_time, duration_minutes, days_of_week, valid_from, valid_to, base_price, gate_number)
+OUTPUT inserted.schedule_id
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+""")
+
+
+def days_mask(text):
+    """FLIGHT_SCHEDULES.days_of_week for "daily", "Mon-Fri", "Mon,Wed,Fri", "Sat-Sun" or "Fri-Mon".
+
+    Raises ValueError for anything else.
+    """
+    text = text.strip()
+    if text.lower() == "daily":
+        return "1" * 7
+    index = {day.lower(): i for i, day in enumerate(WEEKDAYS)}
+    flags = ["0"] * 7
+    for part in text.split(","):
+        ends = [end.strip()[:3].lower() for end in part.split("-")]
+        if len(ends) > 2 or any(end not in index for end in ends):
+            raise ValueError(f"Not a day or range of days: {part.strip()!r}")
+        first, last = index[ends[0]], index[ends[-1]]
+        for i in range((last - first) % 7 + 1):
+            flags[(first + i) % 7] = "1"
+    return "".join(flags)
+
+
+def add_schedule(db, airline_id, aircraft_id, flight_number, departure_airport_id, arrival_airport_id,
+                 departure_time, duration_minutes, days, valid_from, valid_to, base_price, gate_number=None):
+    """Add a pattern; its flights appear at the next expand_schedules(). Returns (schedule_id, msg)."""
+    data, msg = db.fetch_results(ADD_SCHEDULE_SQL, (airline_id, aircraft_id, flight_number, departure_airport_id,
+                                                    arrival_airport_id, departure_time, duration_minutes, days,
+                                                    valid_from, valid_to, base_price, gate_number),
+                                 idempotent=False)
+    if data is None:
+        return None, msg
+    return data[1][0][0], "Schedule added."
+
+
+def expand_schedules(db, through=None, schedule_id=None):
+    """Bring FLIGHTS in line with the patterns up to through (HORIZON_DAYS from today by default).
+
+    Returns (counts, msg); counts has changed_schedules, inserted, updated,
+    deleted, cancelled and conflicts, or is None on failure.
+    """
+    through = through or date.today() + timedelta(days=HORIZON_DAYS)
+    data, msg = db.fetch_results(EXPAND_SQL, (through, schedule_id), idempotent=False, query_class="admin")
+    if data is None:
+        return None, msg
+    counts = dict(zip(data[0], data[1][0]))
+    changed = counts["inserted"] + counts["updated"] + counts["deleted"] + counts["cancelled"]
+    msg = (f"Schedules expanded through {through}: {counts['inserted']} flight(s) added, {counts['updated']} updated, "
+           f"{counts['deleted']} removed, {counts['cancelled']} cancelled" if changed
+           else f"Flights are up to date with the schedules through {through}")
+    if counts["conflicts"]:
+        msg += f"; {counts['conflicts']} conflict(s) left as they were"
+    return counts, msg + "."
+
+
+def main(argv):
+    through = date.fromisoformat(argv[0]) if argv else None
+    schedule_id = int(argv[1]) if len(argv) > 1 else None
+    db = DatabaseConnection()
+    ok, msg = db.connect()
+    print(msg)
+    if not ok:
+        return
+    counts, msg = expand_schedules(db, through, schedule_id)
+    print(msg)
+    db.disconnect()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
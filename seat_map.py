@@ -0,0 +1,198 @@
+"""Seat maps: the cabin layout of a flight's aircraft and which seats are taken.
+
+The layout is derived from the class seat counts in AIRCRAFT, the same way
+FN_SeatLayout does on the server: First Class rows at the front, then
+Business, then Economy, rows numbered from 1 and each cabin's last row
+filled from the left. Occupied seats are kept in a bitmap of one bit per
+seat, so checking a seat costs a dictionary lookup and a bit test.
+
+    seats, msg = load_seat_map(db, flight_id)   # one query
+    seats.is_free("12C")
+    seat = seats.next_best("Economy", preferred="12C")
+    seats.refresh(db)                           # one query again
+"""
+from statements import register
+
+# class -> seat letters across a row, spaces marking the aisles. Economy has
+# two aisles on aircraft with more than WIDE_BODY_ECONOMY economy seats.
+# FN_SeatLayout (SQLQuery_4.sql) must use the same letters.
+CABIN_ORDER = ("First Class", "Business", "Economy")
+CABIN_LETTERS = {"First Class": "AC DF", "Business": "ABC DEF", "Economy": "ABC DEF"}
+WIDE_ECONOMY_LETTERS = "ABC DEFG HK"
+WIDE_BODY_ECONOMY = 200
+
+# Seats holding a place on the flight, as counted by TRG_UpdateAvailableSeats
+SEAT_MAP_SQL = register("seat_map", """
+SELECT ac.economy_seats, ac.business_seats, ac.first_class_seats, r.seat_number, r.class_type
+FROM FLIGHTS f
+INNER JOIN AIRCRAFT ac ON f.aircraft_id = ac.aircraft_id
+LEFT JOIN RESERVATIONS r ON r.flight_id = f.flight_id
+    AND r.reservation_status IN ('Confirmed', 'Checked-In')
+WHERE f.flight_id = ?
+""")
+
+
+class SeatLayout:
+    """Every seat of one cabin configuration, in index order from the front row."""
+
+    def __init__(self, economy_seats, business_seats, first_class_seats):
+        counts = {"Economy": economy_seats or 0, "Business": business_seats or 0,
+                  "First Class": first_class_seats or 0}
+        self.labels = []      # seat index -> "12C"
+        self.classes = []     # seat index -> class_type
+        self.row_numbers = [] # seat index -> row number
+        self.positions = []   # seat index -> position across the row, aisles counted
+        self.ranks = []       # seat index -> 0 window, 1 aisle, 2 middle
+        self.cabins = {}      # class_type -> (first index, end index)
+        self.rows = []        # (row number, class_type, [seat index, or None for an aisle or empty place])
+        row = 1
+        for class_type in CABIN_ORDER:
+            letters = letters_for(class_type, counts["Economy"])
+            start = len(self.labels)
+            remaining = counts[class_type]
+            while remaining > 0:
+                cells = []
+                for pos, letter in enumerate(letters):
+                    if letter == " " or not remaining:
+                        cells.append(None)
+                        continue
+                    cells.append(len(self.labels))
+                    self.labels.append(f"{row}{letter}")
+                    self.classes.append(class_type)
+                    self.row_numbers.append(row)
+                    self.positions.append(pos)
+                    self.ranks.append(_seat_rank(letters, pos))
+                    remaining -= 1
+                self.rows.append((row, class_type, cells))
+                row += 1
+            self.cabins[class_type] = (start, len(self.labels))
+        self.index = {label: i for i, label in enumerate(self.labels)}
+
+    def __len__(self):
+        return len(self.labels)
+
+
+def letters_for(class_type, economy_seats):
+    if class_type == "Economy" and economy_seats > WIDE_BODY_ECONOMY:
+        return WIDE_ECONOMY_LETTERS
+    return CABIN_LETTERS[class_type]
+
+
+def _seat_rank(letters, pos):
+    if pos == 0 or pos == len(letters) - 1:
+        return 0
+    if letters[pos - 1] == " " or letters[pos + 1] == " ":
+        return 1
+    return 2
+
+
+class SeatMap:
+    """Occupancy of one flight: a SeatLayout plus a bitmap of the seats taken."""
+
+    def __init__(self, flight_id, layout, taken=()):
+        self.flight_id = flight_id
+        self.layout = layout
+        self._load(taken)
+
+    def _load(self, taken):
+        """taken: (seat_number, class_type) pairs of the seat-holding reservations."""
+        self._bits = bytearray((len(self.layout) + 7) // 8)
+        self._free = {class_type: end - start for class_type, (start, end) in self.layout.cabins.items()}
+        # Reservations whose seat is not on this layout (assigned before seat maps, or
+        # typed in by hand) still use up a seat of their class
+        self.unplaced = []
+        for seat_number, class_type in taken:
+            i = self.layout.index.get(seat_number)
+            if i is not None and not self._taken(i):
+                self._set(i)
+            elif seat_number is not None or class_type is not None:
+                self.unplaced.append(seat_number)
+                if class_type in self._free:
+                    self._free[class_type] = max(self._free[class_type] - 1, 0)
+
+    def refresh(self, db):
+        """Reload the occupied seats in one query. Returns (success, msg)."""
+        data, msg = db.fetch_results(SEAT_MAP_SQL, (self.flight_id,))
+        if data is None:
+            return False, msg
+        if not data[1]:
+            return False, "Flight not found."
+        self._load((row[3], row[4]) for row in data[1] if row[3] is not None or row[4] is not None)
+        return True, "Success"
+
+    # --- Bitmap ---
+    def _taken(self, i):
+        return self._bits[i >> 3] >> (i & 7) & 1
+
+    def _set(self, i):
+        self._bits[i >> 3] |= 1 << (i & 7)
+        self._free[self.layout.classes[i]] -= 1
+
+    def _clear(self, i):
+        self._bits[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+        self._free[self.layout.classes[i]] += 1
+
+    # --- Queries ---
+    def is_free(self, seat_number):
+        """True if the seat exists on this aircraft and nobody holds it."""
+        i = self.layout.index.get(seat_number)
+        return i is not None and not self._taken(i)
+
+    def class_of(self, seat_number):
+        i = self.layout.index.get(seat_number)
+        return self.layout.classes[i] if i is not None else None
+
+    def free_count(self, class_type):
+        return self._free.get(class_type, 0)
+
+    def occupy(self, seat_number):
+        """Mark a seat taken (e.g. just booked). Returns False if it was already taken or does not exist."""
+        i = self.layout.index.get(seat_number)
+        if i is None or self._taken(i):
+            return False
+        self._set(i)
+        return True
+
+    def release(self, seat_number):
+        i = self.layout.index.get(seat_number)
+        if i is None or not self._taken(i):
+            return False
+        self._clear(i)
+        return True
+
+    def next_best(self, class_type, preferred=None):
+        """The free seat in class_type closest to preferred, or the best one when there is no preference.
+
+        Closest means fewest rows away, then fewest seats across. With no
+        (usable) preference it is the front-most free seat, window before
+        aisle before middle. Returns None when the cabin is full.
+        """
+        if self.free_count(class_type) <= 0:
+            return None
+        start, end = self.layout.cabins.get(class_type, (0, 0))
+        target = self.layout.index.get(preferred)
+        if target is not None and not start <= target < end:
+            target = None
+        if target is not None and not self._taken(target):
+            return preferred
+        rows, positions, ranks = self.layout.row_numbers, self.layout.positions, self.layout.ranks
+        if target is None:
+            key = lambda i: (rows[i], ranks[i], i)
+        else:
+            key = lambda i: (abs(rows[i] - rows[target]), abs(positions[i] - positions[target]), i)
+        free = [i for i in range(start, end) if not self._taken(i)]
+        return self.layout.labels[min(free, key=key)] if free else None
+
+
+def load_seat_map(db, flight_id):
+    """Layout and occupied seats of one flight in one query. Returns (SeatMap, msg) or (None, msg)."""
+    data, msg = db.fetch_results(SEAT_MAP_SQL, (flight_id,))
+    if data is None:
+        return None, msg
+    rows = data[1]
+    if not rows:
+        return None, "Flight not found."
+    economy, business, first = rows[0][:3]
+    seats = SeatMap(flight_id, SeatLayout(economy, business, first),
+                    [(row[3], row[4]) for row in rows if row[3] is not None or row[4] is not None])
+    return seats, "Success"
@@ -1,36 +1,238 @@
+"""Runs the SQLQuery_*.sql setup scripts batch by batch, with a ledger of what ran.
+
+Scripts are split into batches the way sqlcmd splits them: at a line holding
+only GO (optionally "GO n" to run the batch n times, and a trailing comment).
+A GO inside a comment, a string or a bracketed or quoted identifier is part
+of the text. The split streams the file a line at a time, so only the batch
+being read is held in memory, and every batch carries the line it starts on.
+
+Every batch that runs is recorded in SCHEMA_MIGRATIONS (see SQLQuery_1.sql)
+under its script name and the SHA-256 of its text. run_all_scripts() rebuilds
+the database from scratch, as SQLQuery_0/1 drop and create it.
+run_all_scripts(incremental=True) reads the ledger and runs only the batches
+that are new or changed, skipping scripts that have none. An up-to-date
+database therefore costs one ledger read. Both report the time of every
+batch they ran.
+
+    runner = SQLRunner(db)
+    success, msg = runner.run_all_scripts(PROJECT_DIR, incremental=True)
+"""
+import hashlib
 import os
 import re
+import time
+
+LEDGER = 'SCHEMA_MIGRATIONS'
+MAX_REPORTED_BATCHES = 100  # per script; a data script of thousands of batches gets a count for the rest
+# Batches that only switch database; they run whenever a later batch of their script does
+SESSION_ONLY = re.compile(r'^(\s*USE\s+\[?\w+\]?\s*;?)+\s*$', re.IGNORECASE)
+# Batches that drop or create the whole database, taking the ledger with it
+RESET = re.compile(r'\b(DROP|CREATE)\s+DATABASE\b', re.IGNORECASE)
+# Statements that fail when their object already exists, so a batch of them edited in place cannot
+# run again, unless the batch checks for the object first or drops it
+CREATES_OBJECT = re.compile(r'\bCREATE\s+(?!OR\s+ALTER\b)(?:UNIQUE\s+)?(?:(?:NON)?CLUSTERED\s+)?'
+                            r'(?:TABLE|INDEX|VIEW|PROC|PROCEDURE|FUNCTION|TRIGGER)\b|\bALTER\s+TABLE\b',
+                            re.IGNORECASE)
+GUARDED = re.compile(r'\bIF\s+(?:NOT\s+)?EXISTS\b|\bOBJECT_ID\s*\(|\bDROP\s+\w+\s+IF\s+EXISTS\b'
+                     r'|\bDROP_EXISTING\s*=\s*ON\b', re.IGNORECASE)
+COMMENT = re.compile(r'--[^\n]*')
+
+# --- Splitting ---
+GO_LINE = re.compile(r'^[ \t]*GO(?:[ \t]+(\d+))?[ \t]*(?:--.*)?$', re.IGNORECASE)
+# Where code enters a comment, string or identifier
+OPENERS = re.compile(r"--|/\*|['\[\"]")
+NESTED_COMMENT = re.compile(r'/\*|\*/')
+CLOSERS = {"'": "'", '[': ']', '"': '"'}
+
+
+def _scan(line, state, depth):
+    """The lexical state at the end of line, given the one at its start.
+
+    state is None in code, "/*" in a block comment (nested depth levels
+    deep), or the opening quote or bracket of an unfinished string or
+    identifier, all of which may run over several lines.
+    """
+    pos = 0
+    while True:
+        if state is None:
+            match = OPENERS.search(line, pos)
+            if match is None or match.group() == '--':
+                return None, 0
+            state, pos = match.group(), match.end()
+            depth = 1 if state == '/*' else 0
+        elif state == '/*':
+            match = NESTED_COMMENT.search(line, pos)
+            if match is None:
+                return state, depth
+            depth += 1 if match.group() == '/*' else -1
+            pos = match.end()
+            if depth == 0:
+                state = None
+        else:
+            # '' in a string, ]] in a bracketed identifier and "" in a quoted one stand for the character
+            closer = CLOSERS[state]
+            end = line.find(closer, pos)
+            if end < 0:
+                return state, depth
+            if line.startswith(closer, end + 1):
+                pos = end + 2
+            else:
+                state, pos = None, end + 1
+
+
+def iter_batches(lines):
+    """(number, first line, text) of every non-empty batch of a script given as lines.
+
+    "GO n" gives its batch n times, under the same number. Raises
+    ValueError for a GO count below 1.
+    """
+    state, depth = None, 0
+    buffer = []
+    first = None  # line number of the batch's first non-blank line
+    number = 0
+    for line_number, line in enumerate(lines, 1):
+        match = GO_LINE.match(line.rstrip('\r\n')) if state is None else None
+        if match is None:
+            if first is None and line.strip():
+                first = line_number
+            buffer.append(line)
+            state, depth = _scan(line, state, depth)
+            continue
+        count = int(match.group(1) or 1)
+        if count < 1:
+            raise ValueError(f"line {line_number}: GO needs a count of at least 1")
+        if first is not None:
+            number += 1
+            text = ''.join(buffer).strip()
+            for _ in range(count):
+                yield number, first, text
+        buffer, first = [], None
+    if first is not None:
+        yield number + 1, first, ''.join(buffer).strip()
+
+
+def split_batches(content):
+    """iter_batches() over a script already in memory, as a list."""
+    return list(iter_batches(content.splitlines(keepends=True)))
+
+
+def script_batches(file_path):
+    """iter_batches() over a script file, read as it goes."""
+    # utf-8-sig: editors such as SSMS save scripts with a byte order mark
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        yield from iter_batches(f)
+
+
+def batch_hash(text):
+    # Line endings are normalized so a Windows checkout hashes like any other
+    return hashlib.sha256(text.replace('\r\n', '\n').encode('utf-8')).hexdigest()
+
+
+def session_only(text):
+    return SESSION_ONLY.match(COMMENT.sub('', text)) is not None
+
+
+def summary(text, width=60):
+    """The first line of a batch that is not a comment, for the report."""
+    for line in COMMENT.sub('', text).splitlines():
+        if line.strip():
+            line = line.strip()
+            return line if len(line) <= width else line[:width - 3] + '...'
+    return '(comments only)'
+
 
 class SQLRunner:
     def __init__(self, db_connection):
         self.db = db_connection
+        # Three-part name: the ledger is reachable whatever database an earlier USE left the session in
+        self.ledger = f"{db_connection.settings['database']}.dbo.{LEDGER}"
+        self.timings = []  # (script, batch number, first line, seconds) of every batch the last run executed
 
     def run_script(self, file_path):
         if not os.path.exists(file_path):
             return False, f"File not found: {file_path}"
-        
+        self.timings = []
+        success, msg, _ = self._run_batches(os.path.basename(file_path), file_path, set())
+        return success, msg
+
+    def _run_batches(self, name, file_path, applied):
+        """Run the batches of one script whose hash is not in applied, timing each.
+
+        Returns (success, report, ledger rows of the batches that ran).
+        """
+        ran = []
+        recorded = set()
+        lines = []
+        started = time.perf_counter()
+        skipped = 0
+        executed = 0
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except Exception as e:
-            return False, f"Error reading file: {e}"
-
-        # Split by GO command (case insensitive), handling varying whitespace
-        # Regex looks for GO on its own line or surrounded by whitespace
-        commands = re.split(r'\bGO\b', content, flags=re.IGNORECASE)
-
-        for cmd in commands:
-            cmd = cmd.strip()
-            if not cmd:
-                continue
-            
-            success, msg = self.db.execute_query(cmd)
+            for number, line, text in script_batches(file_path):
+                digest = batch_hash(text)
+                session = session_only(text)
+                if not session and (name, digest) in applied:
+                    skipped += 1
+                    continue
+
+                batch_started = time.perf_counter()
+                success, msg = self.db.execute_query(text)
+                seconds = time.perf_counter() - batch_started
+                if not success:
+                    lines.append(f"Error in {name}, batch {number} (line {line}): {msg}")
+                    return False, "\n".join(lines), ran
+                executed += 1
+                self.timings.append((name, number, line, seconds))
+                if executed <= MAX_REPORTED_BATCHES:
+                    lines.append(f"  batch {number:>3} (line {line:>4}) {seconds * 1000:9.1f} ms  {summary(text)}")
+                # A batch repeated word for word in a script runs each time but has one ledger row
+                if not session and digest not in recorded:
+                    recorded.add(digest)
+                    ran.append((name, digest, number, line, round(seconds * 1000)))
+        except (OSError, ValueError) as e:
+            lines.append(f"Error reading {name}: {e}")
+            return False, "\n".join(lines), ran
+
+        if executed > MAX_REPORTED_BATCHES:
+            lines.append(f"  ... and {executed - MAX_REPORTED_BATCHES} more batch(es)")
+        head = f"Successfully executed {name}: {len(ran)} batch(es) in {time.perf_counter() - started:.2f} s"
+        if skipped:
+            head += f", {skipped} unchanged skipped"
+        return True, "\n".join([head] + lines), ran
+
+    def _applied(self):
+        """{(script, hash): batch number} of the ledger, or None when there is no ledger to read."""
+        data, _ = self.db.fetch_results(f"SELECT script_name, batch_hash, batch_number FROM {self.ledger}",
+                                        query_class="admin")
+        if data is None:
+            return None
+        return {(script, digest): number for script, digest, number in data[1]}
+
+    def _record(self, ran, stale):
+        """Write the batches that ran to the ledger and drop the rows of batches no longer in the scripts."""
+        keys = [(script, digest) for script, digest in stale] + [row[:2] for row in ran]
+        if keys:
+            success, msg = self.db.execute_many(
+                f"DELETE FROM {self.ledger} WHERE script_name = ? AND batch_hash = ?", keys, query_class="admin")
             if not success:
-                return False, f"Error in {os.path.basename(file_path)}: {msg}"
-        
-        return True, f"Successfully executed {os.path.basename(file_path)}"
+                return success, msg
+        if not ran:
+            return True, ""
+        return self.db.execute_many(
+            f"INSERT INTO {self.ledger} (script_name, batch_hash, batch_number, start_line, duration_ms) "
+            f"VALUES (?, ?, ?, ?, ?)", ran, query_class="admin")
+
+    def run_all_scripts(self, directory, incremental=False):
+        """Run the SQLQuery_*.sql scripts of directory in order. Returns (success, report).
 
-    def run_all_scripts(self, directory):
+        With incremental=True only batches missing from the ledger run. A
+        database without a ledger, a changed batch that drops or creates
+        the database, or one that creates a table, index or other object
+        without checking for it first, needs a full run; incremental mode
+        then stops before running anything. So does a script that cannot be
+        read or split. A batch counts as changed when the ledger's batch of
+        the same number is no longer in the script; a new batch slotted in
+        before it is not.
+        """
         # Find all SQLQuery_*.sql files and sort them
         files = [f for f in os.listdir(directory) if f.startswith('SQLQuery_') and f.endswith('.sql')]
         files.sort() # SQLQuery_0.sql, SQLQuery_1.sql, etc.
@@ -38,12 +240,77 @@ class SQLRunner:
         if not files:
             return False, "No SQLQuery_*.sql files found."
 
+        self.timings = []
         results = []
-        for file_name in files:
-            full_path = os.path.join(directory, file_name)
-            success, msg = self.run_script(full_path)
-            results.append(msg)
-            if not success:
-                return False, "\n".join(results)
-        
-        return True, "All scripts executed successfully.\n" + "\n".join(results)
+        ran = []
+        started = time.perf_counter()
+        # Scripts switch databases with USE, so every batch must run on the same connection
+        with self.db.pinned():
+            applied = {}
+            if incremental:
+                applied = self._applied()
+                if applied is None:
+                    return False, (f"No migration ledger in {self.ledger}: run all scripts in full once "
+                                   "to build the database and its ledger.")
+
+            # A first pass over the files hashes every batch, holding only the hashes
+            current = set()
+            pending = {}  # script -> batches to run, leaving out USE
+            creating = []  # (script, number, line) of pending batches that create objects unguarded
+            for name in files:
+                pending[name] = 0
+                try:
+                    for number, line, text in script_batches(os.path.join(directory, name)):
+                        if session_only(text):
+                            continue
+                        key = (name, batch_hash(text))
+                        current.add(key)
+                        if key in applied:
+                            continue
+                        pending[name] += 1
+                        code = COMMENT.sub('', text)
+                        if incremental and RESET.search(code):
+                            return False, (f"{name}, batch {number} (line {line}) drops or creates the database "
+                                           "and has changed: run all scripts in full to rebuild it.")
+                        if incremental and CREATES_OBJECT.search(code) and not GUARDED.search(code):
+                            creating.append((name, number, line))
+                except (OSError, ValueError) as e:
+                    return False, f"Error reading {name}: {e}"
+
+            # The numbers of applied batches edited or removed since; a new batch may take one of
+            # them, but a batch that creates objects in that place is an edit of one that ran
+            replaced = {(script, number) for (script, digest), number in applied.items()
+                        if (script, digest) not in current}
+            for name, number, line in creating:
+                if (name, number) in replaced:
+                    return False, (f"{name}, batch {number} (line {line}) creates objects that already exist "
+                                   "and has changed, so it cannot run again: run all scripts in full, or put "
+                                   "the change in a new batch (e.g. ALTER TABLE) after it.")
+
+            success = True
+            for name in files:
+                if not pending[name]:
+                    results.append(f"{name}: unchanged, skipped")
+                    continue
+                success, msg, script_ran = self._run_batches(name, os.path.join(directory, name), applied)
+                results.append(msg)
+                ran += script_ran
+                if not success:
+                    break
+
+            # Even after a failure, the batches that did run are recorded, so the next run resumes after them.
+            # Rows of batches gone from the scripts are dropped only once the scripts ran through.
+            recorded, msg = self._record(ran, applied.keys() - current if success else set())
+            if not recorded:
+                results.append(f"Could not update the migration ledger: {msg}")
+
+        seconds = time.perf_counter() - started
+        if not success:
+            return False, "\n".join(results)
+        if incremental and not ran:
+            head = f"Schema is up to date: {len(current)} batch(es) already applied ({seconds * 1000:.0f} ms)."
+        elif incremental:
+            head = f"{len(ran)} new or changed batch(es) applied in {seconds:.2f} s."
+        else:
+            head = f"All scripts executed successfully in {seconds:.2f} s."
+        return recorded, head + "\n" + "\n".join(results)
@@ -0,0 +1,231 @@
+"""Registry of the named, parameterized statements the application runs.
+
+Every value goes in as a ? parameter, never into the text, so each
+statement compiles to one plan on the server that every call reuses,
+whoever runs it and with whatever values. Both GUIs run the same
+Statement objects, so they share those plans too; inline SQL differing
+only in indentation would not.
+
+    data, msg = db.fetch_results(statements.LOGIN, (user, password))
+
+A Statement is a str with a name. DatabaseConnection keeps one cursor per
+connection for each registered statement, so running it again on that
+connection skips the prepare. Modules declare their own statements with
+register() next to the code that reads the results (booking.BOOK_SQL,
+flight_search.SEARCH_SQL, ...); the GUI-only ones are below.
+
+plan_cache_report() shows how the server's plan cache is reused, and
+
+    python statements.py
+
+lists the registry and exits with status 1 when a hot-path module builds
+SQL with values pasted into the text; tests/test_statements.py runs the
+same check.
+"""
+import ast
+import os
+import re
+import sys
+import textwrap
+
+STATEMENTS = {}  # name -> Statement
+
+
+class Statement(str):
+    """SQL text carrying its registry name; anywhere else it is the plain string."""
+
+    def __new__(cls, name, sql):
+        self = super().__new__(cls, sql)
+        self.name = name
+        return self
+
+
+def register(name, sql):
+    """Add a statement to the registry and return it. Names are unique."""
+    sql = textwrap.dedent(sql).strip()
+    existing = STATEMENTS.get(name)
+    if existing is not None:
+        if existing != sql:
+            raise ValueError(f"Statement {name!r} is already registered with different SQL")
+        return existing
+    STATEMENTS[name] = Statement(name, sql)
+    return STATEMENTS[name]
+
+
+# --- GUI statements ---
+LOGIN = register("login", """
+    DECLARE @uid INT, @role VARCHAR(20), @pid INT;
+    EXEC SP_AuthenticateUser ?, ?, @uid OUTPUT, @role OUTPUT, @pid OUTPUT;
+    SELECT @uid, @role, @pid;
+""")
+
+REGISTER_USER = register("register_user", """
+    DECLARE @new_id INT;
+    EXEC SP_RegisterUser ?, ?, ?, 'Customer', NULL, @new_id OUTPUT;
+    SELECT @new_id;
+""")
+
+CHECK_IN = register("check_in", """
+    DECLARE @info VARCHAR(MAX);
+    EXEC SP_CheckInPassenger ?, @info OUTPUT;
+    SELECT @info;
+""")
+
+# The flight comes back too so cached searches can be dropped
+CANCEL_RESERVATION = register("cancel_reservation", """
+    DECLARE @refund DECIMAL(10,2);
+    EXEC SP_CancelReservation ?, 'User Requested', @refund OUTPUT;
+    SELECT @refund, f.flight_id, f.departure_airport_id, f.arrival_airport_id, f.departure_datetime
+    FROM RESERVATIONS r INNER JOIN FLIGHTS f ON r.flight_id = f.flight_id
+    WHERE r.reservation_id = ?;
+""")
+
+UPDATE_FLIGHT_STATUS = register("update_flight_status", "EXEC SP_UpdateFlightStatus @flight_id=?, @new_status=?")
+
+LIST_TABLES = register("list_tables",
+                       "SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE='BASE TABLE'")
+
+# All three analytics views in one round trip (Tkinter)
+ANALYTICS = register("analytics", """
+    SELECT airline_name, total_flights, total_passengers, avg_occupancy_rate, total_revenue
+    FROM VW_AirlinePerformance;
+
+    SELECT booking_date, total_bookings, gross_revenue, paid_revenue
+    FROM VW_DailyRevenue
+    ORDER BY booking_date DESC;
+
+    SELECT flight_number, airline_name, departure_datetime, total_seats, available_seats,
+           booked_seats, occupancy_percentage, total_revenue
+    FROM VW_FlightStatistics
+    ORDER BY departure_datetime DESC;
+""")
+
+# Airline Performance and Flight Statistics only (PyQt)
+ANALYTICS_WITHOUT_REVENUE = register("analytics_without_revenue", """
+    SELECT airline_name, total_flights, total_passengers, avg_occupancy_rate, total_revenue
+    FROM VW_AirlinePerformance;
+
+    SELECT flight_number, airline_name, departure_datetime, total_seats, available_seats,
+           booked_seats, occupancy_percentage, total_revenue
+    FROM VW_FlightStatistics;
+""")
+
+
+# --- Plan cache ---
+# Plans of this database by kind, then statements the server compiled more than once
+# (the same query_hash under several plans: usually literals pasted into ad-hoc SQL).
+# Needs VIEW SERVER STATE.
+PLAN_CACHE = register("plan_cache", """
+    SELECT cp.objtype, COUNT(*) AS plans, SUM(CAST(cp.usecounts AS BIGINT)) AS uses,
+           SUM(CASE WHEN cp.usecounts = 1 THEN 1 ELSE 0 END) AS single_use,
+           SUM(CAST(cp.size_in_bytes AS BIGINT)) / 1024 AS size_kb
+    FROM sys.dm_exec_cached_plans cp
+    CROSS APPLY sys.dm_exec_sql_text(cp.plan_handle) st
+    WHERE st.dbid = DB_ID()
+    GROUP BY cp.objtype
+    ORDER BY plans DESC;
+
+    SELECT TOP (10) COUNT(DISTINCT qs.plan_handle) AS plans, SUM(qs.execution_count) AS executions,
+           MIN(LEFT(st.text, 150)) AS example
+    FROM sys.dm_exec_query_stats qs
+    CROSS APPLY sys.dm_exec_sql_text(qs.sql_handle) st
+    WHERE st.dbid = DB_ID()
+    GROUP BY qs.query_hash
+    HAVING COUNT(DISTINCT qs.plan_handle) > 1
+    ORDER BY plans DESC;
+""")
+
+
+def plan_cache_report(db):
+    """Report lines on plan reuse, server side (plan cache) and client side (prepared cursors).
+
+    Returns (lines, msg); lines is None when the plan cache could not be read.
+    """
+    prepared = db.prepared_stats()
+    client = (f"Prepared cursors: {prepared['cursors']} open, {prepared['prepares']} prepares, "
+              f"{prepared['reuses']} reuses")
+    data, msg = db.fetch_all_results(PLAN_CACHE, query_class="admin")
+    if not data:
+        return None, f"Plan cache unavailable: {msg}. {client}"
+    lines = ["Plan cache of this database:"]
+    for objtype, plans, uses, single_use, size_kb in data[0][1]:
+        lines.append(f"  {objtype:<10} {plans:6d} plans {uses or 0:9d} uses {single_use:6d} used once {size_kb or 0:8d} KB")
+    repeated = data[1][1] if len(data) > 1 else []
+    if repeated:
+        lines.append("Statements compiled into more than one plan:")
+        for plans, executions, example in repeated:
+            lines.append(f"  {plans:5d} plans {executions:8d} runs  {' '.join(str(example).split())}")
+    else:
+        lines.append("No statement has more than one plan.")
+    lines.append(client)
+    return lines, "Success"
+
+
+# --- Ad-hoc SQL check ---
+# Modules on the GUIs' request paths; benchmarks.py keeps the old ad-hoc code on purpose
+HOT_PATH_MODULES = ("gui.py", "gui_pyqt.py", "booking.py", "flight_search.py", "seat_map.py", "itineraries.py",
+                    "reference_data.py", "pagination.py", "database_connection.py")
+_SQL_KEYWORD = re.compile(r"\b(SELECT|INSERT|UPDATE|DELETE|EXEC|MERGE)\b")
+# Text right before an interpolated piece that makes it a value: inside quotes, after a
+# comparison, as a function argument, or in an IN/VALUES/LIKE list
+_VALUE_CONTEXT = re.compile(r"(?:'|[=<>]\s*|\w\(\s*|\b(?:IN|VALUES)\s*\(\s*|\bLIKE\s+)$", re.IGNORECASE)
+_FORMAT_FIELD = re.compile(r"\{[^{}]*\}|%[sdrf]")
+_MARK = "\x00"
+
+
+def _interpolates_values(template):
+    """template is SQL text with _MARK where values are interpolated."""
+    if not _SQL_KEYWORD.search(template):
+        return False
+    pieces = template.split(_MARK)
+    return any(_VALUE_CONTEXT.search(piece) for piece in pieces[:-1])
+
+
+def _template(node):
+    """The literal text of an f-string, .format() or % expression with _MARK for each field, or None."""
+    if isinstance(node, ast.JoinedStr):
+        return "".join(part.value if isinstance(part, ast.Constant) else _MARK for part in node.values)
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "format"
+            and isinstance(node.func.value, ast.Constant) and isinstance(node.func.value.value, str)):
+        return _FORMAT_FIELD.sub(_MARK, node.func.value.value)
+    if (isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mod) and isinstance(node.left, ast.Constant)
+            and isinstance(node.left.value, str)):
+        return _FORMAT_FIELD.sub(_MARK, node.left.value)
+    return None
+
+
+def find_adhoc_sql(paths):
+    """(path, line, text) of every string expression in paths that pastes values into SQL."""
+    found = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            template = _template(node)
+            if template is not None and _interpolates_values(template):
+                found.append((path, node.lineno, " ".join(template.replace(_MARK, "{...}").split())[:100]))
+    return sorted(found)
+
+
+def main():
+    # Modules declaring statements register them on import, into the imported copy of this
+    # module rather than __main__
+    import booking, flight_import, flight_search, itineraries, reference_data, schedules, seat_map  # noqa: F401
+    from statements import STATEMENTS as registered
+
+    print(f"{len(registered)} registered statements:")
+    for name, sql in sorted(registered.items()):
+        print(f"  {name:<28} {' '.join(sql.split())[:90]}")
+    here = os.path.dirname(os.path.abspath(__file__))
+    found = find_adhoc_sql([os.path.join(here, name) for name in HOT_PATH_MODULES])
+    if not found:
+        print("No ad-hoc SQL with interpolated values in the hot paths.")
+        return 0
+    print(f"{len(found)} ad-hoc statement(s) with values pasted into the SQL:")
+    for path, line, text in found:
+        print(f"  {os.path.basename(path)}:{line}: {text}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
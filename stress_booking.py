@@ -0,0 +1,177 @@
+"""Stress harness for concurrent bookings on one flight.
+
+Starts N threads that each book M seats on the same flight through
+booking.book(), then reports throughput, median and p99 latency, retries by
+error class and failures, and checks the flight for overselling: more seat-holding
+reservations in a class than it has seats, a seat held twice, or an
+available_seats counter out of step with the reservations.
+
+    python stress_booking.py 12                    # flight 12, 8 threads x 10 bookings, Economy
+    python stress_booking.py 12 32 5 Business pick # 32 x 5 Business, each thread choosing its seat first
+
+It books real reservations for made-up passengers (passport numbers starting
+with ST), so point it at a test database. `python benchmarks.py
+booking_contention` runs the same harness against emulated procedures, and
+tests/test_booking.py asserts that it books every seat and oversells none.
+"""
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+
+from booking import BOOK_ATTEMPTS, book
+from database_connection import DatabaseConnection
+from seat_map import load_seat_map
+
+CHECK_BATCH = """
+SELECT f.available_seats, ac.total_seats, ac.economy_seats, ac.business_seats, ac.first_class_seats
+FROM FLIGHTS f INNER JOIN AIRCRAFT ac ON f.aircraft_id = ac.aircraft_id
+WHERE f.flight_id = ?;
+
+SELECT class_type, COUNT(*) AS held, COUNT(seat_number) AS seated, COUNT(DISTINCT seat_number) AS seats
+FROM RESERVATIONS
+WHERE flight_id = ? AND reservation_status IN ('Confirmed', 'Checked-In')
+GROUP BY class_type;
+"""
+
+
+def check_flight(db, flight_id):
+    """Seat accounting of one flight after a run. Returns (check, msg); check["oversold"] is the verdict."""
+    data, msg = db.fetch_all_results(CHECK_BATCH, (flight_id, flight_id))
+    if not data or len(data) < 2 or not data[0][1]:
+        return None, f"Could not check flight {flight_id}: {msg}"
+    (_, flight), (_, classes) = data[:2]
+    available, total, economy, business, first = flight[0]
+    capacity = {"Economy": economy, "Business": business, "First Class": first}
+    held = {row[0]: row[1] for row in classes}
+    over = {cls: held.get(cls, 0) - seats for cls, seats in capacity.items() if held.get(cls, 0) > seats}
+    duplicates = sum(row[2] - row[3] for row in classes)
+    expected = total - sum(held.values())
+    check = {"capacity": capacity, "held": held, "over_capacity": over, "duplicate_seats": duplicates,
+             "available_seats": available, "expected_available": expected,
+             "oversold": bool(over) or duplicates > 0 or expected < 0}
+    return check, "Success"
+
+
+def run_stress(db, flight_id, threads=8, bookings=10, class_type="Economy", pick_seats=False, attempts=None):
+    """Book threads x bookings seats on flight_id at once and collect the outcome.
+
+    With pick_seats each booking first loads the seat map and asks for its
+    best seat, the way the booking dialogs do, so threads collide on the same
+    seat; when the seat is taken first it reloads the map and tries the
+    nearest free one (counted as a retry). Otherwise the server assigns
+    seats. attempts overrides the retry limit of book() and of the
+    connection's retry policy for the run (1 turns retries off). The
+    database needs a pool of at least threads connections.
+    """
+    run_tag = time.strftime("%H%M%S")
+    latencies, retries, failures = [], [], Counter()
+    lock = threading.Lock()
+    start_line = threading.Barrier(threads)
+    options = {} if attempts is None else {"attempts": attempts}
+    max_picks = attempts or BOOK_ATTEMPTS
+    policy_attempts = db.retry_policy.attempts
+    if attempts is not None:
+        db.retry_policy.attempts = attempts
+    before = db.retry_stats()
+
+    def worker(t):
+        start_line.wait()  # Everyone starts together, so the first bookings contend too
+        for n in range(bookings):
+            passport = f"ST{run_tag}{t:03d}{n:04d}"
+            seat, picks = None, 0
+            started = time.perf_counter()
+            while True:
+                if pick_seats:
+                    seats, _ = load_seat_map(db, flight_id)
+                    seat = seats.next_best(class_type, seat) if seats is not None else None
+                    picks += 1
+                booking, msg = book(db, "Stress", "Test", passport, f"{passport.lower()}@example.com",
+                                    "03001234567", flight_id, class_type, seat_number=seat, **options)
+                if booking is not None or not seat or "already booked" not in msg or picks >= max_picks:
+                    break
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if booking is None:
+                    failures[msg.split(" (gave up")[0][:80]] += 1
+                else:
+                    retries.append(booking["attempts"] - 1 + max(picks - 1, 0))
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    started = time.perf_counter()
+    try:
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+    finally:
+        db.retry_policy.attempts = policy_attempts
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    after = db.retry_stats()
+    # Retries made by the connection (deadlocks, lock timeouts, ...) plus book()'s own for taken seats
+    by_class = Counter(after["retries"]) - Counter(before["retries"])
+    if sum(retries):
+        by_class["seat taken"] = sum(retries)
+    check, msg = check_flight(db, flight_id)
+    return {
+        "attempted": threads * bookings, "booked": len(retries), "failures": failures,
+        "retries": sum(by_class.values()), "retry_classes": by_class,
+        "gave_up": Counter(after["gave_up"]) - Counter(before["gave_up"]),
+        "elapsed": elapsed, "throughput": len(retries) / elapsed if elapsed else 0.0,
+        "median": statistics.median(latencies) if latencies else 0.0,
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0,
+        "check": check, "check_msg": msg,
+    }
+
+
+def summary(result):
+    """Report lines for a run_stress() result."""
+    lines = [f"{result['booked']}/{result['attempted']} booked in {result['elapsed']:.2f} s "
+             f"({result['throughput']:.0f} bookings/s), {result['median'] * 1000:.1f} ms median, "
+             f"{result['p99'] * 1000:.1f} ms p99",
+             f"retries: {result['retries']} ({_counts(result['retry_classes']) or 'none'}), "
+             f"gave up: {_counts(result['gave_up']) or 'never'}"]
+    for msg, count in result["failures"].most_common():
+        lines.append(f"failed x{count}: {msg}")
+    check = result["check"]
+    if check is None:
+        lines.append(result["check_msg"])
+        return lines
+    verdict = "OVERSOLD" if check["oversold"] else "not oversold"
+    lines.append(f"{verdict}: held {check['held']} of {check['capacity']}, "
+                 f"{check['duplicate_seats']} seat(s) held twice, available_seats {check['available_seats']} "
+                 f"(expected {check['expected_available']})")
+    return lines
+
+
+def _counts(counter):
+    return ", ".join(f"{name} {count}" for name, count in counter.most_common())
+
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return
+    flight_id = int(argv[0])
+    threads = int(argv[1]) if len(argv) > 1 else 8
+    bookings = int(argv[2]) if len(argv) > 2 else 10
+    class_type = argv[3] if len(argv) > 3 else "Economy"
+    pick_seats = len(argv) > 4 and argv[4] == "pick"
+
+    db = DatabaseConnection(pool_max=threads)
+    ok, msg = db.connect()
+    print(msg)
+    if not ok:
+        return
+    print(f"{threads} threads x {bookings} {class_type} bookings on flight {flight_id}"
+          f"{', seats chosen by the client' if pick_seats else ''}")
+    for line in summary(run_stress(db, flight_id, threads, bookings, class_type, pick_seats)):
+        print("  " + line)
+    db.disconnect()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
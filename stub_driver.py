@@ -0,0 +1,318 @@
+"""Local stand-in for pyodbc backed by sqlite3.
+
+Exposes the small part of the pyodbc module surface that DatabaseConnection
+uses (connect, drivers, Error classes, cursors with description/fetchmany/
+nextset/cancel) so the pool and client-side logic can be exercised without a
+SQL Server instance:
+
+    db = DatabaseConnection(driver=stub_driver)
+
+Connections that share the same DATABASE= value share one in-memory sqlite
+database. LATENCY=<seconds> in the connection string adds a fixed delay per
+execute() to approximate a network round trip; the module-level settings
+below shape the login behaviour. Like pyodbc, a cursor takes the query
+timeout of its connection when it is created: a statement running longer is
+interrupted with HYT00, and cursor.cancel() from another thread interrupts
+it with HY008. A login slower than connect()'s timeout fails with HYT00. Stored procedures can be emulated by
+registering a Python function in `procedures`.
+"""
+import re
+import sqlite3
+import threading
+import time
+from decimal import Decimal
+
+version = "stub"
+
+# pyodbc binds Decimal parameters (DECIMAL columns); sqlite stores them as REAL
+sqlite3.register_adapter(Decimal, float)
+
+
+class Error(Exception):
+    pass
+
+
+class InterfaceError(Error):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+class ProgrammingError(DatabaseError):
+    pass
+
+
+class IntegrityError(DatabaseError):
+    pass
+
+
+# Login behaviour, adjustable by benchmarks
+installed = ["Stub Driver"]      # what drivers() reports
+broken_drivers = set()           # installed, but every login fails (e.g. TLS/cert mismatch)
+missing_databases = set()        # DATABASE= values that fail with error 4060
+login_latency = 0.0              # seconds spent on every login that reaches the server
+# Readers skip shared-cache table locks instead of failing with "database table is locked"
+# while another connection writes; for benchmarks that read and write from many threads
+read_uncommitted = False
+
+# Emulated stored procedures: name -> fn(sqlite_connection, params) returning (columns, rows).
+# A batch that EXECs a registered name runs the function instead of the SQL, as one round trip.
+procedures = {}
+_EXEC = re.compile(r"\bEXEC(?:UTE)?\s+(?:dbo\.)?(\w+)", re.IGNORECASE)
+
+_lock = threading.Lock()
+_keepalive = {}  # database name -> sqlite connection keeping the shared memory db alive
+stats = {"connects": 0, "logins": 0, "executes": 0, "prepares": 0}
+# Distinct statement texts executed, standing in for the server's plan cache
+plans = set()
+
+
+def drivers():
+    return list(installed)
+
+
+def _parse(conn_str):
+    parts = {}
+    for item in conn_str.split(";"):
+        if "=" in item:
+            key, value = item.split("=", 1)
+            parts[key.strip().upper()] = value.strip().strip("{}")
+    return parts
+
+
+def connect(conn_str, autocommit=False, timeout=0, **kwargs):
+    parts = _parse(conn_str)
+    driver = parts.get("DRIVER")
+    if driver and driver not in installed:
+        raise InterfaceError("IM002", f"[IM002] Data source name not found: {driver}")
+
+    name = parts.get("DATABASE", "default")
+    stats["logins"] += 1
+    if timeout and login_latency > timeout:
+        time.sleep(timeout)
+        raise OperationalError("HYT00", "[HYT00] [Stub Driver]Login timeout expired (0) (SQLDriverConnect)")
+    if login_latency:
+        time.sleep(login_latency)
+    if driver in broken_drivers:
+        raise OperationalError("08001", f"[08001] [{driver}] SSL Provider: certificate verify failed")
+    if name in missing_databases:
+        raise ProgrammingError("42000", f"[42000] Cannot open database \"{name}\" requested by the login. (4060)")
+    uri = f"file:stub_{name}?mode=memory&cache=shared"
+    with _lock:
+        if name not in _keepalive:
+            _keepalive[name] = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        stats["connects"] += 1
+    raw = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                          isolation_level=None if autocommit else "DEFERRED")
+    if read_uncommitted:
+        raw.execute("PRAGMA read_uncommitted = 1")
+    return Connection(raw, autocommit, float(parts.get("LATENCY", 0) or 0))
+
+
+def reset(name=None):
+    """Drop shared in-memory databases (all of them when name is None)."""
+    with _lock:
+        names = [name] if name else list(_keepalive)
+        for n in names:
+            conn = _keepalive.pop(n, None)
+            if conn:
+                conn.close()
+
+
+def _translate(exc):
+    if isinstance(exc, sqlite3.IntegrityError):
+        return IntegrityError("23000", str(exc))
+    if isinstance(exc, sqlite3.OperationalError):
+        return ProgrammingError("42000", str(exc))
+    return DatabaseError("HY000", str(exc))
+
+
+class Connection:
+    def __init__(self, raw, autocommit, latency):
+        self._raw = raw
+        self._autocommit = autocommit
+        self.latency = latency
+        self.timeout = 0
+        self.closed = False
+        self.broken = False  # set to True to simulate a dropped connection
+
+    @property
+    def autocommit(self):
+        return self._autocommit
+
+    @autocommit.setter
+    def autocommit(self, value):
+        # Like pyodbc, turning autocommit back on commits the open transaction
+        self._autocommit = value
+        self._raw.isolation_level = None if value else "DEFERRED"
+
+    def cursor(self):
+        if self.closed:
+            raise ProgrammingError("HY000", "Attempt to use a closed connection.")
+        return Cursor(self)
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def commit(self):
+        if not self.autocommit and self._raw.in_transaction:
+            self._raw.commit()
+
+    def rollback(self):
+        if self._raw.in_transaction:
+            self._raw.rollback()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._raw.close()
+
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self._cur = connection._raw.cursor()
+        self.description = None
+        self.rowcount = -1
+        self.fast_executemany = False
+        self._pending = []
+        self._rows = None  # Result of an emulated procedure, served instead of the sqlite cursor
+        self._prepared = None  # Like pyodbc, a cursor prepares again only when the SQL text changes
+        self.timeout = connection.timeout  # Query timeout in seconds, fixed at creation like pyodbc's
+        self._timed_out = False
+
+    def _check(self):
+        conn = self.connection
+        if conn.closed:
+            raise ProgrammingError("HY000", "Attempt to use a closed connection.")
+        if conn.broken:
+            raise OperationalError("08S01", "Communication link failure")
+        if conn.latency:
+            time.sleep(conn.latency)
+        stats["executes"] += 1
+
+    def _run(self, sql, params):
+        self._rows = None
+        timer = None
+        if self.timeout:
+            timer = threading.Timer(self.timeout, self._expire)
+            timer.daemon = True
+            timer.start()
+        try:
+            self._cur.execute(sql, params)
+        except sqlite3.Error as e:
+            raise self._error(e)
+        finally:
+            if timer:
+                timer.cancel()
+        self.description = self._cur.description
+        self.rowcount = self._cur.rowcount
+
+    def execute(self, sql, *params):
+        self._check()
+        if sql != self._prepared:
+            self._prepared = sql
+            stats["prepares"] += 1
+            plans.add(sql)
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = tuple(params[0])
+        match = _EXEC.search(sql)
+        if match and match.group(1) in procedures:
+            return self._call(procedures[match.group(1)], params)
+        # Statements separated by ';' become separate result sets, like a T-SQL batch
+        statements = [s for s in (part.strip() for part in sql.split(";")) if s]
+        if not statements:
+            statements = [sql]
+        if len(statements) == 1:
+            self._pending = []
+            self._run(statements[0], params)
+            return self
+        batches = []
+        offset = 0
+        for stmt in statements:
+            count = stmt.count("?")
+            batches.append((stmt, params[offset:offset + count]))
+            offset += count
+        self._pending = batches[1:]
+        self._run(*batches[0])
+        return self
+
+    def _expire(self):
+        self._timed_out = True
+        self.connection._raw.interrupt()
+
+    def _error(self, exc):
+        """The driver error for a sqlite error, telling a timeout from a cancel."""
+        if isinstance(exc, sqlite3.OperationalError) and "interrupted" in str(exc):
+            timed_out, self._timed_out = self._timed_out, False
+            if timed_out:
+                return OperationalError("HYT00", "[HYT00] [Stub Driver]Query timeout expired (0) (SQLExecDirectW)")
+            return OperationalError("HY008", "[HY008] [Stub Driver]Operation canceled (0) (SQLFetch)")
+        return _translate(exc)
+
+    def _call(self, procedure, params):
+        raw = self.connection._raw
+        try:
+            columns, rows = procedure(raw, params)
+        except sqlite3.Error as e:
+            raise _translate(e)
+        self._pending = []
+        self._rows = list(rows)
+        self.description = [(c, None, None, None, None, None, True) for c in columns]
+        self.rowcount = len(self._rows)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._check()
+        try:
+            self._cur.executemany(sql, [tuple(p) for p in seq_of_params])
+        except sqlite3.Error as e:
+            raise _translate(e)
+        self.description = None
+        self.rowcount = self._cur.rowcount
+
+    def nextset(self):
+        if not self._pending:
+            self.description = None
+            return False
+        self._run(*self._pending.pop(0))
+        return True
+
+    def fetchone(self):
+        if self._rows is not None:
+            return self._rows.pop(0) if self._rows else None
+        return self._fetch(self._cur.fetchone)
+
+    def fetchmany(self, size=1):
+        if self._rows is not None:
+            batch, self._rows = self._rows[:size], self._rows[size:]
+            return batch
+        return self._fetch(self._cur.fetchmany, size)
+
+    def fetchall(self):
+        if self._rows is not None:
+            rows, self._rows = self._rows, []
+            return rows
+        return self._fetch(self._cur.fetchall)
+
+    def _fetch(self, fetch, *args):
+        # sqlite computes rows as they are fetched, so a cancel can land here too
+        try:
+            return fetch(*args)
+        except sqlite3.Error as e:
+            raise self._error(e)
+
+    def cancel(self):
+        self.connection._raw.interrupt()
+
+    def close(self):
+        self._cur.close()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
@@ -0,0 +1,171 @@
+"""Row storage and windowed views for large result grids.
+
+Both GUIs keep query results in a RowStore and let the view draw only what
+is on screen: PyQt through a QAbstractTableModel (gui_pyqt.RowTableModel),
+Tkinter through WindowedTreeview, which creates Treeview items for the
+visible lines only and re-fills them as the user scrolls.
+"""
+import tkinter as tk
+from tkinter import ttk
+
+
+class RowStore:
+    """Result rows as plain tuples in one list, with no per-row or per-cell widget objects."""
+
+    def __init__(self, rows=()):
+        self._rows = []
+        self.extend(rows)
+
+    def extend(self, rows):
+        self._rows.extend(tuple(r) for r in rows)
+
+    def clear(self):
+        self._rows = []
+
+    def window(self, start, count):
+        return self._rows[start:start + count]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        return self._rows[index]
+
+
+class WindowedTreeview(ttk.Treeview):
+    """A Treeview that holds its rows in a RowStore and only creates items for the visible lines.
+
+    Fill it with set_rows()/append_rows() instead of insert(). selection(),
+    item() and identify_row() keep working on the visible items; use
+    selected_row() for the full row behind the selection. A scrollbar wired
+    the usual way (command=tree.yview, tree.configure(yscroll=sb.set)) scrolls
+    over all rows.
+    """
+
+    def __init__(self, master=None, **kw):
+        self._yscroll = kw.pop("yscrollcommand", None) or kw.pop("yscroll", None)
+        super().__init__(master, **kw)
+        self.rows = RowStore()
+        self.offset = 0  # Index of the row shown on the first line
+        self.visible = int(self.cget("height")) or 10
+        self.selected_index = None
+        self._slots = []  # Item ids, one per visible line
+
+        self.bind("<Configure>", self._on_resize, add="+")
+        self.bind("<<TreeviewSelect>>", self._on_select, add="+")
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.bind(sequence, self._on_wheel, add="+")
+        self.bind("<Up>", lambda e: self._move_selection(-1))
+        self.bind("<Down>", lambda e: self._move_selection(1))
+        self.bind("<Prior>", lambda e: self._move_selection(-self.visible))
+        self.bind("<Next>", lambda e: self._move_selection(self.visible))
+
+    def configure(self, cnf=None, **kw):
+        for name in ("yscrollcommand", "yscroll"):
+            if name in kw:
+                self._yscroll = kw.pop(name)
+        return super().configure(cnf, **kw)
+
+    config = configure
+
+    # --- Rows ---
+    def set_rows(self, rows):
+        self.rows.clear()
+        self.offset = 0
+        self.selected_index = None
+        self.append_rows(rows)
+
+    def append_rows(self, rows):
+        before = len(self.rows)
+        self.rows.extend(rows)
+        # Only redraw when the new rows land inside the visible window
+        if before < self.offset + self.visible:
+            self._render()
+        else:
+            self._update_scrollbar()
+
+    def clear_rows(self):
+        self.set_rows(())
+
+    def selected_row(self):
+        if self.selected_index is None or self.selected_index >= len(self.rows):
+            return None
+        return self.rows[self.selected_index]
+
+    # --- Scrolling ---
+    def yview(self, *args):
+        """Scrollbar protocol over the whole row store rather than the items that exist."""
+        if not args:
+            return self._fractions()
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == "scroll":
+            step = int(args[1]) * (self.visible if args[2] == "pages" else 1)
+            self.scroll_to(self.offset + step)
+
+    def scroll_to(self, offset):
+        last = max(0, len(self.rows) - self.visible)
+        self.offset = min(max(0, offset), last)
+        self._render()
+
+    def _fractions(self):
+        total = len(self.rows)
+        if not total:
+            return 0.0, 1.0
+        return self.offset / total, min(1.0, (self.offset + self.visible) / total)
+
+    def _update_scrollbar(self):
+        if self._yscroll:
+            self._yscroll(*self._fractions())
+
+    def _render(self):
+        window = self.rows.window(self.offset, self.visible)
+        # Keep exactly one item per line that has a row; re-use them across scrolls
+        while len(self._slots) < len(window):
+            self._slots.append(super().insert("", tk.END))
+        while len(self._slots) > len(window):
+            super().delete(self._slots.pop())
+        for iid, row in zip(self._slots, window):
+            self.item(iid, values=row)
+
+        index = self.selected_index
+        if index is not None and self.offset <= index < self.offset + len(window):
+            self.selection_set(self._slots[index - self.offset])
+        elif self.selection():
+            self.selection_remove(*self.selection())
+        self._update_scrollbar()
+
+    # --- Events ---
+    def _on_resize(self, event):
+        rowheight = int(ttk.Style(self).lookup("Treeview", "rowheight") or 20)
+        lines = max(1, event.height // rowheight - 1)  # One line goes to the headings
+        if lines != self.visible:
+            self.visible = lines
+            self.scroll_to(self.offset)
+
+    def _on_select(self, event):
+        selected = self.selection()
+        if selected and selected[0] in self._slots:
+            self.selected_index = self.offset + self._slots.index(selected[0])
+
+    def _on_wheel(self, event):
+        step = -3 if event.num == 4 or event.delta > 0 else 3
+        self.scroll_to(self.offset + step)
+        return "break"
+
+    def _move_selection(self, step):
+        if not len(self.rows):
+            return "break"
+        if self.selected_index is None:
+            current = self.offset - 1 if step > 0 else self.offset
+        else:
+            current = self.selected_index
+        index = min(max(0, current + step), len(self.rows) - 1)
+        self.selected_index = index
+        if index < self.offset:
+            self.scroll_to(index)
+        elif index >= self.offset + self.visible:
+            self.scroll_to(index - self.visible + 1)
+        else:
+            self._render()
+        return "break"
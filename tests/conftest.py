@@ -0,0 +1,26 @@
+import pytest
+
+import stub_driver
+from database_connection import DEFAULT_SETTINGS, DatabaseConnection
+
+
+@pytest.fixture
+def stub_db(tmp_path):
+    """Factory of connected DatabaseConnections, each on its own stub database; disconnected afterwards."""
+    opened = []
+
+    def connect(name="test", latency=0.0, **kwargs):
+        stub_driver.reset(name)
+        settings = dict(DEFAULT_SETTINGS, driver="Stub Driver", database=name, server=f"test-{name}")
+        db = DatabaseConnection(driver=stub_driver, settings=settings, cache_path=str(tmp_path / "cache.json"),
+                                **kwargs)
+        db.connection_string_template += f"LATENCY={latency};"
+        ok, msg = db.connect()
+        assert ok, msg
+        opened.append(db)
+        return db
+
+    yield connect
+    for db in opened:
+        db.disconnect()
+    stub_driver.procedures.clear()
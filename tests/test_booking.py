@@ -0,0 +1,90 @@
+import pytest
+
+import stub_driver
+from benchmarks import CONTENTION_SCHEMA, DUPLICATE_SEAT_ERROR, ContentionServer
+from booking import book
+from database_connection import RetryPolicy
+from seat_map import SeatLayout
+from stress_booking import run_stress
+
+LAYOUT = SeatLayout(150, 12, 0)  # An A320: 150 Economy, 12 Business
+
+
+def contended_flight(stub_db, free, threads, attempts=3, **options):
+    """A flight with free Economy seats left, booked through an emulated SP_BookFlight."""
+    stub_driver.read_uncommitted = True
+    db = stub_db("contention", 0.001, pool_max=threads, retry_policy=RetryPolicy(attempts, base_delay=0.001))
+    for statement in CONTENTION_SCHEMA:
+        db.execute_query(statement)
+    db.execute_query("INSERT INTO AIRCRAFT VALUES (1, 162, 150, 12, 0)")
+    db.execute_query(f"INSERT INTO FLIGHTS VALUES (1, 1, 100.0, {12 + free})")
+    start, end = LAYOUT.cabins["Economy"]
+    with db.pool.connection() as conn:
+        conn.cursor().executemany(
+            "INSERT INTO RESERVATIONS (passenger_id, flight_id, seat_number, class_type, total_price) "
+            "VALUES (0, 1, ?, 'Economy', 100.0)", [(seat,) for seat in LAYOUT.labels[start:end - free]])
+    stub_driver.procedures["SP_BookFlight"] = ContentionServer(LAYOUT, **options).book_flight
+    return db
+
+
+@pytest.fixture(autouse=True)
+def committed_reads():
+    yield
+    stub_driver.read_uncommitted = False
+
+
+@pytest.mark.parametrize("pick_seats", [False, True])
+def test_flight_lock_does_not_oversell_under_contention(stub_db, pick_seats):
+    db = contended_flight(stub_db, free=6, threads=8, flight_lock=True, deadlock_rate=0.2)
+    result = run_stress(db, 1, threads=8, bookings=3, pick_seats=pick_seats)
+    check = result["check"]
+    assert not check["oversold"]
+    assert result["booked"] == 6
+    assert check["held"]["Economy"] == 150
+    assert check["available_seats"] == check["expected_available"] == 12
+
+
+def test_deadlocked_bookings_are_retried(stub_db):
+    # Enough attempts that no booking runs out of them
+    db = contended_flight(stub_db, free=40, threads=4, attempts=20, flight_lock=True, deadlock_rate=0.3)
+    result = run_stress(db, 1, threads=4, bookings=5)
+    assert result["booked"] == 20
+    assert result["retry_classes"]["deadlock"] > 0
+    assert not result["check"]["oversold"]
+
+
+class SeatTaken:
+    """SP_BookFlight failing as if a concurrent booking took the seat first."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self, raw, params):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise stub_driver.IntegrityError("23000", DUPLICATE_SEAT_ERROR)
+        return ["passenger_id", "reservation_id", "booking_reference", "total_price", "payment_id"], \
+            [(1, 7, "ST000007", 100.0, None)]
+
+
+def booking(db, seat=None):
+    return book(db, "Ada", "Test", "ST1", "st1@example.com", "03001234567", 1, "Economy", seat_number=seat)
+
+
+def test_server_picked_seat_collision_is_retried(stub_db, monkeypatch):
+    monkeypatch.setattr("booking.RETRY_DELAY", 0)
+    db = stub_db()
+    stub_driver.procedures["SP_BookFlight"] = procedure = SeatTaken(failures=2)
+    result, msg = booking(db)
+    assert result["reservation_id"] == 7 and result["attempts"] == 3
+    assert procedure.calls == 3
+
+
+def test_chosen_seat_collision_fails_at_once(stub_db):
+    db = stub_db()
+    stub_driver.procedures["SP_BookFlight"] = procedure = SeatTaken(failures=1)
+    result, msg = booking(db, seat="12A")
+    assert result is None and msg == "Seat 12A already booked"
+    assert procedure.calls == 1
+
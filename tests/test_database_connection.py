@@ -0,0 +1,270 @@
+import threading
+import time
+
+import pytest
+
+import stub_driver
+from benchmarks import DEADLOCK_ERROR, ENDLESS_SQL, break_idle_connections
+from database_connection import CancelHandle, RetryPolicy, classify_error
+
+LINK_FAILURE = "[08S01] [Microsoft][ODBC Driver 18 for SQL Server]Communication link failure (10054) (SQLExecDirectW)"
+
+
+# --- Retries ---
+@pytest.mark.parametrize("exc, expected", [
+    (stub_driver.OperationalError("40001", DEADLOCK_ERROR), "deadlock"),
+    (stub_driver.OperationalError("HY000", "[HY000] Lock request time out period exceeded. (1222) (SQLExecDirectW)"),
+     "lock_timeout"),
+    (stub_driver.OperationalError("08S01", LINK_FAILURE), "connection"),
+    (stub_driver.OperationalError("08S02", "[08S02] Physical connection is not usable"), "connection"),
+    (stub_driver.OperationalError("42000", "[42000] Database 'FlightReservationDB' on server 'x' is not "
+                                           "currently available. (40613) (SQLExecDirectW)"), "unavailable"),
+    (stub_driver.OperationalError("HYT00", "[HYT00] Query timeout expired (0) (SQLExecDirectW)"), "timeout"),
+    (stub_driver.OperationalError("HY008", "[HY008] Operation canceled (0) (SQLFetch)"), "cancelled"),
+    (stub_driver.IntegrityError("23000", "[23000] Cannot insert duplicate key row in object 'dbo.RESERVATIONS' "
+                                         "with unique index 'UQ_seat_per_flight'. (2601) (SQLExecDirectW)"), None),
+    (stub_driver.ProgrammingError("42000", "[42000] No seats available on this flight (50000)"), None),
+])
+def test_classify_error(exc, expected):
+    assert classify_error(exc) == expected
+
+
+@pytest.mark.parametrize("value", ["1205", "10054", "1222", "40613"])
+def test_numbers_echoed_in_the_message_do_not_classify(value):
+    exc = stub_driver.IntegrityError(
+        "23000", f"[23000] [Microsoft][ODBC Driver 18 for SQL Server][SQL Server]Violation of UNIQUE KEY constraint "
+                 f"'UQ_passport'. Cannot insert duplicate key in object 'dbo.PASSENGERS'. The duplicate key value is "
+                 f"({value}). (2627) (SQLExecDirectW)")
+    assert classify_error(exc) is None
+
+
+def test_native_number_of_a_later_diagnostic_record_classifies():
+    exc = stub_driver.Error("HY000", "[HY000] [SQL Server]The statement has been terminated. (3621) (SQLExecute); "
+                                     "[HY000] [SQL Server]Lock request time out period exceeded. (1222) (SQLExecute)")
+    assert classify_error(exc) == "lock_timeout"
+
+
+@pytest.mark.parametrize("error_class, sent, idempotent, expected", [
+    ("deadlock", True, False, True),        # the server rolled the write back
+    ("lock_timeout", True, False, True),
+    ("connection", True, False, False),     # the write may have committed
+    ("connection", True, True, True),
+    ("connection", False, False, True),     # nothing reached the server
+    ("unavailable", True, True, True),
+    ("timeout", True, True, False),
+    ("cancelled", False, True, False),
+    (None, True, True, False),
+])
+def test_retryable(error_class, sent, idempotent, expected):
+    assert RetryPolicy().retryable(error_class, sent, idempotent) is expected
+
+
+def test_non_atomic_write_is_not_retried_after_a_deadlock():
+    assert not RetryPolicy().retryable("deadlock", sent=True, idempotent=False, atomic=False)
+
+
+def test_delay_doubles_with_jitter():
+    policy = RetryPolicy(base_delay=0.1, max_delay=0.3)
+    assert 0.05 <= policy.delay(1) <= 0.15
+    assert 0.1 <= policy.delay(2) <= 0.3
+    assert 0.15 <= policy.delay(5) <= 0.45
+
+
+class Flaky:
+    """A procedure failing with error for its first failures calls."""
+
+    def __init__(self, failures, error):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self, raw, params):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return ["ok"], [(1,)]
+
+
+def fast_db(stub_db, attempts=3, **kwargs):
+    return stub_db(retry_policy=RetryPolicy(attempts, base_delay=0.001), **kwargs)
+
+
+def test_read_is_retried_after_a_deadlock(stub_db):
+    db = fast_db(stub_db)
+    stub_driver.procedures["SP_Lookup"] = procedure = Flaky(2, stub_driver.OperationalError("40001", DEADLOCK_ERROR))
+    data, msg = db.fetch_results("EXEC SP_Lookup")
+    assert data == (["ok"], [(1,)])
+    assert procedure.calls == 3
+    assert db.retry_stats() == {"retries": {"deadlock": 2}, "gave_up": {}}
+
+
+def test_gives_up_after_the_last_attempt(stub_db):
+    db = fast_db(stub_db)
+    stub_driver.procedures["SP_Lookup"] = procedure = Flaky(5, stub_driver.OperationalError("40001", DEADLOCK_ERROR))
+    data, msg = db.fetch_results("EXEC SP_Lookup")
+    assert data is None and msg.endswith("(gave up after 3 attempts)")
+    assert procedure.calls == 3
+    assert db.retry_stats()["gave_up"] == {"deadlock": 1}
+
+
+def test_non_idempotent_call_is_not_retried_after_a_dropped_connection(stub_db):
+    db = fast_db(stub_db)
+    stub_driver.procedures["SP_Book"] = procedure = Flaky(1, stub_driver.OperationalError("08S01", LINK_FAILURE))
+    data, msg = db.fetch_results("EXEC SP_Book", idempotent=False)
+    assert data is None and "Communication link failure" in msg
+    assert procedure.calls == 1
+    assert db.retry_stats()["retries"] == {}
+
+
+def test_non_idempotent_call_is_retried_after_a_deadlock(stub_db):
+    db = fast_db(stub_db)
+    stub_driver.procedures["SP_Book"] = procedure = Flaky(1, stub_driver.OperationalError("40001", DEADLOCK_ERROR))
+    data, msg = db.fetch_results("EXEC SP_Book", idempotent=False)
+    assert data is not None and procedure.calls == 2
+
+
+def test_idempotent_read_is_retried_after_a_dropped_connection(stub_db):
+    db = fast_db(stub_db)
+    stub_driver.procedures["SP_Lookup"] = procedure = Flaky(1, stub_driver.OperationalError("08S01", LINK_FAILURE))
+    data, msg = db.fetch_results("EXEC SP_Lookup")
+    assert data is not None and procedure.calls == 2
+
+
+def test_script_batch_is_not_retried_once_sent(stub_db):
+    db = fast_db(stub_db)
+    stub_driver.procedures["SP_Setup"] = procedure = Flaky(1, stub_driver.OperationalError("40001", DEADLOCK_ERROR))
+    ok, msg = db.execute_query("EXEC SP_Setup")
+    assert not ok and procedure.calls == 1
+
+
+def test_pinned_calls_are_not_retried(stub_db):
+    db = fast_db(stub_db)
+    stub_driver.procedures["SP_Lookup"] = procedure = Flaky(1, stub_driver.OperationalError("40001", DEADLOCK_ERROR))
+    with db.pinned():
+        data, msg = db.fetch_results("EXEC SP_Lookup")
+    assert data is None and procedure.calls == 1
+
+
+def test_dead_pooled_connections_are_replaced(stub_db):
+    db = fast_db(stub_db, pool_min=3)
+    db.execute_query("CREATE TABLE PINGS (n INTEGER)")
+    break_idle_connections(db)
+    data, msg = db.fetch_results("SELECT COUNT(*) FROM PINGS")
+    assert data == (["COUNT(*)"], [(0,)])
+    assert db.pool_stats()["failed_pings"] >= 2
+    assert db.retry_stats()["retries"] == {"connection": 1}
+
+
+def test_stream_is_retried_until_it_opens(stub_db):
+    db = fast_db(stub_db)
+    stub_driver.procedures["SP_Lookup"] = procedure = Flaky(2, stub_driver.OperationalError("40001", DEADLOCK_ERROR))
+    data, msg = db.iter_results("EXEC SP_Lookup")
+    assert data[0] == ["ok"] and db.pool_stats()["in_use"] == 1
+    assert list(data[1]) == [(1,)]
+    assert procedure.calls == 3 and db.pool_stats()["in_use"] == 0
+
+
+def test_stream_hands_its_connection_back_after_any_error(stub_db, monkeypatch):
+    db = stub_db()
+    monkeypatch.setattr(db, "_execute", lambda cursor, query, params=None: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        db.fetch_batches("SELECT 1")
+    assert db.pool_stats()["in_use"] == 0
+
+
+@pytest.mark.parametrize("error, pings", [
+    (stub_driver.ProgrammingError("42S02", "[42S02] Invalid object name 'NO_SUCH_TABLE'. (208) (SQLExecDirectW)"), 0),
+    (stub_driver.OperationalError("08S01", LINK_FAILURE), 1),
+])
+def test_pool_pings_a_connection_only_after_a_connection_error(stub_db, monkeypatch, error, pings):
+    db = stub_db()
+    pinged = []
+    ping = db.pool._ping
+    monkeypatch.setattr(db.pool, "_ping", lambda conn: pinged.append(conn) or ping(conn))
+    with pytest.raises(type(error)):
+        with db.pool.connection():
+            raise error
+    assert len(pinged) == pings and db.pool_stats()["in_use"] == 0
+
+
+# --- Timeouts and cancelling ---
+def cancel_after(seconds, cancel):
+    timer = threading.Timer(seconds, cancel)
+    timer.start()
+    return timer
+
+
+def endless_db(stub_db, timeout=0.3):
+    db = stub_db(query_timeouts={"analytics": timeout})
+    db.execute_query("CREATE TABLE FLIGHTS (flight_id INTEGER PRIMARY KEY)")
+    return db
+
+
+def test_query_over_its_class_timeout_is_stopped(stub_db):
+    db = endless_db(stub_db)
+    started = time.perf_counter()
+    data, msg = db.fetch_results(ENDLESS_SQL, query_class="analytics")
+    assert time.perf_counter() - started < 2
+    assert data is None and msg.endswith("(over the 0.3 s limit for analytics queries)")
+    assert db.retry_stats()["retries"] == {}
+    assert db.query_stats.interruptions() == {"timeouts": 1, "cancelled": 0}
+
+
+def test_timeout_applies_per_query_class(stub_db):
+    db = endless_db(stub_db)
+    db.query_timeouts["search"] = 0.1
+    with db.scope("search"):
+        data, msg = db.fetch_results(ENDLESS_SQL)
+    assert data is None and "limit for search queries" in msg
+
+
+def test_unknown_query_class_is_rejected(stub_db):
+    db = stub_db()
+    with pytest.raises(ValueError, match="Unknown query class"):
+        db.fetch_results("SELECT 1", query_class="reports")
+
+
+def test_cancel_stops_running_statements(stub_db):
+    db = endless_db(stub_db, timeout=10)
+    cancel_after(0.1, db.cancel)
+    started = time.perf_counter()
+    data, msg = db.fetch_results(ENDLESS_SQL, query_class="analytics")
+    assert time.perf_counter() - started < 2
+    assert data is None and msg.endswith("(cancelled)")
+    assert db.running() == {}
+    assert db.fetch_results("SELECT COUNT(*) FROM FLIGHTS")[0] == (["COUNT(*)"], [(0,)])
+
+
+def test_cancel_handle_stops_the_rest_of_its_scope(stub_db):
+    db = endless_db(stub_db, timeout=10)
+    handle = CancelHandle()
+    cancel_after(0.1, handle.cancel)
+    with db.scope("analytics", handle):
+        first = db.fetch_results(ENDLESS_SQL)
+        second = db.fetch_results("SELECT COUNT(*) FROM FLIGHTS")
+    assert first[0] is None and first[1].endswith("(cancelled)")
+    assert second == (None, "Fetch failed: Cancelled before it started.")
+    # Calls outside the scope are not affected
+    assert db.fetch_results("SELECT COUNT(*) FROM FLIGHTS")[0] is not None
+
+
+def test_cancel_stops_a_stream(stub_db):
+    db = endless_db(stub_db, timeout=10)
+    data, msg = db.iter_results(ENDLESS_SQL.replace("COUNT(*)", "i").replace("i < 0", "i > 0"),
+                                query_class="analytics")
+    cancel_after(0.1, db.cancel)
+    with pytest.raises(stub_driver.Error) as raised:
+        for _ in data[1]:
+            pass
+    assert classify_error(raised.value) == "cancelled"
+    assert db.pool_stats()["in_use"] == 0
+
+
+def test_slow_login_times_out(stub_db, monkeypatch):
+    db = stub_db()
+    db.login_timeout = 0.1
+    monkeypatch.setattr(stub_driver, "login_latency", 0.5)
+    started = time.perf_counter()
+    ok, msg = db.connect()
+    assert time.perf_counter() - started < 0.5
+    assert not ok and "Login timeout expired" in msg
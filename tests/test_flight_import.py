@@ -0,0 +1,144 @@
+import csv
+import json
+
+import pytest
+
+import stub_driver
+from benchmarks import IMPORT_FIELDS, IMPORT_SCHEMA, merge_staged_flights
+from flight_import import DUPLICATE, import_flights
+
+GOOD = {"airline_code": "A1", "flight_number": "A1-100", "aircraft_registration": "AP-10",
+        "departure_airport": "P01", "arrival_airport": "P02", "departure_datetime": "2026-01-01 06:00",
+        "arrival_datetime": "2026-01-01 08:00", "base_price": "24000", "status": "", "gate_number": "G1"}
+
+# (change to a good record, reason it is rejected for)
+FAULTS = [
+    ({"flight_number": ""}, "missing flight_number"),
+    ({"base_price": None}, "missing base_price"),
+    ({"flight_number": "A1-" + "9" * 20}, "flight_number longer than 20"),
+    ({"gate_number": "G" * 11}, "gate_number longer than 10"),
+    ({"airline_code": "ZZ"}, "unknown airline"),
+    ({"aircraft_registration": "AP-99"}, "unknown aircraft"),
+    ({"aircraft_registration": "AP-20"}, "aircraft of another airline"),
+    ({"arrival_airport": "P99"}, "unknown airport"),
+    ({"arrival_airport": "P01"}, "same departure and arrival airport"),
+    ({"departure_datetime": "tomorrow"}, "bad date"),
+    ({"arrival_datetime": "2026-01-01 06:00"}, "arrival not after departure"),
+    ({"base_price": "-1"}, "bad base_price"),
+    ({"base_price": "lots"}, "bad base_price"),
+    ({"status": "Lost"}, "unknown status"),
+]
+
+
+@pytest.fixture
+def import_db(stub_db):
+    db = stub_db()
+    for statement in IMPORT_SCHEMA:
+        db.execute_query(statement)
+    db.execute_many("INSERT INTO AIRPORTS VALUES (?, ?, ?, ?, 'Pakistan', 'PKT', 'Active')",
+                    [(i, f"P{i:02d}", f"Airport {i}", f"City {i}") for i in range(1, 4)])
+    db.execute_many("INSERT INTO AIRLINES VALUES (?, ?, ?, 'Pakistan', 'Active')",
+                    [(i, f"A{i}", f"Airline {i}") for i in range(1, 3)])
+    db.execute_many("INSERT INTO AIRCRAFT VALUES (?, ?, ?, 'A320', 180, 150, 24, 6, 'Active')",
+                    [(a * 10, a, f"AP-{a}0") for a in range(1, 3)])
+    stub_driver.procedures["SP_MergeStagedFlights"] = merge_staged_flights
+    return db
+
+
+def flight(n, **changes):
+    record = dict(GOOD, flight_number=f"A1-{100 + n}", departure_datetime=f"2026-01-{n % 28 + 1:02d} 06:00",
+                  arrival_datetime=f"2026-01-{n % 28 + 1:02d} 08:00")
+    record.update(changes)
+    return record
+
+
+def write(path, records):
+    path = str(path)
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, IMPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+    elif path.endswith(".jsonl"):
+        with open(path, "w") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+    else:
+        with open(path, "w") as f:
+            json.dump(records, f, indent=1)
+    return path
+
+
+def flights(db):
+    data, _ = db.fetch_results("SELECT flight_number, base_price, available_seats FROM FLIGHTS ORDER BY flight_number")
+    return data[1]
+
+
+@pytest.mark.parametrize("changes, reason", FAULTS)
+def test_rejection_reason(import_db, tmp_path, changes, reason):
+    path = write(tmp_path / "schedule.json", [flight(1), flight(2, **changes)])
+    result, msg = import_flights(import_db, path)
+    assert msg == "Success"
+    assert result.rejected == {reason: 1}
+    assert result.examples == [(2, reason)]
+    assert result.staged == 1 and result.merged["inserted"] == 1
+
+
+def test_rejections_are_counted_by_reason(import_db, tmp_path):
+    records = [flight(n) for n in range(10)] + [flight(n, **changes) for n, (changes, _) in enumerate(FAULTS, 10)]
+    result, msg = import_flights(import_db, write(tmp_path / "schedule.csv", records))
+    expected = {}
+    for _, reason in FAULTS:
+        expected[reason] = expected.get(reason, 0) + 1
+    assert result.rejected == expected
+    assert result.read == len(records) and result.staged == 10
+    assert len(flights(import_db)) == 10
+
+
+def test_json_array_that_is_not_objects(import_db, tmp_path):
+    path = tmp_path / "schedule.json"
+    path.write_text(json.dumps([flight(1), 5, "A1-101"]))
+    result, msg = import_flights(import_db, str(path))
+    assert result.rejected == {"not an object": 2}
+
+
+def test_broken_json_stops_the_import_and_unstages(import_db, tmp_path):
+    path = tmp_path / "schedule.jsonl"
+    path.write_text(json.dumps(flight(1)) + "\n{\"airline_code\": \n")
+    result, msg = import_flights(import_db, str(path))
+    assert msg.startswith("Could not read") and result.seconds > 0
+    assert import_db.fetch_results("SELECT COUNT(*) FROM FLIGHTS_STAGING")[0][1] == [(0,)]
+    assert flights(import_db) == []
+
+
+def test_staging_failure_is_timed(import_db, tmp_path):
+    import_db.execute_query("DROP TABLE FLIGHTS_STAGING")
+    result, msg = import_flights(import_db, write(tmp_path / "schedule.json", [flight(1)]))
+    assert msg.startswith("Staging failed") and result.seconds > 0
+    assert result.staged == 0 and flights(import_db) == []
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".json", ".jsonl"])
+def test_formats_import_alike(import_db, tmp_path, suffix):
+    records = [flight(n) for n in range(30)]
+    result, msg = import_flights(import_db, write(tmp_path / f"schedule{suffix}", records), batch_size=7)
+    assert msg == "Success" and result.staged == 30
+    assert result.merged["inserted"] == 30
+    assert [row[2] for row in flights(import_db)] == [180] * 30
+
+
+def test_repeated_flights_are_dropped_within_and_across_batches(import_db, tmp_path):
+    records = [flight(n) for n in range(6)] + [flight(1), flight(5)]
+    result, msg = import_flights(import_db, write(tmp_path / "schedule.csv", records), batch_size=4)
+    # Record 7 repeats record 2 across batches, record 8 repeats record 6 in the same batch
+    assert result.rejected == {DUPLICATE: 1}
+    assert result.merged["duplicates"] == 1 and result.merged["duplicate_records"] == "7"
+    assert result.merged["inserted"] == 6
+
+
+def test_reimport_updates_changed_flights_only(import_db, tmp_path):
+    records = [flight(n) for n in range(5)]
+    import_flights(import_db, write(tmp_path / "first.csv", records))
+    records[2]["base_price"] = "30000"
+    result, msg = import_flights(import_db, write(tmp_path / "second.csv", records))
+    assert (result.merged["inserted"], result.merged["updated"], result.merged["unchanged"]) == (0, 1, 4)
+    assert flights(import_db)[2][1] == 30000
@@ -0,0 +1,104 @@
+import pytest
+
+import stub_driver
+from flight_search import SearchCache, grid_rows, search
+
+COLUMNS = ["flight_id", "flight_number", "airline_name"]
+
+
+class SearchServer:
+    """SP_SearchFlights returning fixed rows; during runs it calls it (a booking committing meanwhile)."""
+
+    def __init__(self, rows, during=None):
+        self.rows = rows
+        self.during = during
+        self.calls = 0
+
+    def __call__(self, raw, params):
+        self.calls += 1
+        if self.during:
+            self.during()
+        return COLUMNS, list(self.rows)
+
+
+def test_repeated_search_is_cached(stub_db):
+    db = stub_db()
+    cache = SearchCache()
+    stub_driver.procedures["SP_SearchFlights"] = server = SearchServer([(1, "PK-1", "PIA")])
+    assert search(db, 1, 2, "2025-01-15", cache=cache)[1] == "Success"
+    assert search(db, 1, 2, "2025-01-15", cache=cache) == ((COLUMNS, [(1, "PK-1", "PIA")]), "Success (cached)")
+    assert server.calls == 1
+
+
+def test_invalidation_drops_results_listing_the_flight():
+    cache = SearchCache()
+    cache.put((1, 2, "2025-01-15", None, 0, None, None), (COLUMNS, [(7, "PK-7", "PIA")]))
+    cache.put((1, 2, "2025-01-16", None, 0, None, None), (COLUMNS, [(8, "PK-8", "PIA")]))
+    assert cache.invalidate_flight(7) == 1
+    assert cache.get((1, 2, "2025-01-15", None, 0, None, None)) is None
+    assert cache.get((1, 2, "2025-01-16", None, 0, None, None)) is not None
+
+
+def test_invalidation_with_route_drops_results_the_flight_could_join():
+    cache = SearchCache()
+    flexible = (1, 2, "2025-01-14", None, 1, None, None)
+    cache.put(flexible, (COLUMNS, []))
+    cache.put((1, 2, "2025-01-20", None, 0, None, None), (COLUMNS, []))
+    cache.put((2, 1, "2025-01-15", None, 0, None, None), (COLUMNS, []))
+    assert cache.invalidate_flight(9, (1, 2), "2025-01-15 09:00:00") == 1
+    assert cache.get(flexible) is None
+
+
+def test_search_racing_a_booking_is_not_cached(stub_db):
+    db = stub_db()
+    cache = SearchCache()
+    # The booking commits and invalidates while the search's query runs
+    server = SearchServer([(1, "PK-1", "PIA")], during=lambda: cache.invalidate_flight(1, (1, 2), "2025-01-15 09:00"))
+    stub_driver.procedures["SP_SearchFlights"] = server
+    data, msg = search(db, 1, 2, "2025-01-15", cache=cache)
+    assert data == (COLUMNS, [(1, "PK-1", "PIA")])
+    assert cache.stats["stale"] == 1
+    server.during = None
+    assert search(db, 1, 2, "2025-01-15", cache=cache)[1] == "Success"
+    assert server.calls == 2
+
+
+def test_put_after_clear_is_dropped():
+    cache = SearchCache()
+    generation = cache.generation
+    cache.clear()
+    assert not cache.put((1, 2, "2025-01-15", None, 0, None, None), (COLUMNS, []), generation)
+    assert cache.put((1, 2, "2025-01-15", None, 0, None, None), (COLUMNS, []), cache.generation)
+
+
+# --- Grid rows ---
+RESULT_COLUMNS = ["flight_id", "flight_number", "airline_name", "airline_code", "departure_airport", "departure_city",
+                  "arrival_airport", "arrival_city", "departure_datetime", "arrival_datetime",
+                  "flight_duration_minutes", "base_price", "available_seats", "aircraft_model", "status",
+                  "gate_number", "class_price", "economy_price", "economy_seats", "business_price", "business_seats",
+                  "first_class_price", "first_class_seats"]
+RESULT = dict(zip(RESULT_COLUMNS, (7, "PK-7", "PIA", "PK", "Jinnah", "Karachi", "Allama Iqbal", "Lahore",
+                                   "2025-01-15 09:00", "2025-01-15 10:45", 105, 100.0, 40, "A320", "Scheduled",
+                                   "G1", 100.0, 130.0, 30, 325.0, 8, 520.0, 2)))
+
+
+def rows_for(columns, class_type, result=RESULT):
+    return grid_rows((columns, [tuple(result[name] for name in columns)]), class_type)
+
+
+@pytest.mark.parametrize("class_type, price, seats", [
+    (None, 130.0, 40), ("Any", 130.0, 40), ("Economy", 130.0, 30), ("Business", 325.0, 8), ("First Class", 520.0, 2),
+])
+def test_grid_rows_show_the_quote_of_the_class(class_type, price, seats):
+    assert rows_for(RESULT_COLUMNS, class_type) == [
+        (7, "PIA", "PK-7", "Karachi", "Lahore", "2025-01-15 09:00", price, seats, "Scheduled")]
+
+
+def test_grid_rows_find_columns_by_name():
+    columns = ["route_note"] + RESULT_COLUMNS[::-1]
+    result = dict(RESULT, route_note="direct")
+    assert rows_for(columns, "Business", result) == rows_for(RESULT_COLUMNS, "Business")
+
+
+def test_grid_rows_of_a_procedure_without_quotes_use_the_class_price():
+    assert rows_for(RESULT_COLUMNS[:17], "Business")[0][6:8] == (100.0, 40)
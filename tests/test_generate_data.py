@@ -0,0 +1,59 @@
+from datetime import date
+
+from benchmarks import GENERATED_DRIFT_SQL, GENERATED_KEYS
+from generate_data import COLUMNS, DataGenerator, first_ids, load
+
+START = date(2025, 6, 1)
+
+
+def rows_of(generator):
+    return [(table, list(rows)) for table, rows in generator.chunks()]
+
+
+def generated_db(stub_db):
+    db = stub_db()
+    for table, columns in COLUMNS.items():
+        db.execute_query(f"CREATE TABLE {table} ({columns[0]} INTEGER PRIMARY KEY, {', '.join(columns[1:])})")
+    for sql in GENERATED_KEYS:
+        db.execute_query(sql)
+    return db
+
+
+def test_same_seed_gives_the_same_rows():
+    assert rows_of(DataGenerator(2000, seed=7, start=START)) == rows_of(DataGenerator(2000, seed=7, start=START))
+
+
+def test_other_seed_gives_other_rows():
+    assert rows_of(DataGenerator(2000, seed=7, start=START)) != rows_of(DataGenerator(2000, seed=8, start=START))
+
+
+def test_load_keeps_the_unique_keys_and_seat_counters(stub_db):
+    db = generated_db(stub_db)
+    generator = DataGenerator(5000, seed=7, start=START, first_ids=first_ids(db)[0])
+    throughput, msg = load(db, generator, chunk_size=1000, sql_server=False)
+    assert msg == "Success"
+    generated = sum(len(rows) for table, rows in generator.chunks() if table == "RESERVATIONS")
+    data, _ = db.fetch_results("SELECT COUNT(*) FROM RESERVATIONS")
+    assert data[1][0][0] == generated > 0
+    drift, _ = db.fetch_results(GENERATED_DRIFT_SQL)
+    assert drift[1][0][0] == 0
+
+
+def test_ids_continue_after_existing_rows(stub_db):
+    db = generated_db(stub_db)
+    load(db, DataGenerator(500, seed=1, start=START, first_ids=first_ids(db)[0]), sql_server=False)
+    before, _ = db.fetch_results("SELECT COUNT(*) FROM PASSENGERS")
+    throughput, msg = load(db, DataGenerator(500, seed=2, start=START, first_ids=first_ids(db)[0]), sql_server=False)
+    after, _ = db.fetch_results("SELECT COUNT(*) FROM PASSENGERS")
+    assert msg == "Success"
+    assert after[1][0][0] > before[1][0][0]
+
+
+def test_execute_many_writes_all_rows_or_none(stub_db):
+    db = stub_db()
+    db.execute_query("CREATE TABLE T (n INTEGER PRIMARY KEY)")
+    assert db.execute_many("INSERT INTO T VALUES (?)", [(n,) for n in range(100)])[0]
+    ok, msg = db.execute_many("INSERT INTO T VALUES (?)", [(n,) for n in range(100, 150)] + [(5,)])
+    assert not ok
+    data, _ = db.fetch_results("SELECT COUNT(*) FROM T")
+    assert data[1][0][0] == 100
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pytest
+
+from itineraries import FlightNetwork, leg_rows
+
+NOW = datetime(2026, 3, 2, 0, 0)
+
+
+def flight(flight_id, dep, arr, leaves, lands, base_price, economy, business, first=(0.0, 0)):
+    """A FLIGHTS_SQL row; each class is (quoted price, free seats)."""
+    return (flight_id, f"XX{flight_id}", "Airline", dep, arr, datetime(2026, 3, 2, *leaves),
+            datetime(2026, 3, 2, *lands), base_price, economy[1] + business[1] + first[1],
+            *economy, *business, *first)
+
+
+@pytest.fixture
+def network():
+    network = FlightNetwork(None, now=lambda: NOW)
+    network.load([
+        # 1 -> 3 direct: a low base fare, but quoted close to departure
+        flight(1, 1, 3, (9, 0), (12, 0), 100.0, (150.0, 4), (375.0, 0)),
+        # 1 -> 2 -> 3: a higher base fare, quoted lower
+        flight(2, 1, 2, (8, 0), (9, 0), 120.0, (60.0, 9), (150.0, 2)),
+        flight(3, 2, 3, (10, 0), (11, 30), 120.0, (70.0, 5), (175.0, 3)),
+    ])
+    network.loaded_at = float("inf")
+    return network
+
+
+def search(network, class_type=None, sort="price"):
+    trips, msg = network.search(1, 3, "2026-03-02", class_type, max_legs=2, sort=sort)
+    return trips
+
+
+def test_itineraries_are_priced_and_sorted_by_quote(network):
+    trips = search(network, "Any")
+    assert [(trip.price, [leg.flight_id for leg in trip.legs]) for trip in trips] == [(130.0, [2, 3]), (150.0, [1])]
+    assert [trip.price for trip in search(network, "Economy")] == [130.0, 150.0]
+
+
+def test_class_without_free_seats_is_left_out(network):
+    trips = search(network, "Business")
+    assert [(trip.price, trip.available_seats) for trip in trips] == [(325.0, 2)]
+
+
+def test_leg_rows_show_the_quote_and_class_seats(network):
+    rows = leg_rows(search(network, "Business"), "Business", str)
+    assert [(row[0], row[6], row[7], row[8]) for row in rows] == [(2, 150.0, 2, "Trip 1: 1/2"), (3, 175.0, 3, "Trip 1: 2/2")]
+    rows = leg_rows(search(network), None, str)
+    assert [(row[0], row[6], row[7]) for row in rows] == [(2, 60.0, 11), (3, 70.0, 8), (1, 150.0, 4)]
@@ -0,0 +1,26 @@
+from query_stats import QueryStats, fingerprint
+
+LOGIN = "EXEC SP_AuthenticateUser 'admin', 'hunter2'"
+
+
+def test_fingerprint_folds_values():
+    assert fingerprint("SELECT * FROM FLIGHTS WHERE flight_id IN (1, 2, 3) AND status = 'Delayed' -- note") == (
+        "SELECT * FROM FLIGHTS WHERE flight_id IN (...) AND status = ?")
+
+
+def test_slow_log_keeps_no_error_text():
+    stats = QueryStats(slow_threshold=0.1)
+    error = "Fetch failed: [42000] Login failed for user 'admin' with password 'hunter2'. (18456) (SQLExecDirectW)"
+    stats.record(LOGIN, 0.2, error=error)
+    stats.record(LOGIN, 0.01, error="Fetch failed: Query timeout expired 'hunter2'", error_class="timeout")
+    assert [entry[3:] for entry in stats.slow()] == [
+        ("EXEC SP_AuthenticateUser ?, ?", True, "timeout"), ("EXEC SP_AuthenticateUser ?, ?", True, None)]
+    report = "\n".join(stats.report())
+    assert "hunter2" not in report and "TIMED OUT" in report and "FAILED" in report
+    assert stats.top()[0].errors == 2 and stats.interruptions() == {"timeouts": 1, "cancelled": 0}
+
+
+def test_quick_successful_calls_stay_out_of_the_slow_log():
+    stats = QueryStats(slow_threshold=0.1)
+    stats.record(LOGIN, 0.01)
+    assert stats.slow() == [] and stats.top()[0].calls == 1
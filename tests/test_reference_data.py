@@ -0,0 +1,43 @@
+import pytest
+
+from benchmarks import IMPORT_SCHEMA
+from reference_data import ReferenceCache
+
+
+def reference_db(stub_db, name, airports):
+    db = stub_db(name)
+    for statement in IMPORT_SCHEMA[:3]:
+        db.execute_query(statement)
+    db.execute_many("INSERT INTO AIRPORTS VALUES (?, ?, ?, ?, 'Pakistan', 'PKT', 'Operational')",
+                    [(i, f"P{i:02d}", f"Airport {i}", f"City {i}") for i in range(1, airports + 1)])
+    return db
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    return str(tmp_path / "reference.json")
+
+
+def test_snapshot_warms_a_cache_for_the_same_database(stub_db, snapshot_path):
+    db = reference_db(stub_db, "karachi", 3)
+    assert ReferenceCache(db, snapshot_path=snapshot_path).refresh()[0]
+    cache = ReferenceCache(db, snapshot_path=snapshot_path)
+    assert cache.load_snapshot()
+    assert cache.airports.by_code("p02")["city"] == "City 2"
+    assert cache.fresh and cache.stats == {"loads": 0, "snapshot_loads": 1}
+
+
+def test_snapshot_of_another_server_or_database_is_ignored(stub_db, snapshot_path):
+    db = reference_db(stub_db, "karachi", 3)
+    assert ReferenceCache(db, snapshot_path=snapshot_path).refresh()[0]
+    cache = ReferenceCache(reference_db(stub_db, "lahore", 2), snapshot_path=snapshot_path)
+    assert not cache.load_snapshot()
+    assert len(cache.airports) == 0 and not cache.fresh
+    db.settings["database"] = "Staging"
+    assert not ReferenceCache(db, snapshot_path=snapshot_path).load_snapshot()
+
+
+def test_snapshot_without_a_source_is_ignored(stub_db, snapshot_path):
+    with open(snapshot_path, "w", encoding="utf-8") as f:
+        f.write('{"saved_at": null, "tables": {"airports": [], "airlines": [], "aircraft": []}}')
+    assert not ReferenceCache(reference_db(stub_db, "karachi", 1), snapshot_path=snapshot_path).load_snapshot()
@@ -0,0 +1,132 @@
+from datetime import date, datetime
+
+import pytest
+
+import stub_driver
+from benchmarks import PATTERN_COLUMNS, SCHEDULE_SCHEMA, ScheduleServer
+from schedules import days_mask, expand_schedules
+
+NOW = datetime(2026, 3, 2, 12, 0)  # a Monday
+THROUGH = date(2026, 3, 15)
+# airline, aircraft, number, from, to, time, minutes, days, valid from, valid to, price, gate, status
+DAILY = (1, 1, "SX-1", 1, 2, "09:00", 90, "1111111", "2026-03-01", "2026-12-31", 100.0, "G1", "Active")
+WEEKDAYS = (1, 2, "SX-2", 2, 1, "18:00", 60, "1111100", "2026-03-01", "2026-12-31", 200.0, "G2", "Active")
+
+
+@pytest.mark.parametrize("text, mask", [
+    ("daily", "1111111"),
+    ("Daily ", "1111111"),
+    ("Mon-Fri", "1111100"),
+    ("Mon,Wed,Fri", "1010100"),
+    ("Sat-Sun", "0000011"),
+    ("Fri-Mon", "1000111"),
+    ("sun", "0000001"),
+    ("Monday-Tuesday, Sun", "1100001"),
+])
+def test_days_mask(text, mask):
+    assert days_mask(text) == mask
+
+
+@pytest.mark.parametrize("text", ["", "weekdays", "Mon-Wed-Fri", "Mon,,Fri"])
+def test_days_mask_rejects(text):
+    with pytest.raises(ValueError):
+        days_mask(text)
+
+
+@pytest.fixture
+def schedule_db(stub_db):
+    db = stub_db()
+    for statement in SCHEDULE_SCHEMA:
+        db.execute_query(statement)
+    db.execute_many("INSERT INTO AIRCRAFT VALUES (?, ?)", [(1, 150), (2, 180), (3, 60)])
+    stub_driver.procedures["SP_ExpandSchedules"] = ScheduleServer(NOW).expand
+    return db
+
+
+def add(db, schedule_id, pattern):
+    ok, msg = db.execute_commit(f"INSERT INTO FLIGHT_SCHEDULES (schedule_id, {', '.join(PATTERN_COLUMNS)}) "
+                                f"VALUES (?, {', '.join('?' * len(PATTERN_COLUMNS))})", (schedule_id,) + pattern)
+    assert ok, msg
+
+
+def edit(db, schedule_id, **changes):
+    sets = ", ".join(f"{column} = ?" for column in changes)
+    assert db.execute_commit(f"UPDATE FLIGHT_SCHEDULES SET {sets} WHERE schedule_id = ?",
+                             tuple(changes.values()) + (schedule_id,))[0]
+
+
+def counts(db, through=THROUGH):
+    result, msg = expand_schedules(db, through)
+    assert result is not None, msg
+    return {key: value for key, value in result.items() if value}
+
+
+def flights(db, schedule_id):
+    data, _ = db.fetch_results("SELECT departure_datetime, status, available_seats FROM FLIGHTS "
+                               "WHERE schedule_id = ? ORDER BY departure_datetime", (schedule_id,))
+    return data[1]
+
+
+def test_expansion_counts(schedule_db):
+    add(schedule_db, 1, DAILY)
+    add(schedule_db, 2, WEEKDAYS)
+    # Daily from 3 March (today's 09:00 has left), weekdays from today's 18:00
+    assert counts(schedule_db) == {"changed_schedules": 2, "inserted": 13 + 10}
+    assert flights(schedule_db, 1)[0] == ("2026-03-03 09:00:00", "Scheduled", 150)
+    assert [row[0][:10] for row in flights(schedule_db, 2)][4:6] == ["2026-03-06", "2026-03-09"]
+
+
+def test_rerun_writes_nothing(schedule_db):
+    add(schedule_db, 1, DAILY)
+    counts(schedule_db)
+    assert counts(schedule_db) == {}
+
+
+def test_later_horizon_adds_only_the_new_days(schedule_db):
+    add(schedule_db, 1, DAILY)
+    add(schedule_db, 2, WEEKDAYS)
+    counts(schedule_db)
+    assert counts(schedule_db, date(2026, 3, 22)) == {"inserted": 7 + 5}
+
+
+def test_validity_period_and_status_limit_the_flights(schedule_db):
+    add(schedule_db, 1, DAILY[:8] + ("2026-03-10", "2026-03-12") + DAILY[10:])
+    add(schedule_db, 2, WEEKDAYS[:-1] + ("Inactive",))
+    assert counts(schedule_db) == {"changed_schedules": 2, "inserted": 3}
+
+
+def test_edited_days_remove_unbooked_and_cancel_booked_flights(schedule_db):
+    add(schedule_db, 2, WEEKDAYS)
+    counts(schedule_db)
+    booked = flights(schedule_db, 2)
+    # A booking on the Friday 6 March flight
+    schedule_db.execute_commit("INSERT INTO RESERVATIONS (flight_id) SELECT flight_id FROM FLIGHTS "
+                               "WHERE departure_datetime = '2026-03-06 18:00:00'")
+    edit(schedule_db, 2, days_of_week=days_mask("Mon-Thu"))
+    assert counts(schedule_db) == {"changed_schedules": 1, "deleted": 1, "cancelled": 1}
+    assert len(flights(schedule_db, 2)) == len(booked) - 1
+    assert ("2026-03-06 18:00:00", "Cancelled", 180) in flights(schedule_db, 2)
+
+
+def test_edited_price_updates_flights_in_place(schedule_db):
+    add(schedule_db, 1, DAILY)
+    counts(schedule_db)
+    edit(schedule_db, 1, base_price=120.0)
+    assert counts(schedule_db) == {"changed_schedules": 1, "updated": 13}
+
+
+def test_aircraft_swap_that_does_not_fit_the_sold_seats_is_a_conflict(schedule_db):
+    add(schedule_db, 1, DAILY)
+    counts(schedule_db)
+    # 100 seats sold on the 3 March flight; the 60-seat aircraft cannot take them
+    schedule_db.execute_commit("UPDATE FLIGHTS SET available_seats = 50 WHERE departure_datetime = '2026-03-03 09:00:00'")
+    edit(schedule_db, 1, aircraft_id=3)
+    assert counts(schedule_db) == {"changed_schedules": 1, "updated": 12, "conflicts": 1}
+    assert flights(schedule_db, 1)[0][2] == 50
+    assert {row[2] for row in flights(schedule_db, 1)[1:]} == {60}
+
+
+def test_flight_held_by_another_schedule_is_a_conflict(schedule_db):
+    add(schedule_db, 1, DAILY)
+    add(schedule_db, 2, DAILY[:4] + (3,) + DAILY[5:])  # same flight number and time, another route
+    assert counts(schedule_db) == {"changed_schedules": 2, "inserted": 13, "conflicts": 13}
@@ -0,0 +1,238 @@
+import os
+import random
+import re
+
+import pytest
+
+from benchmarks import write_setup_scripts
+from sql_runner import LEDGER, SQLRunner, script_batches, split_batches
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETUP_SCRIPTS = [f"SQLQuery_{n}.sql" for n in range(6)]
+
+
+def texts(content):
+    return [text for _, _, text in split_batches(content)]
+
+
+# --- Splitting ---
+@pytest.mark.parametrize("name", SETUP_SCRIPTS)
+def test_setup_scripts_split_as_the_old_regex_did(name):
+    with open(os.path.join(ROOT, name), encoding="utf-8") as f:
+        content = f.read()
+    old = [part.strip() for part in re.split(r"\bGO\b", content, flags=re.IGNORECASE) if part.strip()]
+    assert texts(content) == old
+
+
+@pytest.mark.parametrize("name", SETUP_SCRIPTS)
+def test_setup_script_batches_start_on_their_line(name):
+    path = os.path.join(ROOT, name)
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    for _, line, text in script_batches(path):
+        assert lines[line - 1].strip() and text.startswith(lines[line - 1].strip())
+
+
+@pytest.mark.parametrize("hidden", [
+    "PRINT 'first line\nGO\nstill the same string';",
+    "SELECT 'it''s\nGO 2\n''quoted''' AS s;",
+    "/* a comment\nGO\nover lines */ SELECT 1;",
+    "/* nested /* comments\nGO\n*/ still a comment\ngo\n*/ SELECT 1;",
+    "SELECT [bracketed ]] name\nGO\n] FROM t;",
+    "SELECT \"quoted \"\" name\nGO\n\" FROM t;",
+])
+def test_go_inside_strings_comments_and_identifiers_is_text(hidden):
+    assert texts(f"SELECT 0;\nGO\n{hidden}\nGO\n") == ["SELECT 0;", hidden]
+
+
+@pytest.mark.parametrize("statement", ["SELECT [GO] FROM [dbo].[GO];", "EXEC dbo.GO;", "GOTO done;",
+                                       "SELECT 'GO' AS go_text;", "-- GO in a line comment"])
+def test_go_token_not_alone_on_its_line_does_not_split(statement):
+    assert texts(f"{statement}\nSELECT 1;\nGO\n") == [f"{statement}\nSELECT 1;"]
+
+
+@pytest.mark.parametrize("separator", ["GO", "go", "  Go  ", "GO -- done", "GO\r"])
+def test_go_line_variants_split(separator):
+    assert texts(f"SELECT 1;\n{separator}\nSELECT 2;") == ["SELECT 1;", "SELECT 2;"]
+
+
+def test_go_count_repeats_the_batch_under_one_number():
+    assert split_batches("SELECT 1;\nGO 3\nSELECT 2;\n\tgo\t2 -- twice\n") == [
+        (1, 1, "SELECT 1;")] * 3 + [(2, 3, "SELECT 2;")] * 2
+
+
+def test_go_count_below_one_is_rejected():
+    with pytest.raises(ValueError, match="line 2"):
+        split_batches("SELECT 1;\nGO 0\n")
+
+
+def test_batches_carry_their_first_non_blank_line():
+    script = "\n\n-- header\nSELECT 1;\nGO\n\n\nSELECT 2;\nGO\nGO\n  \nSELECT 3;"
+    assert [(number, line) for number, line, _ in split_batches(script)] == [(1, 3), (2, 8), (3, 12)]
+
+
+def test_script_file_with_byte_order_mark_and_crlf(tmp_path):
+    path = tmp_path / "script.sql"
+    path.write_bytes("\ufeffSELECT 'é';\r\nGO\r\nSELECT 2;\r\n".encode("utf-8"))
+    assert [(number, line, text) for number, line, text in script_batches(str(path))] == [
+        (1, 1, "SELECT 'é';"), (2, 3, "SELECT 2;")]
+
+
+# --- Fuzzing ---
+# Pieces of T-SQL that leave the lexer back in code; several hide a GO line or a GO token
+FRAGMENTS = [
+    "SELECT 1;",
+    "SELECT 'GO' AS go_text;",
+    "PRINT 'first line\nGO\nstill the same string';",
+    "SELECT 'it''s\nGO 2\n''quoted''' AS s;",
+    "PRINT N'ünïcode ✓ GO';",
+    "-- GO in a line comment",
+    "SELECT 1; -- a trailing comment with a quote ' and a bracket [",
+    "/* a comment\nGO\nover lines */",
+    "/* nested /* comments\nGO\n*/ still a comment\ngo\n*/",
+    "SELECT [GO] FROM [dbo].[GO];",
+    "SELECT [bracketed ]] name\nGO\n] FROM t;",
+    "SELECT \"quoted \"\" name\nGO\n\" FROM t;",
+    "EXEC dbo.GO;",
+    "GOTO done;\ndone:",
+    "SELECT '--' + '/*' AS not_comments;",
+    "SELECT 1 /* it's ' unbalanced in a comment */;",
+    "CREATE OR ALTER PROCEDURE p AS\nBEGIN\n    SELECT 1 AS go;\nEND;",
+    "INSERT INTO t VALUES ('a;b', 'GO;');",
+]
+SEPARATORS = [("GO", 1), ("go", 1), ("  Go  ", 1), ("GO 3", 3), ("GO -- done", 1), ("\tgo\t2 -- twice", 2)]
+
+
+def fuzz_script(rng):
+    """(script text, expected [(number, first line, text)]) for a random script built from FRAGMENTS."""
+    parts, expected = [], []
+    line = 1
+    batches = rng.randint(1, 8)
+    for number in range(1, batches + 1):
+        pieces = [rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 5))]
+        # A line comment runs to the end of its line, so what follows one starts a new line
+        body = rng.choice(["", "\n", "\n\n", "  "]) + "".join(
+            p + ("\n" if "-- " in p else rng.choice(["\n", " ", "\n\n"])) for p in pieces)
+        separator, count = rng.choice(SEPARATORS)
+        # The last batch may end without GO
+        text = body if number == batches and rng.random() < 0.3 else body + "\n" + separator + "\n"
+        if body.strip():
+            first = line + body[:len(body) - len(body.lstrip())].count("\n")
+            expected += [(len({n for n, _, _ in expected}) + 1, first, body.strip())] * (count if text != body else 1)
+        parts.append(text)
+        line += text.count("\n")
+    return "".join(parts), expected
+
+
+def test_fuzzed_scripts_split_as_built(tmp_path):
+    rng = random.Random(25)
+    path = str(tmp_path / "fuzz.sql")
+    for _ in range(2000):
+        script, expected = fuzz_script(rng)
+        with open(path, "w", encoding=rng.choice(["utf-8", "utf-8-sig"]), newline=rng.choice(["\n", "\r\n"])) as f:
+            f.write(script)
+        assert list(script_batches(path)) == expected, script
+
+
+# --- Migration ledger ---
+@pytest.fixture
+def runner(stub_db, tmp_path):
+    runner = SQLRunner(stub_db("migrations"))
+    runner.ledger = LEDGER  # sqlite has no three-part names
+    write_setup_scripts(str(tmp_path), rows=10)
+    return runner
+
+
+def edit(directory, name, old, new):
+    path = os.path.join(directory, name)
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+    assert old in content
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content.replace(old, new))
+
+
+def ledger(runner):
+    data, _ = runner.db.fetch_results(f"SELECT script_name, batch_number FROM {LEDGER} ORDER BY script_name, batch_number")
+    return data[1]
+
+
+def ran(runner):
+    return [(name, number) for name, number, _, _ in runner.timings]
+
+
+def test_incremental_run_needs_a_ledger(runner, tmp_path):
+    success, msg = runner.run_all_scripts(str(tmp_path), incremental=True)
+    assert not success and msg.startswith("No migration ledger")
+    assert runner.timings == []
+
+
+def test_full_run_records_every_batch(runner, tmp_path):
+    success, msg = runner.run_all_scripts(str(tmp_path))
+    assert success, msg
+    batches = sum(len(list(script_batches(str(tmp_path / f"SQLQuery_{n}.sql")))) for n in (0, 1, 2, 3, 5))
+    assert len(ledger(runner)) == len(runner.timings) == batches
+
+
+def test_unchanged_scripts_are_skipped(runner, tmp_path):
+    runner.run_all_scripts(str(tmp_path))
+    success, msg = runner.run_all_scripts(str(tmp_path), incremental=True)
+    assert success and msg.startswith("Schema is up to date")
+    assert runner.timings == []
+
+
+def test_only_new_and_changed_batches_rerun(runner, tmp_path):
+    runner.run_all_scripts(str(tmp_path))
+    before = len(ledger(runner))
+    edit(str(tmp_path), "SQLQuery_3.sql", "COUNT(*) AS n FROM FLIGHTS GROUP", "SUM(value) AS n FROM FLIGHTS GROUP")
+    with open(tmp_path / "SQLQuery_2.sql", "a", encoding="utf-8") as f:
+        f.write("\nCREATE INDEX idx_flights_created ON FLIGHTS (created)\nGO\n")
+    success, msg = runner.run_all_scripts(str(tmp_path), incremental=True)
+    assert success, msg
+    assert ran(runner) == [("SQLQuery_2.sql", 12), ("SQLQuery_3.sql", 6)]
+    assert "SQLQuery_5.sql: unchanged, skipped" in msg
+    # The view's old row is pruned, the new index gets one
+    assert len(ledger(runner)) == before + 1
+    success, msg = runner.run_all_scripts(str(tmp_path), incremental=True)
+    assert msg.startswith("Schema is up to date")
+
+
+def test_failed_batch_reruns_next_time(runner, tmp_path):
+    runner.run_all_scripts(str(tmp_path))
+    with open(tmp_path / "SQLQuery_2.sql", "a", encoding="utf-8") as f:
+        f.write("\nCREATE INDEX idx_flights_created ON FLIGHTS (created)\nGO\n"
+                "CREATE INDEX idx_broken ON NO_SUCH_TABLE (created)\nGO\n")
+    success, msg = runner.run_all_scripts(str(tmp_path), incremental=True)
+    assert not success and "SQLQuery_2.sql, batch 13" in msg
+    edit(str(tmp_path), "SQLQuery_2.sql", "NO_SUCH_TABLE", "USERS")
+    success, msg = runner.run_all_scripts(str(tmp_path), incremental=True)
+    assert success, msg
+    # The batch that ran before the failure was recorded and is not run again
+    assert ran(runner) == [("SQLQuery_2.sql", 13)]
+
+
+def test_changed_database_reset_needs_a_full_run(runner, tmp_path):
+    runner.run_all_scripts(str(tmp_path))
+    with open(tmp_path / "SQLQuery_0.sql", "a", encoding="utf-8") as f:
+        f.write("\n-- a full rebuild\nDROP DATABASE IF EXISTS FlightReservationDB\nGO\n")
+    success, msg = runner.run_all_scripts(str(tmp_path), incremental=True)
+    assert not success and "drops or creates the database" in msg
+    assert runner.timings == []
+
+
+def test_edited_create_table_needs_a_full_run(runner, tmp_path):
+    runner.run_all_scripts(str(tmp_path))
+    before = ledger(runner)
+    edit(str(tmp_path), "SQLQuery_1.sql", "CREATE TABLE USERS (id INTEGER PRIMARY KEY, code,",
+         "CREATE TABLE USERS (id INTEGER PRIMARY KEY, email, code,")
+    success, msg = runner.run_all_scripts(str(tmp_path), incremental=True)
+    assert not success and "SQLQuery_1.sql, batch" in msg and "cannot run again" in msg
+    assert runner.timings == [] and ledger(runner) == before
+
+
+def test_new_table_in_a_batch_of_its_own_runs(runner, tmp_path):
+    runner.run_all_scripts(str(tmp_path))
+    edit(str(tmp_path), "SQLQuery_1.sql", "-- TABLE 1:", "CREATE TABLE ROUTES (id INTEGER PRIMARY KEY)\nGO\n\n-- TABLE 1:")
+    success, msg = runner.run_all_scripts(str(tmp_path), incremental=True)
+    assert success, msg
+    assert ran(runner) == [("SQLQuery_1.sql", 1)]
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+import statements
+from statements import HOT_PATH_MODULES, find_adhoc_sql, register
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_hot_paths_have_no_adhoc_sql():
+    assert find_adhoc_sql([os.path.join(ROOT, name) for name in HOT_PATH_MODULES]) == []
+
+
+def test_checker_reports_interpolated_value(tmp_path):
+    module = tmp_path / "planted.py"
+    module.write_text(
+        "def lookup(db, v):\n"
+        "    return db.fetch_results(f\"SELECT * FROM FLIGHTS WHERE x = '{v}'\")\n")
+    found = find_adhoc_sql([str(module)])
+    assert [(path, line) for path, line, _ in found] == [(str(module), 2)]
+
+
+@pytest.mark.parametrize("expression", [
+    "\"SELECT * FROM FLIGHTS WHERE flight_id = {}\".format(v)",
+    "\"DELETE FROM FLIGHTS WHERE flight_id IN (%s)\" % v",
+    "f\"SELECT * FROM AIRPORTS WHERE city LIKE {v}\"",
+])
+def test_checker_reports_format_and_percent(tmp_path, expression):
+    module = tmp_path / "planted.py"
+    module.write_text(f"sql = {expression}\n")
+    assert len(find_adhoc_sql([str(module)])) == 1
+
+
+def test_checker_allows_interpolated_identifiers(tmp_path):
+    module = tmp_path / "identifiers.py"
+    module.write_text("sql = f\"SELECT TOP (?) * FROM {table} ORDER BY {column}\"\n")
+    assert find_adhoc_sql([str(module)]) == []
+
+
+def test_register_rejects_a_name_reused_for_other_sql():
+    first = register("test_statement", "SELECT 1")
+    assert register("test_statement", "  SELECT 1  ") is first
+    with pytest.raises(ValueError):
+        register("test_statement", "SELECT 2")
+    del statements.STATEMENTS["test_statement"]
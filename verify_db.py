@@ -1,8 +1,12 @@
 from database_connection import DatabaseConnection
 from sql_runner import SQLRunner
 import os
+import sys
+
+def main(argv):
+    # python verify_db.py [incremental]: only run batches new or changed since the last run
+    incremental = bool(argv) and argv[0] == "incremental"
 
-def main():
     print("Initializing database connection...")
     db = DatabaseConnection()
     success, msg = db.connect()
@@ -17,10 +21,10 @@ def main():
     current_dir = os.getcwd()
     print(f"Running scripts in: {current_dir}")
     
-    success, msg = runner.run_all_scripts(current_dir)
+    success, msg = runner.run_all_scripts(current_dir, incremental=incremental)
     print(msg)
     
     db.disconnect()
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])